@@ -0,0 +1,49 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import sys
+from pathlib import Path
+
+from odoo import SUPERUSER_ID, api
+from odoo.cli import Command
+from odoo.modules.registry import Registry
+from odoo.tools import config
+
+from ..models.account_move_line import REPORT_INDEXES
+
+
+class FinancialReportIndexes(Command):
+    """Report the usage of the move line indexes by the financial reports"""
+
+    name = "financial_report_indexes"
+
+    def run(self, args):
+        config.parser.prog = f"{Path(sys.argv[0]).name} {self.name}"
+        config.parse_config(args, setup_logging=True)
+        dbname = config["db_name"]
+        if not dbname or "," in dbname:
+            sys.exit("A single database must be given with -d")
+        with Registry(dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            usage = env["account.move.line"]._get_report_index_usage()
+        print(f"{'Index':<60} {'Scans':>12} {'Tuples read':>14} {'Size':>10}")
+        for index in usage:
+            flags = []
+            if index["managed"]:
+                flags.append("report")
+            if not index["valid"]:
+                flags.append("INVALID")
+            if index["managed"] and not index["scans"]:
+                flags.append("unused")
+            print(
+                f"{index['name']:<60} {index['scans']:>12} "
+                f"{index['tuples_read']:>14} {index['size']:>10}"
+                + (f"  ({', '.join(flags)})" if flags else "")
+            )
+        missing = sorted(set(REPORT_INDEXES) - {index["name"] for index in usage})
+        for name in missing:
+            print(f"{name:<60} {'missing':>12}")
+        print(
+            "\nScans are counted by PostgreSQL since its statistics were last "
+            "reset. Report indexes without scans are not used by the reports "
+            "on this database."
+        )
@@ -0,0 +1,290 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import base64
+import io
+import logging
+import zipfile
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+REPORT_WIZARDS = [
+    ("general.ledger.report.wizard", "General Ledger"),
+    ("journal.ledger.report.wizard", "Journal Ledger"),
+    ("trial.balance.report.wizard", "Trial Balance"),
+    ("open.items.report.wizard", "Open Items"),
+    ("aged.partner.balance.report.wizard", "Aged Partner Balance"),
+    ("vat.report.wizard", "VAT Report"),
+]
+
+# Reports of the balances at a date rather than over a period
+DATE_AT_WIZARDS = ["open.items.report.wizard", "aged.partner.balance.report.wizard"]
+
+# Crons rendering the queued lines: a cron never runs twice at once, each one
+# is a job of its own, run by the cron worker processes. Every job holds one
+# database connection, so the pool stays well below db_maxconn.
+CRON_POOL = [
+    "account_financial_report.ir_cron_financial_report_export",
+    "account_financial_report.ir_cron_financial_report_export_2",
+    "account_financial_report.ir_cron_financial_report_export_3",
+    "account_financial_report.ir_cron_financial_report_export_4",
+]
+
+
+class AccountFinancialReportExport(models.Model):
+    """Batch of XLSX financial reports, rendered in background jobs.
+
+    The crons of the pool claim the queued lines one at a time, and commit the
+    workbook of each line on its own. The job rendering the last line zips the
+    workbooks into one attachment. A killed job leaves its line queued, and
+    the next job renders it again.
+    """
+
+    _name = "account.financial.report.export"
+    _description = "Financial Report Batch Export"
+    _order = "id desc"
+
+    name = fields.Char(required=True, default="Financial reports")
+    user_id = fields.Many2one(
+        "res.users",
+        string="Requested by",
+        required=True,
+        default=lambda self: self.env.user,
+        help="The reports are computed with the access rights of this user.",
+    )
+    line_ids = fields.One2many(
+        "account.financial.report.export.line", "export_id", string="Reports"
+    )
+    state = fields.Selection(
+        [
+            ("draft", "Draft"),
+            ("queued", "Queued"),
+            ("running", "Running"),
+            ("done", "Done"),
+            ("failed", "Failed"),
+        ],
+        default="draft",
+        required=True,
+        readonly=True,
+    )
+    workers = fields.Integer(
+        help="Number of reports rendered at the same time, each by a cron job "
+        "of its own, at most 4 and by default 4.",
+    )
+    attachment_id = fields.Many2one("ir.attachment", readonly=True, copy=False)
+    error = fields.Text(readonly=True, copy=False)
+
+    def action_enqueue(self):
+        self.line_ids.write({"state": "queued", "error": False})
+        self.write({"state": "queued", "error": False})
+        workers = max((export._get_workers() for export in self), default=1)
+        for xmlid in CRON_POOL[:workers]:
+            self.env.ref(xmlid)._trigger()
+
+    def action_download(self):
+        self.ensure_one()
+        return {
+            "type": "ir.actions.act_url",
+            "url": f"/web/content/{self.attachment_id.id}?download=true",
+            "target": "self",
+        }
+
+    def _get_workers(self):
+        """Number of crons of the pool to wake up for the export"""
+        self.ensure_one()
+        workers = min(self.workers or len(CRON_POOL), len(CRON_POOL))
+        return max(min(workers, len(self.line_ids)), 1)
+
+    @api.model
+    def _cron_process_queue(self):
+        """Job of a cron of the pool: render the queued lines, each in its own
+        transaction, then zip the exports with all their lines rendered"""
+        self._start_queued()
+        self.env.cr.commit()
+        line_model = self.env["account.financial.report.export.line"]
+        while line := line_model._claim_queued():
+            line._run_as_requester()
+            self.env.cr.commit()
+        while export := self._claim_rendered():
+            export._zip_lines()
+            self.env.cr.commit()
+
+    @api.model
+    def _start_queued(self):
+        self.search([("state", "=", "queued")]).state = "running"
+
+    @api.model
+    def _claim_rendered(self):
+        """Lock a running export without queued lines, skipping those locked
+        by the other jobs"""
+        self.env.flush_all()
+        self.env.cr.execute(
+            """
+            SELECT export.id FROM account_financial_report_export export
+            WHERE export.state = 'running'
+                AND NOT EXISTS (
+                    SELECT 1 FROM account_financial_report_export_line line
+                    WHERE line.export_id = export.id AND line.state = 'queued'
+                )
+            ORDER BY export.id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+            """
+        )
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    def _zip_lines(self):
+        """Zip the workbooks of the lines, once they are all rendered"""
+        self.ensure_one()
+        self.line_ids.invalidate_recordset()
+        failed = self.line_ids.filtered(lambda line: line.state != "done")
+        if failed:
+            errors = [
+                f"{line._get_file_name()}: {line.error or 'not rendered'}"
+                for line in failed
+            ]
+            self.write({"state": "failed", "error": "\n".join(errors)})
+            return
+        try:
+            with self.env.cr.savepoint():
+                buffer = io.BytesIO()
+                with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                    for line in self.line_ids:
+                        archive.writestr(line._get_file_name(), line.attachment_id.raw)
+                attachment = self.env["ir.attachment"].create(
+                    {
+                        "name": f"{self.name}.zip",
+                        "datas": base64.b64encode(buffer.getvalue()),
+                        "mimetype": "application/zip",
+                        "res_model": self._name,
+                        "res_id": self.id,
+                    }
+                )
+                self.write({"state": "done", "attachment_id": attachment.id})
+        except Exception as e:
+            _logger.exception("Financial report export %s failed", self.id)
+            self.write({"state": "failed", "error": str(e)})
+
+
+class AccountFinancialReportExportLine(models.Model):
+    _name = "account.financial.report.export.line"
+    _description = "Financial Report Batch Export Line"
+    _order = "sequence, id"
+
+    export_id = fields.Many2one(
+        "account.financial.report.export", required=True, ondelete="cascade"
+    )
+    sequence = fields.Integer(default=10)
+    report_model = fields.Selection(REPORT_WIZARDS, string="Report", required=True)
+    company_id = fields.Many2one("res.company", required=True)
+    date_from = fields.Date(help="Start of the period of the report.")
+    date_to = fields.Date(
+        required=True,
+        default=fields.Date.context_today,
+        help="End of the period of the report, or the date of the open items "
+        "and aged balances.",
+    )
+    target_move = fields.Selection(
+        [("posted", "All Posted Entries"), ("all", "All Entries")],
+        string="Target Moves",
+        required=True,
+        default="posted",
+    )
+    wizard_values = fields.Json(
+        help="Other values of the report wizard, as passed to its create "
+        "method, over those of the line."
+    )
+    state = fields.Selection(
+        [("queued", "Queued"), ("done", "Done"), ("failed", "Failed")],
+        default="queued",
+        required=True,
+        readonly=True,
+        copy=False,
+    )
+    attachment_id = fields.Many2one("ir.attachment", readonly=True, copy=False)
+    error = fields.Text(readonly=True, copy=False)
+
+    def _get_file_name(self):
+        self.ensure_one()
+        report_name = dict(REPORT_WIZARDS)[self.report_model]
+        index = list(self.export_id.line_ids).index(self) + 1
+        return f"{index:02d} {self.company_id.name} - {report_name}.xlsx"
+
+    def _get_wizard_values(self):
+        """Values of the report wizard of the line"""
+        self.ensure_one()
+        if self.report_model in DATE_AT_WIZARDS:
+            values = {"date_at": self.date_to}
+        else:
+            values = {"date_from": self.date_from, "date_to": self.date_to}
+        if self.report_model == "journal.ledger.report.wizard":
+            values["move_target"] = self.target_move
+        else:
+            values["target_move"] = self.target_move
+        values.update(self.wizard_values or {})
+        values["company_id"] = self.company_id.id
+        return values
+
+    @api.model
+    def _claim_queued(self):
+        """Lock the next queued line of the running exports, skipping those
+        rendered by the other jobs. The lock lasts until the line is
+        committed, or is released if the job is killed."""
+        self.env.flush_all()
+        self.env.cr.execute(
+            """
+            SELECT line.id FROM account_financial_report_export_line line
+            JOIN account_financial_report_export export
+                ON export.id = line.export_id
+            WHERE line.state = 'queued' AND export.state = 'running'
+            ORDER BY line.export_id, line.sequence, line.id
+            LIMIT 1
+            FOR UPDATE OF line SKIP LOCKED
+            """
+        )
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    def _run_as_requester(self):
+        """Render the line with the access rights of the user of its export"""
+        self.ensure_one()
+        user = self.export_id.user_id
+        self.with_user(user).with_context(
+            lang=user.lang,
+            tz=user.tz,
+            allowed_company_ids=user.company_ids.ids,
+        )._run()
+
+    def _run(self):
+        """Render the line into its workbook attachment"""
+        self.ensure_one()
+        try:
+            with self.env.cr.savepoint():
+                attachment = self.env["ir.attachment"].create(
+                    {
+                        "name": self._get_file_name(),
+                        "raw": self._render(),
+                        "res_model": self._name,
+                        "res_id": self.id,
+                    }
+                )
+                self.write(
+                    {"state": "done", "attachment_id": attachment.id, "error": False}
+                )
+        except Exception as e:
+            _logger.exception("Financial report export line %s failed", self.id)
+            self.write({"state": "failed", "error": str(e)})
+
+    def _render(self):
+        """Render the XLSX report of the line, as its wizard would"""
+        self.ensure_one()
+        wizard = (
+            self.env[self.report_model]
+            .with_company(self.company_id)
+            .create(self._get_wizard_values())
+        )
+        action = wizard._print_report("xlsx")
+        content, _report_type = self.env["ir.actions.report"]._render_xlsx(
+            action["report_name"], wizard.ids, action["data"]
+        )
+        return content
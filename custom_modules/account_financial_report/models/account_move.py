@@ -0,0 +1,14 @@
+# Copyright 2026 ForgeFlow S.L. (https://www.forgeflow.com)
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import models
+
+
+class AccountMove(models.Model):
+    _inherit = "account.move"
+
+    def unlink(self):
+        # Changes of the state or date of the move reach the lines when their
+        # stored related fields are flushed, only the deletion is caught here
+        self.env["account.period.balance"]._invalidate_move_lines(self.line_ids)
+        return super().unlink()
@@ -1,9 +1,57 @@
 # Copyright 2019 ACSONE SA/NV (<http://acsone.eu>)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).-
+import logging
 from collections import defaultdict
 
 from odoo import api, fields, models
 from odoo.fields import Command
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Move line fields summed up or keyed on by the period balance snapshots
+PERIOD_BALANCE_FIELDS = {
+    "account_id",
+    "amount_currency",
+    "balance",
+    "company_id",
+    "credit",
+    "date",
+    "debit",
+    "move_id",
+    "parent_state",
+    "partner_id",
+}
+
+# Indexes of the query shapes of the reports, by name
+REPORT_INDEXES = {
+    # The join between the accounts and partners of the initial balances and
+    # the move lines can be heavy to compute on big databases
+    "account_move_line_account_id_partner_id_index": "(account_id, partner_id)",
+    # Period and initial balances of posted entries, per account: the sums
+    # are read from the index only
+    "account_move_line_afr_posted_account_date_index": (
+        "(company_id, account_id, date) "
+        "INCLUDE (partner_id, debit, credit, balance, amount_currency) "
+        "WHERE parent_state = 'posted'"
+    ),
+    # Same, when the report is filtered on partners
+    "account_move_line_afr_posted_partner_date_index": (
+        "(company_id, partner_id, account_id, date) WHERE parent_state = 'posted'"
+    ),
+    # Open items and aged balances: only the lines of reconcilable accounts,
+    # receivable and payable ones, carry a residual
+    "account_move_line_afr_open_items_index": (
+        "(company_id, account_id, partner_id, date) "
+        "INCLUDE (date_maturity, amount_residual, amount_residual_currency) "
+        "WHERE NOT reconciled AND amount_residual != 0"
+    ),
+    # VAT report, tax lines of posted entries
+    "account_move_line_afr_posted_tax_line_index": (
+        "(company_id, date, tax_line_id) "
+        "WHERE parent_state = 'posted' AND tax_line_id IS NOT NULL"
+    ),
+}
 
 
 class AccountMoveLine(models.Model):
@@ -38,28 +86,98 @@ class AccountMoveLine(models.Model):
 
     def init(self):
         """
-            The join between accounts_partners subquery and account_move_line
-            can be heavy to compute on big databases.
-            Join sample:
-                JOIN
-                    account_move_line ml
-                        ON ap.account_id = ml.account_id
-                        AND ml.date < '2018-12-30'
-                        AND ap.partner_id = ml.partner_id
-                        AND ap.include_initial_balance = TRUE
-            By adding the following index, performances are strongly increased.
+            The report indexes of REPORT_INDEXES are created concurrently, so
+            that installing or updating the module does not lock the move
+            lines against writes on a big database. CREATE INDEX CONCURRENTLY
+            cannot run inside the transaction of the update, the indexes are
+            created once it is committed.
         :return:
         """
-        self._cr.execute(
-            "SELECT indexname FROM pg_indexes WHERE indexname = " "%s",
-            ("account_move_line_account_id_partner_id_index",),
-        )
-        if not self._cr.fetchone():
-            self._cr.execute(
+        self._cr.postcommit.add(self._create_report_indexes)
+
+    @api.model
+    def _create_report_indexes(self):
+        """Create the missing report indexes, and rebuild those left invalid
+        by an interrupted concurrent build"""
+        cr = self.env.registry.cursor()
+        try:
+            cr._cnx.autocommit = True
+            for name, definition in REPORT_INDEXES.items():
+                cr.execute(
+                    SQL(
+                        "SELECT indisvalid FROM pg_index WHERE indexrelid = "
+                        "to_regclass(%s)",
+                        name,
+                    )
+                )
+                row = cr.fetchone()
+                if row and row[0]:
+                    continue
+                if row:
+                    cr.execute(
+                        SQL("DROP INDEX CONCURRENTLY %s", SQL.identifier(name))
+                    )
+                _logger.info("Creating index %s on account_move_line", name)
+                cr.execute(
+                    SQL(
+                        "CREATE INDEX CONCURRENTLY %s ON account_move_line %s",
+                        SQL.identifier(name),
+                        SQL(definition),
+                    )
+                )
+        finally:
+            cr._cnx.autocommit = False
+            cr.close()
+
+    @api.model
+    def _get_report_index_usage(self):
+        """Usage statistics of the indexes of the move lines, most scanned
+        first, as collected by PostgreSQL since its statistics were last
+        reset.
+
+        :return: list of dicts with the name of the index, whether it is one
+            of REPORT_INDEXES, whether it is valid, its number of scans, the
+            number of index entries they read and its size
+        """
+        self.env.cr.execute(
+            SQL(
                 """
-            CREATE INDEX account_move_line_account_id_partner_id_index
-            ON account_move_line (account_id, partner_id)"""
+                SELECT s.indexrelname AS name,
+                    s.indexrelname = ANY(%s) AS managed,
+                    i.indisvalid AS valid,
+                    s.idx_scan AS scans,
+                    s.idx_tup_read AS tuples_read,
+                    pg_size_pretty(pg_relation_size(s.indexrelid)) AS size
+                FROM pg_stat_user_indexes s
+                JOIN pg_index i ON i.indexrelid = s.indexrelid
+                WHERE s.relname = 'account_move_line'
+                ORDER BY s.idx_scan DESC, s.indexrelname
+                """,
+                list(REPORT_INDEXES),
             )
+        )
+        return self.env.cr.dictfetchall()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env["account.period.balance"]._invalidate_move_lines(lines)
+        return lines
+
+    def _write(self, vals):
+        # Explicit writes and the stored fields recomputed from the move, like
+        # the balance, the state or the date, all reach the database here
+        if PERIOD_BALANCE_FIELDS.isdisjoint(vals):
+            return super()._write(vals)
+        period_balance = self.env["account.period.balance"]
+        period_balance._invalidate_move_lines(self)
+        res = super()._write(vals)
+        period_balance._invalidate_move_lines(self)
+        return res
+
+    def unlink(self):
+        self.env["account.period.balance"]._invalidate_move_lines(self)
+        return super().unlink()
 
     @api.model
     def search_count(self, domain, limit=None):
@@ -0,0 +1,495 @@
+# Copyright 2026 ForgeFlow S.L. (https://www.forgeflow.com)
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import logging
+
+from dateutil.relativedelta import relativedelta
+from psycopg2.errors import SerializationFailure
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Domain leaves of the opening balance queries the snapshots can answer,
+# mapped to the filter they set
+BALANCE_DOMAIN_LEAVES = {
+    ("company_id", "="): "company_ids",
+    ("company_id", "in"): "company_ids",
+    ("account_id", "in"): "account_ids",
+    ("partner_id", "in"): "partner_ids",
+    ("date", "<"): "date_to",
+    ("date", ">="): "date_from",
+    ("parent_state", "="): "states",
+    ("parent_state", "in"): "states",
+    ("move_id.state", "="): "states",
+    ("move_id.state", "in"): "states",
+    ("account_id.account_type", "in"): "account_types",
+    ("account_type", "in"): "account_types",
+    ("account_type", "not in"): "excluded_account_types",
+}
+
+BALANCE_COLUMNS = ["debit", "credit", "balance", "amount_currency"]
+
+
+class AccountPeriodBalance(models.Model):
+    """Balances of the move lines of a closed month of a company.
+
+    Snapshots are built by a cron for the months ending before the current
+    one, per account and partner, once for the posted entries and once for
+    the posted and draft ones. Any change of a move line of a month reaching
+    the database, explicit or recomputed from its move, flags the month as
+    invalid. Opening balances are read as the sum of the valid snapshots,
+    plus the move lines of the invalid months and of the partial months at
+    both ends of the range. Reports never write nor lock the snapshots.
+
+    Each build runs in two transactions of the cron. The first one locks
+    the month, waiting for the transactions changing its move lines, and
+    flags it as building. The second one builds it, unless a change flagged
+    it as invalid in between. Changes of the move lines hold a key share
+    lock on the month until they commit, so they do not wait for each other.
+    """
+
+    _name = "account.period.balance"
+    _description = "Account Period Balance Snapshot"
+    _order = "month desc"
+    _rec_name = "month"
+
+    company_id = fields.Many2one(
+        comodel_name="res.company", required=True, ondelete="cascade"
+    )
+    month = fields.Date(required=True, index=True, help="First day of the month")
+    posted_only = fields.Boolean(help="Only the posted entries are summed up")
+    valid = fields.Boolean(help="Up to date with the move lines of the month")
+    building = fields.Boolean(help="Being built from the move lines of the month")
+    line_ids = fields.One2many(
+        comodel_name="account.period.balance.line", inverse_name="period_id"
+    )
+
+    _sql_constraints = [
+        (
+            "company_month_posted_uniq",
+            "unique(company_id, month, posted_only)",
+            "Only one balance snapshot per company, month and posted flag is allowed.",
+        ),
+    ]
+
+    @api.model
+    def _get_current_month(self):
+        """First day of the month still open to snapshots"""
+        return fields.Date.today().replace(day=1)
+
+    @api.model
+    def _insert_months(self, company_ids, months):
+        """Create the missing snapshots of ``months`` of the companies, as
+        invalid, for each pair of the arrays"""
+        self.env.cr.execute(
+            """
+            INSERT INTO account_period_balance
+                (company_id, month, posted_only, valid, building,
+                create_date, write_date)
+            SELECT m.company_id, m.month, f.posted_only, false, false,
+                now() at time zone 'UTC', now() at time zone 'UTC'
+            FROM unnest(%s::int[], %s::date[]) AS m(company_id, month)
+            CROSS JOIN (VALUES (true), (false)) AS f(posted_only)
+            ON CONFLICT (company_id, month, posted_only) DO NOTHING
+            """,
+            (company_ids, months),
+        )
+
+    @api.model
+    def _invalidate_move_lines(self, move_lines):
+        """Flag the snapshots of the months holding ``move_lines``, as stored
+        in the database"""
+        if not move_lines:
+            return
+        self.env.cr.execute(
+            """
+            SELECT DISTINCT company_id, date_trunc('month', date)::date
+            FROM account_move_line
+            WHERE id = ANY(%s) AND company_id IS NOT NULL
+            """,
+            (move_lines.ids,),
+        )
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return
+        company_ids = [company_id for company_id, _month in rows]
+        months = [month for _company_id, month in rows]
+        # The cron creates the snapshots ahead of the postings: this only
+        # inserts those of months far in the past or the future
+        self._insert_months(company_ids, months)
+        # The lock is held until the commit, so that a build of the month
+        # waits for the move lines of this transaction
+        self.env.cr.execute(
+            """
+            SELECT p.id FROM account_period_balance p
+            JOIN unnest(%s::int[], %s::date[]) AS m(company_id, month)
+                ON p.company_id = m.company_id AND p.month = m.month
+            ORDER BY p.id
+            FOR KEY SHARE OF p
+            """,
+            (company_ids, months),
+        )
+        period_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env.cr.execute(
+            """
+            UPDATE account_period_balance SET valid = false, building = false
+            WHERE id = ANY(%s) AND (valid OR building)
+            """,
+            (period_ids,),
+        )
+        self.invalidate_model(["valid", "building"])
+
+    @api.model
+    def _get_periods(self, company_id, months, posted_only):
+        """Ids of the valid snapshots of ``months``, by month"""
+        if not months:
+            return {}
+        # Pending changes of the move lines invalidate snapshots when flushed
+        self.env.flush_all()
+        self.env.cr.execute(
+            """
+            SELECT month, id FROM account_period_balance
+            WHERE company_id = %s AND posted_only = %s
+                AND month = ANY(%s::date[]) AND valid
+            """,
+            (company_id, posted_only, months),
+        )
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _create_periods(self):
+        """Create the missing snapshots, from the first month of the move lines
+        of each company up to the next month, so that the postings find them"""
+        self.env["account.move.line"].flush_model(["company_id", "date"])
+        self.env.cr.execute(
+            """
+            SELECT c.company_id, month::date
+            FROM (
+                SELECT company_id, date_trunc('month', MIN(date)) AS first_month
+                FROM account_move_line WHERE company_id IS NOT NULL
+                GROUP BY company_id
+            ) c
+            CROSS JOIN LATERAL generate_series(
+                c.first_month, %s::date + interval '1 month', interval '1 month'
+            ) AS month
+            """,
+            (self._get_current_month(),),
+        )
+        rows = self.env.cr.fetchall()
+        self._insert_months(
+            [company_id for company_id, _month in rows],
+            [month for _company_id, month in rows],
+        )
+
+    @api.model
+    def _cron_build_periods(self):
+        """Build the invalid snapshots of the closed months, one at a time"""
+        self._create_periods()
+        self.env.cr.commit()
+        periods = self.search(
+            [("valid", "=", False), ("month", "<", self._get_current_month())],
+            order="month, company_id, posted_only",
+        )
+        for period in periods:
+            try:
+                period._prepare_build()
+                self.env.cr.commit()
+                period._build()
+                self.env.cr.commit()
+            except SerializationFailure:
+                # A concurrent change of the month, built again on next run
+                self.env.cr.rollback()
+                _logger.info("Period balance %s changed during its build", period.id)
+
+    def _prepare_build(self):
+        """First transaction of the build: wait for the pending changes of the
+        move lines of the months and flag them as building"""
+        self.env.cr.execute(
+            "SELECT id FROM account_period_balance WHERE id = ANY(%s) FOR UPDATE",
+            (self.ids,),
+        )
+        self.env.cr.execute(
+            "UPDATE account_period_balance SET building = true WHERE id = ANY(%s)",
+            (self.ids,),
+        )
+        self.invalidate_model(["building"])
+
+    def _build(self):
+        """Second transaction of the build: recompute the snapshot lines of
+        the months still flagged as building from their move lines"""
+        self.env.flush_all()
+        self.env.cr.execute(
+            """
+            SELECT id FROM account_period_balance
+            WHERE id = ANY(%s) AND building
+            FOR UPDATE
+            """,
+            (self.ids,),
+        )
+        period_ids = [row[0] for row in self.env.cr.fetchall()]
+        if not period_ids:
+            return
+        self.env.cr.execute(
+            "DELETE FROM account_period_balance_line WHERE period_id = ANY(%s)",
+            (period_ids,),
+        )
+        self.env.cr.execute(
+            """
+            INSERT INTO account_period_balance_line
+                (period_id, account_id, partner_id, debit, credit, balance,
+                amount_currency)
+            SELECT p.id, aml.account_id, aml.partner_id, SUM(aml.debit),
+                SUM(aml.credit), SUM(aml.balance), SUM(aml.amount_currency)
+            FROM account_period_balance p
+            JOIN account_move_line aml
+                ON aml.company_id = p.company_id
+                AND aml.date >= p.month
+                AND aml.date < p.month + interval '1 month'
+            WHERE p.id = ANY(%s)
+                AND aml.account_id IS NOT NULL
+                AND (aml.parent_state = 'posted'
+                    OR (NOT p.posted_only AND aml.parent_state = 'draft'))
+            GROUP BY p.id, aml.account_id, aml.partner_id
+            """,
+            (period_ids,),
+        )
+        self.env.cr.execute(
+            """
+            UPDATE account_period_balance SET valid = true, building = false
+            WHERE id = ANY(%s)
+            """,
+            (period_ids,),
+        )
+        self.invalidate_model(["valid", "building"])
+        self.env["account.period.balance.line"].invalidate_model()
+
+    @api.model
+    def _parse_balance_domain(self, domain):
+        """Filters of an opening balance domain, or None when the snapshots
+        cannot answer it"""
+        filters = {}
+        for leaf in domain:
+            if not isinstance(leaf, list | tuple) or len(leaf) != 3:
+                return None
+            key = BALANCE_DOMAIN_LEAVES.get((leaf[0], leaf[1]))
+            if key is None or key in filters:
+                return None
+            filters[key] = leaf[2]
+        if "company_ids" not in filters or "date_to" not in filters:
+            return None
+        company_ids = filters["company_ids"]
+        if not isinstance(company_ids, list | tuple):
+            company_ids = [company_ids]
+        if not set(company_ids) <= set(self.env.companies.ids):
+            # Let read_group apply the record rules
+            return None
+        filters["company_ids"] = list(company_ids)
+        states = filters.get("states")
+        if isinstance(states, str):
+            states = [states]
+        if not states or set(states) not in ({"posted"}, {"posted", "draft"}):
+            return None
+        filters["posted_only"] = "draft" not in states
+        filters["date_to"] = fields.Date.to_date(filters["date_to"])
+        if filters.get("date_from"):
+            filters["date_from"] = fields.Date.to_date(filters["date_from"])
+        if "account_types" in filters or "excluded_account_types" in filters:
+            accounts_domain = []
+            if "account_ids" in filters:
+                accounts_domain += [("id", "in", filters["account_ids"])]
+            if "account_types" in filters:
+                accounts_domain += [("account_type", "in", filters["account_types"])]
+            if "excluded_account_types" in filters:
+                accounts_domain += [
+                    ("account_type", "not in", filters["excluded_account_types"])
+                ]
+            filters["account_ids"] = (
+                self.env["account.account"]
+                .with_context(active_test=False)
+                .search(accounts_domain)
+                .ids
+            )
+        return filters
+
+    @api.model
+    def _get_sources(self, company_ids, date_from, date_to, posted_only):
+        """Split [date_from, date_to) into valid snapshots of closed months
+        and segments read from the move lines.
+
+        Returns:
+            tuple: (snapshot ids, list of (start, end) segments, start
+            being None for an unbounded segment)
+        """
+        cutoff = min(date_to.replace(day=1), self._get_current_month())
+        if date_from:
+            first_full = date_from.replace(day=1)
+            if first_full < date_from:
+                first_full += relativedelta(months=1)
+        else:
+            self.env["account.move.line"].flush_model(["company_id", "date"])
+            self.env.cr.execute(
+                "SELECT MIN(date) FROM account_move_line WHERE company_id = ANY(%s)",
+                (company_ids,),
+            )
+            first_date = self.env.cr.fetchone()[0]
+            first_full = first_date.replace(day=1) if first_date else cutoff
+        if first_full >= cutoff:
+            return [], [(date_from, date_to)]
+        months = []
+        month = first_full
+        while month < cutoff:
+            months.append(month)
+            month += relativedelta(months=1)
+        periods = {
+            company_id: self._get_periods(company_id, months, posted_only)
+            for company_id in company_ids
+        }
+        period_ids = []
+        segments = []
+        if date_from and date_from < first_full:
+            segments.append((date_from, first_full))
+        # The months without a valid snapshot of every company are read from
+        # the move lines, merged with the adjacent segments
+        for month in months:
+            if all(month in periods[company_id] for company_id in company_ids):
+                period_ids += [periods[company_id][month] for company_id in company_ids]
+                continue
+            end = month + relativedelta(months=1)
+            if segments and segments[-1][1] == month:
+                segments[-1] = (segments[-1][0], end)
+            else:
+                segments.append((month, end))
+        if cutoff < date_to:
+            if segments and segments[-1][1] == cutoff:
+                segments[-1] = (segments[-1][0], date_to)
+            else:
+                segments.append((cutoff, date_to))
+        return period_ids, segments
+
+    @api.model
+    def _read_balances(self, domain, groupby):
+        """Sums of the move lines of ``domain`` grouped by ``groupby``, shaped
+        like the rows of a non lazy read_group.
+
+        Returns None when the domain filters on something the snapshots are
+        not keyed by, or when grouping on anything else than the account and
+        the partner.
+        """
+        if not groupby or groupby[0] != "account_id":
+            return None
+        if not set(groupby) <= {"account_id", "partner_id"}:
+            return None
+        filters = self._parse_balance_domain(domain)
+        if filters is None:
+            return None
+        if "account_ids" in filters and not filters["account_ids"]:
+            return []
+        period_ids, segments = self._get_sources(
+            filters["company_ids"],
+            filters.get("date_from"),
+            filters["date_to"],
+            filters["posted_only"],
+        )
+        states = ["posted"] if filters["posted_only"] else ["posted", "draft"]
+        columns = SQL(", ").join(
+            SQL.identifier(column)
+            for column in ["account_id", "partner_id"] + BALANCE_COLUMNS
+        )
+        parts = [
+            SQL(
+                "SELECT %s FROM account_period_balance_line WHERE period_id = ANY(%s)",
+                columns,
+                period_ids,
+            )
+        ]
+        if segments:
+            self.env["account.move.line"].flush_model()
+        for start, end in segments:
+            parts.append(
+                SQL(
+                    """
+                    SELECT %s FROM account_move_line
+                    WHERE company_id = ANY(%s) AND parent_state = ANY(%s)
+                        AND account_id IS NOT NULL AND date < %s %s
+                    """,
+                    columns,
+                    filters["company_ids"],
+                    states,
+                    end,
+                    SQL("AND date >= %s", start) if start else SQL(),
+                )
+            )
+        conditions = [SQL("TRUE")]
+        if "account_ids" in filters:
+            conditions.append(SQL("account_id = ANY(%s)", filters["account_ids"]))
+        if "partner_ids" in filters:
+            conditions.append(SQL("partner_id = ANY(%s)", filters["partner_ids"]))
+        groupby_sql = SQL(", ").join(SQL.identifier(field) for field in groupby)
+        self.env.cr.execute(
+            SQL(
+                "SELECT %s, %s FROM (%s) balances WHERE %s GROUP BY %s",
+                groupby_sql,
+                SQL(", ").join(
+                    SQL("SUM(%s) AS %s", SQL.identifier(column), SQL.identifier(column))
+                    for column in BALANCE_COLUMNS
+                ),
+                SQL(" UNION ALL ").join(parts),
+                SQL(" AND ").join(conditions),
+                groupby_sql,
+            )
+        )
+        rows = self.env.cr.dictfetchall()
+        return self._format_balance_rows(rows, groupby)
+
+    @api.model
+    def _format_balance_rows(self, rows, groupby):
+        """Replace the ids of the rows by read_group (id, name) pairs, in the
+        order of the grouped models"""
+        orders = {}
+        names = {}
+        for field in groupby:
+            comodel = self.env["account.move.line"]._fields[field].comodel_name
+            records = (
+                self.env[comodel]
+                .with_context(active_test=False)
+                .browse({row[field] for row in rows if row[field]})
+                .sorted()
+            )
+            orders[field] = {record.id: index for index, record in enumerate(records)}
+            names[field] = {record.id: record.display_name for record in records}
+        for row in rows:
+            for field in groupby:
+                record_id = row[field]
+                row[field] = record_id and (record_id, names[field][record_id])
+        # Like read_group, the rows without partner come last
+        rows.sort(
+            key=lambda row: tuple(
+                orders[field][row[field][0]] if row[field] else len(orders[field])
+                for field in groupby
+            )
+        )
+        return rows
+
+
+class AccountPeriodBalanceLine(models.Model):
+    """Balances of one account and partner in a period balance snapshot"""
+
+    _name = "account.period.balance.line"
+    _description = "Account Period Balance Snapshot Line"
+
+    period_id = fields.Many2one(
+        comodel_name="account.period.balance",
+        required=True,
+        index=True,
+        ondelete="cascade",
+    )
+    account_id = fields.Many2one(
+        comodel_name="account.account", required=True, ondelete="cascade"
+    )
+    partner_id = fields.Many2one(comodel_name="res.partner", ondelete="cascade")
+    debit = fields.Float()
+    credit = fields.Float()
+    balance = fields.Float()
+    amount_currency = fields.Float()
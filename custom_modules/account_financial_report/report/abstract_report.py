@@ -1,7 +1,99 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-from odoo import api, models
+import hashlib
+import io
+import json
+import logging
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Size of the pickled report values kept by the report values cache
+REPORT_VALUES_CACHE_SIZE = 64 * 1024 * 1024
+
+
+class _RecordsPickler(pickle.Pickler):
+    """Pickle records as references, browsed again in the environment the
+    values are loaded in"""
+
+    def persistent_id(self, obj):
+        if isinstance(obj, models.BaseModel):
+            return (obj._name, obj._ids)
+        return None
+
+
+class _RecordsUnpickler(pickle.Unpickler):
+    def __init__(self, file, env):
+        super().__init__(file)
+        self.env = env
+
+    def persistent_load(self, pid):
+        model, ids = pid
+        return self.env[model].browse(ids)
+
+
+class ReportValuesCache:
+    """Least recently used cache of pickled report values, bounded by the
+    total size of the pickles, with the ledger watermark they were computed
+    at. Values are stored pickled: every hit gets its own copy, that the
+    renderers are free to change."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, watermark):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != watermark:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, watermark, payload):
+        if len(payload) > self.max_size:
+            return
+        with self.lock:
+            self.pop(key)
+            self.entries[key] = (watermark, payload)
+            self.size += len(payload)
+            while self.size > self.max_size:
+                _key, (_watermark, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+report_values_cache = ReportValuesCache(REPORT_VALUES_CACHE_SIZE)
+
+
+def cached_report_values(method):
+    """Decorate the ``_get_report_values`` of a report to serve its values from
+    the report values cache, see ``_get_cached_report_values``"""
+
+    @wraps(method)
+    def wrapper(self, docids, data):
+        return self._get_cached_report_values(data, lambda: method(self, docids, data))
+
+    return wrapper
 
 
 class AgedPartnerBalanceReport(models.AbstractModel):
@@ -19,109 +111,234 @@ class AgedPartnerBalanceReport(models.AbstractModel):
     ]
 
     @api.model
-    def _get_move_lines_domain_not_reconciled(
-        self, company_id, account_ids, partner_ids, only_posted_moves, date_from
+    def _get_open_move_lines_domain(
+        self, company_id, account_ids, partner_ids, only_posted_moves, date_at_object
     ):
         domain = [
             ("account_id", "in", account_ids),
             ("company_id", "=", company_id),
-            ("reconciled", "=", False),
+            ("date", "<=", date_at_object),
         ]
         if partner_ids:
             domain += [("partner_id", "in", partner_ids)]
         if only_posted_moves:
-            domain += [("move_id.state", "=", "posted")]
+            domain += [("parent_state", "=", "posted")]
         else:
-            domain += [("move_id.state", "in", ["posted", "draft"])]
-        if date_from:
-            domain += [("date", ">", date_from)]
+            domain += [("parent_state", "in", ["posted", "draft"])]
         return domain
 
     @api.model
-    def _get_new_move_lines_domain(
-        self, new_ml_ids, account_ids, company_id, partner_ids, only_posted_moves
-    ):
-        domain = [
-            ("account_id", "in", account_ids),
-            ("company_id", "=", company_id),
-            ("id", "in", new_ml_ids),
-        ]
-        if partner_ids:
-            domain += [("partner_id", "in", partner_ids)]
-        if only_posted_moves:
-            domain += [("move_id.state", "=", "posted")]
-        else:
-            domain += [("move_id.state", "in", ["posted", "draft"])]
-        return domain
-
-    def _recalculate_move_lines(
+    def _get_open_move_lines_query(
         self,
-        move_lines,
-        debit_ids,
-        credit_ids,
-        debit_amount,
-        credit_amount,
-        ml_ids,
-        account_ids,
         company_id,
+        account_ids,
         partner_ids,
+        date_at_object,
+        date_from,
         only_posted_moves,
-        debit_amount_currency,
-        credit_amount_currency,
     ):
-        debit_ids = set(debit_ids)
-        credit_ids = set(credit_ids)
-        in_credit_but_not_in_debit = credit_ids - debit_ids
-        reconciled_ids = list(debit_ids) + list(in_credit_but_not_in_debit)
-        reconciled_ids = set(reconciled_ids)
-        ml_ids = set(ml_ids)
-        new_ml_ids = reconciled_ids - ml_ids
-        new_ml_ids = list(new_ml_ids)
-        new_domain = self._get_new_move_lines_domain(
-            new_ml_ids, account_ids, company_id, partner_ids, only_posted_moves
+        """Query of the move lines open at ``date_at_object``, with their
+        residual at that date.
+
+        For a past date, the partial reconciliations made after it are added
+        back to the current residual of both of their lines in one grouped
+        query, so the lines reconciled since then are open again. Lines whose
+        residual at that date rounds to zero are left out.
+
+        Columns: id, account_id, partner_id, date, date_maturity,
+        amount_residual, amount_residual_currency, amount_currency and rank,
+        the position of the line in the move line order. As in v13, the
+        amount in currency of the lines in the company currency is 0.
+        """
+        domain = self._get_open_move_lines_domain(
+            company_id, account_ids, partner_ids, only_posted_moves, date_at_object
         )
-        company_currency = self.env["res.company"].browse(company_id).currency_id
-        ml_fields = self._get_ml_fields()
-        new_move_lines = self.env["account.move.line"].search_read(
-            domain=new_domain, fields=ml_fields
+        query = self.env["account.move.line"]._search(domain)
+        if date_at_object < date.today():
+            later_partials = SQL(
+                "company_id = %s AND max_date > %s", company_id, date_at_object
+            )
+        else:
+            later_partials = SQL("FALSE")
+            # Only the lines still open are left: written like the predicate
+            # of the open items index, so that the index can be used
+            query.add_where(
+                SQL(
+                    "NOT %s AND %s != 0",
+                    SQL.identifier(query.table, "reconciled"),
+                    SQL.identifier(query.table, "amount_residual"),
+                )
+            )
+        unreconciled = SQL("NOT aml.reconciled")
+        if date_from:
+            unreconciled = SQL(
+                "%s AND aml.date > %s", unreconciled, fields.Date.to_date(date_from)
+            )
+        return SQL(
+            """
+            WITH later_partials AS (
+                SELECT debit_move_id AS line_id, amount,
+                    debit_amount_currency AS amount_currency
+                FROM account_partial_reconcile WHERE %(later_partials)s
+                UNION ALL
+                SELECT credit_move_id, -amount, -credit_amount_currency
+                FROM account_partial_reconcile WHERE %(later_partials)s
+            ), later_residuals AS (
+                SELECT line_id, SUM(amount) AS amount,
+                    SUM(amount_currency) AS amount_currency
+                FROM later_partials
+                GROUP BY line_id
+            )
+            SELECT aml.id, aml.account_id, aml.partner_id, aml.date,
+                aml.date_maturity,
+                aml.amount_residual + COALESCE(lr.amount, 0) AS amount_residual,
+                aml.amount_residual_currency + COALESCE(lr.amount_currency, 0)
+                    AS amount_residual_currency,
+                CASE WHEN aml.currency_id IS NULL
+                    OR aml.currency_id = aml.company_currency_id
+                    THEN 0 ELSE aml.amount_currency END AS amount_currency,
+                ROW_NUMBER() OVER (
+                    ORDER BY aml.date DESC, aml.move_name DESC, aml.id
+                ) AS rank
+            FROM account_move_line aml
+            LEFT JOIN later_residuals lr ON lr.line_id = aml.id
+            WHERE aml.id IN %(lines)s
+                AND ((%(unreconciled)s) OR lr.line_id IS NOT NULL)
+                AND ROUND(aml.amount_residual + COALESCE(lr.amount, 0), 2) != 0
+            """,
+            later_partials=later_partials,
+            lines=query.subselect(),
+            unreconciled=unreconciled,
         )
-        move_lines = move_lines + new_move_lines
+
+    @api.model
+    def _get_open_move_lines(self, open_lines_query, ml_fields):
+        """Read ``ml_fields`` of the lines of ``open_lines_query``, with their
+        residual at the report date"""
+        self.env.flush_all()
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT id, amount_residual, amount_residual_currency,
+                    amount_currency
+                FROM (%s) open_lines
+                ORDER BY rank
+                """,
+                open_lines_query,
+            )
+        )
+        amounts = {row[0]: row[1:] for row in self.env.cr.fetchall()}
+        move_lines = self.env["account.move.line"].browse(list(amounts)).read(ml_fields)
         for move_line in move_lines:
-            ml_id = move_line["id"]
-            if ml_id in debit_ids:
-                if move_line.get("amount_residual", False):
-                    move_line["amount_residual"] += debit_amount[ml_id]
-                else:
-                    move_line["amount_residual"] = debit_amount[ml_id]
-                if move_line.get("amount_residual_currency", False):
-                    move_line["amount_residual_currency"] += debit_amount_currency[
-                        ml_id
-                    ]
-                else:
-                    move_line["amount_residual_currency"] = debit_amount_currency[ml_id]
-            if ml_id in credit_ids:
-                if move_line.get("amount_residual", False):
-                    move_line["amount_residual"] -= credit_amount[ml_id]
-                else:
-                    move_line["amount_residual"] = -credit_amount[ml_id]
-                if move_line.get("amount_residual_currency", False):
-                    move_line["amount_residual_currency"] -= credit_amount_currency[
-                        ml_id
-                    ]
-                else:
-                    move_line["amount_residual_currency"] = -credit_amount_currency[
-                        ml_id
-                    ]
-            # Set amount_currency=0 to keep the same behaviour as in v13
-            # Conditions: if there is no curency_id defined or it is equal
-            # to the company's curency_id
-            if "amount_currency" in move_line and (
-                "currency_id" not in move_line
-                or move_line["currency_id"] == company_currency.id
-            ):
-                move_line["amount_currency"] = 0
+            (
+                move_line["amount_residual"],
+                move_line["amount_residual_currency"],
+                amount_currency,
+            ) = amounts[move_line["id"]]
+            if "amount_currency" in move_line:
+                move_line["amount_currency"] = amount_currency
         return move_lines
 
+    def _get_cached_report_values(self, data, compute):
+        """Return the report values of ``data``, computed by ``compute`` unless
+        they are in the report values cache.
+
+        Cached values are keyed on the wizard data, whatever the wizard they
+        come from, and are only served while the ledger watermark of the
+        company is unchanged."""
+        if not self._can_cache_report_values():
+            return compute()
+        key = self._get_report_values_cache_key(data)
+        watermark = self._get_ledger_watermark(data)
+        payload = report_values_cache.get(key, watermark)
+        if payload is not None:
+            values = _RecordsUnpickler(io.BytesIO(payload), self.env).load()
+            if "docs" in values:
+                values["doc_ids"] = [data["wizard_id"]]
+                values["docs"] = values["docs"].browse(data["wizard_id"])
+            return values
+        values = compute()
+        buffer = io.BytesIO()
+        try:
+            _RecordsPickler(buffer, pickle.HIGHEST_PROTOCOL).dump(values)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            _logger.debug("Values of %s cannot be cached", self._name, exc_info=True)
+            return values
+        report_values_cache.put(key, watermark, buffer.getvalue())
+        return values
+
+    def _can_cache_report_values(self):
+        """Whether the report values cache can be used: not in a transaction
+        that wrote anything, whose own changes may not move the watermark"""
+        self.env.flush_all()
+        self.env.cr.execute(SQL("SELECT txid_current_if_assigned() IS NULL"))
+        return self.env.cr.fetchone()[0]
+
+    def _get_report_values_cache_key(self, data):
+        key_data = {
+            "database": self.env.cr.dbname,
+            "report": self._name,
+            "uid": self.env.uid,
+            "lang": self.env.lang,
+            "company_ids": self.env.companies.ids,
+            "data": {key: value for key, value in data.items() if key != "wizard_id"},
+        }
+        key_json = json.dumps(key_data, sort_keys=True, default=str)
+        return hashlib.sha256(key_json.encode()).hexdigest()
+
+    def _get_ledger_watermark(self, data):
+        """Cheap fingerprint of the ledger of the company of the report, up to
+        its date: any posting, change or deletion of a move line, and any
+        reconciliation, changes it.
+
+        The accounts, account groups, partners, journals and taxes, whose
+        codes and names are shown in the reports, are fingerprinted too, as
+        are the aging configurations whose intervals split the aged
+        balances."""
+        date_to = data.get("date_to") or data.get("date_at")
+        states = ["posted"] if data.get("only_posted_moves") else ["posted", "draft"]
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT COUNT(*), MAX(id), MAX(write_date),
+                    (SELECT ROW(COUNT(*), MAX(id))::text
+                        FROM account_partial_reconcile
+                        WHERE company_id = %(company_id)s),
+                    (SELECT MAX(write_date) FROM account_account),
+                    (SELECT MAX(write_date) FROM account_group),
+                    (SELECT MAX(write_date) FROM res_partner),
+                    (SELECT MAX(write_date) FROM account_journal
+                        WHERE company_id = %(company_id)s),
+                    (SELECT MAX(write_date) FROM account_tax
+                        WHERE company_id = %(company_id)s),
+                    (SELECT MAX(write_date) FROM account_age_report_configuration),
+                    (SELECT ROW(COUNT(*), MAX(id), MAX(write_date))::text
+                        FROM account_age_report_configuration_line)
+                FROM account_move_line
+                WHERE company_id = %(company_id)s
+                    AND parent_state = ANY(%(states)s)
+                    AND %(date_condition)s
+                """,
+                company_id=data["company_id"],
+                states=states,
+                date_condition=SQL("date <= %s", date_to) if date_to else SQL("TRUE"),
+            )
+        )
+        return self.env.cr.fetchone()
+
+    def _read_group_initial_balances(self, domain, fields, groupby, lazy=True):
+        """read_group of the move lines of an opening balance, answered from
+        the period balance snapshots whenever the domain and the grouping
+        allow it"""
+        rows = None
+        if not lazy or len(groupby) == 1:
+            rows = self.env["account.period.balance"]._read_balances(domain, groupby)
+        if rows is None:
+            rows = self.env["account.move.line"].read_group(
+                domain=domain, fields=fields, groupby=groupby, lazy=lazy
+            )
+        return rows
+
     def _get_accounts_data(self, accounts_ids):
         accounts = self.env["account.account"].browse(accounts_ids)
         accounts_data = {}
@@ -2,11 +2,12 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-import operator
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 
 from odoo import api, models
-from odoo.tools import float_is_zero
+from odoo.tools import SQL
+
+from .abstract_report import cached_report_values
 
 
 class AgedPartnerBalanceReport(models.AbstractModel):
@@ -45,50 +46,6 @@ class AgedPartnerBalanceReport(models.AbstractModel):
             ag_pb_data[acc_id][prt_id][interval_line] = 0.0
         return ag_pb_data
 
-    @api.model
-    def _calculate_amounts(
-        self, ag_pb_data, acc_id, prt_id, residual, due_date, date_at_object
-    ):
-        ag_pb_data[acc_id]["residual"] += residual
-        ag_pb_data[acc_id][prt_id]["residual"] += residual
-        interval_lines = self.env.context["age_partner_config"].line_ids
-        today = date_at_object
-        if not due_date or today <= due_date:
-            ag_pb_data[acc_id]["current"] += residual
-            ag_pb_data[acc_id][prt_id]["current"] += residual
-            due_date = today
-        elif today <= due_date + timedelta(days=30):
-            ag_pb_data[acc_id]["30_days"] += residual
-            ag_pb_data[acc_id][prt_id]["30_days"] += residual
-        elif today <= due_date + timedelta(days=60):
-            ag_pb_data[acc_id]["60_days"] += residual
-            ag_pb_data[acc_id][prt_id]["60_days"] += residual
-        elif today <= due_date + timedelta(days=90):
-            ag_pb_data[acc_id]["90_days"] += residual
-            ag_pb_data[acc_id][prt_id]["90_days"] += residual
-        elif today <= due_date + timedelta(days=120):
-            ag_pb_data[acc_id]["120_days"] += residual
-            ag_pb_data[acc_id][prt_id]["120_days"] += residual
-        else:
-            ag_pb_data[acc_id]["older"] += residual
-            ag_pb_data[acc_id][prt_id]["older"] += residual
-
-        days_difference = abs((today - due_date).days)
-        for index, line in enumerate(interval_lines):
-            lower_limit = 0 if not index else interval_lines[index - 1].inferior_limit
-            next_line = interval_lines[index] if index < len(interval_lines) else None
-            interval_range = self._get_values_for_range_intervals(
-                lower_limit, next_line.inferior_limit
-            )
-            if (
-                days_difference in interval_range
-                or days_difference == line.inferior_limit
-            ):
-                ag_pb_data[acc_id][line] += residual
-                ag_pb_data[acc_id][prt_id][line] += residual
-                break
-        return ag_pb_data
-
     def _get_values_for_range_intervals(self, num1, num2):
         min_num = min(num1, num2)
         max_num = max(num1, num2)
@@ -96,48 +53,81 @@ class AgedPartnerBalanceReport(models.AbstractModel):
             return [max_num]
         return list(range(min_num + 1, max_num))
 
-    def _get_account_partial_reconciled(self, company_id, date_at_object):
-        domain = [("max_date", ">", date_at_object), ("company_id", "=", company_id)]
-        fields = [
-            "debit_move_id",
-            "credit_move_id",
-            "amount",
-            "debit_amount_currency",
-            "credit_amount_currency",
-        ]
-        accounts_partial_reconcile = self.env["account.partial.reconcile"].search_read(
-            domain=domain, fields=fields
+    @api.model
+    def _get_interval_line_condition(self, interval_lines, index):
+        """SQL condition on days_due matching the interval line at ``index``,
+        as _get_values_for_range_intervals does"""
+        line = interval_lines[index]
+        lower_limit = 0 if not index else interval_lines[index - 1].inferior_limit
+        min_num = min(lower_limit, line.inferior_limit)
+        max_num = max(lower_limit, line.inferior_limit)
+        if max_num - min_num == 1:
+            condition = SQL("days_due = %s", max_num)
+        else:
+            condition = SQL("(days_due > %s AND days_due < %s)", min_num, max_num)
+        return SQL("%s OR days_due = %s", condition, line.inferior_limit)
+
+    @api.model
+    def _get_aged_amounts_query(self, open_lines_query, date_at_object):
+        """Residuals of the open lines summed up per account, partner, aging
+        bucket and interval line of the age configuration.
+
+        The bucket is one of current, 30_days, 60_days, 90_days, 120_days
+        and older; the interval is the index of the configuration line, or
+        NULL. Groups come in the order of their first move line.
+        """
+        buckets = SQL(
+            """
+            CASE
+                WHEN date_maturity IS NULL OR date_maturity >= %(date_at)s
+                    THEN 'current'
+                WHEN date_maturity >= %(date_at)s - 30 THEN '30_days'
+                WHEN date_maturity >= %(date_at)s - 60 THEN '60_days'
+                WHEN date_maturity >= %(date_at)s - 90 THEN '90_days'
+                WHEN date_maturity >= %(date_at)s - 120 THEN '120_days'
+                ELSE 'older'
+            END
+            """,
+            date_at=date_at_object,
         )
-        debit_amount = {}
-        debit_amount_currency = {}
-        credit_amount = {}
-        credit_amount_currency = {}
-        for account_partial_reconcile_data in accounts_partial_reconcile:
-            debit_move_id = account_partial_reconcile_data["debit_move_id"][0]
-            credit_move_id = account_partial_reconcile_data["credit_move_id"][0]
-            if debit_move_id not in debit_amount.keys():
-                debit_amount[debit_move_id] = 0.0
-                debit_amount_currency[debit_move_id] = 0.0
-            debit_amount_currency[debit_move_id] += account_partial_reconcile_data[
-                "debit_amount_currency"
-            ]
-            debit_amount[debit_move_id] += account_partial_reconcile_data["amount"]
-            if credit_move_id not in credit_amount.keys():
-                credit_amount[credit_move_id] = 0.0
-                credit_amount_currency[credit_move_id] = 0.0
-            credit_amount[credit_move_id] += account_partial_reconcile_data["amount"]
-            credit_amount_currency[credit_move_id] += account_partial_reconcile_data[
-                "credit_amount_currency"
-            ]
-            account_partial_reconcile_data.update(
-                {"debit_move_id": debit_move_id, "credit_move_id": credit_move_id}
+        interval_lines = self.env.context["age_partner_config"].line_ids
+        if interval_lines:
+            intervals = SQL(
+                "CASE %s END",
+                SQL(" ").join(
+                    SQL(
+                        "WHEN %s THEN %s",
+                        self._get_interval_line_condition(interval_lines, index),
+                        index,
+                    )
+                    for index in range(len(interval_lines))
+                ),
             )
-        return (
-            accounts_partial_reconcile,
-            debit_amount,
-            credit_amount,
-            debit_amount_currency,
-            credit_amount_currency,
+        else:
+            intervals = SQL("NULL::int")
+        return SQL(
+            """
+            SELECT account_id, partner_id, bucket, interval,
+                SUM(amount_residual) AS residual
+            FROM (
+                SELECT open_lines.*, %(buckets)s AS bucket, %(intervals)s AS interval
+                FROM (
+                    SELECT open_lines.*,
+                        CASE
+                            WHEN date_maturity IS NULL
+                                OR date_maturity >= %(date_at)s THEN 0
+                            ELSE %(date_at)s - date_maturity
+                        END AS days_due
+                    FROM (%(open_lines)s) open_lines
+                ) open_lines
+            ) aged_lines
+            GROUP BY account_id, partner_id, bucket, interval
+            ORDER BY MIN(rank)
+            """,
+            buckets=buckets,
+            intervals=intervals,
+            date_at=date_at_object,
+            open_lines=open_lines_query,
         )
 
     def _get_move_lines_data(
@@ -150,70 +140,59 @@ class AgedPartnerBalanceReport(models.AbstractModel):
         only_posted_moves,
         show_move_line_details,
     ):
-        domain = self._get_move_lines_domain_not_reconciled(
-            company_id, account_ids, partner_ids, only_posted_moves, date_from
+        open_lines_query = self._get_open_move_lines_query(
+            company_id,
+            account_ids,
+            partner_ids,
+            date_at_object,
+            date_from,
+            only_posted_moves,
+        )
+        self.env.flush_all()
+        self.env.cr.execute(
+            self._get_aged_amounts_query(open_lines_query, date_at_object)
+        )
+        aged_amounts = self.env.cr.fetchall()
+        interval_lines = self.env.context["age_partner_config"].line_ids
+        partners = self.env["res.partner"].browse(
+            {prt_id for _acc_id, prt_id, _bucket, _interval, _res in aged_amounts}
+            - {None}
         )
-        ml_fields = self._get_ml_fields()
-        line_model = self.env["account.move.line"]
-        move_lines = line_model.search_read(domain=domain, fields=ml_fields)
+        partner_names = {partner.id: partner.display_name for partner in partners}
         journals_ids = set()
-        partners_ids = set()
         partners_data = {}
         ag_pb_data = {}
-        if date_at_object < date.today():
-            (
-                acc_partial_rec,
-                debit_amount,
-                credit_amount,
-                debit_amount_currency,
-                credit_amount_currency,
-            ) = self._get_account_partial_reconciled(company_id, date_at_object)
-            if acc_partial_rec:
-                ml_ids = list(map(operator.itemgetter("id"), move_lines))
-                debit_ids = list(
-                    map(operator.itemgetter("debit_move_id"), acc_partial_rec)
-                )
-                credit_ids = list(
-                    map(operator.itemgetter("credit_move_id"), acc_partial_rec)
-                )
-                move_lines = self._recalculate_move_lines(
-                    move_lines,
-                    debit_ids,
-                    credit_ids,
-                    debit_amount,
-                    credit_amount,
-                    ml_ids,
-                    account_ids,
-                    company_id,
-                    partner_ids,
-                    only_posted_moves,
-                    debit_amount_currency,
-                    credit_amount_currency,
-                )
-        move_lines = [
-            move_line
-            for move_line in move_lines
-            if move_line["date"] <= date_at_object
-            and not float_is_zero(move_line["amount_residual"], precision_digits=2)
-        ]
-        for move_line in move_lines:
-            journals_ids.add(move_line["journal_id"][0])
-            acc_id = move_line["account_id"][0]
-            if move_line["partner_id"]:
-                prt_id = move_line["partner_id"][0]
-                prt_name = move_line["partner_id"][1]
-            else:
-                prt_id = 0
-                prt_name = ""
-            if prt_id not in partners_ids:
-                partners_data.update({prt_id: {"id": prt_id, "name": prt_name}})
-                partners_ids.add(prt_id)
+        for acc_id, prt_id, bucket, interval, residual in aged_amounts:
+            prt_id = prt_id or 0
+            if prt_id not in partners_data:
+                partners_data[prt_id] = {
+                    "id": prt_id,
+                    "name": partner_names.get(prt_id, ""),
+                }
             if acc_id not in ag_pb_data.keys():
                 ag_pb_data = self._initialize_account(ag_pb_data, acc_id)
             if prt_id not in ag_pb_data[acc_id]:
                 ag_pb_data = self._initialize_partner(ag_pb_data, acc_id, prt_id)
-            move_line_data = {}
-            if show_move_line_details:
+            amount_keys = ["residual", bucket]
+            if interval is not None:
+                amount_keys.append(interval_lines[interval])
+            for amount_key in amount_keys:
+                ag_pb_data[acc_id][amount_key] += residual
+                ag_pb_data[acc_id][prt_id][amount_key] += residual
+        if show_move_line_details:
+            line_model = self.env["account.move.line"]
+            move_lines = self._get_open_move_lines(
+                open_lines_query, self._get_ml_fields()
+            )
+            for move_line in move_lines:
+                journals_ids.add(move_line["journal_id"][0])
+                acc_id = move_line["account_id"][0]
+                if move_line["partner_id"]:
+                    prt_id = move_line["partner_id"][0]
+                    prt_name = move_line["partner_id"][1]
+                else:
+                    prt_id = 0
+                    prt_name = ""
                 if move_line["ref"] == move_line["name"]:
                     if move_line["ref"]:
                         ref_label = move_line["ref"]
@@ -225,28 +204,18 @@ class AgedPartnerBalanceReport(models.AbstractModel):
                     ref_label = move_line["ref"]
                 else:
                     ref_label = move_line["ref"] + " - " + move_line["name"]
-                move_line_data.update(
-                    {
-                        "line_rec": line_model.browse(move_line["id"]),
-                        "date": move_line["date"],
-                        "entry": move_line["move_id"][1],
-                        "jnl_id": move_line["journal_id"][0],
-                        "acc_id": acc_id,
-                        "partner": prt_name,
-                        "ref_label": ref_label,
-                        "due_date": move_line["date_maturity"],
-                        "residual": move_line["amount_residual"],
-                    }
-                )
+                move_line_data = {
+                    "line_rec": line_model.browse(move_line["id"]),
+                    "date": move_line["date"],
+                    "entry": move_line["move_id"][1],
+                    "jnl_id": move_line["journal_id"][0],
+                    "acc_id": acc_id,
+                    "partner": prt_name,
+                    "ref_label": ref_label,
+                    "due_date": move_line["date_maturity"],
+                    "residual": move_line["amount_residual"],
+                }
                 ag_pb_data[acc_id][prt_id]["move_lines"].append(move_line_data)
-            ag_pb_data = self._calculate_amounts(
-                ag_pb_data,
-                acc_id,
-                prt_id,
-                move_line["amount_residual"],
-                move_line["date_maturity"],
-                date_at_object,
-            )
         journals_data = self._get_journals_data(list(journals_ids))
         accounts_data = self._get_accounts_data(ag_pb_data.keys())
         return ag_pb_data, accounts_data, partners_data, journals_data
@@ -408,6 +377,7 @@ class AgedPartnerBalanceReport(models.AbstractModel):
                     account[f"percent_{interval_line.id}"] = 0.0
         return aged_partner_data
 
+    @cached_report_values
     def _get_report_values(self, docids, data):
         wizard_id = data["wizard_id"]
         company = self.env["res.company"].browse(data["company_id"])
@@ -6,9 +6,73 @@
 import calendar
 import datetime
 import operator
+from collections.abc import Mapping
 
 from odoo import _, api, models
-from odoo.tools import float_is_zero
+from odoo.tools import SQL, float_is_zero
+
+from .abstract_report import cached_report_values
+
+# Move lines fetched per round trip by the streaming General Ledger
+STREAM_CHUNK_SIZE = 2000
+
+
+class GeneralLedgerMoveLine(Mapping):
+    """Move line of the General Ledger, as rendered by the QWeb and XLSX
+    reports.
+
+    The ledger holds one per move line, hence a slotted record rather than a
+    dict. Its values are read as items, like those of the centralized entries;
+    only the existing ones can be set, so the renderers share it as is.
+    """
+
+    __slots__ = (
+        "id",
+        "date",
+        "entry",
+        "entry_id",
+        "journal_id",
+        "account_id",
+        "partner_id",
+        "partner_name",
+        "ref",
+        "name",
+        "tax_ids",
+        "tax_line_id",
+        "debit",
+        "credit",
+        "balance",
+        "bal_curr",
+        "rec_id",
+        "rec_name",
+        "currency_id",
+        "analytic_distribution",
+        "ref_label",
+    )
+    _keys = frozenset(__slots__)
+
+    def __init__(self, *values):
+        for key, value in zip(self.__slots__, values, strict=True):
+            setattr(self, key, value)
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._keys:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
 
 
 class GeneralLedgerReport(models.AbstractModel):
@@ -106,12 +170,12 @@ class GeneralLedgerReport(models.AbstractModel):
         return domain
 
     def _get_accounts_initial_balance(self, initial_domain_bs, initial_domain_pl):
-        gl_initial_acc_bs = self.env["account.move.line"].read_group(
+        gl_initial_acc_bs = self._read_group_initial_balances(
             domain=initial_domain_bs,
             fields=["account_id", "debit", "credit", "balance", "amount_currency:sum"],
             groupby=["account_id"],
         )
-        gl_initial_acc_pl = self.env["account.move.line"].read_group(
+        gl_initial_acc_pl = self._read_group_initial_balances(
             domain=initial_domain_pl,
             fields=["account_id", "debit", "credit", "balance", "amount_currency:sum"],
             groupby=["account_id"],
@@ -141,7 +205,7 @@ class GeneralLedgerReport(models.AbstractModel):
         domain = self._get_initial_balance_fy_pl_ml_domain(
             account_ids, company_id, fy_start_date, base_domain
         )
-        initial_balances = self.env["account.move.line"].read_group(
+        initial_balances = self._read_group_initial_balances(
             domain=domain,
             fields=["account_id", "debit", "credit", "balance", "amount_currency:sum"],
             groupby=["account_id"],
@@ -199,7 +263,7 @@ class GeneralLedgerReport(models.AbstractModel):
         return getattr(self, method)(data, domain, grouped_by)
 
     def _prepare_gen_ld_data_group_partners(self, data, domain, grouped_by):
-        gl_initial_acc_prt = self.env["account.move.line"].read_group(
+        gl_initial_acc_prt = self._read_group_initial_balances(
             domain=domain,
             fields=[
                 "account_id",
@@ -228,7 +292,7 @@ class GeneralLedgerReport(models.AbstractModel):
         return data
 
     def _prepare_gen_ld_data_group_taxes(self, data, domain, grouped_by):
-        gl_initial_acc_prt = self.env["account.move.line"].read_group(
+        gl_initial_acc_prt = self._read_group_initial_balances(
             domain=domain,
             fields=[
                 "account_id",
@@ -280,9 +344,9 @@ class GeneralLedgerReport(models.AbstractModel):
         if partner_ids:
             base_domain += [("partner_id", "in", partner_ids)]
         if only_posted_moves:
-            base_domain += [("move_id.state", "=", "posted")]
+            base_domain += [("parent_state", "=", "posted")]
         else:
-            base_domain += [("move_id.state", "in", ["posted", "draft"])]
+            base_domain += [("parent_state", "in", ["posted", "draft"])]
         if cost_center_ids:
             base_domain += [("analytic_account_ids", "in", cost_center_ids)]
         if extra_domain:
@@ -317,48 +381,120 @@ class GeneralLedgerReport(models.AbstractModel):
         return data
 
     @api.model
-    def _get_move_line_data(self, move_line):
-        move_line_data = {
-            "id": move_line["id"],
-            "date": move_line["date"],
-            "entry": move_line["move_name"],
-            "entry_id": move_line["move_id"][0],
-            "journal_id": move_line["journal_id"][0],
-            "account_id": move_line["account_id"][0],
-            "partner_id": move_line["partner_id"][0]
-            if move_line["partner_id"]
-            else False,
-            "partner_name": move_line["partner_id"][1]
-            if move_line["partner_id"]
-            else "",
-            "ref": "" if not move_line["ref"] else move_line["ref"],
-            "name": "" if not move_line["name"] else move_line["name"],
-            "tax_ids": move_line["tax_ids"],
-            "tax_line_id": move_line["tax_line_id"],
-            "debit": move_line["debit"],
-            "credit": move_line["credit"],
-            "balance": move_line["balance"],
-            "bal_curr": move_line["amount_currency"],
-            "rec_id": move_line["full_reconcile_id"][0]
-            if move_line["full_reconcile_id"]
-            else False,
-            "rec_name": move_line["matching_number"]
-            if move_line["full_reconcile_id"]
-            else "",
-            "currency_id": move_line["currency_id"],
-            "analytic_distribution": move_line["analytic_distribution"] or {},
+    def _read_move_lines(self, ml_ids):
+        """Return the move lines ``ml_ids`` as GeneralLedgerMoveLine records, in
+        that order.
+
+        The columns of all the lines are read in one query, the names of their
+        partners, taxes and currencies in one lookup per model.
+        """
+        aml_model = self.env["account.move.line"]
+        aml_model.flush_model()
+        tax_ids_field = aml_model._fields["tax_ids"]
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT aml.id, aml.date, aml.move_name, aml.move_id,
+                    aml.journal_id, aml.account_id, aml.partner_id, aml.ref,
+                    aml.name, COALESCE(taxes.ids, '{}'), aml.tax_line_id,
+                    aml.debit, aml.credit, aml.balance, aml.amount_currency,
+                    aml.full_reconcile_id, aml.matching_number, aml.currency_id,
+                    aml.analytic_distribution
+                FROM unnest(%(ml_ids)s::int[]) WITH ORDINALITY AS ml(id, position)
+                JOIN account_move_line aml ON aml.id = ml.id
+                LEFT JOIN LATERAL (
+                    SELECT ARRAY_AGG(tax.id ORDER BY tax.sequence, tax.id) AS ids
+                    FROM %(tax_rel)s rel
+                    JOIN account_tax tax ON tax.id = rel.%(tax_col)s
+                    WHERE rel.%(ml_col)s = aml.id
+                ) taxes ON TRUE
+                ORDER BY ml.position
+                """,
+                ml_ids=list(ml_ids),
+                tax_rel=SQL.identifier(tax_ids_field.relation),
+                tax_col=SQL.identifier(tax_ids_field.column2),
+                ml_col=SQL.identifier(tax_ids_field.column1),
+            )
+        )
+        rows = self.env.cr.fetchall()
+        partner_names = self._get_display_names(
+            "res.partner", {row[6] for row in rows}
+        )
+        tax_lines = {
+            tax_id: (tax_id, name)
+            for tax_id, name in self._get_display_names(
+                "account.tax", {row[10] for row in rows}
+            ).items()
         }
-        if (
-            move_line_data["ref"] == move_line_data["name"]
-            or move_line_data["ref"] == ""
-        ):
-            ref_label = move_line_data["name"]
-        elif move_line_data["name"] == "":
-            ref_label = move_line_data["ref"]
-        else:
-            ref_label = move_line_data["ref"] + " - " + move_line_data["name"]
-        move_line_data.update({"ref_label": ref_label})
-        return move_line_data
+        currencies = {
+            currency_id: (currency_id, name)
+            for currency_id, name in self._get_display_names(
+                "res.currency", {row[17] for row in rows}
+            ).items()
+        }
+        move_lines = []
+        for (
+            ml_id,
+            ml_date,
+            move_name,
+            move_id,
+            journal_id,
+            account_id,
+            partner_id,
+            ref,
+            name,
+            tax_ids,
+            tax_line_id,
+            debit,
+            credit,
+            balance,
+            amount_currency,
+            full_reconcile_id,
+            matching_number,
+            currency_id,
+            analytic_distribution,
+        ) in rows:
+            ref = ref or ""
+            name = name or ""
+            if ref == name or ref == "":
+                ref_label = name
+            elif name == "":
+                ref_label = ref
+            else:
+                ref_label = ref + " - " + name
+            move_lines.append(
+                GeneralLedgerMoveLine(
+                    ml_id,
+                    ml_date,
+                    move_name,
+                    move_id,
+                    journal_id,
+                    account_id,
+                    partner_id or False,
+                    partner_names.get(partner_id, ""),
+                    ref,
+                    name,
+                    tax_ids,
+                    tax_lines.get(tax_line_id, False),
+                    debit,
+                    credit,
+                    balance,
+                    amount_currency,
+                    full_reconcile_id or False,
+                    matching_number if full_reconcile_id else "",
+                    currencies.get(currency_id, False),
+                    analytic_distribution or {},
+                    ref_label,
+                )
+            )
+        return move_lines
+
+    @api.model
+    def _get_display_names(self, model, ids):
+        """Display names of the records ``ids`` of ``model``, as read on the
+        many2one fields of the move lines"""
+        records = self.env[model].sudo().browse(ids - {None})
+        return {record.id: record.display_name for record in records}
 
     @api.model
     def _get_period_domain(
@@ -383,9 +519,9 @@ class GeneralLedgerReport(models.AbstractModel):
         if partner_ids:
             domain += [("partner_id", "in", partner_ids)]
         if only_posted_moves:
-            domain += [("move_id.state", "=", "posted")]
+            domain += [("parent_state", "=", "posted")]
         else:
-            domain += [("move_id.state", "in", ["posted", "draft"])]
+            domain += [("parent_state", "in", ["posted", "draft"])]
 
         if cost_center_ids:
             domain += [("analytic_account_ids", "in", cost_center_ids)]
@@ -420,9 +556,9 @@ class GeneralLedgerReport(models.AbstractModel):
     def _prepare_ml_items(self, move_line, grouped_by):
         res = []
         if grouped_by == "partners":
-            item_id = move_line["partner_id"][0] if move_line["partner_id"] else 0
+            item_id = move_line["partner_id"] or 0
             item_name = (
-                move_line["partner_id"][1]
+                move_line["partner_name"]
                 if move_line["partner_id"]
                 else _("Missing Partner")
             )
@@ -433,17 +569,83 @@ class GeneralLedgerReport(models.AbstractModel):
                 item_name = move_line["tax_line_id"][1]
                 res.append({"id": item_id, "name": item_name})
             elif move_line["tax_ids"]:
-                for tax_id in move_line["tax_ids"]:
-                    tax_item = self.env["account.tax"].search_fetch(
-                        [("id", "=", tax_id)], ["name"]
-                    )
-                    res.append({"id": tax_item.id, "name": tax_item.name})
+                # Names fetched for all the taxes of the line at once
+                for tax in self.env["account.tax"].browse(move_line["tax_ids"]):
+                    res.append({"id": tax.id, "name": tax.name})
             else:
                 res.append({"id": 0, "name": "Missing Tax"})
         else:
             res.append({"id": 0, "name": ""})
         return res
 
+    def _collect_move_line_refs(
+        self,
+        move_line,
+        journal_ids,
+        taxes_ids,
+        analytic_ids,
+        full_reconcile_ids,
+        full_reconcile_data,
+    ):
+        journal_ids.add(move_line["journal_id"])
+        taxes_ids.update(move_line["tax_ids"])
+        for analytic_account in move_line["analytic_distribution"]:
+            analytic_ids.add(int(analytic_account))
+        if move_line["rec_id"]:
+            rec_id = move_line["rec_id"]
+            if rec_id not in full_reconcile_ids:
+                full_reconcile_data.update(
+                    {
+                        rec_id: {
+                            "id": rec_id,
+                            "name": move_line["rec_name"],
+                        }
+                    }
+                )
+                full_reconcile_ids.add(rec_id)
+
+    def _add_period_move_line(
+        self, gen_ld_data, move_line, foreign_currency, grouped_by, acc_prt_account_ids
+    ):
+        acc_id = move_line["account_id"]
+        ml_id = move_line["id"]
+        if acc_id not in gen_ld_data.keys():
+            gen_ld_data[acc_id] = self._initialize_data(foreign_currency)
+            gen_ld_data[acc_id]["id"] = acc_id
+            if grouped_by:
+                gen_ld_data[acc_id][grouped_by] = False
+        if acc_id in acc_prt_account_ids:
+            item_ids = self._prepare_ml_items(move_line, grouped_by)
+            for item in item_ids:
+                item_id = item["id"]
+                if item_id not in gen_ld_data[acc_id]:
+                    if grouped_by:
+                        gen_ld_data[acc_id][grouped_by] = True
+                    gen_ld_data[acc_id][item_id] = self._initialize_data(
+                        foreign_currency
+                    )
+                    gen_ld_data[acc_id][item_id]["id"] = item_id
+                    gen_ld_data[acc_id][item_id]["name"] = item["name"]
+                gen_ld_data[acc_id][item_id][ml_id] = move_line
+                gen_ld_data[acc_id][item_id]["fin_bal"]["credit"] += move_line[
+                    "credit"
+                ]
+                gen_ld_data[acc_id][item_id]["fin_bal"]["debit"] += move_line["debit"]
+                gen_ld_data[acc_id][item_id]["fin_bal"]["balance"] += move_line[
+                    "balance"
+                ]
+                if foreign_currency:
+                    gen_ld_data[acc_id][item_id]["fin_bal"]["bal_curr"] += move_line[
+                        "bal_curr"
+                    ]
+        else:
+            gen_ld_data[acc_id][ml_id] = move_line
+        gen_ld_data[acc_id]["fin_bal"]["credit"] += move_line["credit"]
+        gen_ld_data[acc_id]["fin_bal"]["debit"] += move_line["debit"]
+        gen_ld_data[acc_id]["fin_bal"]["balance"] += move_line["balance"]
+        if foreign_currency:
+            gen_ld_data[acc_id]["fin_bal"]["bal_curr"] += move_line["bal_curr"]
+
     def _get_period_ml_data(
         self,
         account_ids,
@@ -469,9 +671,8 @@ class GeneralLedgerReport(models.AbstractModel):
         )
         if extra_domain:
             domain += extra_domain
-        ml_fields = self._get_ml_fields()
-        move_lines = self.env["account.move.line"].search_read(
-            domain=domain, fields=ml_fields, order="date,move_name"
+        move_lines = self._read_move_lines(
+            self.env["account.move.line"].search(domain, order="date,move_name").ids
         )
         journal_ids = set()
         full_reconcile_ids = set()
@@ -480,68 +681,21 @@ class GeneralLedgerReport(models.AbstractModel):
         full_reconcile_data = {}
         acc_prt_account_ids = self._get_acc_prt_accounts_ids(company_id, grouped_by)
         for move_line in move_lines:
-            journal_ids.add(move_line["journal_id"][0])
-            for tax_id in move_line["tax_ids"]:
-                taxes_ids.add(tax_id)
-            for analytic_account in move_line["analytic_distribution"] or {}:
-                analytic_ids.add(int(analytic_account))
-            if move_line["full_reconcile_id"]:
-                rec_id = move_line["full_reconcile_id"][0]
-                if rec_id not in full_reconcile_ids:
-                    full_reconcile_data.update(
-                        {
-                            rec_id: {
-                                "id": rec_id,
-                                "name": move_line["matching_number"],
-                            }
-                        }
-                    )
-                    full_reconcile_ids.add(rec_id)
-            acc_id = move_line["account_id"][0]
-            ml_id = move_line["id"]
-            if acc_id not in gen_ld_data.keys():
-                gen_ld_data[acc_id] = self._initialize_data(foreign_currency)
-                gen_ld_data[acc_id]["id"] = acc_id
-                gen_ld_data[acc_id]["mame"] = move_line["account_id"][1]
-                if grouped_by:
-                    gen_ld_data[acc_id][grouped_by] = False
-            if acc_id in acc_prt_account_ids:
-                item_ids = self._prepare_ml_items(move_line, grouped_by)
-                for item in item_ids:
-                    item_id = item["id"]
-                    if item_id not in gen_ld_data[acc_id]:
-                        if grouped_by:
-                            gen_ld_data[acc_id][grouped_by] = True
-                        gen_ld_data[acc_id][item_id] = self._initialize_data(
-                            foreign_currency
-                        )
-                        gen_ld_data[acc_id][item_id]["id"] = item_id
-                        gen_ld_data[acc_id][item_id]["name"] = item["name"]
-                    gen_ld_data[acc_id][item_id][ml_id] = self._get_move_line_data(
-                        move_line
-                    )
-                    gen_ld_data[acc_id][item_id]["fin_bal"]["credit"] += move_line[
-                        "credit"
-                    ]
-                    gen_ld_data[acc_id][item_id]["fin_bal"]["debit"] += move_line[
-                        "debit"
-                    ]
-                    gen_ld_data[acc_id][item_id]["fin_bal"]["balance"] += move_line[
-                        "balance"
-                    ]
-                    if foreign_currency:
-                        gen_ld_data[acc_id][item_id]["fin_bal"]["bal_curr"] += (
-                            move_line["amount_currency"]
-                        )
-            else:
-                gen_ld_data[acc_id][ml_id] = self._get_move_line_data(move_line)
-            gen_ld_data[acc_id]["fin_bal"]["credit"] += move_line["credit"]
-            gen_ld_data[acc_id]["fin_bal"]["debit"] += move_line["debit"]
-            gen_ld_data[acc_id]["fin_bal"]["balance"] += move_line["balance"]
-            if foreign_currency:
-                gen_ld_data[acc_id]["fin_bal"]["bal_curr"] += move_line[
-                    "amount_currency"
-                ]
+            self._collect_move_line_refs(
+                move_line,
+                journal_ids,
+                taxes_ids,
+                analytic_ids,
+                full_reconcile_ids,
+                full_reconcile_data,
+            )
+            self._add_period_move_line(
+                gen_ld_data,
+                move_line,
+                foreign_currency,
+                grouped_by,
+                acc_prt_account_ids,
+            )
         journals_data = self._get_journals_data(list(journal_ids))
         accounts_data = self._get_accounts_data(gen_ld_data.keys())
         taxes_data = self._get_taxes_data(list(taxes_ids))
@@ -651,64 +805,87 @@ class GeneralLedgerReport(models.AbstractModel):
         general_ledger = []
         rounding = self.env.company.currency_id.rounding
         for acc_id in gen_led_data.keys():
-            account = {}
-            account.update(
-                {
-                    "code": accounts_data[acc_id]["code"],
-                    "name": accounts_data[acc_id]["name"],
-                    "type": "account",
-                    "currency_id": accounts_data[acc_id]["currency_id"],
-                    "centralized": accounts_data[acc_id]["centralized"],
-                    "grouped_by": grouped_by,
-                }
+            account = self._create_general_ledger_account(
+                acc_id,
+                gen_led_data,
+                accounts_data,
+                grouped_by,
+                rec_after_date_to_ids,
+                hide_account_at_0,
+                rounding,
+            )
+            if account:
+                general_ledger += [account]
+        return general_ledger
+
+    def _create_general_ledger_account(
+        self,
+        acc_id,
+        gen_led_data,
+        accounts_data,
+        grouped_by,
+        rec_after_date_to_ids,
+        hide_account_at_0,
+        rounding,
+    ):
+        """Return the ledger entry of one account, False if it must be hidden"""
+        account = {}
+        account.update(
+            {
+                "code": accounts_data[acc_id]["code"],
+                "name": accounts_data[acc_id]["name"],
+                "type": "account",
+                "currency_id": accounts_data[acc_id]["currency_id"],
+                "centralized": accounts_data[acc_id]["centralized"],
+                "grouped_by": grouped_by,
+            }
+        )
+        if grouped_by and not gen_led_data[acc_id][grouped_by]:
+            account = self._create_account(
+                account, acc_id, gen_led_data, rec_after_date_to_ids
             )
-            if grouped_by and not gen_led_data[acc_id][grouped_by]:
-                account = self._create_account(
-                    account, acc_id, gen_led_data, rec_after_date_to_ids
+            if (
+                hide_account_at_0
+                and float_is_zero(
+                    gen_led_data[acc_id]["init_bal"]["balance"],
+                    precision_rounding=rounding,
                 )
+                and account["move_lines"] == []
+            ):
+                return False
+        else:
+            if grouped_by:
+                account, list_grouped = self._get_list_grouped_item(
+                    gen_led_data[acc_id],
+                    account,
+                    rec_after_date_to_ids,
+                    hide_account_at_0,
+                    rounding,
+                )
+                account.update({"list_grouped": list_grouped})
                 if (
                     hide_account_at_0
                     and float_is_zero(
                         gen_led_data[acc_id]["init_bal"]["balance"],
                         precision_rounding=rounding,
                     )
-                    and account["move_lines"] == []
+                    and account["list_grouped"] == []
                 ):
-                    continue
+                    return False
             else:
-                if grouped_by:
-                    account, list_grouped = self._get_list_grouped_item(
-                        gen_led_data[acc_id],
-                        account,
-                        rec_after_date_to_ids,
-                        hide_account_at_0,
-                        rounding,
-                    )
-                    account.update({"list_grouped": list_grouped})
-                    if (
-                        hide_account_at_0
-                        and float_is_zero(
-                            gen_led_data[acc_id]["init_bal"]["balance"],
-                            precision_rounding=rounding,
-                        )
-                        and account["list_grouped"] == []
-                    ):
-                        continue
-                else:
-                    account = self._create_account_not_show_item(
-                        account, acc_id, gen_led_data, rec_after_date_to_ids, grouped_by
+                account = self._create_account_not_show_item(
+                    account, acc_id, gen_led_data, rec_after_date_to_ids, grouped_by
+                )
+                if (
+                    hide_account_at_0
+                    and float_is_zero(
+                        gen_led_data[acc_id]["init_bal"]["balance"],
+                        precision_rounding=rounding,
                     )
-                    if (
-                        hide_account_at_0
-                        and float_is_zero(
-                            gen_led_data[acc_id]["init_bal"]["balance"],
-                            precision_rounding=rounding,
-                        )
-                        and account["move_lines"] == []
-                    ):
-                        continue
-            general_ledger += [account]
-        return general_ledger
+                    and account["move_lines"] == []
+                ):
+                    return False
+        return account
 
     @api.model
     def _calculate_centralization(self, centralized_ml, move_line, date_to):
@@ -775,7 +952,245 @@ class GeneralLedgerReport(models.AbstractModel):
             list_centralized_ml += list(centralized_ml[jnl_id].values())
         return list_centralized_ml
 
+    def _finalize_general_ledger_account(
+        self,
+        gl_item,
+        gen_ld_data,
+        date_to,
+        grouped_by,
+        centralize,
+        foreign_currency,
+        company,
+        rec_after_date_to_ids,
+    ):
+        """Centralize the account if needed and set its foreign currency totals"""
+        if centralize and gl_item["centralized"]:
+            centralized_ml = self._get_centralized_ml(gl_item, date_to, grouped_by)
+            gl_item["move_lines"] = centralized_ml
+            gl_item["move_lines"] = self._recalculate_cumul_balance(
+                gl_item["move_lines"],
+                gen_ld_data[gl_item["id"]]["init_bal"]["balance"],
+                rec_after_date_to_ids,
+            )
+            if grouped_by and gl_item[grouped_by]:
+                gl_item[grouped_by] = False
+                del gl_item["list_grouped"]
+        # Set the bal_curr of the initial balance to 0 if it does not correspond
+        # (reducing the corresponding of the bal_curr of the initial balance).
+        if foreign_currency and (
+            not gl_item["currency_id"]
+            or gl_item["currency_id"] != company.currency_id.id
+        ):
+            gl_item["fin_bal"]["bal_curr"] -= gl_item["init_bal"]["bal_curr"]
+            gl_item["init_bal"]["bal_curr"] = 0
+            if "list_grouped" in gl_item:
+                for lg_item in gl_item["list_grouped"]:
+                    lg_item["fin_bal"]["bal_curr"] -= lg_item["init_bal"]["bal_curr"]
+                    lg_item["init_bal"]["bal_curr"] = 0
+        # Set the fin_bal_currency_id value if the account does not have it set
+        # and there are move lines in a currency different from that of
+        # the company (USD for example).
+        fin_bal_currency_ids = []
+        fin_bal_currency_id = gl_item["currency_id"]
+        if gl_item["currency_id"] or not foreign_currency:
+            gl_item["fin_bal_currency_id"] = fin_bal_currency_id
+            return gl_item
+        gl_item["fin_bal"]["bal_curr"] = gl_item["init_bal"]["bal_curr"]
+        if "move_lines" in gl_item:
+            for ml in gl_item["move_lines"]:
+                ml_currency_id = ml["currency_id"][0] if ml["currency_id"] else False
+                if ml_currency_id and ml_currency_id != company.currency_id.id:
+                    gl_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
+                    if ml_currency_id not in fin_bal_currency_ids:
+                        fin_bal_currency_ids.append(ml_currency_id)
+        elif "list_grouped" in gl_item:
+            fin_bal_currency_ids = []
+            for lg_item in gl_item["list_grouped"]:
+                lg_item["fin_bal"]["bal_curr"] = lg_item["init_bal"]["bal_curr"]
+                for ml in lg_item["move_lines"]:
+                    ml_currency_id = (
+                        ml["currency_id"][0] if ml["currency_id"] else False
+                    )
+                    if ml_currency_id and ml_currency_id != company.currency_id.id:
+                        lg_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
+                        gl_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
+                        if ml_currency_id not in fin_bal_currency_ids:
+                            fin_bal_currency_ids.append(ml_currency_id)
+        # If there is only 1 currency, we set that one as fin_bal_currency_id
+        # The use of different move lines with different currencies (EUR + GBP)
+        # will be excluded. We use a different field to avoid showing the initial
+        # balance and/or distorting data.
+        if not gl_item["currency_id"] and len(fin_bal_currency_ids) == 1:
+            fin_bal_currency_id = fin_bal_currency_ids[0]
+        gl_item["fin_bal_currency_id"] = fin_bal_currency_id
+        return gl_item
+
+    def _iter_period_move_lines(
+        self, domain, account_order, chunk_size=STREAM_CHUNK_SIZE
+    ):
+        """Yield the move lines of ``domain`` as GeneralLedgerMoveLine records,
+        account by account in ``account_order``, then by date and entry.
+
+        Ids are read through a named cursor and the lines are read by chunks,
+        so that only ``chunk_size`` lines are loaded at a time.
+        """
+        aml_model = self.env["account.move.line"]
+        query = aml_model._search(domain)
+        table = query.table
+        query.order = SQL(
+            "array_position(%s::int[], %s), %s, %s, %s",
+            account_order,
+            SQL.identifier(table, "account_id"),
+            SQL.identifier(table, "date"),
+            SQL.identifier(table, "move_name"),
+            SQL.identifier(table, "id"),
+        )
+        cursor_name = SQL.identifier(f"general_ledger_stream_{id(query)}")
+        self.env.cr.execute(
+            SQL(
+                "DECLARE %s NO SCROLL CURSOR FOR %s",
+                cursor_name,
+                query.select(SQL.identifier(table, "id")),
+            )
+        )
+        try:
+            while True:
+                self.env.cr.execute(SQL("FETCH %s FROM %s", chunk_size, cursor_name))
+                ml_ids = [row[0] for row in self.env.cr.fetchall()]
+                if not ml_ids:
+                    break
+                yield from self._read_move_lines(ml_ids)
+        finally:
+            self.env.cr.execute(SQL("CLOSE %s", cursor_name))
+
+    def _iter_general_ledger(self, data):
+        """Yield ``(account, side_data)`` for each account of the ledger.
+
+        Accounts come in code order with the same content as the
+        ``general_ledger`` of ``_get_report_values``, but only the move lines
+        of the current account are held in memory. ``side_data`` holds the
+        ``accounts_data``, ``journals_data``, ``taxes_data`` and
+        ``analytic_data`` needed to render the accounts yielded so far.
+        """
+        company = self.env["res.company"].browse(data["company_id"])
+        company_id = data["company_id"]
+        date_to = data["date_to"]
+        date_from = data["date_from"]
+        partner_ids = data["partner_ids"]
+        account_ids = data["account_ids"]
+        cost_center_ids = data["cost_center_ids"]
+        grouped_by = data["grouped_by"]
+        hide_account_at_0 = data["hide_account_at_0"]
+        foreign_currency = data["foreign_currency"]
+        only_posted_moves = data["only_posted_moves"]
+        centralize = data["centralize"]
+        extra_domain = data["domain"]
+        gen_ld_data = self._get_initial_balance_data(
+            account_ids,
+            partner_ids,
+            company_id,
+            date_from,
+            foreign_currency,
+            only_posted_moves,
+            data["unaffected_earnings_account"],
+            data["fy_start_date"],
+            cost_center_ids,
+            extra_domain,
+            grouped_by,
+        )
+        domain = self._get_period_domain(
+            account_ids,
+            partner_ids,
+            company_id,
+            only_posted_moves,
+            date_to,
+            date_from,
+            cost_center_ids,
+        )
+        if extra_domain:
+            domain += extra_domain
+        period_accounts = self.env["account.move.line"]._read_group(
+            domain, ["account_id"]
+        )
+        acc_ids = set(gen_ld_data) | {account.id for account, in period_accounts}
+        accounts_data = self._get_accounts_data(list(acc_ids))
+        account_order = sorted(
+            acc_ids, key=lambda acc_id: accounts_data[acc_id]["code"]
+        )
+        acc_prt_account_ids = self._get_acc_prt_accounts_ids(company_id, grouped_by)
+        rounding = self.env.company.currency_id.rounding
+        side_data = {
+            "accounts_data": accounts_data,
+            "journals_data": {},
+            "taxes_data": {},
+            "analytic_data": {},
+        }
+        move_lines = self._iter_period_move_lines(domain, account_order)
+        move_line = next(move_lines, None)
+        for acc_id in account_order:
+            account_data = {}
+            if acc_id in gen_ld_data:
+                account_data[acc_id] = gen_ld_data.pop(acc_id)
+            journal_ids = set()
+            taxes_ids = set()
+            analytic_ids = set()
+            full_reconcile_ids = set()
+            full_reconcile_data = {}
+            while move_line and move_line["account_id"] == acc_id:
+                self._collect_move_line_refs(
+                    move_line,
+                    journal_ids,
+                    taxes_ids,
+                    analytic_ids,
+                    full_reconcile_ids,
+                    full_reconcile_data,
+                )
+                self._add_period_move_line(
+                    account_data,
+                    move_line,
+                    foreign_currency,
+                    grouped_by,
+                    acc_prt_account_ids,
+                )
+                move_line = next(move_lines, None)
+            # Side data of the lines of this account not loaded yet
+            journal_ids -= set(side_data["journals_data"])
+            taxes_ids -= set(side_data["taxes_data"])
+            analytic_ids -= set(side_data["analytic_data"])
+            side_data["journals_data"].update(
+                self._get_journals_data(list(journal_ids))
+            )
+            side_data["taxes_data"].update(self._get_taxes_data(list(taxes_ids)))
+            side_data["analytic_data"].update(
+                self._get_analytic_data(list(analytic_ids))
+            )
+            rec_after_date_to_ids = self._get_reconciled_after_date_to_ids(
+                full_reconcile_data.keys(), date_to
+            )
+            account = self._create_general_ledger_account(
+                acc_id,
+                account_data,
+                accounts_data,
+                grouped_by,
+                rec_after_date_to_ids,
+                hide_account_at_0,
+                rounding,
+            )
+            if account:
+                self._finalize_general_ledger_account(
+                    account,
+                    account_data,
+                    date_to,
+                    grouped_by,
+                    centralize,
+                    foreign_currency,
+                    company,
+                    rec_after_date_to_ids,
+                )
+                yield account, side_data
+
     # flake8: noqa: C901
+    @cached_report_values
     def _get_report_values(self, docids, data):
         wizard_id = data["wizard_id"]
         company = self.env["res.company"].browse(data["company_id"])
@@ -834,78 +1249,18 @@ class GeneralLedgerReport(models.AbstractModel):
             rec_after_date_to_ids,
             hide_account_at_0,
         )
-        if centralize:
-            for account in general_ledger:
-                if account["centralized"]:
-                    centralized_ml = self._get_centralized_ml(
-                        account, date_to, grouped_by
-                    )
-                    account["move_lines"] = centralized_ml
-                    account["move_lines"] = self._recalculate_cumul_balance(
-                        account["move_lines"],
-                        gen_ld_data[account["id"]]["init_bal"]["balance"],
-                        rec_after_date_to_ids,
-                    )
-                    if grouped_by and account[grouped_by]:
-                        account[grouped_by] = False
-                        del account["list_grouped"]
+        for account in general_ledger:
+            self._finalize_general_ledger_account(
+                account,
+                gen_ld_data,
+                date_to,
+                grouped_by,
+                centralize,
+                foreign_currency,
+                company,
+                rec_after_date_to_ids,
+            )
         general_ledger = sorted(general_ledger, key=lambda k: k["code"])
-        # Set the bal_curr of the initial balance to 0 if it does not correspond
-        # (reducing the corresponding of the bal_curr of the initial balance).
-        for gl_item in general_ledger:
-            if not foreign_currency:
-                continue
-            if (
-                not gl_item["currency_id"]
-                or gl_item["currency_id"] != company.currency_id.id
-            ):
-                gl_item["fin_bal"]["bal_curr"] -= gl_item["init_bal"]["bal_curr"]
-                gl_item["init_bal"]["bal_curr"] = 0
-                if "list_grouped" in gl_item:
-                    for lg_item in gl_item["list_grouped"]:
-                        lg_item["fin_bal"]["bal_curr"] -= lg_item["init_bal"][
-                            "bal_curr"
-                        ]
-                        lg_item["init_bal"]["bal_curr"] = 0
-        # Set the fin_bal_currency_id value if the account does not have it set
-        # and there are move lines in a currency different from that of
-        # the company (USD for example).
-        for gl_item in general_ledger:
-            fin_bal_currency_ids = []
-            fin_bal_currency_id = gl_item["currency_id"]
-            if gl_item["currency_id"] or not foreign_currency:
-                gl_item["fin_bal_currency_id"] = fin_bal_currency_id
-                continue
-            gl_item["fin_bal"]["bal_curr"] = gl_item["init_bal"]["bal_curr"]
-            if "move_lines" in gl_item:
-                for ml in gl_item["move_lines"]:
-                    ml_currency_id = (
-                        ml["currency_id"][0] if ml["currency_id"] else False
-                    )
-                    if ml_currency_id and ml_currency_id != company.currency_id.id:
-                        gl_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
-                        if ml_currency_id not in fin_bal_currency_ids:
-                            fin_bal_currency_ids.append(ml_currency_id)
-            elif "list_grouped" in gl_item:
-                fin_bal_currency_ids = []
-                for lg_item in gl_item["list_grouped"]:
-                    lg_item["fin_bal"]["bal_curr"] = lg_item["init_bal"]["bal_curr"]
-                    for ml in lg_item["move_lines"]:
-                        ml_currency_id = (
-                            ml["currency_id"][0] if ml["currency_id"] else False
-                        )
-                        if ml_currency_id and ml_currency_id != company.currency_id.id:
-                            lg_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
-                            gl_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
-                            if ml_currency_id not in fin_bal_currency_ids:
-                                fin_bal_currency_ids.append(ml_currency_id)
-            # If there is only 1 currency, we set that one as fin_bal_currency_id
-            # The use of different move lines with different currencies (EUR + GBP)
-            # will be excluded. We use a different field to avoid showing the initial
-            # balance and/or distorting data.
-            if not gl_item["currency_id"] and len(fin_bal_currency_ids) == 1:
-                fin_bal_currency_id = fin_bal_currency_ids[0]
-            gl_item["fin_bal_currency_id"] = fin_bal_currency_id
         return {
             "doc_ids": [wizard_id],
             "doc_model": "general.ledger.report.wizard",
@@ -929,18 +1284,3 @@ class GeneralLedgerReport(models.AbstractModel):
             "filter_partner_ids": True if partner_ids else False,
             "currency_model": self.env["res.currency"],
         }
-
-    def _get_ml_fields(self):
-        return self.COMMON_ML_FIELDS + [
-            "analytic_distribution",
-            "full_reconcile_id",
-            "tax_line_id",
-            "currency_id",
-            "credit",
-            "debit",
-            "amount_currency",
-            "balance",
-            "tax_ids",
-            "move_name",
-            "matching_number",
-        ]
@@ -5,6 +5,8 @@
 # Copyright 2022 Tecnativa - V??ctor Mart??nez
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+from collections import ChainMap
+
 from odoo import _, models
 
 
@@ -130,12 +132,24 @@ class GeneralLedgerXslx(models.AbstractModel):
     def _get_col_pos_final_balance_label(self):
         return 5
 
-    # flake8: noqa: C901
     def _generate_report_content(self, workbook, report, data, report_data):
-        res_data = self.env[
+        # Accounts are built and written one at a time, rows go straight to
+        # the constant_memory workbook
+        company = self.env["res.company"].browse(data["company_id"])
+        res_data = {
+            "filter_partner_ids": bool(data["partner_ids"]),
+            "foreign_currency": data["foreign_currency"],
+            "company_currency": company.currency_id,
+        }
+        for account, side_data in self.env[
             "report.account_financial_report.general_ledger"
-        ]._get_report_values(report, data)
-        general_ledger = res_data["general_ledger"]
+        ]._iter_general_ledger(data):
+            res_data.update(side_data)
+            self._write_account(account, res_data, report_data)
+
+    # flake8: noqa: C901
+    def _write_account(self, account, res_data, report_data):
+        """Write the ledger of one account"""
         accounts_data = res_data["accounts_data"]
         journals_data = res_data["journals_data"]
         taxes_data = res_data["taxes_data"]
@@ -143,46 +157,150 @@ class GeneralLedgerXslx(models.AbstractModel):
         filter_partner_ids = res_data["filter_partner_ids"]
         foreign_currency = res_data["foreign_currency"]
         company_currency = res_data["company_currency"]
-        # For each account
-        for account in general_ledger:
-            # Write account title
-            total_bal_curr = 0
-            self.write_array_title(
-                account["code"] + " - " + accounts_data[account["id"]]["name"],
-                report_data,
+        # Write account title
+        total_bal_curr = 0
+        self.write_array_title(
+            account["code"] + " - " + accounts_data[account["id"]]["name"],
+            report_data,
+        )
+
+        if "list_grouped" not in account:
+            # Display array header for move lines
+            self.write_array_header(report_data)
+
+            # Display initial balance line for account
+            account.update(
+                {
+                    "initial_debit": account["init_bal"]["debit"],
+                    "initial_credit": account["init_bal"]["credit"],
+                    "initial_balance": account["init_bal"]["balance"],
+                }
+            )
+            if foreign_currency and account["currency_id"]:
+                account.update(
+                    {"initial_bal_curr": account["init_bal"]["bal_curr"]}
+                )
+            self.write_initial_balance_from_dict(account, report_data)
+
+            # Display account move lines
+            for line in account["move_lines"]:
+                # The line is shared with the other renderers, leave it as is
+                values = {
+                    "account": account["code"],
+                    "journal": journals_data[line["journal_id"]]["code"],
+                }
+                line_currency_id = (
+                    line["currency_id"][0] if line["currency_id"] else False
+                )
+                if line_currency_id and line_currency_id != company_currency.id:
+                    values.update(
+                        {
+                            "currency_name": line["currency_id"][1],
+                            "currency_id": line["currency_id"][0],
+                        }
+                    )
+                if line["ref_label"] != "Centralized entries":
+                    taxes_description = ""
+                    analytic_distribution = ""
+                    for tax_id in line["tax_ids"]:
+                        taxes_description += taxes_data[tax_id]["tax_name"] + " "
+                    if line["tax_line_id"]:
+                        taxes_description += line["tax_line_id"][1]
+                    for account_id, value in line["analytic_distribution"].items():
+                        if value < 100:
+                            analytic_distribution += "%s %d%% " % (
+                                analytic_data[int(account_id)]["name"],
+                                value,
+                            )
+                        else:
+                            analytic_distribution += (
+                                f"{analytic_data[int(account_id)]['name']} "
+                            )
+                    values.update(
+                        {
+                            "taxes_description": taxes_description,
+                            "analytic_distribution": analytic_distribution,
+                        }
+                    )
+                if (
+                    foreign_currency
+                    and line_currency_id
+                    and line_currency_id != company_currency.id
+                ):
+                    total_bal_curr += line["bal_curr"]
+                    values.update({"total_bal_curr": total_bal_curr})
+                self.write_line_from_dict(ChainMap(values, line), report_data)
+            # Display ending balance line for account
+            account.update(
+                {
+                    "final_debit": account["fin_bal"]["debit"],
+                    "final_credit": account["fin_bal"]["credit"],
+                    "final_balance": account["fin_bal"]["balance"],
+                }
             )
+            if foreign_currency and account["currency_id"]:
+                account.update(
+                    {
+                        "final_bal_curr": account["fin_bal"]["bal_curr"],
+                    }
+                )
+            self.write_ending_balance_from_dict(account, report_data)
+
+        else:
+            # For each partner
+            total_bal_curr = 0
+            for group_item in account["list_grouped"]:
+                # Write partner title
+                self.write_array_title(group_item["name"], report_data)
 
-            if "list_grouped" not in account:
                 # Display array header for move lines
                 self.write_array_header(report_data)
 
-                # Display initial balance line for account
                 account.update(
                     {
-                        "initial_debit": account["init_bal"]["debit"],
-                        "initial_credit": account["init_bal"]["credit"],
-                        "initial_balance": account["init_bal"]["balance"],
+                        "currency_id": accounts_data[account["id"]]["currency_id"],
+                        "currency_name": accounts_data[account["id"]][
+                            "currency_name"
+                        ],
                     }
                 )
-                if foreign_currency and account["currency_id"]:
-                    account.update(
-                        {"initial_bal_curr": account["init_bal"]["bal_curr"]}
-                    )
-                self.write_initial_balance_from_dict(account, report_data)
 
-                # Display account move lines
-                for line in account["move_lines"]:
-                    line.update(
+                # Display initial balance line for partner
+                group_item.update(
+                    {
+                        "initial_debit": group_item["init_bal"]["debit"],
+                        "initial_credit": group_item["init_bal"]["credit"],
+                        "initial_balance": group_item["init_bal"]["balance"],
+                        "type": "partner",
+                        "grouped_by": account["grouped_by"]
+                        if "grouped_by" in account
+                        else "",
+                        "currency_id": accounts_data[account["id"]]["currency_id"],
+                        "currency_name": accounts_data[account["id"]][
+                            "currency_name"
+                        ],
+                    }
+                )
+                if foreign_currency and account["currency_id"]:
+                    group_item.update(
                         {
-                            "account": account["code"],
-                            "journal": journals_data[line["journal_id"]]["code"],
+                            "initial_bal_curr": group_item["init_bal"]["bal_curr"],
                         }
                     )
+                self.write_initial_balance_from_dict(group_item, report_data)
+
+                # Display account move lines
+                for line in group_item["move_lines"]:
+                    # The line is shared with the other renderers, leave it as is
+                    values = {
+                        "account": account["code"],
+                        "journal": journals_data[line["journal_id"]]["code"],
+                    }
                     line_currency_id = (
                         line["currency_id"][0] if line["currency_id"] else False
                     )
                     if line_currency_id and line_currency_id != company_currency.id:
-                        line.update(
+                        values.update(
                             {
                                 "currency_name": line["currency_id"][1],
                                 "currency_id": line["currency_id"][0],
@@ -192,10 +310,12 @@ class GeneralLedgerXslx(models.AbstractModel):
                         taxes_description = ""
                         analytic_distribution = ""
                         for tax_id in line["tax_ids"]:
-                            taxes_description += taxes_data[tax_id]["tax_name"] + " "
-                        if line["tax_line_id"]:
-                            taxes_description += line["tax_line_id"][1]
-                        for account_id, value in line["analytic_distribution"].items():
+                            taxes_description += (
+                                taxes_data[tax_id]["tax_name"] + " "
+                            )
+                        for account_id, value in line[
+                            "analytic_distribution"
+                        ].items():
                             if value < 100:
                                 analytic_distribution += "%s %d%% " % (
                                     analytic_data[int(account_id)]["name"],
@@ -205,7 +325,7 @@ class GeneralLedgerXslx(models.AbstractModel):
                                 analytic_distribution += (
                                     f"{analytic_data[int(account_id)]['name']} "
                                 )
-                        line.update(
+                        values.update(
                             {
                                 "taxes_description": taxes_description,
                                 "analytic_distribution": analytic_distribution,
@@ -217,157 +337,47 @@ class GeneralLedgerXslx(models.AbstractModel):
                         and line_currency_id != company_currency.id
                     ):
                         total_bal_curr += line["bal_curr"]
-                        line.update({"total_bal_curr": total_bal_curr})
-                    self.write_line_from_dict(line, report_data)
-                # Display ending balance line for account
-                account.update(
+                        values.update({"total_bal_curr": total_bal_curr})
+                    self.write_line_from_dict(ChainMap(values, line), report_data)
+
+                # Display ending balance line for partner
+                group_item.update(
                     {
-                        "final_debit": account["fin_bal"]["debit"],
-                        "final_credit": account["fin_bal"]["credit"],
-                        "final_balance": account["fin_bal"]["balance"],
+                        "final_debit": group_item["fin_bal"]["debit"],
+                        "final_credit": group_item["fin_bal"]["credit"],
+                        "final_balance": group_item["fin_bal"]["balance"],
                     }
                 )
-                if foreign_currency and account["currency_id"]:
-                    account.update(
-                        {
-                            "final_bal_curr": account["fin_bal"]["bal_curr"],
-                        }
-                    )
-                self.write_ending_balance_from_dict(account, report_data)
-
-            else:
-                # For each partner
-                total_bal_curr = 0
-                for group_item in account["list_grouped"]:
-                    # Write partner title
-                    self.write_array_title(group_item["name"], report_data)
-
-                    # Display array header for move lines
-                    self.write_array_header(report_data)
-
-                    account.update(
-                        {
-                            "currency_id": accounts_data[account["id"]]["currency_id"],
-                            "currency_name": accounts_data[account["id"]][
-                                "currency_name"
-                            ],
-                        }
-                    )
-
-                    # Display initial balance line for partner
+                if foreign_currency and group_item["currency_id"]:
                     group_item.update(
                         {
-                            "initial_debit": group_item["init_bal"]["debit"],
-                            "initial_credit": group_item["init_bal"]["credit"],
-                            "initial_balance": group_item["init_bal"]["balance"],
-                            "type": "partner",
-                            "grouped_by": account["grouped_by"]
-                            if "grouped_by" in account
-                            else "",
-                            "currency_id": accounts_data[account["id"]]["currency_id"],
-                            "currency_name": accounts_data[account["id"]][
-                                "currency_name"
-                            ],
+                            "final_bal_curr": group_item["fin_bal"]["bal_curr"],
                         }
                     )
-                    if foreign_currency and account["currency_id"]:
-                        group_item.update(
-                            {
-                                "initial_bal_curr": group_item["init_bal"]["bal_curr"],
-                            }
-                        )
-                    self.write_initial_balance_from_dict(group_item, report_data)
+                self.write_ending_balance_from_dict(group_item, report_data)
 
-                    # Display account move lines
-                    for line in group_item["move_lines"]:
-                        line.update(
-                            {
-                                "account": account["code"],
-                                "journal": journals_data[line["journal_id"]]["code"],
-                            }
-                        )
-                        line_currency_id = (
-                            line["currency_id"][0] if line["currency_id"] else False
-                        )
-                        if line_currency_id and line_currency_id != company_currency.id:
-                            line.update(
-                                {
-                                    "currency_name": line["currency_id"][1],
-                                    "currency_id": line["currency_id"][0],
-                                }
-                            )
-                        if line["ref_label"] != "Centralized entries":
-                            taxes_description = ""
-                            analytic_distribution = ""
-                            for tax_id in line["tax_ids"]:
-                                taxes_description += (
-                                    taxes_data[tax_id]["tax_name"] + " "
-                                )
-                            for account_id, value in line[
-                                "analytic_distribution"
-                            ].items():
-                                if value < 100:
-                                    analytic_distribution += "%s %d%% " % (
-                                        analytic_data[int(account_id)]["name"],
-                                        value,
-                                    )
-                                else:
-                                    analytic_distribution += (
-                                        f"{analytic_data[int(account_id)]['name']} "
-                                    )
-                            line.update(
-                                {
-                                    "taxes_description": taxes_description,
-                                    "analytic_distribution": analytic_distribution,
-                                }
-                            )
-                        if (
-                            foreign_currency
-                            and line_currency_id
-                            and line_currency_id != company_currency.id
-                        ):
-                            total_bal_curr += line["bal_curr"]
-                            line.update({"total_bal_curr": total_bal_curr})
-                        self.write_line_from_dict(line, report_data)
-
-                    # Display ending balance line for partner
-                    group_item.update(
-                        {
-                            "final_debit": group_item["fin_bal"]["debit"],
-                            "final_credit": group_item["fin_bal"]["credit"],
-                            "final_balance": group_item["fin_bal"]["balance"],
-                        }
-                    )
-                    if foreign_currency and group_item["currency_id"]:
-                        group_item.update(
-                            {
-                                "final_bal_curr": group_item["fin_bal"]["bal_curr"],
-                            }
-                        )
-                    self.write_ending_balance_from_dict(group_item, report_data)
-
-                    # Line break
-                    report_data["row_pos"] += 1
+                # Line break
+                report_data["row_pos"] += 1
 
-                if not filter_partner_ids:
+            if not filter_partner_ids:
+                account.update(
+                    {
+                        "final_debit": account["fin_bal"]["debit"],
+                        "final_credit": account["fin_bal"]["credit"],
+                        "final_balance": account["fin_bal"]["balance"],
+                    }
+                )
+                if foreign_currency and account["fin_bal_currency_id"]:
                     account.update(
                         {
-                            "final_debit": account["fin_bal"]["debit"],
-                            "final_credit": account["fin_bal"]["credit"],
-                            "final_balance": account["fin_bal"]["balance"],
+                            "final_bal_curr": total_bal_curr,
+                            "currency_id": account["fin_bal_currency_id"],
                         }
                     )
-                    if foreign_currency and account["fin_bal_currency_id"]:
-                        account.update(
-                            {
-                                "final_bal_curr": total_bal_curr,
-                                "currency_id": account["fin_bal_currency_id"],
-                            }
-                        )
-                    self.write_ending_balance_from_dict(account, report_data)
+                self.write_ending_balance_from_dict(account, report_data)
 
-            # 2 lines break
-            report_data["row_pos"] += 2
+        # 2 lines break
+        report_data["row_pos"] += 2
 
     def write_initial_balance_from_dict(self, my_object, report_data):
         """Specific function to write initial balance for General Ledger"""
@@ -2,8 +2,7 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-import operator
-from datetime import date, datetime
+from datetime import datetime
 
 from odoo import _, api, models
 from odoo.tools import float_is_zero
@@ -14,50 +13,6 @@ class OpenItemsReport(models.AbstractModel):
     _description = "Open Items Report"
     _inherit = "report.account_financial_report.abstract_report"
 
-    def _get_account_partial_reconciled(self, company_id, date_at_object):
-        domain = [("max_date", ">", date_at_object), ("company_id", "=", company_id)]
-        fields = [
-            "debit_move_id",
-            "credit_move_id",
-            "amount",
-            "debit_amount_currency",
-            "credit_amount_currency",
-        ]
-        accounts_partial_reconcile = self.env["account.partial.reconcile"].search_read(
-            domain=domain, fields=fields
-        )
-        debit_amount = {}
-        debit_amount_currency = {}
-        credit_amount = {}
-        credit_amount_currency = {}
-        for account_partial_reconcile_data in accounts_partial_reconcile:
-            debit_move_id = account_partial_reconcile_data["debit_move_id"][0]
-            credit_move_id = account_partial_reconcile_data["credit_move_id"][0]
-            if debit_move_id not in debit_amount.keys():
-                debit_amount[debit_move_id] = 0.0
-                debit_amount_currency[debit_move_id] = 0.0
-            debit_amount[debit_move_id] += account_partial_reconcile_data["amount"]
-            debit_amount_currency[debit_move_id] += account_partial_reconcile_data[
-                "debit_amount_currency"
-            ]
-            if credit_move_id not in credit_amount.keys():
-                credit_amount[credit_move_id] = 0.0
-                credit_amount_currency[credit_move_id] = 0.0
-            credit_amount[credit_move_id] += account_partial_reconcile_data["amount"]
-            credit_amount_currency[credit_move_id] += account_partial_reconcile_data[
-                "credit_amount_currency"
-            ]
-            account_partial_reconcile_data.update(
-                {"debit_move_id": debit_move_id, "credit_move_id": credit_move_id}
-            )
-        return (
-            accounts_partial_reconcile,
-            debit_amount,
-            credit_amount,
-            debit_amount_currency,
-            credit_amount_currency,
-        )
-
     def _get_data(
         self,
         account_ids,
@@ -67,52 +22,18 @@ class OpenItemsReport(models.AbstractModel):
         company_id,
         date_from,
     ):
-        domain = self._get_move_lines_domain_not_reconciled(
-            company_id, account_ids, partner_ids, only_posted_moves, date_from
-        )
-        ml_fields = self._get_ml_fields()
-        move_lines = self.env["account.move.line"].search_read(
-            domain=domain, fields=ml_fields
+        open_lines_query = self._get_open_move_lines_query(
+            company_id,
+            account_ids,
+            partner_ids,
+            date_at_object,
+            date_from,
+            only_posted_moves,
         )
+        move_lines = self._get_open_move_lines(open_lines_query, self._get_ml_fields())
         journals_ids = set()
         partners_ids = set()
         partners_data = {}
-        if date_at_object < date.today():
-            (
-                acc_partial_rec,
-                debit_amount,
-                credit_amount,
-                debit_amount_currency,
-                credit_amount_currency,
-            ) = self._get_account_partial_reconciled(company_id, date_at_object)
-            if acc_partial_rec:
-                ml_ids = list(map(operator.itemgetter("id"), move_lines))
-                debit_ids = list(
-                    map(operator.itemgetter("debit_move_id"), acc_partial_rec)
-                )
-                credit_ids = list(
-                    map(operator.itemgetter("credit_move_id"), acc_partial_rec)
-                )
-                move_lines = self._recalculate_move_lines(
-                    move_lines,
-                    debit_ids,
-                    credit_ids,
-                    debit_amount,
-                    credit_amount,
-                    ml_ids,
-                    account_ids,
-                    company_id,
-                    partner_ids,
-                    only_posted_moves,
-                    debit_amount_currency,
-                    credit_amount_currency,
-                )
-        move_lines = [
-            move_line
-            for move_line in move_lines
-            if move_line["date"] <= date_at_object
-            and not float_is_zero(move_line["amount_residual"], precision_digits=2)
-        ]
 
         open_items_move_lines_data = {}
         for move_line in move_lines:
@@ -3,11 +3,15 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+from collections import defaultdict
 
-from odoo import _, api, models
+from odoo import _, api, models, tools
 from odoo.exceptions import UserError
+from odoo.tools import SQL
 from odoo.tools.float_utils import float_is_zero
 
+from .abstract_report import cached_report_values
+
 
 class TrialBalanceReport(models.AbstractModel):
     _name = "report.account_financial_report.trial_balance"
@@ -40,9 +44,9 @@ class TrialBalanceReport(models.AbstractModel):
         if partner_ids:
             domain += [("partner_id", "in", partner_ids)]
         if only_posted_moves:
-            domain += [("move_id.state", "=", "posted")]
+            domain += [("parent_state", "=", "posted")]
         else:
-            domain += [("move_id.state", "in", ["posted", "draft"])]
+            domain += [("parent_state", "in", ["posted", "draft"])]
         if show_partner_details:
             domain += [
                 (
@@ -80,9 +84,9 @@ class TrialBalanceReport(models.AbstractModel):
         if partner_ids:
             domain += [("partner_id", "in", partner_ids)]
         if only_posted_moves:
-            domain += [("move_id.state", "=", "posted")]
+            domain += [("parent_state", "=", "posted")]
         else:
-            domain += [("move_id.state", "in", ["posted", "draft"])]
+            domain += [("parent_state", "in", ["posted", "draft"])]
         if show_partner_details:
             domain += [
                 (
@@ -119,9 +123,9 @@ class TrialBalanceReport(models.AbstractModel):
         if partner_ids:
             domain += [("partner_id", "in", partner_ids)]
         if only_posted_moves:
-            domain += [("move_id.state", "=", "posted")]
+            domain += [("parent_state", "=", "posted")]
         else:
-            domain += [("move_id.state", "in", ["posted", "draft"])]
+            domain += [("parent_state", "in", ["posted", "draft"])]
         if show_partner_details:
             domain += [
                 (
@@ -158,9 +162,9 @@ class TrialBalanceReport(models.AbstractModel):
         if partner_ids:
             domain += [("partner_id", "in", partner_ids)]
         if only_posted_moves:
-            domain += [("move_id.state", "=", "posted")]
+            domain += [("parent_state", "=", "posted")]
         else:
-            domain += [("move_id.state", "in", ["posted", "draft"])]
+            domain += [("parent_state", "in", ["posted", "draft"])]
         if show_partner_details:
             domain += [
                 (
@@ -191,7 +195,7 @@ class TrialBalanceReport(models.AbstractModel):
             only_posted_moves,
             show_partner_details,
         )
-        initial_balances = self.env["account.move.line"].read_group(
+        initial_balances = self._read_group_initial_balances(
             domain=domain,
             fields=["account_id", "balance", "amount_currency:sum"],
             groupby=["account_id"],
@@ -208,7 +212,13 @@ class TrialBalanceReport(models.AbstractModel):
 
     @api.model
     def _compute_account_amount(
-        self, total_amount, tb_initial_acc, tb_period_acc, foreign_currency
+        self,
+        total_amount,
+        tb_initial_acc,
+        tb_period_acc,
+        foreign_currency,
+        group_by=False,
+        tb_period_grouped=None,
     ):
         for tb in tb_period_acc:
             acc_id = tb["account_id"][0]
@@ -219,22 +229,9 @@ class TrialBalanceReport(models.AbstractModel):
             total_amount[acc_id]["initial_balance"] = 0.0
             if foreign_currency:
                 total_amount[acc_id]["initial_currency_balance"] = 0.0
-            if "__context" in tb and "group_by" in tb["__context"]:
-                group_by = tb["__context"]["group_by"][0]
+            if group_by:
                 gb_data = {}
-                tb_grouped = self.env["account.move.line"].read_group(
-                    domain=tb["__domain"],
-                    fields=[
-                        group_by,
-                        "debit",
-                        "credit",
-                        "balance",
-                        "amount_currency:sum",
-                    ],
-                    groupby=[group_by],
-                )
-                for tb2 in tb_grouped:
-                    gb_id = tb2[group_by][0] if tb2[group_by] else 0
+                for gb_id, tb2 in (tb_period_grouped or {}).get(acc_id, {}).items():
                     gb_data[gb_id] = self._prepare_total_amount(tb2, foreign_currency)
                     gb_data[gb_id]["credit"] = tb2["credit"]
                     gb_data[gb_id]["debit"] = tb2["debit"]
@@ -286,6 +283,25 @@ class TrialBalanceReport(models.AbstractModel):
                                     ] += round(tb2["amount_currency"], 2)
         return total_amount
 
+    @api.model
+    def _read_group_by_dimension(self, domain, fields, group_by):
+        """Sums of the move lines of ``domain`` per account and ``group_by``
+        value, read in a single query.
+
+        :return: {account id: {group_by id or 0: read_group row}}
+        """
+        rows = self.env["account.move.line"].read_group(
+            domain=domain,
+            fields=[group_by] + fields,
+            groupby=["account_id", group_by],
+            lazy=False,
+        )
+        data = defaultdict(dict)
+        for row in rows:
+            gb_id = row[group_by][0] if row[group_by] else 0
+            data[row["account_id"][0]][gb_id] = row
+        return data
+
     @api.model
     def _prepare_total_amount(self, tb, foreign_currency):
         res = {
@@ -427,14 +443,17 @@ class TrialBalanceReport(models.AbstractModel):
             # don't include unaffected earnings account
             unaffected_earnings_account = False
         accounts = self.env["account.account"].search(accounts_domain)
-        tb_initial_acc = []
+        tb_initial_acc = {}
         for account in accounts:
-            tb_initial_acc.append(
-                {"account_id": account.id, "balance": 0.0, "amount_currency": 0.0}
-            )
-        groupby_fields = ["account_id"]
-        if grouped_by:
-            groupby_fields.append("analytic_account_ids")
+            tb_initial_acc[account.id] = {
+                "account_id": account.id,
+                "balance": 0.0,
+                "amount_currency": 0.0,
+            }
+        # Accounts are summed up on their own and, for the grouped report,
+        # per analytic account in a second query: grouping by a many2many
+        # counts the lines once per analytic account.
+        group_by = "analytic_account_ids" if grouped_by else False
         initial_domain_bs = self._get_initial_balances_bs_ml_domain(
             account_ids,
             journal_ids,
@@ -444,11 +463,6 @@ class TrialBalanceReport(models.AbstractModel):
             only_posted_moves,
             show_partner_details,
         )
-        tb_initial_acc_bs = self.env["account.move.line"].read_group(
-            domain=initial_domain_bs,
-            fields=["account_id", "balance", "amount_currency:sum"],
-            groupby=groupby_fields,
-        )
         initial_domain_pl = self._get_initial_balances_pl_ml_domain(
             account_ids,
             journal_ids,
@@ -459,39 +473,33 @@ class TrialBalanceReport(models.AbstractModel):
             show_partner_details,
             fy_start_date,
         )
-        tb_initial_acc_pl = self.env["account.move.line"].read_group(
-            domain=initial_domain_pl,
-            fields=["account_id", "balance", "amount_currency:sum"],
-            groupby=groupby_fields,
-        )
-        tb_initial_acc_rg = tb_initial_acc_bs + tb_initial_acc_pl
-        for account_rg in tb_initial_acc_rg:
-            element = list(
-                filter(
-                    lambda acc_dict: acc_dict["account_id"]
-                    == account_rg["account_id"][0],
-                    tb_initial_acc,
-                )
+        for initial_domain in (initial_domain_bs, initial_domain_pl):
+            tb_initial_acc_rg = self._read_group_initial_balances(
+                domain=initial_domain,
+                fields=["account_id", "balance", "amount_currency:sum"],
+                groupby=["account_id"],
             )
-            if element:
-                element[0]["balance"] += account_rg["balance"]
-                element[0]["amount_currency"] += account_rg["amount_currency"]
-                if "__context" in account_rg and "group_by" in account_rg["__context"]:
-                    group_by = account_rg["__context"]["group_by"][0]
-                    gb_data = {}
-                    account_rg_grouped = self.env["account.move.line"].read_group(
-                        domain=account_rg["__domain"],
-                        fields=[group_by, "balance", "amount_currency:sum"],
-                        groupby=[group_by],
-                    )
-                    for a_rg2 in account_rg_grouped:
-                        gb_id = a_rg2[group_by][0] if a_rg2[group_by] else 0
-                        gb_data[gb_id] = {
+            if group_by:
+                tb_initial_grouped = self._read_group_by_dimension(
+                    initial_domain, ["balance", "amount_currency:sum"], group_by
+                )
+            for account_rg in tb_initial_acc_rg:
+                acc_id = account_rg["account_id"][0]
+                element = tb_initial_acc.get(acc_id)
+                if not element:
+                    continue
+                element["balance"] += account_rg["balance"]
+                element["amount_currency"] += account_rg["amount_currency"]
+                if group_by:
+                    element["group_by"] = group_by
+                    element["group_by_data"] = {
+                        gb_id: {
                             "balance": a_rg2["balance"],
                             "amount_currency": a_rg2["amount_currency"],
                         }
-                    element[0]["group_by"] = group_by
-                    element[0]["group_by_data"] = gb_data
+                        for gb_id, a_rg2 in tb_initial_grouped[acc_id].items()
+                    }
+        tb_initial_acc = list(tb_initial_acc.values())
         if hide_account_at_0:
             tb_initial_acc = [p for p in tb_initial_acc if p["balance"] != 0]
 
@@ -508,20 +516,28 @@ class TrialBalanceReport(models.AbstractModel):
         tb_period_acc = self.env["account.move.line"].read_group(
             domain=period_domain,
             fields=["account_id", "debit", "credit", "balance", "amount_currency:sum"],
-            groupby=groupby_fields,
+            groupby=["account_id"],
         )
+        tb_period_grouped = {}
+        if group_by:
+            tb_period_grouped = self._read_group_by_dimension(
+                period_domain,
+                ["debit", "credit", "balance", "amount_currency:sum"],
+                group_by,
+            )
 
         if show_partner_details:
-            tb_initial_prt_bs = self.env["account.move.line"].read_group(
+            tb_initial_prt_bs = self._read_group_initial_balances(
                 domain=initial_domain_bs,
                 fields=["account_id", "partner_id", "balance", "amount_currency:sum"],
                 groupby=["account_id", "partner_id"],
                 lazy=False,
             )
-            tb_initial_prt_pl = self.env["account.move.line"].read_group(
+            tb_initial_prt_pl = self._read_group_initial_balances(
                 domain=initial_domain_pl,
                 fields=["account_id", "partner_id", "balance", "amount_currency:sum"],
                 groupby=["account_id", "partner_id"],
+                lazy=False,
             )
             tb_initial_prt = tb_initial_prt_bs + tb_initial_prt_pl
             if hide_account_at_0:
@@ -542,7 +558,12 @@ class TrialBalanceReport(models.AbstractModel):
         total_amount = {}
         partners_data = []
         total_amount = self._compute_account_amount(
-            total_amount, tb_initial_acc, tb_period_acc, foreign_currency
+            total_amount,
+            tb_initial_acc,
+            tb_period_acc,
+            foreign_currency,
+            group_by,
+            tb_period_grouped,
         )
         if show_partner_details:
             total_amount, partners_data = self._compute_partner_amount(
@@ -689,14 +710,10 @@ class TrialBalanceReport(models.AbstractModel):
 
     def _get_hierarchy_groups(self, group_ids, groups_data, foreign_currency):
         processed_groups = []
+        groups_info = self._get_account_groups_info()
         # Sort groups so that parent groups are processed before child groups
-        groups = (
-            self.env["account.group"]
-            .browse(group_ids)
-            .sorted(key=lambda x: x.complete_code)
-        )
-        for group in groups:
-            group_id = group.id
+        group_ids = sorted(group_ids, key=lambda x: groups_data[x]["complete_code"])
+        for group_id in group_ids:
             parent_id = groups_data[group_id]["parent_id"]
             if group_id in processed_groups:
                 raise UserError(
@@ -710,23 +727,16 @@ class TrialBalanceReport(models.AbstractModel):
                 processed_groups.append(parent_id)
             while parent_id:
                 if parent_id not in groups_data.keys():
-                    group = self.env["account.group"].browse(parent_id)
-                    groups_data[group.id] = {
-                        "id": group.id,
-                        "code": group.code_prefix_start,
-                        "name": group.name,
-                        "parent_id": group.parent_id.id,
-                        "complete_code": group.complete_code,
-                        "account_ids": group.compute_account_ids.ids,
-                        "type": "group_type",
-                        "initial_balance": 0,
-                        "debit": 0,
-                        "credit": 0,
-                        "balance": 0,
-                        "ending_balance": 0,
-                    }
+                    groups_data[parent_id] = dict(
+                        self._get_account_group_info(groups_info, parent_id),
+                        initial_balance=0,
+                        debit=0,
+                        credit=0,
+                        balance=0,
+                        ending_balance=0,
+                    )
                     if foreign_currency:
-                        groups_data[group.id].update(
+                        groups_data[parent_id].update(
                             initial_currency_balance=0,
                             ending_currency_balance=0,
                         )
@@ -759,30 +769,12 @@ class TrialBalanceReport(models.AbstractModel):
                     account_group_relation.update({account.group_id.id: [account.id]})
                 else:
                     account_group_relation[account.group_id.id].append(account.id)
-        groups = self.env["account.group"].browse(account_group_relation.keys())
+        groups_info = self._get_account_groups_info()
         groups_data = {}
-        for group in groups:
-            groups_data.update(
-                {
-                    group.id: {
-                        "id": group.id,
-                        "code": group.code_prefix_start,
-                        "name": group.name,
-                        "parent_id": group.parent_id.id,
-                        "type": "group_type",
-                        "complete_code": group.complete_code,
-                        "account_ids": group.compute_account_ids.ids,
-                        "initial_balance": 0.0,
-                        "credit": 0.0,
-                        "debit": 0.0,
-                        "balance": 0.0,
-                        "ending_balance": 0.0,
-                    }
-                }
+        for group_id in account_group_relation.keys():
+            groups_data[group_id] = self._prepare_group_data(
+                self._get_account_group_info(groups_info, group_id), foreign_currency
             )
-            if foreign_currency:
-                groups_data[group.id]["initial_currency_balance"] = 0.0
-                groups_data[group.id]["ending_currency_balance"] = 0.0
         for group_id in account_group_relation.keys():
             for account_id in account_group_relation[group_id]:
                 groups_data[group_id]["initial_balance"] += total_amount[account_id][
@@ -809,54 +801,161 @@ class TrialBalanceReport(models.AbstractModel):
         )
         return groups_data
 
+    @api.model
+    def _get_account_groups_version(self, company_ids):
+        """Fingerprint of the account group fields the cached structure of
+        ``_get_account_groups_structure`` depends on: their code prefixes,
+        their parents and the accounts they hold."""
+        self.env["account.account"].flush_model(["group_id"])
+        groups = self.env["account.group"]
+        groups.flush_model(
+            ["company_id", "code_prefix_start", "parent_id", "compute_account_ids"]
+        )
+        field = groups._fields["compute_account_ids"]
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT md5(
+                    COALESCE((
+                        SELECT string_agg(
+                            concat_ws(':', id, code_prefix_start, parent_id),
+                            ',' ORDER BY id
+                        )
+                        FROM account_group
+                        WHERE company_id = ANY(%(company_ids)s)
+                    ), '') || '|' || COALESCE((
+                        SELECT string_agg(
+                            concat_ws(':', rel.%(group)s, rel.%(account)s),
+                            ',' ORDER BY rel.%(group)s, rel.%(account)s
+                        )
+                        FROM %(relation)s rel
+                        JOIN account_group g ON g.id = rel.%(group)s
+                        WHERE g.company_id = ANY(%(company_ids)s)
+                    ), '')
+                )
+                """,
+                company_ids=list(company_ids),
+                relation=SQL.identifier(field.relation),
+                group=SQL.identifier(field.column1),
+                account=SQL.identifier(field.column2),
+            )
+        )
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _get_account_groups_structure(self, company_ids):
+        """Static data of the account groups of ``company_ids`` and the trie of
+        their code prefixes, with the names of the groups in the language of
+        the environment."""
+        groups_info, trie = self._get_account_groups_structure_cached(
+            company_ids, self._get_account_groups_version(company_ids)
+        )
+        groups = self.env["account.group"].sudo().browse(groups_info)
+        names = {group.id: group.name for group in groups}
+        groups_info = {
+            group_id: dict(group_info, name=names[group_id])
+            for group_id, group_info in groups_info.items()
+        }
+        return groups_info, trie
+
+    @api.model
+    @tools.ormcache("company_ids", "version")
+    def _get_account_groups_structure_cached(self, company_ids, version):
+        """Codes of the account groups of ``company_ids`` and the trie of their
+        code prefixes, cached until ``version`` changes.
+
+        Each node of the trie maps the next character of a code to its child
+        node, and the None key to the groups whose prefix ends there. The
+        translatable names are left out of the cache.
+        """
+        groups = (
+            self.env["account.group"]
+            .sudo()
+            .search([("company_id", "in", list(company_ids))])
+        )
+        groups_info = {}
+        trie = {}
+        for group in groups:
+            groups_info[group.id] = self._get_account_group_values(group)
+            groups_info[group.id].pop("name")
+            if not group.code_prefix_start:
+                continue
+            node = trie
+            for char in group.code_prefix_start:
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append(group.id)
+        return groups_info, trie
+
+    def _get_account_groups_info(self):
+        return self._get_account_groups_structure(
+            tuple(sorted(self.env.companies.ids))
+        )[0]
+
+    def _get_account_group_info(self, groups_info, group_id):
+        if group_id in groups_info:
+            return groups_info[group_id]
+        group = self.env["account.group"].browse(group_id)
+        return self._get_account_group_values(group)
+
+    @api.model
+    def _get_account_group_values(self, group):
+        return {
+            "id": group.id,
+            "code": group.code_prefix_start,
+            "name": group.name,
+            "parent_id": group.parent_id.id,
+            "type": "group_type",
+            "complete_code": group.complete_code,
+            "account_ids": group.compute_account_ids.ids,
+        }
+
+    @api.model
+    def _prepare_group_data(self, group_info, foreign_currency):
+        group_data = dict(
+            group_info,
+            initial_balance=0.0,
+            credit=0.0,
+            debit=0.0,
+            balance=0.0,
+            ending_balance=0.0,
+        )
+        if foreign_currency:
+            group_data["initial_currency_balance"] = 0.0
+            group_data["ending_currency_balance"] = 0.0
+        return group_data
+
     def _get_computed_groups_data(self, accounts_data, total_amount, foreign_currency):
-        groups = self.env["account.group"].search([("id", "!=", False)])
+        """Totals of every account group over the accounts whose code starts
+        with the group code prefix.
+
+        Each account walks the prefix trie once along its code, adding its
+        totals to every group met on the way.
+        """
+        groups_info, trie = self._get_account_groups_structure(
+            tuple(sorted(self.env.companies.ids))
+        )
         groups_data = {}
-        for group in groups:
-            len_group_code = len(group.code_prefix_start)
-            groups_data.update(
-                {
-                    group.id: {
-                        "id": group.id,
-                        "code": group.code_prefix_start,
-                        "name": group.name,
-                        "parent_id": group.parent_id.id,
-                        "type": "group_type",
-                        "complete_code": group.complete_code,
-                        "account_ids": group.compute_account_ids.ids,
-                        "initial_balance": 0.0,
-                        "credit": 0.0,
-                        "debit": 0.0,
-                        "balance": 0.0,
-                        "ending_balance": 0.0,
-                    }
-                }
+        for group_id, group_info in groups_info.items():
+            groups_data[group_id] = self._prepare_group_data(
+                group_info, foreign_currency
             )
-            if foreign_currency:
-                groups_data[group.id]["initial_currency_balance"] = 0.0
-                groups_data[group.id]["ending_currency_balance"] = 0.0
-            for account in accounts_data.values():
-                if group.code_prefix_start == account["code"][:len_group_code]:
-                    acc_id = account["id"]
-                    group_id = group.id
-                    groups_data[group_id]["initial_balance"] += total_amount[acc_id][
-                        "initial_balance"
-                    ]
-                    groups_data[group_id]["debit"] += total_amount[acc_id]["debit"]
-                    groups_data[group_id]["credit"] += total_amount[acc_id]["credit"]
-                    groups_data[group_id]["balance"] += total_amount[acc_id]["balance"]
-                    groups_data[group_id]["ending_balance"] += total_amount[acc_id][
-                        "ending_balance"
-                    ]
-                    if foreign_currency:
-                        groups_data[group_id]["initial_currency_balance"] += (
-                            total_amount[acc_id]["initial_currency_balance"]
-                        )
-                        groups_data[group_id]["ending_currency_balance"] += (
-                            total_amount[acc_id]["ending_currency_balance"]
-                        )
+        amount_keys = ["initial_balance", "debit", "credit", "balance"]
+        amount_keys += ["ending_balance"]
+        if foreign_currency:
+            amount_keys += ["initial_currency_balance", "ending_currency_balance"]
+        for account in accounts_data.values():
+            account_amount = total_amount[account["id"]]
+            node = trie
+            for char in account["code"] or "":
+                node = node.get(char)
+                if node is None:
+                    break
+                for group_id in node.get(None, []):
+                    for amount_key in amount_keys:
+                        groups_data[group_id][amount_key] += account_amount[amount_key]
         return groups_data
 
+    @cached_report_values
     def _get_report_values(self, docids, data):
         show_partner_details = data["show_partner_details"]
         wizard_id = data["wizard_id"]
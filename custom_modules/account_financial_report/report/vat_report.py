@@ -38,9 +38,9 @@ class VATReport(models.AbstractModel):
             ("tax_line_id", "!=", False),
         ] + self.env["account.move.line"]._get_tax_exigible_domain()
         if only_posted_moves:
-            domain += [("move_id.state", "=", "posted")]
+            domain += [("parent_state", "=", "posted")]
         else:
-            domain += [("move_id.state", "in", ["posted", "draft"])]
+            domain += [("parent_state", "in", ["posted", "draft"])]
         return domain
 
     @api.model
@@ -51,9 +51,9 @@ class VATReport(models.AbstractModel):
             ("date", "<=", date_to),
         ] + self.env["account.move.line"]._get_tax_exigible_domain()
         if only_posted_moves:
-            domain += [("move_id.state", "=", "posted")]
+            domain += [("parent_state", "=", "posted")]
         else:
-            domain += [("move_id.state", "in", ["posted", "draft"])]
+            domain += [("parent_state", "in", ["posted", "draft"])]
         return domain
 
     def _get_vat_report_data(self, company_id, date_from, date_to, only_posted_moves):
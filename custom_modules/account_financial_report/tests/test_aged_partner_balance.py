@@ -122,3 +122,16 @@ class TestAgedPartnerBalance(TransactionCase):
             data=data,
         )
         self.assertTrue(result)
+
+    def test_watermark_aged_report_configuration(self):
+        """The intervals of the configurations move the cached values"""
+        wizard = self.wizard_with_line_details
+        wizard.age_partner_config_id = self.account_age_report_config.id
+        data = wizard._prepare_report_aged_partner_balance()
+        report = self.env["report.account_financial_report.aged_partner_balance"]
+        watermark = report._get_ledger_watermark(data)
+        self.account_age_report_config.line_ids = [
+            (0, 0, {"name": "31-60", "inferior_limit": 60})
+        ]
+        self.env.flush_all()
+        self.assertNotEqual(report._get_ledger_watermark(data), watermark)
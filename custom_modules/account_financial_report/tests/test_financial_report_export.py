@@ -0,0 +1,141 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import base64
+import io
+import zipfile
+
+from odoo.tests import tagged
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+
+@tagged("post_install", "-at_install")
+class TestFinancialReportExport(AccountTestInvoicingCommon):
+    def _create_export(self, companies, **values):
+        return self.env["account.financial.report.export"].create(
+            dict(
+                {
+                    "name": "Month-end pack",
+                    "line_ids": [
+                        (
+                            0,
+                            0,
+                            {
+                                "report_model": "trial.balance.report.wizard",
+                                "company_id": company.id,
+                                "date_from": "2016-01-01",
+                                "date_to": "2016-12-31",
+                            },
+                        )
+                        for company in companies
+                    ]
+                    + [
+                        (
+                            0,
+                            0,
+                            {
+                                "report_model": "open.items.report.wizard",
+                                "company_id": self.env.company.id,
+                                "date_to": "2016-12-31",
+                                "wizard_values": {"hide_account_at_0": False},
+                            },
+                        )
+                    ],
+                },
+                **values,
+            )
+        )
+
+    def _process_queue(self):
+        """Run a job of the cron pool, without its commits"""
+        export_model = self.env["account.financial.report.export"]
+        export_model._start_queued()
+        line_model = self.env["account.financial.report.export.line"]
+        while line := line_model._claim_queued():
+            line._run_as_requester()
+        while export := export_model._claim_rendered():
+            export._zip_lines()
+
+    def test_export_zip(self):
+        company_2 = self.setup_other_company()["company"]
+        self.env.user.company_ids |= company_2
+        export = self._create_export(self.env.company | company_2, workers=2)
+        export.action_enqueue()
+        self.assertEqual(export.state, "queued")
+        self.assertEqual(set(export.line_ids.mapped("state")), {"queued"})
+        self._process_queue()
+        self.assertEqual(export.state, "done", export.error)
+        self.assertEqual(set(export.line_ids.mapped("state")), {"done"})
+        archive = zipfile.ZipFile(
+            io.BytesIO(base64.b64decode(export.attachment_id.datas))
+        )
+        self.assertEqual(
+            archive.namelist(),
+            [
+                f"01 {self.env.company.name} - Trial Balance.xlsx",
+                f"02 {company_2.name} - Trial Balance.xlsx",
+                f"03 {self.env.company.name} - Open Items.xlsx",
+            ],
+        )
+        for name in archive.namelist():
+            self.assertTrue(zipfile.is_zipfile(io.BytesIO(archive.read(name))))
+
+    def test_wizard_values(self):
+        export = self._create_export(self.env.company)
+        trial_balance, open_items = export.line_ids
+        self.assertEqual(
+            trial_balance._get_wizard_values(),
+            {
+                "date_from": trial_balance.date_from,
+                "date_to": trial_balance.date_to,
+                "target_move": "posted",
+                "company_id": self.env.company.id,
+            },
+        )
+        self.assertEqual(
+            open_items._get_wizard_values(),
+            {
+                "date_at": open_items.date_to,
+                "target_move": "posted",
+                "hide_account_at_0": False,
+                "company_id": self.env.company.id,
+            },
+        )
+
+    def test_failed_line(self):
+        export = self._create_export(self.env.company, workers=2)
+        export.line_ids[0].wizard_values = {"no_such_field": True}
+        export.action_enqueue()
+        self._process_queue()
+        self.assertEqual(export.state, "failed")
+        self.assertEqual(export.line_ids.mapped("state"), ["failed", "done"])
+        self.assertIn("Trial Balance", export.error)
+
+    def test_workers(self):
+        export = self._create_export(self.env.company)
+        self.assertEqual(export._get_workers(), 2)
+        export.workers = 1
+        self.assertEqual(export._get_workers(), 1)
+        export.workers = 64
+        export.line_ids = [(0, 0, values) for values in export.line_ids.copy_data()]
+        self.assertEqual(len(export.line_ids), 4)
+        # At most the crons of the pool, whatever the number of lines
+        self.assertEqual(export._get_workers(), 4)
+
+    def test_claims(self):
+        export = self._create_export(self.env.company)
+        draft = self._create_export(self.env.company)
+        export.action_enqueue()
+        line_model = self.env["account.financial.report.export.line"]
+        # The lines of the exports not started yet are not claimed
+        self.assertFalse(line_model._claim_queued())
+        self.env["account.financial.report.export"]._start_queued()
+        self.assertEqual(export.state, "running")
+        self.assertEqual(draft.state, "draft")
+        self.assertEqual(line_model._claim_queued(), export.line_ids[0])
+        # An export is zipped once none of its lines is queued any more
+        export.line_ids[0].state = "done"
+        self.assertFalse(export._claim_rendered())
+        export.line_ids[1].state = "failed"
+        self.assertFalse(line_model._claim_queued())
+        self.assertEqual(export._claim_rendered(), export)
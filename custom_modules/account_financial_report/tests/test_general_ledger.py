@@ -5,11 +5,15 @@
 
 import time
 from datetime import date
+from unittest.mock import patch
 
 from odoo import api, fields
 from odoo.tests import tagged
 
 from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.account_financial_report.report.abstract_report import (
+    report_values_cache,
+)
 
 
 @tagged("post_install", "-at_install")
@@ -731,3 +735,133 @@ class TestGeneralLedgerReport(AccountTestInvoicingCommon):
         wizard.onchange_date_range_id()
         self.assertEqual(wizard.date_from, date(2018, 1, 1))
         self.assertEqual(wizard.date_to, date(2018, 12, 31))
+
+    def test_streamed_general_ledger(self):
+        self._add_move(
+            date=self.previous_fy_date_end,
+            receivable_debit=1000,
+            receivable_credit=0,
+            income_debit=0,
+            income_credit=1000,
+        )
+        self._add_move(
+            date=self.fy_date_start,
+            receivable_debit=0,
+            receivable_credit=300,
+            income_debit=300,
+            income_credit=0,
+        )
+        for with_partners in (False, True):
+            general_ledger = self.env["general.ledger.report.wizard"].create(
+                {
+                    "date_from": self.fy_date_start,
+                    "date_to": self.fy_date_end,
+                    "target_move": "posted",
+                    "hide_account_at_0": False,
+                    "company_id": self.env.user.company_id.id,
+                    "fy_start_date": self.fy_date_start,
+                    "centralize": not with_partners,
+                }
+            )
+            data = general_ledger._prepare_report_general_ledger()
+            report = self.env["report.account_financial_report.general_ledger"]
+            expected = report._get_report_values(general_ledger, data)["general_ledger"]
+            streamed = [account for account, _side in report._iter_general_ledger(data)]
+            self.assertEqual(
+                [account["id"] for account in streamed],
+                [account["id"] for account in expected],
+            )
+            for account, expected_account in zip(streamed, expected, strict=True):
+                self.assertEqual(account["init_bal"], expected_account["init_bal"])
+                self.assertEqual(account["fin_bal"], expected_account["fin_bal"])
+                self.assertEqual(
+                    account.get("move_lines"), expected_account.get("move_lines")
+                )
+                self.assertEqual(
+                    account.get("list_grouped"), expected_account.get("list_grouped")
+                )
+
+    def test_read_move_lines(self):
+        invoice = self.init_invoice(
+            "out_invoice",
+            partner=self.partner_a,
+            invoice_date="2019-01-21",
+            amounts=[1000],
+            taxes=self.tax_sale_a,
+            post=True,
+        )
+        report = self.env["report.account_financial_report.general_ledger"]
+        ml_ids = invoice.line_ids.ids[::-1]
+        move_lines = report._read_move_lines(ml_ids)
+        self.assertEqual([line["id"] for line in move_lines], ml_ids)
+        for line, aml in zip(move_lines, invoice.line_ids[::-1], strict=True):
+            self.assertEqual(line["entry"], invoice.name)
+            self.assertEqual(line["entry_id"], invoice.id)
+            self.assertEqual(line["journal_id"], invoice.journal_id.id)
+            self.assertEqual(line["account_id"], aml.account_id.id)
+            self.assertEqual(line["partner_id"], self.partner_a.id)
+            self.assertEqual(line["partner_name"], self.partner_a.display_name)
+            self.assertEqual(line["tax_ids"], aml.tax_ids.ids)
+            self.assertEqual(
+                line["tax_line_id"],
+                aml.tax_line_id
+                and (aml.tax_line_id.id, aml.tax_line_id.display_name),
+            )
+            self.assertEqual(line["balance"], aml.balance)
+            self.assertEqual(
+                line["currency_id"], (aml.currency_id.id, aml.currency_id.name)
+            )
+            self.assertEqual(line["ref_label"], aml.name or "")
+        # Only the values of a move line can be set
+        move_lines[0]["balance"] = 0.0
+        self.assertEqual(move_lines[0]["balance"], 0.0)
+        with self.assertRaises(KeyError):
+            move_lines[0]["journal"] = "INV"
+
+    def test_cached_report_values(self):
+        self._add_move(
+            date=self.fy_date_start,
+            receivable_debit=1000,
+            receivable_credit=0,
+            income_debit=0,
+            income_credit=1000,
+        )
+        wizard_values = {
+            "date_from": self.fy_date_start,
+            "date_to": self.fy_date_end,
+            "target_move": "posted",
+            "company_id": self.env.user.company_id.id,
+            "fy_start_date": self.fy_date_start,
+        }
+        report = self.env["report.account_financial_report.general_ledger"]
+        report_values_cache.clear()
+        # The cache is not used in a transaction that wrote, as the tests do
+        with patch.object(type(report), "_can_cache_report_values", return_value=True):
+            wizard = self.env["general.ledger.report.wizard"].create(wizard_values)
+            data = wizard._prepare_report_general_ledger()
+            values = report._get_report_values(wizard, data)
+            # Same settings from another wizard, nothing recomputed
+            other_wizard = self.env["general.ledger.report.wizard"].create(
+                wizard_values
+            )
+            other_data = other_wizard._prepare_report_general_ledger()
+            with patch.object(
+                type(report), "_get_period_ml_data", side_effect=AssertionError
+            ):
+                cached_values = report._get_report_values(other_wizard, other_data)
+            self.assertEqual(cached_values["docs"], other_wizard)
+            self.assertEqual(cached_values["doc_ids"], [other_wizard.id])
+            self.assertEqual(cached_values["general_ledger"], values["general_ledger"])
+            # Every hit gets its own copy of the values
+            self.assertIsNot(cached_values["general_ledger"], values["general_ledger"])
+            # A new posting moves the watermark
+            self._add_move(
+                date=self.fy_date_start,
+                receivable_debit=500,
+                receivable_credit=0,
+                income_debit=0,
+                income_credit=500,
+            )
+            new_values = report._get_report_values(other_wizard, other_data)
+            self.assertNotEqual(new_values["general_ledger"], values["general_ledger"])
+        report_values_cache.clear()
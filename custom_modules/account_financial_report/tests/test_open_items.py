@@ -2,6 +2,8 @@
 # Copyright 2016 Camptocamp SA
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+from datetime import date
+
 from odoo.tests import tagged
 
 from odoo.addons.account.tests.common import AccountTestInvoicingCommon
@@ -39,3 +41,128 @@ class TestOpenItems(AccountTestInvoicingCommon):
 
         wizard = self.env["open.items.report.wizard"].with_context(**context)
         self.assertEqual(wizard._default_partners(), expected_list)
+
+    def _post_receivable_move(
+        self, move_date, amount, date_maturity=False, currency=False
+    ):
+        receivable = self.company_data["default_account_receivable"]
+        receivable_vals = {}
+        counterpart_vals = {}
+        if currency:
+            receivable_vals = {
+                "currency_id": currency.id,
+                "amount_currency": amount * 2,
+            }
+            counterpart_vals = {
+                "currency_id": currency.id,
+                "amount_currency": -amount * 2,
+            }
+        move = self.env["account.move"].create(
+            {
+                "journal_id": self.company_data["default_journal_misc"].id,
+                "date": move_date,
+                "line_ids": [
+                    (
+                        0,
+                        0,
+                        {
+                            "account_id": receivable.id,
+                            "partner_id": self.partner_a.id,
+                            "debit": max(amount, 0.0),
+                            "credit": max(-amount, 0.0),
+                            "date_maturity": date_maturity or move_date,
+                            **receivable_vals,
+                        },
+                    ),
+                    (
+                        0,
+                        0,
+                        {
+                            "account_id": self.company_data[
+                                "default_account_revenue"
+                            ].id,
+                            "debit": max(-amount, 0.0),
+                            "credit": max(amount, 0.0),
+                            **counterpart_vals,
+                        },
+                    ),
+                ],
+            }
+        )
+        move.action_post()
+        return move.line_ids.filtered(lambda line: line.account_id == receivable)
+
+    def test_residual_at_past_date(self):
+        receivable = self.company_data["default_account_receivable"]
+        invoice_line = self._post_receivable_move("2016-01-10", 1000.0)
+        payment_line = self._post_receivable_move("2016-03-01", -400.0)
+        (invoice_line | payment_line).reconcile()
+        report = self.env["report.account_financial_report.open_items"]
+
+        def residuals(date_at):
+            move_lines = report._get_data(
+                [receivable.id],
+                [self.partner_a.id],
+                date_at,
+                True,
+                self.env.company.id,
+                False,
+            )[0]
+            return {ml["id"]: ml["amount_residual"] for ml in move_lines}
+
+        self.assertEqual(residuals(date(2016, 2, 15)), {invoice_line.id: 1000.0})
+        self.assertEqual(residuals(date(2016, 3, 15)), {invoice_line.id: 600.0})
+        self.assertEqual(residuals(date.today()), {invoice_line.id: 600.0})
+        # Aged buckets are summed up from the same residuals
+        config = self.env["account.age.report.configuration"].create(
+            {
+                "name": "Intervals",
+                "line_ids": [
+                    (0, 0, {"name": "1-30", "inferior_limit": 30}),
+                    (0, 0, {"name": "31-90", "inferior_limit": 90}),
+                ],
+            }
+        )
+        ag_pb_data = (
+            self.env["report.account_financial_report.aged_partner_balance"]
+            .with_context(age_partner_config=config)
+            ._get_move_lines_data(
+                self.env.company.id,
+                [receivable.id],
+                [self.partner_a.id],
+                date(2016, 3, 15),
+                False,
+                True,
+                True,
+            )[0]
+        )
+        partner_data = ag_pb_data[receivable.id][self.partner_a.id]
+        self.assertEqual(partner_data["residual"], 600.0)
+        # Due on January 10th, 65 days before
+        self.assertEqual(partner_data["90_days"], 600.0)
+        self.assertEqual(partner_data[config.line_ids[1]], 600.0)
+        self.assertEqual(partner_data["move_lines"][0]["residual"], 600.0)
+
+    def test_amount_currency(self):
+        receivable = self.company_data["default_account_receivable"]
+        currency = (
+            self.env["res.currency"]
+            .with_context(active_test=False)
+            .search([("id", "!=", self.env.company.currency_id.id)], limit=1)
+        )
+        currency.active = True
+        company_line = self._post_receivable_move("2016-01-10", 1000.0)
+        currency_line = self._post_receivable_move(
+            "2016-01-10", 300.0, currency=currency
+        )
+        move_lines = self.env["report.account_financial_report.open_items"]._get_data(
+            [receivable.id],
+            [self.partner_a.id],
+            date(2016, 2, 15),
+            True,
+            self.env.company.id,
+            False,
+        )[0]
+        amounts = {ml["id"]: ml["amount_currency"] for ml in move_lines}
+        # Lines in the company currency show no amount in currency, like v13
+        self.assertEqual(amounts, {company_line.id: 0, currency_line.id: 600.0})
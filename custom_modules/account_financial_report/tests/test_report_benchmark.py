@@ -0,0 +1,351 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+"""
+Scale benchmark of the financial reports.
+
+A ledger of the requested size is generated in SQL for a new company, over
+accounts, partners, currencies, taxes and analytic distributions. Then the
+report values and the XLSX file of every report are measured: wall time, SQL
+query count and peak RSS of the process. The run fails when a measure is
+clearly worse than its baseline in ``benchmark_baselines.json``, or has no
+baseline yet (see ``odoo.addons.benchmark_base.tests.common``).
+
+Excluded from the standard test run, start it with::
+
+    odoo-bin -d <db> -i account_financial_report --test-tags afr_benchmark
+
+Environment variables:
+    AFR_BENCH_SCALE: move lines to generate, '100k', '1m' or '5m'
+    AFR_BENCH_ROUNDS: runs per measure, the median time is kept
+    AFR_BENCH_RECORD: set to 1 to write the measures as baselines
+"""
+
+import logging
+import os
+import time
+from datetime import date
+from functools import partial
+
+from dateutil.relativedelta import relativedelta
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.benchmark_base.tests.common import BenchmarkCase
+
+_logger = logging.getLogger(__name__)
+
+# Partner, base and tax line
+LINES_PER_MOVE = 3
+HISTORY_DAYS = 730
+
+
+@tagged("post_install", "-at_install", "-standard", "afr_benchmark")
+class TestReportBenchmark(BenchmarkCase, TransactionCase):
+    """Wall time, query count and peak RSS of the reports at scale"""
+
+    benchmark_name = "account_financial_report"
+    benchmark_env_prefix = "AFR_BENCH"
+    benchmark_baselines_path = os.path.join(
+        os.path.dirname(__file__), "benchmark_baselines.json"
+    )
+    # Move lines, partners and accounts of each type of each scale
+    benchmark_scales = {
+        "100k": (100000, 1000, 20),
+        "1m": (1000000, 10000, 50),
+        "5m": (5000000, 50000, 100),
+    }
+    benchmark_default_scale = "100k"
+    benchmark_measure_rss = True
+    # Reports are slower to render than RPC calls, and noisier
+    latency_slack = 0.1
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        line_count, cls.partner_count, cls.account_count = cls._setup_benchmark()
+        cls.move_count = max(line_count // LINES_PER_MOVE, 1)
+        cls.today = date.today()
+
+        start = time.perf_counter()
+        cls._generate_ledger()
+        _logger.info(
+            "account_financial_report benchmark: %s moves, %s lines generated "
+            "in %.1fs",
+            cls.move_count,
+            cls.move_count * LINES_PER_MOVE,
+            time.perf_counter() - start,
+        )
+
+    @classmethod
+    def _create_accounts(cls, account_type, prefix, count):
+        return cls.env["account.account"].create(
+            [
+                {
+                    "code": f"{prefix}{i:04d}",
+                    "name": f"Benchmark {account_type} {i}",
+                    "account_type": account_type,
+                    "reconcile": account_type
+                    in ("asset_receivable", "liability_payable"),
+                }
+                for i in range(count)
+            ]
+        )
+
+    @classmethod
+    def _generate_ledger(cls):
+        """Company, accounts, partners and taxes through the ORM, moves and
+        move lines in SQL"""
+        company = cls.env["res.company"].create(
+            {"name": "Benchmark Company", "currency_id": cls.env.ref("base.USD").id}
+        )
+        cls.env.user.company_ids |= company
+        cls.env = cls.env(
+            context=dict(cls.env.context, allowed_company_ids=company.ids)
+        )
+        cls.company = company
+        foreign_currency = cls.env.ref("base.EUR")
+        foreign_currency.active = True
+        receivable = cls._create_accounts("asset_receivable", "411", 2)
+        payable = cls._create_accounts("liability_payable", "401", 2)
+        income = cls._create_accounts("income", "700", cls.account_count)
+        expense = cls._create_accounts("expense", "600", cls.account_count)
+        tax_account = cls._create_accounts("liability_current", "445", 1)
+        cls._create_accounts("equity_unaffected", "999", 1)
+        cls.partner_accounts = receivable | payable
+        journal = cls.env["account.journal"].create(
+            {"name": "Benchmark", "code": "BNCH", "type": "general"}
+        )
+        partners = cls.env["res.partner"].create(
+            [{"name": f"Benchmark Partner {i:05d}"} for i in range(cls.partner_count)]
+        )
+        tax_group = cls.env["account.tax.group"].create({"name": "Benchmark VAT"})
+        taxes = cls.env["account.tax"].create(
+            [
+                {
+                    "name": f"Benchmark {type_tax_use} 15%",
+                    "type_tax_use": type_tax_use,
+                    "amount": 15.0,
+                    "tax_group_id": tax_group.id,
+                }
+                for type_tax_use in ("sale", "purchase")
+            ]
+        )
+        tax_repartition_lines = [
+            tax.invoice_repartition_line_ids.filtered(
+                lambda line: line.repartition_type == "tax"
+            )
+            for tax in taxes
+        ]
+        analytic_plan = cls.env["account.analytic.plan"].create({"name": "Benchmark"})
+        analytic_accounts = cls.env["account.analytic.account"].create(
+            [
+                {"name": f"Benchmark Analytic {i}", "plan_id": analytic_plan.id}
+                for i in range(cls.account_count)
+            ]
+        )
+        cls.env.flush_all()
+
+        aml_fields = cls.env["account.move.line"]._fields
+        params = {
+            "company_id": company.id,
+            "journal_id": journal.id,
+            "currency_id": company.currency_id.id,
+            "foreign_currency_id": foreign_currency.id,
+            "uid": cls.env.uid,
+            "today": cls.today,
+            "days": HISTORY_DAYS,
+            "move_count": cls.move_count,
+            "receivable_ids": receivable.ids,
+            "payable_ids": payable.ids,
+            "income_ids": income.ids,
+            "expense_ids": expense.ids,
+            "account_count": cls.account_count,
+            "tax_account_id": tax_account.id,
+            "partner_ids": partners.ids,
+            "partner_count": len(partners),
+            "tax_ids": taxes.ids,
+            "tax_repartition_line_ids": [line.id for line in tax_repartition_lines],
+            "tax_group_id": tax_group.id,
+            "analytic_ids": analytic_accounts.ids,
+        }
+        cr = cls.env.cr
+        cr.execute(
+            """
+            INSERT INTO account_move (name, date, state, move_type, journal_id,
+                company_id, currency_id, auto_post, create_uid, create_date,
+                write_uid, write_date)
+            SELECT 'BENCH/' || LPAD(i::text, 8, '0'),
+                %(today)s - (i %% %(days)s), 'posted', 'entry', %(journal_id)s,
+                %(company_id)s, %(currency_id)s, 'no', %(uid)s, NOW(), %(uid)s,
+                NOW()
+            FROM generate_series(1, %(move_count)s) AS i
+            """,
+            params,
+        )
+        # One move in three is a purchase, one in five in foreign currency,
+        # every other base line has an analytic distribution
+        cr.execute(
+            """
+            WITH moves AS (
+                SELECT id, name, date, row_number() OVER (ORDER BY id) AS n
+                FROM account_move
+                WHERE company_id = %(company_id)s AND name LIKE 'BENCH/%%'
+            ), amounts AS (
+                SELECT moves.*, n %% 3 = 0 AS purchase,
+                    CASE WHEN n %% 5 = 0 THEN %(foreign_currency_id)s
+                        ELSE %(currency_id)s END AS line_currency_id,
+                    CASE WHEN n %% 5 = 0 THEN 1.1 ELSE 1 END AS rate,
+                    (10 + n * 37 %% 1000)::numeric AS base,
+                    ROUND((10 + n * 37 %% 1000) * 0.15, 2) AS tax,
+                    (%(partner_ids)s::int[])[1 + n %% %(partner_count)s]
+                        AS partner_id
+                FROM moves
+            ), lines AS (
+                SELECT amounts.*, 1 AS sequence,
+                    CASE WHEN purchase
+                        THEN (%(payable_ids)s::int[])[1 + n %% 2]
+                        ELSE (%(receivable_ids)s::int[])[1 + n %% 2]
+                    END AS account_id,
+                    CASE WHEN purchase THEN -(base + tax) ELSE base + tax END
+                        AS amount,
+                    NULL::int AS tax_index,
+                    NULL::int AS tax_line_index,
+                    NULL::jsonb AS analytic_distribution
+                FROM amounts
+                UNION ALL
+                SELECT amounts.*, 2,
+                    CASE WHEN purchase
+                        THEN (%(expense_ids)s::int[])[1 + n %% %(account_count)s]
+                        ELSE (%(income_ids)s::int[])[1 + n %% %(account_count)s]
+                    END,
+                    CASE WHEN purchase THEN base ELSE -base END,
+                    CASE WHEN purchase THEN 2 ELSE 1 END,
+                    NULL,
+                    CASE WHEN n %% 2 = 0 THEN jsonb_build_object(
+                        ((%(analytic_ids)s::int[])[1 + n %% %(account_count)s])::text,
+                        100
+                    ) END
+                FROM amounts
+                UNION ALL
+                SELECT amounts.*, 3, %(tax_account_id)s,
+                    CASE WHEN purchase THEN tax ELSE -tax END,
+                    NULL,
+                    CASE WHEN purchase THEN 2 ELSE 1 END,
+                    NULL
+                FROM amounts
+            )
+            INSERT INTO account_move_line (move_id, move_name, date, parent_state,
+                journal_id, company_id, company_currency_id, currency_id,
+                account_id, partner_id, name, display_type, sequence, debit,
+                credit, balance, amount_currency, amount_residual,
+                amount_residual_currency, reconciled, date_maturity, tax_line_id,
+                tax_repartition_line_id, tax_group_id, tax_base_amount,
+                analytic_distribution, create_uid, create_date, write_uid,
+                write_date)
+            SELECT id, name, date, 'posted', %(journal_id)s, %(company_id)s,
+                %(currency_id)s, line_currency_id, account_id, partner_id,
+                name || '-' || sequence, 'product', sequence,
+                GREATEST(amount, 0), GREATEST(-amount, 0), amount,
+                amount * rate,
+                CASE WHEN sequence = 1 THEN amount ELSE 0 END,
+                CASE WHEN sequence = 1 THEN amount * rate ELSE 0 END,
+                FALSE, date + 30,
+                (%(tax_ids)s::int[])[tax_line_index],
+                (%(tax_repartition_line_ids)s::int[])[tax_line_index],
+                CASE WHEN tax_line_index IS NOT NULL THEN %(tax_group_id)s END,
+                CASE WHEN tax_line_index IS NOT NULL THEN base ELSE 0 END,
+                analytic_distribution, %(uid)s, NOW(), %(uid)s, NOW()
+            FROM lines
+            """,
+            params,
+        )
+        tax_ids_field = aml_fields["tax_ids"]
+        analytic_field = aml_fields["analytic_account_ids"]
+        cr.execute(
+            f"""
+            INSERT INTO {tax_ids_field.relation}
+                ({tax_ids_field.column1}, {tax_ids_field.column2})
+            SELECT aml.id, CASE WHEN aml.balance > 0
+                THEN (%(tax_ids)s::int[])[2] ELSE (%(tax_ids)s::int[])[1] END
+            FROM account_move_line aml
+            WHERE aml.company_id = %(company_id)s AND aml.sequence = 2
+            """,
+            params,
+        )
+        cr.execute(
+            f"""
+            INSERT INTO {analytic_field.relation}
+                ({analytic_field.column1}, {analytic_field.column2})
+            SELECT aml.id, key::int
+            FROM account_move_line aml,
+                jsonb_object_keys(aml.analytic_distribution) AS key
+            WHERE aml.company_id = %(company_id)s
+                AND aml.analytic_distribution IS NOT NULL
+            """,
+            params,
+        )
+        cr.execute("ANALYZE account_move")
+        cr.execute("ANALYZE account_move_line")
+        cls.env.invalidate_all()
+
+    def _get_report_wizards(self):
+        """Wizard of every report, over the whole ledger"""
+        year_start = self.today.replace(month=1, day=1)
+        last_year_start = year_start - relativedelta(years=1)
+        period = {"date_from": year_start, "date_to": self.today}
+        open_items = {
+            "date_at": self.today,
+            "account_ids": [(6, 0, self.partner_accounts.ids)],
+        }
+        wizards = {
+            "general_ledger": (
+                "general.ledger.report.wizard",
+                dict(period, grouped_by=False),
+            ),
+            "general_ledger:partners": (
+                "general.ledger.report.wizard",
+                dict(period, grouped_by="partners"),
+            ),
+            "trial_balance": ("trial.balance.report.wizard", period),
+            "trial_balance:partners": (
+                "trial.balance.report.wizard",
+                dict(period, show_partner_details=True),
+            ),
+            "open_items": ("open.items.report.wizard", open_items),
+            "open_items:last_year": (
+                "open.items.report.wizard",
+                dict(open_items, date_at=last_year_start - relativedelta(days=1)),
+            ),
+            "aged_partner_balance": (
+                "aged.partner.balance.report.wizard",
+                dict(open_items, show_move_line_details=True),
+            ),
+            "journal_ledger": ("journal.ledger.report.wizard", period),
+            "vat_report": (
+                "vat.report.wizard",
+                dict(period, based_on="taxgroups", tax_detail=True),
+            ),
+        }
+        return {
+            name: self.env[model].create(dict(values, company_id=self.company.id))
+            for name, (model, values) in wizards.items()
+        }
+
+    def test_reports(self):
+        """Benchmark the values and the XLSX file of every report"""
+        results = {}
+        for name, wizard in self._get_report_wizards().items():
+            values_action = wizard._print_report("qweb-html")
+            report = self.env[f"report.{values_action['report_name']}"]
+            xlsx_action = wizard._print_report("xlsx")
+            results[f"{name}:values"] = self._measure(
+                partial(report._get_report_values, wizard.ids, values_action["data"])
+            )
+            results[f"{name}:xlsx"] = self._measure(
+                partial(
+                    self.env["ir.actions.report"]._render_xlsx,
+                    xlsx_action["report_name"],
+                    wizard.ids,
+                    xlsx_action["data"],
+                )
+            )
+        self._check_baselines(results)
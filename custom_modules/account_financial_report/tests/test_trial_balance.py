@@ -5,7 +5,8 @@
 
 import re
 
-from odoo.tests import tagged
+from odoo.fields import Date
+from odoo.tests import Form, tagged
 
 from odoo.addons.account.tests.common import AccountTestInvoicingCommon
 
@@ -113,6 +114,7 @@ class TestTrialBalanceReport(AccountTestInvoicingCommon):
         income_credit,
         unaffected_debit=0,
         unaffected_credit=0,
+        post=True,
     ):
         journal = self.env["account.journal"].search(
             [("company_id", "=", self.env.user.company_id.id)], limit=1
@@ -175,7 +177,9 @@ class TestTrialBalanceReport(AccountTestInvoicingCommon):
             ],
         }
         move = self.env["account.move"].create(move_vals)
-        move.action_post()
+        if post:
+            move.action_post()
+        return move
 
     def _get_report_lines(
         self, with_partners=False, account_ids=False, show_hierarchy=False
@@ -721,3 +725,257 @@ class TestTrialBalanceReport(AccountTestInvoicingCommon):
         ]
         self.assertEqual(len(trial_balance_code_set), len(all_accounts_code_set))
         self.assertTrue(trial_balance_code_set == all_accounts_code_set)
+
+    def _build_periods(self, company):
+        """Build the snapshots of the company as the cron does, without its
+        commits"""
+        period_model = self.env["account.period.balance"]
+        period_model._create_periods()
+        periods = period_model.search(
+            [
+                ("company_id", "=", company.id),
+                ("month", "<", period_model._get_current_month()),
+            ]
+        )
+        periods.filtered(lambda p: not p.valid)._prepare_build()
+        periods.filtered("building")._build()
+        return periods
+
+    def test_06_period_balance_snapshots(self):
+        company = self.env.user.company_id
+        self._add_move("2015-03-10", 500, 0, 0, 500)
+        self._add_move("2015-11-30", 0, 200, 200, 0)
+        self._add_move("2016-01-15", 100, 0, 0, 100)
+        domain = [
+            ("company_id", "=", company.id),
+            ("account_id", "in", (self.account100 | self.account200).ids),
+            ("date", "<", "2016-01-20"),
+            ("date", ">=", "2015-03-05"),
+            ("move_id.state", "=", "posted"),
+        ]
+        fields = ["account_id", "partner_id", "balance", "amount_currency:sum"]
+        groupby = ["account_id", "partner_id"]
+
+        def read_balances():
+            rows = self.env["account.period.balance"]._read_balances(domain, groupby)
+            return {
+                (row["account_id"][0], row["partner_id"][0]): row["balance"]
+                for row in rows
+            }
+
+        def read_group_balances():
+            rows = self.env["account.move.line"].read_group(
+                domain, fields, groupby, lazy=False
+            )
+            return {
+                (row["account_id"][0], row["partner_id"][0]): row["balance"]
+                for row in rows
+            }
+
+        # Without snapshots, the balances are read from the move lines
+        self.assertEqual(read_balances(), read_group_balances())
+        periods = self._build_periods(company).filtered("posted_only")
+        self.assertIn(Date.to_date("2015-11-01"), periods.mapped("month"))
+        self.assertTrue(all(periods.mapped("valid")))
+        self.assertEqual(read_balances(), read_group_balances())
+        # A new entry in a snapshotted month is accounted for, and the month is
+        # read from the move lines until the next build
+        self._add_move("2015-11-15", 50, 0, 0, 50)
+        november = periods.filtered(lambda p: p.month == Date.to_date("2015-11-01"))
+        self.assertFalse(november.valid)
+        self.assertEqual(read_balances(), read_group_balances())
+        self.assertFalse(november.valid)
+        self._build_periods(company)
+        self.assertTrue(november.valid)
+        self.assertEqual(read_balances(), read_group_balances())
+        self.assertEqual(read_balances()[(self.account100.id, self.partner.id)], 450)
+        # Unknown filters fall back to read_group
+        self.assertIsNone(
+            self.env["account.period.balance"]._read_balances(
+                domain + [("journal_id", "in", [1])], groupby
+            )
+        )
+
+    def test_06_period_balance_snapshots_draft_form(self):
+        company = self.env.user.company_id
+        self._add_move("2015-03-10", 500, 0, 0, 500)
+        move = self._add_move("2015-11-10", 300, 0, 0, 300, post=False)
+        domain = [
+            ("company_id", "=", company.id),
+            ("account_id", "in", (self.account100 | self.account200).ids),
+            ("date", "<", "2016-01-20"),
+            ("date", ">=", "2015-03-01"),
+            ("move_id.state", "in", ["posted", "draft"]),
+        ]
+        groupby = ["account_id", "partner_id"]
+
+        def read_balances():
+            rows = self.env["account.period.balance"]._read_balances(domain, groupby)
+            return {
+                (row["account_id"][0], row["partner_id"][0]): row["balance"]
+                for row in rows
+            }
+
+        self.assertEqual(read_balances()[(self.account100.id, self.partner.id)], 800)
+        period = self._build_periods(company).filtered(
+            lambda p: p.month == Date.to_date("2015-11-01") and not p.posted_only
+        )
+        self.assertTrue(period.valid)
+        self.assertEqual(read_balances()[(self.account100.id, self.partner.id)], 800)
+        # The balance of the lines is recomputed from the debit and credit
+        # edited in the form, without writing it explicitly
+        with Form(move) as move_form:
+            with move_form.line_ids.edit(0) as line_form:
+                line_form.debit = 400
+            with move_form.line_ids.edit(1) as line_form:
+                line_form.credit = 400
+        balances = read_balances()
+        self.assertEqual(balances[(self.account100.id, self.partner.id)], 900)
+        self.assertEqual(balances[(self.account200.id, self.partner.id)], -900)
+        self.assertFalse(period.valid)
+
+    def test_07_grouped_by_analytic_account(self):
+        plan = self.env["account.analytic.plan"].create({"name": "Plan"})
+        analytic_1, analytic_2 = self.env["account.analytic.account"].create(
+            [
+                {"name": "Analytic 1", "plan_id": plan.id},
+                {"name": "Analytic 2", "plan_id": plan.id},
+            ]
+        )
+        journal = self.env["account.journal"].search(
+            [("company_id", "=", self.env.user.company_id.id)], limit=1
+        )
+        moves = self.env["account.move"].create(
+            [
+                {
+                    "journal_id": journal.id,
+                    "date": "2015-06-01",
+                    "line_ids": [
+                        (
+                            0,
+                            0,
+                            {
+                                "debit": 500,
+                                "credit": 0,
+                                "partner_id": self.partner.id,
+                                "account_id": self.account100.id,
+                                "analytic_distribution": {analytic_1.id: 100},
+                            },
+                        ),
+                        (0, 0, {"credit": 500, "account_id": self.account200.id}),
+                    ],
+                },
+                {
+                    "journal_id": journal.id,
+                    "date": "2016-06-01",
+                    "line_ids": [
+                        (
+                            0,
+                            0,
+                            {
+                                "debit": 1000,
+                                "partner_id": self.partner.id,
+                                "account_id": self.account100.id,
+                            },
+                        ),
+                        (
+                            0,
+                            0,
+                            {
+                                "credit": 1000,
+                                "account_id": self.account200.id,
+                                "analytic_distribution": {
+                                    analytic_1.id: 50,
+                                    analytic_2.id: 50,
+                                },
+                            },
+                        ),
+                    ],
+                },
+            ]
+        )
+        moves.action_post()
+        company = self.env.user.company_id
+        trial_balance = self.env["trial.balance.report.wizard"].create(
+            {
+                "date_from": self.date_start,
+                "date_to": self.date_end,
+                "target_move": "posted",
+                "hide_account_at_0": False,
+                "company_id": company.id,
+                "fy_start_date": self.fy_date_start,
+                "grouped_by": "analytic_account",
+            }
+        )
+        data = trial_balance._prepare_report_trial_balance()
+        total_amount = self.env[
+            "report.account_financial_report.trial_balance"
+        ]._get_report_values(trial_balance, data)["total_amount"]
+        # A line split over two analytic accounts is counted once per account
+        income = total_amount[self.account200.id]
+        self.assertEqual(income["credit"], 1000)
+        self.assertEqual(income["group_by_data"][analytic_1.id]["credit"], 1000)
+        self.assertEqual(income["group_by_data"][analytic_2.id]["credit"], 1000)
+        receivable = total_amount[self.account100.id]
+        self.assertEqual(receivable["initial_balance"], 500)
+        self.assertEqual(receivable["debit"], 1000)
+        self.assertEqual(receivable["group_by_data"][0]["debit"], 1000)
+        self.assertEqual(
+            receivable["group_by_data"][analytic_1.id]["initial_balance"], 500
+        )
+
+    def test_08_computed_groups_data(self):
+        report = self.env["report.account_financial_report.trial_balance"]
+        accounts = self.account001 | self.account200 | self.account201
+        accounts |= self.account300
+        accounts_data = {
+            account.id: {"id": account.id, "code": account.code}
+            for account in accounts
+        }
+        total_amount = {
+            account.id: {
+                "initial_balance": 1.0,
+                "debit": 2.0,
+                "credit": 0.0,
+                "balance": 2.0,
+                "ending_balance": 3.0,
+            }
+            for account in accounts
+        }
+        groups_data = report._get_computed_groups_data(
+            accounts_data, total_amount, False
+        )
+        self.assertEqual(groups_data[self.group2.id]["debit"], 4.0)
+        self.assertEqual(groups_data[self.group2.id]["ending_balance"], 6.0)
+        self.assertEqual(groups_data[self.group11.id]["debit"], 0.0)
+        # A new group is part of the cached prefix trie right away
+        group20 = self.env["account.group"].create(
+            {"code_prefix_start": "20", "name": "Group 20"}
+        )
+        groups_data = report._get_computed_groups_data(
+            accounts_data, total_amount, False
+        )
+        self.assertEqual(groups_data[group20.id]["debit"], 4.0)
+        self.assertEqual(groups_data[self.group2.id]["debit"], 4.0)
+
+    def test_09_account_groups_structure_cache(self):
+        report = self.env["report.account_financial_report.trial_balance"]
+        company_ids = tuple(sorted(self.env.companies.ids))
+        group = self.env["account.group"].create(
+            {"code_prefix_start": "20", "name": "Group 20"}
+        )
+        self.env["res.lang"]._activate_lang("fr_FR")
+        group.with_context(lang="fr_FR").name = "Groupe 20"
+        # The cached structure does not hold the names, read per language
+        version = report._get_account_groups_version(company_ids)
+        groups_info = report.with_context(lang="en_US")._get_account_groups_info()
+        self.assertEqual(groups_info[group.id]["name"], "Group 20")
+        groups_info = report.with_context(lang="fr_FR")._get_account_groups_info()
+        self.assertEqual(groups_info[group.id]["name"], "Groupe 20")
+        group.name = "Group twenty"
+        self.assertEqual(report._get_account_groups_version(company_ids), version)
+        # Only the fields of the structure key a new one
+        group.code_prefix_start = "21"
+        self.assertNotEqual(report._get_account_groups_version(company_ids), version)
+        groups_info = report._get_account_groups_info()
+        self.assertEqual(groups_info[group.id]["code"], "21")
@@ -0,0 +1,11 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+{
+    "name": "Benchmark Base",
+    "summary": "Shared harness of the scale benchmarks of the custom modules",
+    "version": "18.0.1.0.0",
+    "category": "Hidden/Tools",
+    "license": "LGPL-3",
+    "installable": True,
+    "depends": ["base"],
+    "data": [],
+}
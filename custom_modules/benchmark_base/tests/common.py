@@ -0,0 +1,157 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+"""
+Harness of the scale benchmarks.
+
+A benchmark is a test case mixing ``BenchmarkCase`` in, tagged out of the
+standard run. It generates its data at the requested scale, then passes the
+measures of its targets to ``_check_baselines``: the run fails when a target
+needs more queries, is clearly slower or grows the peak RSS clearly more than
+its recorded baseline, or when it has no baseline.
+
+Each benchmark reads the following environment variables, prefixed by its
+``benchmark_env_prefix``:
+    <PREFIX>_SCALE: data scale, one of the keys of ``benchmark_scales``
+    <PREFIX>_ROUNDS: calls per target, the median time is kept
+    <PREFIX>_RECORD: set to 1 to write the measures as baselines
+"""
+
+import json
+import logging
+import os
+import resource
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class BenchmarkCase:
+    """Measures of the targets of a benchmark and checks of their baselines"""
+
+    # Name of the benchmark in the logs
+    benchmark_name = None
+    # Prefix of the environment variables, e.g. 'DASHBOARD_POS_BENCH'
+    benchmark_env_prefix = None
+    # JSON file of the baselines, by scale then target
+    benchmark_baselines_path = None
+    # Parameters of each scale, and the default one
+    benchmark_scales = {}
+    benchmark_default_scale = None
+    # Whether to measure and check the peak RSS growth of the targets
+    benchmark_measure_rss = False
+
+    # Tolerances before a measure counts as a regression
+    query_slack = 2
+    latency_factor = 1.5
+    latency_slack = 0.05
+    rss_factor = 1.5
+    rss_slack_kb = 20 * 1024
+
+    @classmethod
+    def _get_benchmark_setting(cls, name, default=None):
+        return os.environ.get(f"{cls.benchmark_env_prefix}_{name}", default)
+
+    @classmethod
+    def _setup_benchmark(cls):
+        """Read the scale, the rounds and the record flag of the run"""
+        cls.scale = cls._get_benchmark_setting(
+            "SCALE", cls.benchmark_default_scale
+        ).lower()
+        if cls.scale not in cls.benchmark_scales:
+            raise ValueError(
+                f"Unknown {cls.benchmark_name} benchmark scale {cls.scale!r}, "
+                f"use one of {', '.join(cls.benchmark_scales)}"
+            )
+        cls.rounds = int(cls._get_benchmark_setting("ROUNDS", 3))
+        cls.record = cls._get_benchmark_setting("RECORD") == "1"
+        return cls.benchmark_scales[cls.scale]
+
+    def _measure(self, call):
+        """Median time and smallest query count of ``call`` over the rounds.
+
+        With ``benchmark_measure_rss``, the peak RSS of the process is added:
+        a target shows up when it raises it, by the growth of the peak during
+        its run.
+        """
+        timings = []
+        queries = []
+        rss_growth = 0
+        rss_after = 0
+        for _round in range(self.rounds):
+            self.env.invalidate_all()
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            count = self.cr.sql_log_count
+            start = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - start)
+            queries.append(self.cr.sql_log_count - count)
+            rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            rss_growth = max(rss_growth, rss_after - rss_before)
+        result = {
+            "queries": min(queries),
+            "seconds": round(sorted(timings)[len(timings) // 2], 4),
+        }
+        if self.benchmark_measure_rss:
+            result.update(peak_rss_kb=rss_after, peak_rss_growth_kb=rss_growth)
+        return result
+
+    def _get_regressions(self, results, baselines):
+        """Messages of the measures worse than their baseline, or without one"""
+        failures = []
+        for name, result in sorted(results.items()):
+            baseline = baselines.get(name)
+            if not baseline:
+                failures.append(
+                    f"{name}: no baseline, run with {self.benchmark_env_prefix}"
+                    "_RECORD=1 on the reference machine and commit "
+                    f"{os.path.basename(self.benchmark_baselines_path)}"
+                )
+                continue
+            if result["queries"] > baseline["queries"] + self.query_slack:
+                failures.append(
+                    f"{name}: {result['queries']} queries, "
+                    f"baseline {baseline['queries']}"
+                )
+            if (
+                result["seconds"]
+                > baseline["seconds"] * self.latency_factor + self.latency_slack
+            ):
+                failures.append(
+                    f"{name}: {result['seconds']:.4f}s, "
+                    f"baseline {baseline['seconds']:.4f}s"
+                )
+            if (
+                self.benchmark_measure_rss
+                and result["peak_rss_growth_kb"]
+                > baseline["peak_rss_growth_kb"] * self.rss_factor + self.rss_slack_kb
+            ):
+                failures.append(
+                    f"{name}: peak RSS +{result['peak_rss_growth_kb']} KB, "
+                    f"baseline +{baseline['peak_rss_growth_kb']} KB"
+                )
+        return failures
+
+    def _check_baselines(self, results):
+        """Record the measures, or compare them with the recorded baselines"""
+        for name, result in sorted(results.items()):
+            _logger.info(
+                "%s benchmark [%s] %s: %s",
+                self.benchmark_name,
+                self.scale,
+                name,
+                ", ".join(f"{key} {value}" for key, value in sorted(result.items())),
+            )
+        baselines = {}
+        if os.path.exists(self.benchmark_baselines_path):
+            with open(self.benchmark_baselines_path) as baselines_file:
+                baselines = json.load(baselines_file)
+        if self.record:
+            baselines.setdefault(self.scale, {}).update(results)
+            with open(self.benchmark_baselines_path, "w") as baselines_file:
+                json.dump(baselines, baselines_file, indent=2, sort_keys=True)
+                baselines_file.write("\n")
+            return
+        failures = self._get_regressions(results, baselines.get(self.scale, {}))
+        self.assertFalse(
+            failures,
+            f"{self.benchmark_name} benchmark regressions:\n" + "\n".join(failures),
+        )
@@ -0,0 +1,40 @@
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl).
+
+from odoo.tests import TransactionCase
+
+from .common import BenchmarkCase
+
+
+class TestBenchmarkCommon(BenchmarkCase, TransactionCase):
+    benchmark_name = "test"
+    benchmark_env_prefix = "TEST_BENCH"
+    benchmark_baselines_path = "benchmark_baselines.json"
+    benchmark_measure_rss = True
+
+    def _result(self, queries, seconds, rss_growth_kb):
+        return {
+            "queries": queries,
+            "seconds": seconds,
+            "peak_rss_kb": 100000,
+            "peak_rss_growth_kb": rss_growth_kb,
+        }
+
+    def test_missing_baseline_fails(self):
+        failures = self._get_regressions({"target": self._result(10, 0.1, 0)}, {})
+        self.assertEqual(len(failures), 1)
+        self.assertIn("no baseline", failures[0])
+
+    def test_regressions(self):
+        baselines = {"target": self._result(10, 1.0, 1024)}
+        # Tolerances: 2 queries, 1.5 x 1.0 + 0.05s, 1.5 x 1024 KB + 20 MB
+        within = {"target": self._result(12, 1.5, 1536 + 20 * 1024)}
+        self.assertEqual(self._get_regressions(within, baselines), [])
+        worse = {"target": self._result(13, 1.6, 1537 + 20 * 1024)}
+        failures = self._get_regressions(worse, baselines)
+        self.assertEqual(len(failures), 3)
+
+    def test_measure(self):
+        self.rounds = 3
+        result = self._measure(lambda: self.env.cr.execute("SELECT 1"))
+        self.assertEqual(result["queries"], 1)
+        self.assertIn("peak_rss_growth_kb", result)
@@ -21,3 +21,9 @@
 ################################################################################
 from . import models
 from . import controllers
+
+
+def post_init_hook(env):
+    """Build the POS daily sales rollup and customer segments from the existing history"""
+    env['pos.sales.daily']._rebuild()
+    env['res.partner']._cron_update_pos_customer_segments()
@@ -21,7 +21,7 @@
 ################################################################################
 {
     'name': "POS Dashboard",
-    'version': '18.0.1.0.2',
+    'version': '18.0.1.0.3',
     'category': 'Point of Sale',
     'summary': """Detailed dashboard view for POS""",
     'description': """Customized POS dashboard view""",
@@ -29,10 +29,11 @@
     'company': 'Cybrosys Techno Solutions',
     'maintainer': 'Cybrosys Techno Solutions',
     'website': "https://www.cybrosys.com",
-    'depends': ['hr', 'point_of_sale', 'web', 'account'],
+    'depends': ['hr', 'point_of_sale', 'web', 'account', 'benchmark_base'],
     'data': [
         'security/security.xml',
         'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
         'views/pos_order_views.xml'
     ],
     'assets': {
@@ -47,9 +48,10 @@
         ],
     },
     'external_dependencies': {
-        'python': ['pandas'],
+        'python': ['pandas', 'numpy'],
     },
     'images': ['static/description/banner.png'],
+    'post_init_hook': 'post_init_hook',
     'license': "AGPL-3",
     'installable': True,
     'application': False,
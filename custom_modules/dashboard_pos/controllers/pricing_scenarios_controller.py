@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
-from odoo import http
-from odoo.http import request
+from odoo import api, http
+from odoo.http import request, content_disposition
 import json
 import logging
 
@@ -79,8 +79,15 @@ class PricingScenariosController(http.Controller):
             "target": 25000
         }
         
+        or, to evaluate several targets at once (e.g. a target slider):
+        {
+            "month": "2024-01",
+            "targets": [5000, 10000, 25000]
+        }
+        
         Returns:
-            JSON response with custom pricing scenario data
+            JSON response with custom pricing scenario data, with one
+            scenario per target in "scenarios" when "targets" is given
         """
         try:
             # Get JSON data from request
@@ -88,6 +95,7 @@ class PricingScenariosController(http.Controller):
             
             month = data.get('month')
             target = data.get('target')
+            targets = data.get('targets')
             
             if not month:
                 return request.make_json_response({
@@ -95,16 +103,23 @@ class PricingScenariosController(http.Controller):
                     'message': 'Month parameter is required'
                 }, status=400)
             
-            if not target:
+            if not target and not targets:
                 return request.make_json_response({
                     'status': 'error',
                     'message': 'Target parameter is required'
                 }, status=400)
             
             try:
-                target = float(target)
-                if target <= 0:
-                    raise ValueError("Target must be positive")
+                if targets:
+                    if not isinstance(targets, list):
+                        raise ValueError("Targets must be a list")
+                    targets = [float(value) for value in targets]
+                    if any(value <= 0 for value in targets):
+                        raise ValueError("Targets must be positive")
+                else:
+                    target = float(target)
+                    if target <= 0:
+                        raise ValueError("Target must be positive")
             except (ValueError, TypeError):
                 return request.make_json_response({
                     'status': 'error',
@@ -135,7 +150,10 @@ class PricingScenariosController(http.Controller):
             
             # Calculate custom scenario
             pos_order_model = request.env['pos.order']
-            result = pos_order_model.calculate_custom_net_scenario(month, target)
+            if targets:
+                result = pos_order_model.calculate_custom_net_scenarios(month, targets)
+            else:
+                result = pos_order_model.calculate_custom_net_scenario(month, target)
             
             # Return appropriate status code based on result
             if result['status'] == 'insufficient':
@@ -247,29 +265,22 @@ class PricingScenariosController(http.Controller):
             from datetime import datetime, date
             from dateutil.relativedelta import relativedelta
             
-            # Execute SQL query to get distinct months with sales data
-            query = """
-                SELECT DISTINCT 
-                    TO_CHAR(DATE_TRUNC('month', date_order), 'YYYY-MM') AS value,
-                    TO_CHAR(DATE_TRUNC('month', date_order), 'Month YYYY') AS label
-                FROM pos_order 
-                WHERE date_order < DATE_TRUNC('month', CURRENT_DATE)
-                    AND state IN ('paid', 'done', 'invoiced')
-                    AND company_id = %s
-                ORDER BY value DESC
-            """
-            
-            # Execute the query
-            request.env.cr.execute(query, (request.env.company.id,))
-            results = request.env.cr.fetchall()
-            
-            # Format results as requested
+            # Read the whole history from the monthly series engine
+            daily_rollup = request.env['pos.sales.daily']
+            first_day = daily_rollup.search(
+                [('company_id', '=', request.env.company.id)], order='date asc', limit=1).date
+            last_month = date.today().replace(day=1) - relativedelta(months=1)
+
             months = []
-            for row in results:
-                months.append({
-                    'value': row[0],
-                    'label': row[1].strip()  # Remove extra spaces from Month YYYY format
-                })
+            if first_day and first_day < date.today().replace(day=1):
+                span = relativedelta(last_month, first_day.replace(day=1))
+                series = daily_rollup._get_monthly_series(span.years * 12 + span.months + 1, last_month)
+                for month in reversed(series):
+                    if month['order_count']:
+                        months.append({
+                            'value': month['month'].strftime('%Y-%m'),
+                            'label': month['month'].strftime('%B %Y')
+                        })
             
             return request.make_json_response({
                 'months': months
@@ -295,35 +306,18 @@ class PricingScenariosController(http.Controller):
             from datetime import datetime, date
             from dateutil.relativedelta import relativedelta
             
-            pos_order_model = request.env['pos.order']
             available_months = []
             
-            # Check last 12 months for available data
+            # Check last 12 months for available data, skipping the current month
             current_date = date.today()
-            for i in range(1, 13):  # Skip current month, check last 12 months
-                check_date = current_date.replace(day=1) - relativedelta(months=i)
-                month_str = check_date.strftime('%Y-%m')
-                
-                # Quick check if there's any sales data for this month
-                month_start = check_date
-                if check_date.month == 12:
-                    month_end = date(check_date.year + 1, 1, 1)
-                else:
-                    month_end = date(check_date.year, check_date.month + 1, 1)
-                
-                # Check if there are any POS orders in this month
-                orders_count = request.env['pos.order'].search_count([
-                    ('date_order', '>=', month_start),
-                    ('date_order', '<', month_end),
-                    ('state', 'in', ['paid', 'done', 'invoiced']),
-                    ('company_id', '=', request.env.company.id)
-                ])
-                
-                if orders_count > 0:
+            last_month = current_date.replace(day=1) - relativedelta(months=1)
+            series = request.env['pos.sales.daily']._get_monthly_series(12, last_month)
+            for month in reversed(series):
+                if month['order_count'] > 0:
                     available_months.append({
-                        'month': month_str,
-                        'display': check_date.strftime('%B %Y'),
-                        'orders_count': orders_count
+                        'month': month['month'].strftime('%Y-%m'),
+                        'display': month['month'].strftime('%B %Y'),
+                        'orders_count': month['order_count']
                     })
             
             return request.make_json_response({
@@ -338,6 +332,96 @@ class PricingScenariosController(http.Controller):
                 'message': f'Internal server error: {str(e)}'
             }, status=500)
 
+    @http.route('/api/pricing-scenarios/export', type='http', auth='user', methods=['GET'], csrf=False)
+    def export_monthly_sales(self, month_start=None, month_end=None, format='csv', **kwargs):
+        """
+        Download the monthly sales data as a streamed CSV or Excel file.
+        
+        Parameters:
+            month_start: Start date in YYYY-MM-DD format (inclusive)
+            month_end: End date in YYYY-MM-DD format (exclusive)
+            format: 'csv' or 'excel'
+            
+        Returns:
+            Chunked CSV response, or an Excel file written in constant memory mode
+        """
+        try:
+            from datetime import datetime
+            
+            if not month_start or not month_end:
+                return request.make_json_response({
+                    'status': 'error',
+                    'message': 'Both month_start and month_end parameters are required'
+                }, status=400)
+            
+            try:
+                start_dt = datetime.strptime(month_start, '%Y-%m-%d').date()
+                end_dt = datetime.strptime(month_end, '%Y-%m-%d').date()
+            except ValueError:
+                return request.make_json_response({
+                    'status': 'error',
+                    'message': 'Invalid date format. Use YYYY-MM-DD format'
+                }, status=400)
+            
+            if format not in ('csv', 'excel'):
+                return request.make_json_response({
+                    'status': 'error',
+                    'message': f'Unsupported format: {format}'
+                }, status=400)
+            
+            filename = 'monthly_sales_%s_%s' % (month_start, month_end)
+            if format == 'excel':
+                return self._export_monthly_sales_excel(start_dt, end_dt, filename + '.xlsx')
+            return self._export_monthly_sales_csv(start_dt, end_dt, filename + '.csv')
+            
+        except Exception as e:
+            _logger.error(f"Error exporting monthly sales data: {str(e)}")
+            return request.make_json_response({
+                'status': 'error',
+                'message': f'Internal server error: {str(e)}'
+            }, status=500)
+
+    def _export_monthly_sales_csv(self, start_dt, end_dt, filename):
+        """Chunked CSV response, rows are fetched while the body is sent."""
+        registry = request.env.registry
+        uid = request.env.uid
+        context = dict(request.env.context)
+        company_id = request.env.company.id
+        
+        def generate():
+            # The request cursor is closed once the response is returned,
+            # the body is produced on a cursor of its own
+            with registry.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                pos_order = env['pos.order'].with_company(company_id)
+                yield from pos_order._stream_monthly_sales_csv(start_dt, end_dt)
+        
+        return request.make_response(generate(), headers=[
+            ('Content-Type', 'text/csv; charset=utf-8'),
+            ('Content-Disposition', content_disposition(filename)),
+        ])
+
+    def _export_monthly_sales_excel(self, start_dt, end_dt, filename):
+        """Excel response, written to a temporary file and sent in chunks."""
+        import tempfile
+        from werkzeug.wsgi import wrap_file
+        
+        tmp = tempfile.TemporaryFile()
+        try:
+            request.env['pos.order']._write_monthly_sales_excel(start_dt, end_dt, tmp)
+        except Exception:
+            tmp.close()
+            raise
+        size = tmp.tell()
+        tmp.seek(0)
+        response = request.make_response(wrap_file(request.httprequest.environ, tmp), headers=[
+            ('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+            ('Content-Disposition', content_disposition(filename)),
+            ('Content-Length', str(size)),
+        ])
+        response.direct_passthrough = True
+        return response
+
     @http.route('/api/pricing-scenarios/apply', type='json', auth='user', methods=['POST'], csrf=False)
     def apply_pricing_scenarios(self, **kwargs):
         """
@@ -354,7 +438,8 @@ class PricingScenariosController(http.Controller):
         }
         """
         try:
-            data = request.jsonrequest
+            # JSON-RPC params are passed as keyword arguments
+            data = kwargs
             
             # Validate required fields
             required_fields = ['month', 'scenario', 'mode']
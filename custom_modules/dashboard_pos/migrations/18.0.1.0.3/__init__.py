@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Migration package for dashboard_pos module
+"""
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+Post-migration script to backfill the POS daily sales rollup and customer segments
+"""
+
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Build the rollup rows and customer segments for the existing order history"""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['pos.sales.daily']._rebuild()
+    _logger.info("POS daily sales rollup backfill completed")
+    env['res.partner']._cron_update_pos_customer_segments()
+    _logger.info("POS customer segments backfill completed")
@@ -21,3 +21,5 @@
 ################################################################################
 from . import pos_order
 from . import pricing_price_list
+from . import pos_sales_daily
+from . import pos_product_sales_month
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+DASHBOARD_CACHE_TTL = 300
+DASHBOARD_CACHE_SIZE = 512
+
+
+class DashboardCache(object):
+    """Process-wide LRU cache whose entries also expire after ``ttl`` seconds"""
+
+    def __init__(self, maxsize=DASHBOARD_CACHE_SIZE, ttl=DASHBOARD_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return ``(True, value)`` for a live entry, ``(False, None)`` otherwise"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+dashboard_cache = DashboardCache()
+
+
+def dashboard_cached(method):
+    """Cache the result of a dashboard RPC method.
+
+    Results are shared between users and keyed on the database, the company,
+    the method and its arguments, the local day and the POS data version of
+    the company (see ``pos.sales.daily._get_data_version``). Paying,
+    refunding or cancelling an order, or posting a vendor bill changes
+    the version, so stale entries are never read back; the TTL bounds the
+    staleness of changes made outside those hooks.
+
+    Cached values are shared: callers must not mutate them.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.env.context.get('dashboard_no_cache'):
+            return method(self, *args, **kwargs)
+        daily_rollup = self.env['pos.sales.daily']
+        company = self.env.company
+        try:
+            key = (
+                self.env.cr.dbname,
+                company.id,
+                self._name,
+                method.__name__,
+                args,
+                tuple(sorted(kwargs.items())),
+                self.env.user.tz,
+                self.env.lang,
+                daily_rollup._get_local_today(company),
+                daily_rollup._get_data_version(company),
+            )
+            hash(key)
+        except TypeError:
+            # Unhashable arguments (lists, dicts), do not cache
+            return method(self, *args, **kwargs)
+        found, value = dashboard_cache.get(key)
+        if found:
+            return value
+        value = method(self, *args, **kwargs)
+        dashboard_cache.set(key, value)
+        return value
+    return wrapper
@@ -19,55 +19,105 @@
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 ################################################################################
-import pytz
 import calendar
+import numpy as np
 from dateutil.relativedelta import relativedelta
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from odoo.tools.sql import create_index
+from .dashboard_cache import dashboard_cached
+from .pricing_solver import PricingScenarioSolver
+from .pos_sales_daily import POS_DONE_STATES
 import logging
 
 _logger = logging.getLogger(__name__)
-from datetime import timedelta, datetime, date, time
+from datetime import timedelta, datetime, date
+
+# Default UAE VAT rate, for products without a percent sale tax
+DEFAULT_VAT_RATE = 0.05
+
+# Local buckets of _get_sales_series, date_order is stored in naive UTC
+SALES_SERIES_BUCKETS = {
+    'hour': "EXTRACT(hour FROM date_order AT TIME ZONE 'UTC' AT TIME ZONE %(tz)s)::int",
+    'day': "(date_order AT TIME ZONE 'UTC' AT TIME ZONE %(tz)s)::date",
+    'month': "date_trunc('month', date_order AT TIME ZONE 'UTC' AT TIME ZONE %(tz)s)::date",
+}
+
+MONTH_LABELS = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN',
+                'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+
+# Columns of the monthly sales exports
+MONTHLY_SALES_EXPORT_HEADERS = [
+    'Product Name', 'SKU', 'Category', 'Total Quantity', 'Sale Quantity', 'Return Quantity',
+    'Order Count', 'Days Sold', 'Avg Daily Sales', 'Avg Price', 'Min Price', 'Max Price',
+    'Price StdDev', 'Price Consistency', 'Total Revenue', 'Avg Cost', 'Total Cost',
+    'Standard Cost', 'List Price', 'Margin Amount', 'Margin %', 'Current Stock',
+    'Turnover Ratio', 'POS Available', 'Sale OK', 'Purchase OK'
+]
+
+# Products fetched per round trip by the streaming exports
+EXPORT_CHUNK_SIZE = 1000
 
 
 class PosOrder(models.Model):
     """ Inherited class of pos dashboard to add features of dashboard"""
     _inherit = 'pos.order'
 
+    def init(self):
+        super().init()
+        # Range scans of the dashboard charts and rollups, see _get_sales_series
+        create_index(self._cr, 'pos_order_company_id_date_order_index',
+                     self._table, ['company_id', 'date_order'])
+        create_index(self._cr, 'pos_order_company_id_state_date_order_index',
+                     self._table, ['company_id', 'state', 'date_order'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        orders = super().create(vals_list)
+        self.env['res.partner']._mark_pos_segment_dirty(orders.partner_id)
+        return orders
+
+    def write(self, vals):
+        if 'partner_id' in vals:
+            self.env['res.partner']._mark_pos_segment_dirty(self.partner_id)
+        res = super().write(vals)
+        if 'partner_id' in vals:
+            self.env['res.partner']._mark_pos_segment_dirty(self.partner_id)
+        return res
+
+    def action_pos_order_paid(self):
+        unpaid = self.filtered(lambda order: order.state not in POS_DONE_STATES)
+        res = super().action_pos_order_paid()
+        paid = unpaid.filtered(lambda order: order.state in POS_DONE_STATES)
+        self.env['pos.sales.daily'].sudo()._add_orders(paid)
+        self.env['pos.product.sales.month'].sudo()._invalidate_orders(paid)
+        return res
+
+    def action_pos_order_cancel(self):
+        paid = self.filtered(lambda order: order.state in POS_DONE_STATES)
+        res = super().action_pos_order_cancel()
+        cancelled = paid.filtered(lambda order: order.state not in POS_DONE_STATES)
+        self.env['pos.sales.daily'].sudo()._add_orders(cancelled, sign=-1)
+        self.env['pos.product.sales.month'].sudo()._invalidate_orders(cancelled)
+        return res
+
     @api.model
     def get_target(self, monthly_target_input):
-        company_id = self.env.company.id
-        print('monthly_target_inputmonthly_target_input', monthly_target_input)
-        daily_actual = 0
-        weekly_actual = 0
-        monthly_actual = 0
-        today_start = fields.Datetime.to_datetime(fields.Date.today())
-        today_end = today_start + timedelta(hours=24)
-        pos_order_sale_daily = self.env['pos.order'].search(
-            [('date_order', '>=', today_start), ('date_order', '<', today_end)])
-        for ord in pos_order_sale_daily:
-            daily_actual += ord.amount_total
-        today = datetime.today().date()
+        daily_rollup = self.env['pos.sales.daily']
+        today = daily_rollup._get_local_today()
+        daily_actual = daily_rollup._get_totals(today, today)['net_amount']
         year = today.year
         month = today.month
         days_in_month = calendar.monthrange(year, month)[1]
         daily_target = round(int(monthly_target_input) / days_in_month, 2)
         daily_percentage = round((daily_actual / daily_target) * 100, 2)
-        date_before_6 = today_start - timedelta(days=6)
-        pos_order_sale_weekly = self.env['pos.order'].search(
-            [('date_order', '>=', date_before_6), ('date_order', '<', today_end)])
-        for ord in pos_order_sale_weekly:
-            weekly_actual += ord.amount_total
+        weekly_actual = daily_rollup._get_totals(today - timedelta(days=6), today)['net_amount']
         weekly_target = daily_target * 7
         weekly_percentage = round((weekly_actual / weekly_target) * 100, 2)
-        first_day_of_month = today_start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        pos_order_sale_monthly = self.env['pos.order'].search(
-            [('date_order', '>=', first_day_of_month), ('date_order', '<', today_end)])
-        for ord in pos_order_sale_monthly:
-            monthly_actual += ord.amount_total
+        monthly_actual = daily_rollup._get_totals(today.replace(day=1), today)['net_amount']
         monthly_target = int(monthly_target_input)
         monthly_percentage = round((monthly_actual / monthly_target) * 100, 2)
         return {
-            'daily_actual': daily_actual,
+            'daily_actual': round(daily_actual, 2),
             'daily_target': daily_target,
             'daily_percentage': daily_percentage,
             'weekly_actual': round(weekly_actual,2),
@@ -79,6 +129,7 @@ class PosOrder(models.Model):
         }
 
     @api.model
+    @dashboard_cached
     def get_all_data(self, from_date_cus, to_date_cus):
         """
         Updated method that uses the comprehensive data source.
@@ -174,105 +225,134 @@ class PosOrder(models.Model):
 
     @api.model
     def get_sale_vs_cost(self, option_pos_sales_cost):
-        company_id = self.env.company.id
-        default_date = datetime.today().date()
-        sale_amount = 0
-        cost_amount = 0
-        profit = 0
+        daily_rollup = self.env['pos.sales.daily']
+        today = daily_rollup._get_local_today()
         if option_pos_sales_cost == 'pos_today_sales_cost':
-            today_start = fields.Datetime.to_datetime(fields.Date.today())
-            today_end = today_start + timedelta(hours=24)
-            pos_order_sale = self.env['pos.order'].search(
-                [('date_order', '>=', today_start), ('date_order', '<', today_end)])
-            for sale in pos_order_sale:
-                sale_amount += sale.amount_total
-            pos_order_cost = self.env['account.move'].search(
-                [('state', '=', 'posted'), ('move_type', '=', 'in_invoice'), ('invoice_date', '=', default_date)])
-            for cost in pos_order_cost:
-                cost_amount += cost.amount_total
-            profit = sale_amount - cost_amount
-        if option_pos_sales_cost == 'pos_week_sales_cost':
-            today_start = fields.Datetime.to_datetime(fields.Date.today())
-            today_end = today_start + timedelta(hours=24)
-            date_before_6 = today_start - timedelta(days=6)
-            date_before_6_date = default_date - timedelta(days=6)
-            pos_order_sale = self.env['pos.order'].search(
-                [('date_order', '>=', date_before_6), ('date_order', '<', today_end)])
-            for sale in pos_order_sale:
-                sale_amount += sale.amount_total
-            pos_order_cost = self.env['account.move'].search(
-                [('state', '=', 'posted'), ('move_type', '=', 'in_invoice'),
-                 ('invoice_date', '>=', date_before_6_date)])
-            for cost in pos_order_cost:
-                cost_amount += cost.amount_total
-            profit = sale_amount - cost_amount
-        if option_pos_sales_cost == 'pos_month_sales_cost':
-            today_start = fields.Datetime.to_datetime(fields.Date.today())
-            today_end = today_start + timedelta(hours=24)
-            first_day_of_month = today_start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            first_day_of_month_date = default_date.replace(day=1)
-            pos_order_sale = self.env['pos.order'].search(
-                [('date_order', '>=', first_day_of_month), ('date_order', '<', today_end)])
-            for sale in pos_order_sale:
-                sale_amount += sale.amount_total
-            pos_order_cost = self.env['account.move'].search(
-                [('state', '=', 'posted'), ('move_type', '=', 'in_invoice'),
-                 ('invoice_date', '>=', first_day_of_month_date)])
-            for cost in pos_order_cost:
-                cost_amount += cost.amount_total
+            date_from = today
+        elif option_pos_sales_cost == 'pos_week_sales_cost':
+            date_from = today - timedelta(days=6)
+        elif option_pos_sales_cost == 'pos_month_sales_cost':
+            [month] = daily_rollup._get_monthly_series(1, today)
+            sale_amount = month['sale']
+            cost_amount = month['cost']
             profit = sale_amount - cost_amount
+            return [round(sale_amount, 2), round(cost_amount, 2), round(profit, 2)]
+        else:
+            return [0, 0, 0]
+        totals = daily_rollup._get_totals(date_from, today)
+        sale_amount = totals['net_amount']
+        cost_amount = totals['vendor_bill_cost']
+        profit = sale_amount - cost_amount
         sale_vs_cost = [round(sale_amount, 2), round(cost_amount, 2), round(profit, 2)]
         return sale_vs_cost
 
     @api.model
+    @dashboard_cached
     def get_department(self, option):
         """ Function to get the order details of company wise"""
-        docs = []
-        company_id = self.env.company.id
-        default_date = datetime.today().date()
-        date_before_6 = default_date - timedelta(days=6)
+        company = self.env.company
+        daily_rollup = self.env['pos.sales.daily']
+        tz = daily_rollup._get_company_tz(company)
+        today = daily_rollup._get_local_today(company)
         if option == 'pos_hourly_sales':
-
-            user_tz = self.env.user.tz if self.env.user.tz else pytz.UTC
-            query = '''select  EXTRACT(hour FROM date_order at time zone 'utc' at time zone '{}') 
-                       as date_month,sum(amount_total) from pos_order where  
-                       EXTRACT(month FROM date_order::date) = EXTRACT(month FROM CURRENT_DATE) 
-                       AND pos_order.company_id = ''' + str(
-                company_id) + ''' group by date_month '''
-            query = query.format(user_tz)
+            # Hours of the day over the current month
+            month_start = today.replace(day=1)
+            utc_start, utc_end = daily_rollup._get_utc_bounds(
+                company, month_start, month_start + relativedelta(months=1))
+            docs = self._get_sales_series('hour', utc_start, utc_end, tz.zone, company)
             label = 'HOURS'
         elif option == 'pos_weekly_sales':
-            query = '''select  date_order::date as date_month,sum(amount_total) from pos_order where 
-             EXTRACT(month FROM date_order::date) = EXTRACT(month FROM CURRENT_DATE) 
-            AND DATE(pos_order.date_order) >= ''' + "'" + date_before_6.strftime('%Y-%m-%d') + "'" + '''
-            AND DATE(pos_order.date_order) <= ''' + "'" + default_date.strftime('%Y-%m-%d') + "'" + '''
-             AND pos_order.company_id = ''' + str(
-                company_id) + '''  group by date_month '''
+            utc_start, utc_end = daily_rollup._get_utc_bounds(
+                company, today - timedelta(days=6), today + timedelta(days=1))
+            docs = self._get_sales_series('day', utc_start, utc_end, tz.zone, company)
             label = 'DAYS'
-            self._cr.execute(query)
-            docs = self._cr.dictfetchall()
         else:
-            query = '''select TO_CHAR(date_order,'MON')date_month,sum(amount_total) from pos_order where
-             EXTRACT(year FROM date_order::date) = EXTRACT(year FROM CURRENT_DATE) AND pos_order.company_id = ''' + str(
-                company_id) + ''' group by date_month'''
+            year_start = today.replace(month=1, day=1)
+            utc_start, utc_end = daily_rollup._get_utc_bounds(
+                company, year_start, year_start + relativedelta(years=1))
+            docs = [(MONTH_LABELS[bucket.month - 1], amount)
+                    for bucket, amount in self._get_sales_series('month', utc_start, utc_end, tz.zone, company)]
             label = 'MONTHS'
-            self._cr.execute(query)
-            docs = self._cr.dictfetchall()
-            month_order = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN',
-                           'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
-            docs = sorted(docs, key=lambda x: month_order.index(x['date_month'].upper()))
-        order = []
-        for record in docs:
-            order.append(record.get('sum'))
-        today = []
-        for record in docs:
-            today.append(record.get('date_month'))
+        order = [amount for bucket, amount in docs]
+        today = [bucket for bucket, amount in docs]
         final = [order, today, label]
         return final
 
+    @api.model
+    def _get_sales_series(self, granularity, utc_start, utc_end, tz, company=None):
+        """
+        Paid order totals of a company per local hour of the day, day or month.
+        
+        The range is filtered on the raw ``date_order`` column so that the
+        ``(company_id, state, date_order)`` index is used; only the buckets
+        are computed in the local timezone.
+        
+        Args:
+            granularity (str): 'hour' (hour of the day), 'day' or 'month'
+            utc_start (datetime): Naive UTC start of the range (inclusive)
+            utc_end (datetime): Naive UTC end of the range (exclusive)
+            tz (str): Timezone in which the buckets are cut
+            company (res.company): Defaults to the current company
+            
+        Returns:
+            list: (bucket, amount) tuples ordered by bucket, where bucket is
+            an hour number, a local date or the local first day of a month
+        """
+        company = company or self.env.company
+        bucket = SALES_SERIES_BUCKETS[granularity]
+        self.flush_model(['company_id', 'state', 'date_order', 'amount_total'])
+        self._cr.execute('''
+            SELECT {bucket} AS bucket, SUM(amount_total)::float AS amount
+            FROM pos_order
+            WHERE company_id = %(company_id)s
+                AND state IN %(states)s
+                AND date_order >= %(start)s
+                AND date_order < %(end)s
+            GROUP BY 1
+            ORDER BY 1
+        '''.format(bucket=bucket), {
+            'company_id': company.id,
+            'states': POS_DONE_STATES,
+            'start': utc_start,
+            'end': utc_end,
+            'tz': tz,
+        })
+        return self._cr.fetchall()
+
     @api.model
     def get_details(self):
         """ Function to get the payment details"""
+        details = self._get_details_data()
+        sessions = self.env['pos.config'].search([])
+        sessions_list = []
+        dict = {
+            'opened': 'Opened',
+            'opening_control': "Opening Control"
+        }
+        for session in sessions:
+            st = dict.get(session.pos_session_state)
+            if st == None:
+                sessions_list.append({
+                    'session': session.name,
+                    'status': 'Closed'
+                })
+            else:
+                sessions_list.append({
+                    'session': session.name,
+                    'status': dict.get(session.pos_session_state)
+                })
+        return {
+            'payment_details': details['payment_details'],
+            'salesperson': details['salesperson'],
+            'selling_product': sessions_list,
+        }
+
+    @api.model
+    @dashboard_cached
+    def _get_details_data(self):
+        """ Payment and salesperson totals of get_details, the session
+        states are read live as opening a session does not change the
+        cache version"""
         company_id = self.env.company.id
         cr = self._cr
         cr.execute(
@@ -297,31 +377,6 @@ class PosOrder(models.Model):
                 rec[1] = "%s %s" % (company.currency_id.symbol, sym_id)
             rec = tuple(rec)
             total_sales.append(rec)
-        cr.execute(
-            '''select DISTINCT(product_template.name) as product_name,sum(qty) as total_quantity from 
-       pos_order_line inner join product_product on product_product.id=pos_order_line.product_id inner join 
-       product_template on product_product.product_tmpl_id = product_template.id  where pos_order_line.company_id =''' + str(
-                company_id) + ''' group by product_template.id ORDER 
-       BY total_quantity DESC Limit 10 ''')
-        selling_product = cr.fetchall()
-        sessions = self.env['pos.config'].search([])
-        sessions_list = []
-        dict = {
-            'opened': 'Opened',
-            'opening_control': "Opening Control"
-        }
-        for session in sessions:
-            st = dict.get(session.pos_session_state)
-            if st == None:
-                sessions_list.append({
-                    'session': session.name,
-                    'status': 'Closed'
-                })
-            else:
-                sessions_list.append({
-                    'session': session.name,
-                    'status': dict.get(session.pos_session_state)
-                })
         payments = []
         for rec in payment_details:
             rec = list(rec)
@@ -336,65 +391,28 @@ class PosOrder(models.Model):
         return {
             'payment_details': payments,
             'salesperson': total_sales,
-            'selling_product': sessions_list,
         }
 
     @api.model
     def get_refund_details(self):
         """ Function to get the Refund details"""
-        default_date = datetime.today().date()
-        pos_order = self.env['pos.order'].search([('state', 'in', ['paid', 'done', 'invoiced'])])
-        dubai_tz = pytz.timezone('Asia/Dubai')
-        utc_tz = pytz.utc
-
-        # Get today's date in Dubai
-        today_dubai = datetime.now(dubai_tz).date()
-
-        # Create start and end datetime in Dubai TZ
-        start_dt_dubai = dubai_tz.localize(datetime.combine(today_dubai, time.min))
-        end_dt_dubai = dubai_tz.localize(datetime.combine(today_dubai, time.max))
-
-        # Convert both to UTC
-        start_datetime = start_dt_dubai.astimezone(utc_tz)
-        end_datetime = end_dt_dubai.astimezone(utc_tz)
-
-        start_datetime = start_datetime.replace(tzinfo=None)
-        end_datetime = end_datetime.replace(tzinfo=None)
-        total = 0
-        today_refund_total = 0
-        total_order_count = 0
-        total_refund_count = 0
-        new_customer_count = 0
-        retained_customer_count = 0
-        inactive_customer_count = 0
-        today_sale = 0
-        today_sale_amount = 0
-        a = 0
-        for rec in pos_order:
-            if rec.amount_total < 0.0 and rec.date_order.date() == default_date:
-                today_refund_total = today_refund_total + 1
-            total_sales = rec.amount_total
-            total = total + total_sales
-            total_order_count = total_order_count + 1
-            # if rec.date_order.date() == default_date:
-            if start_datetime <= rec.date_order <= end_datetime:
-                total_sales_today = rec.amount_total
-                today_sale_amount = today_sale_amount + total_sales_today
-            if start_datetime <= rec.date_order <= end_datetime:
-                today_sale = today_sale + 1
-            if rec.amount_total < 0.0:
-                total_refund_count = total_refund_count + 1
-
-        new_customers = self.env['res.partner'].sudo().search([('company_id', '=', self.env.company.id)])
-        for customer in new_customers:
-            customer._compute_is_new_customer()
-        for cus in new_customers:
-            if cus.is_new_customer == 1:
-                new_customer_count = new_customer_count + 1
-            if cus.is_new_customer > 1:
-                retained_customer_count = retained_customer_count + 1
-            if cus.inactive_customer:
-                inactive_customer_count = inactive_customer_count + 1
+        daily_rollup = self.env['pos.sales.daily']
+        default_date = daily_rollup._get_local_today()
+        all_time = daily_rollup._get_totals()
+        today_totals = daily_rollup._get_totals(default_date, default_date)
+        total = all_time['net_amount']
+        total_order_count = all_time['order_count']
+        total_refund_count = all_time['refund_count']
+        today_sale_amount = today_totals['net_amount']
+        today_sale = today_totals['order_count']
+        today_refund_total = today_totals['refund_count']
+
+        # Segments are maintained by res.partner._update_pos_customer_segments
+        partner_model = self.env['res.partner'].sudo()
+        company_domain = [('company_id', '=', self.env.company.id)]
+        new_customer_count = partner_model.search_count(company_domain + [('is_new_customer', '=', 1)])
+        retained_customer_count = partner_model.search_count(company_domain + [('is_new_customer', '>', 1)])
+        inactive_customer_count = partner_model.search_count(company_domain + [('inactive_customer', '=', True)])
 
         magnitude = 0
         magnitude_tdy = 0
@@ -505,83 +523,19 @@ class PosOrder(models.Model):
             pdt_id = self.env['product.product'].browse(t.get('product'))
             cost = pdt_id.standard_price
             t['cost'] = cost
-        print('top_selling_product_postop_selling_product_pos', top_selling_product_pos)
-        query = """
-                                    SELECT pos_payment_method.name, SUM(amount) 
-                                    FROM pos_payment 
-                                    INNER JOIN pos_payment_method ON pos_payment_method.id = pos_payment.payment_method_id 
-                                    WHERE DATE(pos_payment.payment_date) >= %s 
-                                    AND DATE(pos_payment.payment_date) <= %s 
-                                    GROUP BY pos_payment_method.name 
-                                    ORDER BY SUM(amount) DESC;
-                                """
-        self._cr.execute(query, (from_date_cus, to_date_cus,))
-        payment_details = self._cr.fetchall()
-        print('payment_detailspayment_details', payment_details)
-        def get_monthly_data(start_date, end_date):
-            # Initialize values
-            sale_history = 0
-            cost_history = 0
-            commission_history = 0
-            gross_profit_history = 0
-            expense_history = 0
-            net_income_history = 0
-
-            # Fetch sale history
-            sale_history_order = self.env['pos.order'].search(
-                [('date_order', '>=', start_date), ('date_order', '<', end_date)])
-            for rec in sale_history_order:
-                sale_history += rec.amount_total
-            sale_history = round(sale_history, 2)
-
-            # Fetch cost history
-            cost_history_order = self.env['account.move'].search(
-                [('state', '=', 'posted'), ('move_type', '=', 'in_invoice'),
-                 ('invoice_date', '>=', start_date), ('invoice_date', '<=', end_date)])
-            for cost in cost_history_order:
-                cost_history += cost.amount_total
-
-            gross_profit_history = sale_history - cost_history
-
-            # Fetch expense history
-            expense_history_order = self.env['account.move.line'].search(
-                [('account_id.account_type', '=', 'expense'),
-                 ('date', '>=', start_date), ('date', '<=', end_date)])
-
-            for exp in expense_history_order:
-                expense_history += exp.debit
-            print('expense_historyexpense_history', expense_history)
-
-            net_income_history = sale_history - expense_history
-
-            # Return the dictionary
-            return {
-                "sale": round(sale_history, 2),
-                "cost": round(cost_history, 2),
-                "commission": round(commission_history, 2),
-                "gross_profit": round(gross_profit_history, 2),
-                "expense": round(expense_history, 2),
-                "net_income": round(net_income_history, 2)
-            }
-
-        def get_month_name(offset_months=0):
-            date_obj = datetime.today() - relativedelta(months=offset_months)
-            return  date_obj.strftime("%B %Y")
-
-        # Generate data for the last 12 months
+        payment_details = daily_rollup._get_payment_totals(from_date_cus, to_date_cus)
+        # Generate data for the last 12 months, most recent first
         history_data = []
-        for i in range(12):
-            month_start = fields.Date.today().replace(day=1) - relativedelta(months=i)
-            month_end = fields.Date.today().replace(day=1) - relativedelta(months=i - 1,
-                                                                           days=1)
-
-            monthly_data = get_monthly_data(month_start, month_end)
-
+        for month in reversed(daily_rollup._get_monthly_series(12, default_date)):
             history_data.append({
-                "name": get_month_name(i),
-                **monthly_data
+                "name": month['month'].strftime("%B %Y"),
+                "sale": round(month['sale'], 2),
+                "cost": round(month['cost'], 2),
+                "commission": 0.0,
+                "gross_profit": round(month['gross_profit'], 2),
+                "expense": round(month['expense'], 2),
+                "net_income": round(month['net_income'], 2)
             })
-        print('history_datahistory_datahistory_datahistory_data', history_data)
         return {
             'total_sale': val,
             'today_sale_amount': val_tdy,
@@ -603,6 +557,7 @@ class PosOrder(models.Model):
         }
 
     @api.model
+    @dashboard_cached
     def get_the_top_customer(self, ):
         """ To get the top Customer details"""
         company_id = self.env.company.id
@@ -623,6 +578,7 @@ class PosOrder(models.Model):
         return final
 
     @api.model
+    @dashboard_cached
     def get_the_top_products(self):
         """ Function to get the top products"""
         company_id = self.env.company.id
@@ -643,6 +599,7 @@ class PosOrder(models.Model):
         return final
 
     @api.model
+    @dashboard_cached
     def get_the_top_categories(self):
         """ Function to get the top Product categories"""
         company_id = self.env.company.id
@@ -733,10 +690,12 @@ class PosOrder(models.Model):
         pricing_data = []
         for product in complete_data['products']:
             pricing_data.append({
+                'template_id': product['template_id'],
                 'product_name': product['product_name'],
                 'qty': product['total_quantity'],
                 'price': product['avg_price'],
-                'cost': product['avg_cost']
+                'cost': product['avg_cost'],
+                'vat_rate': product['vat_rate']
             })
         
         # Apply VAT conversion if needed
@@ -744,27 +703,21 @@ class PosOrder(models.Model):
 
     def _calculate_totals(self, product_data, month_start, month_end):
         """Calculate R, G, E, N totals"""
-        R = sum(item['qty'] * item['price'] for item in product_data)
-        G = sum(item['qty'] * (item['price'] - item['cost']) for item in product_data)
+        solver = PricingScenarioSolver(product_data)
+        R = solver.R
+        G = float((solver.qty * (solver.price - solver.cost)).sum())
         
         # Get monthly expenses (OPEX - exclude COGS & VAT)
         E = self._get_monthly_expenses(month_start, month_end)
         
         N = G - E
         
-        # Calculate minimum cost-floor uplift
-        x_min = 0
-        for item in product_data:
-            if item['price'] > 0:
-                cost_floor = (item['cost'] / item['price']) - 1
-                x_min = max(x_min, cost_floor)
-        
         return {
             'R': round(R, 2),
             'G': round(G, 2),
             'E': round(E, 2),
             'N': round(N, 2),
-            'x_min': round(x_min, 4)
+            'x_min': round(solver.x_min, 4)
         }
 
     def _get_monthly_expenses(self, month_start, month_end):
@@ -826,13 +779,33 @@ class PosOrder(models.Model):
         return result[0] > 0 if result else False
 
     def _convert_to_net_prices(self, raw_data):
-        """Convert gross prices to net prices using VAT rates"""
-        # Default UAE VAT rate
-        default_vat_rate = 0.05
+        """Convert gross prices to net prices using VAT rates.
+
+        Items carrying a ``vat_rate`` (see get_complete_monthly_sales_data)
+        are converted as is, the others are resolved in bulk by
+        ``template_id``, or by product name for legacy callers.
+        """
+        missing = [item for item in raw_data if item.get('vat_rate') is None]
+        if missing:
+            by_name = [item['product_name'] for item in missing if not item.get('template_id')]
+            template_by_name = {}
+            if by_name:
+                templates = self.env['product.template'].search([
+                    ('name', 'in', by_name),
+                    ('available_in_pos', '=', True)
+                ])
+                # Keep the first match of each name, like search(limit=1) did
+                for template in templates:
+                    template_by_name.setdefault(template.name, template.id)
+            for item in missing:
+                if not item.get('template_id'):
+                    item['template_id'] = template_by_name.get(item['product_name'])
+            rates = self._get_vat_rates([item['template_id'] for item in missing if item['template_id']])
+            for item in missing:
+                item['vat_rate'] = rates.get(item['template_id'], DEFAULT_VAT_RATE)
         
         for item in raw_data:
-            # Get VAT rate for the product
-            vat_rate = self._get_product_vat_rate(item['product_name'])
+            vat_rate = item['vat_rate']
             
             # Convert price to net (assuming input is gross)
             if item['price'] > 0:
@@ -844,6 +817,90 @@ class PosOrder(models.Model):
         
         return raw_data
 
+    @api.model
+    def _get_vat_rates(self, template_ids, fiscal_position=None):
+        """Sale VAT rate of many product templates, in one query.
+
+        Args:
+            template_ids (list): product.template ids
+            fiscal_position: optional account.fiscal.position mapping the taxes
+
+        Returns:
+            dict: template id -> rate (0.05 = 5%), the UAE default rate is
+            used for templates without a percent sale tax
+        """
+        if not template_ids:
+            return {}
+        company = self.env.company
+        self.env['product.template'].flush_model(['taxes_id'])
+        self._cr.execute('''
+            SELECT DISTINCT ON (rel.prod_id) rel.prod_id, rel.tax_id
+            FROM product_taxes_rel rel
+            INNER JOIN account_tax tax ON tax.id = rel.tax_id
+            WHERE rel.prod_id = ANY(%s)
+                AND tax.company_id = %s
+                AND tax.type_tax_use = 'sale'
+                AND tax.amount_type = 'percent'
+                AND tax.active
+            ORDER BY rel.prod_id, tax.sequence, tax.id
+        ''', (list(template_ids), company.id))
+        tax_rates = self._get_company_tax_rates(company.id, fiscal_position.id if fiscal_position else False)
+        return {
+            template_id: tax_rates.get(tax_id, DEFAULT_VAT_RATE)
+            for template_id, tax_id in self._cr.fetchall()
+        }
+
+    @api.model
+    def _get_company_tax_rates(self, company_id, fiscal_position_id):
+        """Effective rate of each percent sale tax of a company.
+
+        With a fiscal position, each tax is replaced by its mapped taxes; a
+        tax mapped to nothing is exempt.
+        """
+        return self._get_company_tax_rates_cached(
+            company_id, fiscal_position_id, self._get_tax_rates_version(company_id, fiscal_position_id))
+
+    @api.model
+    def _get_tax_rates_version(self, company_id, fiscal_position_id):
+        """Fingerprint of the fields the tax rates of a company depend on.
+
+        It keys the cached rates instead of clearing the registry cache when
+        a tax changes, and reads a few rows of two small tables.
+        """
+        self.env['account.tax'].flush_model(['company_id', 'type_tax_use', 'amount_type', 'amount', 'active'])
+        self.env['account.fiscal.position.tax'].flush_model(['position_id', 'tax_src_id', 'tax_dest_id'])
+        self._cr.execute('''
+            SELECT md5(
+                COALESCE((
+                    SELECT string_agg(concat_ws(':', id, amount_type, amount, active), ',' ORDER BY id)
+                    FROM account_tax
+                    WHERE company_id = %(company_id)s AND type_tax_use = 'sale'
+                ), '') || '|' || COALESCE((
+                    SELECT string_agg(concat_ws(':', id, tax_src_id, tax_dest_id), ',' ORDER BY id)
+                    FROM account_fiscal_position_tax
+                    WHERE position_id = %(fiscal_position_id)s
+                ), '')
+            )
+        ''', {'company_id': company_id, 'fiscal_position_id': fiscal_position_id or None})
+        return self._cr.fetchone()[0]
+
+    @api.model
+    @tools.ormcache('company_id', 'fiscal_position_id', 'version')
+    def _get_company_tax_rates_cached(self, company_id, fiscal_position_id, version):
+        """Rates of ``_get_company_tax_rates``, cached until ``version`` changes"""
+        taxes = self.env['account.tax'].sudo().with_context(active_test=False).search([
+            ('company_id', '=', company_id),
+            ('type_tax_use', '=', 'sale'),
+            ('amount_type', '=', 'percent'),
+        ])
+        fiscal_position = self.env['account.fiscal.position'].sudo().browse(fiscal_position_id)
+        rates = {}
+        for tax in taxes:
+            mapped = fiscal_position.map_tax(tax) if fiscal_position else tax
+            mapped = mapped.filtered(lambda t: t.amount_type == 'percent')
+            rates[tax.id] = mapped[0].amount / 100 if mapped else 0.0
+        return rates
+
     def _get_product_vat_rate(self, product_name):
         """Get VAT rate for a product"""
         try:
@@ -853,22 +910,15 @@ class PosOrder(models.Model):
                 ('available_in_pos', '=', True)
             ], limit=1)
             
-            if product_template and product_template.taxes_id:
-                # Get the first active VAT tax
-                vat_tax = product_template.taxes_id.filtered(
-                    lambda t: t.type_tax_use == 'sale' and 
-                             t.amount_type == 'percent' and 
-                             t.active
-                )
-                if vat_tax:
-                    return vat_tax[0].amount / 100
+            if product_template:
+                return self._get_vat_rates(product_template.ids).get(product_template.id, DEFAULT_VAT_RATE)
             
             # Default to UAE VAT rate
-            return 0.05
+            return DEFAULT_VAT_RATE
             
         except Exception as e:
             _logger.warning(f"Error getting VAT rate for {product_name}: {e}")
-            return 0.05
+            return DEFAULT_VAT_RATE
 
     def _calculate_scenarios(self, product_data, totals):
         """Calculate all pricing scenarios"""
@@ -893,60 +943,57 @@ class PosOrder(models.Model):
 
     def _calculate_break_even(self, product_data, totals):
         """Calculate break-even prices"""
-        break_even_data = []
-        
-        for item in product_data:
-            if totals['R'] > 0:
-                # Break-even price = cost + (E * price / R)
-                price_be = item['cost'] + (totals['E'] * item['price'] / totals['R'])
-                diff = item['price'] - price_be
-                diff_pct = ((item['price'] / price_be) - 1) * 100 if price_be > 0 else 0
-                
-                break_even_data.append({
-                    'product': item['product_name'],
-                    'qty': round(item['qty'], 2),
-                    'cost': round(item['cost'], 2),
-                    'price_real': round(item['price'], 2),
-                    'price_target': round(price_be, 2),
-                    'diff': round(diff, 2),
-                    'diff_pct': round(diff_pct, 2)
-                })
-        
-        return break_even_data
+        if totals['R'] <= 0:
+            return []
+        # Break-even price = cost + (E * price / R)
+        return PricingScenarioSolver(product_data).break_even_rows(totals['E'], totals['R'])
 
     def _calculate_net_target(self, product_data, totals, target_net):
         """Calculate net target scenarios (uniform and weighted)"""
-        N_target = target_net
-        x_raw = (N_target - totals['N']) / totals['R'] if totals['R'] > 0 else 0
-        
-        # Check if unrealistic
-        unrealistic = self._check_unrealistic(x_raw, product_data, totals, N_target)
+        return self._calculate_net_targets(product_data, totals, [target_net])[0]
+
+    def _calculate_net_targets(self, product_data, totals, targets):
+        """Calculate the net target scenarios of several targets at once.
+
+        The uplift budgets of all targets are solved in one vectorized pass,
+        so a target slider costs the same as a single target.
+
+        Returns:
+            list: one ``_calculate_net_target`` result per target
+        """
+        solver = PricingScenarioSolver(product_data)
+        N_targets = np.asarray(targets, dtype=float)
+        x_raw = (N_targets - totals['N']) / totals['R'] if totals['R'] > 0 else np.zeros_like(N_targets)
         
         # Apply cost floor
-        x = max(x_raw, totals['x_min'])
-        
-        # Uniform scenario
-        uniform = self._calculate_uniform_uplift(product_data, x)
-        
-        # Weighted scenario
-        weighted = self._calculate_weighted_uplift(product_data, totals, x)
-        
-        return {
-            'uniform': {
-                'x': round(x, 4),
-                'rows': uniform,
-                'unrealistic': unrealistic
-            },
-            'weighted': {
-                'x_budget': round(x, 4),
-                'x_range': [round(min(row['pct'] for row in weighted), 2), 
-                           round(max(row['pct'] for row in weighted), 2)],
-                'rows': weighted,
-                'unrealistic': unrealistic
-            }
-        }
+        x = np.maximum(x_raw, totals['x_min'])
+        
+        uniform = solver.uniform_uplifts(x)
+        weighted = solver.weighted_uplifts(x)
+        
+        results = []
+        for i, N_target in enumerate(N_targets.tolist()):
+            # Check if unrealistic
+            unrealistic = self._check_unrealistic(float(x_raw[i]), product_data, totals, N_target, solver=solver)
+            weighted_rows = solver.uplift_rows(weighted[i])
+            pct = weighted[i] * 100
+            results.append({
+                'uniform': {
+                    'x': round(float(x[i]), 4),
+                    'rows': solver.uplift_rows(uniform[i]),
+                    'unrealistic': unrealistic
+                },
+                'weighted': {
+                    'x_budget': round(float(x[i]), 4),
+                    'x_range': [round(float(pct.min()), 2) if len(solver) else 0.0,
+                                round(float(pct.max()), 2) if len(solver) else 0.0],
+                    'rows': weighted_rows,
+                    'unrealistic': unrealistic
+                }
+            })
+        return results
 
-    def _check_unrealistic(self, x_raw, product_data, totals, N_target):
+    def _check_unrealistic(self, x_raw, product_data, totals, N_target, solver=None):
         """Check if target is unrealistic"""
         # Check 30% threshold
         if x_raw > 0.30:
@@ -959,116 +1006,25 @@ class PosOrder(models.Model):
             return True
         
         # Check if many items need >2x price
-        high_uplift_count = 0
-        for item in product_data:
-            if item['price'] > 0:
-                required_uplift = (item['cost'] / item['price']) - 1
-                if required_uplift > 1.0:  # >2x price
-                    high_uplift_count += 1
-        
-        if high_uplift_count > len(product_data) * 0.1:  # >10% of items
+        solver = solver or PricingScenarioSolver(product_data)
+        if solver.high_uplift_count() > len(product_data) * 0.1:  # >10% of items
             return True
         
         return False
 
     def _calculate_uniform_uplift(self, product_data, x):
-        """Calculate uniform uplift scenario"""
-        uniform_data = []
-        
-        for item in product_data:
-            price_target = item['price'] * (1 + x)
-            pct_change = x * 100
-            margin_after = ((price_target - item['cost']) / price_target) * 100 if price_target > 0 else 0
-            
-            uniform_data.append({
-                'product': item['product_name'],
-                'qty': round(item['qty'], 2),
-                'cost': round(item['cost'], 2),
-                'price_real': round(item['price'], 2),
-                'price_target': round(price_target, 2),
-                'pct': round(pct_change, 2),
-                'margin_after': round(margin_after, 2)
-            })
-        
-        return uniform_data
+        """Calculate uniform uplift scenario, never below an item's cost floor"""
+        solver = PricingScenarioSolver(product_data)
+        return solver.uplift_rows(solver.uniform_uplifts([x])[0])
 
     def _calculate_weighted_uplift(self, product_data, totals, x_budget):
-        """Calculate weighted uplift scenario"""
-        # Calculate weights
-        weights = []
-        for item in product_data:
-            revenue = item['qty'] * item['price']
-            weight = revenue / totals['R'] if totals['R'] > 0 else 0
-            weights.append(weight)
-        
-        # Calculate S2 (sum of squared weights)
-        S2 = sum(w**2 for w in weights)
-        
-        # Initial per-item uplifts
-        x_items = []
-        for i, item in enumerate(product_data):
-            x_i = x_budget * (weights[i] / S2) if S2 > 0 else 0
-            # Apply cost floor
-            cost_floor = (item['cost'] / item['price']) - 1 if item['price'] > 0 else 0
-            x_i = max(x_i, cost_floor)
-            x_items.append(x_i)
-        
-        # Iterative re-normalization to maintain budget
-        max_iterations = 20
-        tolerance = 0.01
-        
-        for iteration in range(max_iterations):
-            # Calculate current total uplift
-            current_total = sum(x_items[i] * item['qty'] * item['price'] for i, item in enumerate(product_data))
-            target_total = x_budget * totals['R']
-            
-            if abs(current_total - target_total) < tolerance:
-                break
-            
-            # Redistribute remaining budget
-            remaining_budget = target_total - current_total
-            if abs(remaining_budget) < tolerance:
-                break
-            
-            # Find items with headroom (not at cost floor)
-            headroom_items = []
-            for i, item in enumerate(product_data):
-                cost_floor = (item['cost'] / item['price']) - 1 if item['price'] > 0 else 0
-                if x_items[i] > cost_floor + 0.001:  # Small tolerance
-                    headroom_items.append(i)
-            
-            if not headroom_items:
-                break
-            
-            # Redistribute proportionally by weight
-            total_headroom_weight = sum(weights[i] for i in headroom_items)
-            if total_headroom_weight > 0:
-                for i in headroom_items:
-                    adjustment = (remaining_budget * weights[i]) / (total_headroom_weight * item['qty'] * item['price'])
-                    x_items[i] += adjustment
-                    
-                    # Re-apply cost floor
-                    cost_floor = (product_data[i]['cost'] / product_data[i]['price']) - 1 if product_data[i]['price'] > 0 else 0
-                    x_items[i] = max(x_items[i], cost_floor)
-        
-        # Generate weighted data
-        weighted_data = []
-        for i, item in enumerate(product_data):
-            price_target = item['price'] * (1 + x_items[i])
-            pct_change = x_items[i] * 100
-            margin_after = ((price_target - item['cost']) / price_target) * 100 if price_target > 0 else 0
-            
-            weighted_data.append({
-                'product': item['product_name'],
-                'qty': round(item['qty'], 2),
-                'cost': round(item['cost'], 2),
-                'price_real': round(item['price'], 2),
-                'price_target': round(price_target, 2),
-                'pct': round(pct_change, 2),
-                'margin_after': round(margin_after, 2)
-            })
-        
-        return weighted_data
+        """Calculate weighted uplift scenario.
+
+        Uplifts follow the revenue share of each item and respect its cost
+        floor, see PricingScenarioSolver for the water-filling solution.
+        """
+        solver = PricingScenarioSolver(product_data)
+        return solver.uplift_rows(solver.weighted_uplifts([x_budget])[0])
 
     @api.model
     def apply_pricing_scenarios(self, month, scenario, mode, target=None, dry_run=True, idempotency_key=None):
@@ -1214,6 +1170,30 @@ class PosOrder(models.Model):
     @api.model
     def calculate_custom_net_scenario(self, month, custom_target):
         """Calculate custom net target scenario"""
+        result = self.calculate_custom_net_scenarios(month, [custom_target])
+        if result['status'] != 'ok':
+            return result
+        return {
+            'month': month,
+            'totals': result['totals'],
+            'scenarios': {
+                'net_custom': result['scenarios'][0]
+            },
+            'status': 'ok'
+        }
+
+    @api.model
+    def calculate_custom_net_scenarios(self, month, custom_targets):
+        """
+        Calculate custom net target scenarios for several targets at once.
+        
+        Args:
+            month (str): Month in YYYY-MM format
+            custom_targets (list): Target net amounts
+        
+        Returns:
+            dict: Totals and one net_custom scenario per target, in order
+        """
         try:
             # Get existing data
             scenarios_data = self.get_pricing_scenarios(month)
@@ -1227,23 +1207,21 @@ class PosOrder(models.Model):
             )
             
             totals = scenarios_data['totals']
-            N_target = float(custom_target)
+            N_targets = [float(target) for target in custom_targets]
             
-            # Calculate custom scenario
-            custom_scenario = self._calculate_net_target(product_data, totals, N_target)
+            # Calculate custom scenarios
+            custom_scenarios = self._calculate_net_targets(product_data, totals, N_targets)
             
             return {
                 'month': month,
                 'totals': totals,
-                'scenarios': {
-                    'net_custom': {
-                        'target': N_target,
-                        'status': 'ok',
-                        'message': '',
-                        'uniform': custom_scenario['uniform'],
-                        'weighted': custom_scenario['weighted']
-                    }
-                },
+                'scenarios': [{
+                    'target': N_target,
+                    'status': 'ok',
+                    'message': '',
+                    'uniform': custom_scenario['uniform'],
+                    'weighted': custom_scenario['weighted']
+                } for N_target, custom_scenario in zip(N_targets, custom_scenarios)],
                 'status': 'ok'
             }
             
@@ -1334,6 +1312,7 @@ class PosOrder(models.Model):
             query = """
                 SELECT 
                     pol.product_id,
+                    pt.id as template_id,
                     pt.name as product_name,
                     SUM(pol.qty) as total_qty,
                     AVG(pol.price_unit) as avg_price,
@@ -1346,7 +1325,7 @@ class PosOrder(models.Model):
                     AND po.date_order <= %s
                     AND po.state IN ('paid', 'done', 'invoiced')
                     AND po.company_id = %s
-                GROUP BY pol.product_id, pt.name
+                GROUP BY pol.product_id, pt.id, pt.name
                 HAVING SUM(pol.qty) > 0
                 ORDER BY SUM(pol.qty * pol.price_unit) DESC
             """
@@ -1356,9 +1335,10 @@ class PosOrder(models.Model):
             
             product_data = []
             for row in results:
-                product_id, product_name, qty, price, cost = row
+                product_id, template_id, product_name, qty, price, cost = row
                 product_data.append({
                     'product_id': product_id,
+                    'template_id': template_id,
                     'product_name': product_name,
                     'qty': float(qty) if qty is not None else 0.0,
                     'price': float(price) if price is not None else 0.0,
@@ -1501,70 +1481,81 @@ class PosOrder(models.Model):
         Returns:
             dict: Complete sales data with product details
         """
-        company_id = self.env.company.id
-        
         # Convert dates to datetime for proper querying
         if isinstance(month_start, str):
             month_start = datetime.strptime(month_start, '%Y-%m-%d').date()
         if isinstance(month_end, str):
             month_end = datetime.strptime(month_end, '%Y-%m-%d').date()
         
-        # Main comprehensive query
-        query = '''
-            SELECT 
-                pt.id as template_id,
-                pt.name as product_name,
-                pp.id as product_id,
-                pp.default_code as sku,
-                pt.categ_id as category_id,
-                pc.name as category_name,
-                pc.complete_name as category_full_name,
-                SUM(pol.qty) as total_quantity,
-                COUNT(DISTINCT pol.order_id) as order_count,
-                COUNT(DISTINCT DATE(po.date_order)) as days_sold,
-                AVG(pol.price_unit) as avg_price,
-                MIN(pol.price_unit) as min_price,
-                MAX(pol.price_unit) as max_price,
-                SUM(pol.price_subtotal) as total_revenue,
-                AVG(pol.total_cost) as avg_cost,
-                SUM(pol.total_cost) as total_cost,
-                pp.standard_price as standard_cost,
-                pt.list_price as list_price,
-                pt.available_in_pos as pos_available,
-                pp.qty_available as current_stock,
-                pt.sale_ok as sale_ok,
-                pt.purchase_ok as purchase_ok,
-                -- Calculate price variance
-                STDDEV(pol.price_unit) as price_stddev,
-                -- Calculate return quantities
-                SUM(CASE WHEN pol.qty < 0 THEN pol.qty ELSE 0 END) as return_quantity,
-                SUM(CASE WHEN pol.qty > 0 THEN pol.qty ELSE 0 END) as sale_quantity
-            FROM pos_order_line pol
-            INNER JOIN pos_order po ON pol.order_id = po.id
-            INNER JOIN product_product pp ON pol.product_id = pp.id
-            INNER JOIN product_template pt ON pp.product_tmpl_id = pt.id
-            LEFT JOIN product_category pc ON pt.categ_id = pc.id
-            WHERE po.company_id = %s
-                AND po.date_order >= %s
-                AND po.date_order < %s
-                AND po.state IN ('paid', 'done', 'invoiced')
-            GROUP BY 
-                pt.id, pt.name, pp.id, pp.default_code, 
-                pt.categ_id, pc.name, pc.complete_name,
-                pp.standard_price, pt.list_price, 
-                pt.available_in_pos, pp.qty_available,
-                pt.sale_ok, pt.purchase_ok
-            HAVING SUM(pol.qty) != 0
-            ORDER BY SUM(pol.price_subtotal) DESC
-        '''
+        # Per-product aggregates, merged from the monthly sales cubes
+        aggregates = self.env['pos.product.sales.month']._get_product_aggregates(
+            month_start, month_end, self.env.company)
+        aggregates = sorted((agg for agg in aggregates.values() if agg['qty'] != 0),
+                            key=lambda agg: (-agg['revenue'], agg['product_id']))
+        processed_data = self._prepare_monthly_sales_rows(aggregates)
+        total_revenue = sum(agg['revenue'] for agg in aggregates)
+        total_quantity = sum(agg['qty'] for agg in aggregates)
         
-        self._cr.execute(query, (company_id, month_start, month_end))
-        raw_data = self._cr.dictfetchall()
+        return {
+            'month_start': month_start.strftime('%Y-%m-%d'),
+            'month_end': month_end.strftime('%Y-%m-%d'),
+            'total_products': len(processed_data),
+            'total_revenue': round(total_revenue, 2),
+            'total_quantity': round(total_quantity, 2),
+            'products': processed_data
+        }
+
+    def _prepare_monthly_sales_rows(self, aggregates):
+        """
+        Turn per-product sales aggregates into monthly sales data rows.
+        
+        Args:
+            aggregates (list): Finalized aggregates of pos.product.sales.month,
+                in the order of the returned rows
+            
+        Returns:
+            list: Product rows of get_complete_monthly_sales_data
+        """
+        products = self.env['product.product'].with_context(active_test=False).browse(
+            [agg['product_id'] for agg in aggregates])
+        
+        raw_data = []
+        for product, agg in zip(products, aggregates):
+            template = product.product_tmpl_id
+            category = template.categ_id
+            raw_data.append({
+                'template_id': template.id,
+                'product_name': template.name,
+                'product_id': product.id,
+                'sku': product.default_code,
+                'category_id': category.id,
+                'category_name': category.name,
+                'category_full_name': category.complete_name,
+                'total_quantity': agg['qty'],
+                'order_count': agg['order_count'],
+                'days_sold': agg['days_sold'],
+                'avg_price': agg['avg_price'],
+                'min_price': agg['price_min'],
+                'max_price': agg['price_max'],
+                'total_revenue': agg['revenue'],
+                'avg_cost': agg['avg_cost'],
+                'total_cost': agg['cost'],
+                'standard_cost': product.standard_price,
+                'list_price': template.list_price,
+                'pos_available': template.available_in_pos,
+                'current_stock': product.qty_available,
+                'sale_ok': template.sale_ok,
+                'purchase_ok': template.purchase_ok,
+                'price_stddev': agg['price_stddev'],
+                'return_quantity': agg['return_qty'],
+                'sale_quantity': agg['sale_qty'],
+            })
+        
+        # Sale VAT rates of all the templates, resolved in one query
+        vat_rates = self._get_vat_rates(list({row['template_id'] for row in raw_data}))
         
         # Process and enhance the data
         processed_data = []
-        total_revenue = 0
-        total_quantity = 0
         
         for row in raw_data:
             # Calculate margins and percentages
@@ -1611,21 +1602,13 @@ class PosOrder(models.Model):
                 'sale_ok': row['sale_ok'],
                 'purchase_ok': row['purchase_ok'],
                 'current_stock': round(row['current_stock'], 2),
-                'turnover_ratio': round(turnover_ratio, 2)
+                'turnover_ratio': round(turnover_ratio, 2),
+                'vat_rate': vat_rates.get(row['template_id'], DEFAULT_VAT_RATE)
             }
             
             processed_data.append(processed_row)
-            total_revenue += row['total_revenue']
-            total_quantity += row['total_quantity']
         
-        return {
-            'month_start': month_start.strftime('%Y-%m-%d'),
-            'month_end': month_end.strftime('%Y-%m-%d'),
-            'total_products': len(processed_data),
-            'total_revenue': round(total_revenue, 2),
-            'total_quantity': round(total_quantity, 2),
-            'products': processed_data
-        }
+        return processed_data
 
     @api.model
     def get_product_performance_analysis(self, month_start, month_end):
@@ -1739,48 +1722,45 @@ class PosOrder(models.Model):
         writer = csv.writer(output)
         
         # Write headers
-        headers = [
-            'Product Name', 'SKU', 'Category', 'Total Quantity', 'Sale Quantity', 'Return Quantity',
-            'Order Count', 'Days Sold', 'Avg Daily Sales', 'Avg Price', 'Min Price', 'Max Price',
-            'Price StdDev', 'Price Consistency', 'Total Revenue', 'Avg Cost', 'Total Cost',
-            'Standard Cost', 'List Price', 'Margin Amount', 'Margin %', 'Current Stock',
-            'Turnover Ratio', 'POS Available', 'Sale OK', 'Purchase OK'
-        ]
-        writer.writerow(headers)
+        writer.writerow(MONTHLY_SALES_EXPORT_HEADERS)
         
         # Write data
         for product in data['products']:
-            writer.writerow([
-                product['product_name'],
-                product['sku'],
-                product['category_name'],
-                product['total_quantity'],
-                product['sale_quantity'],
-                product['return_quantity'],
-                product['order_count'],
-                product['days_sold'],
-                product['avg_daily_sales'],
-                product['avg_price'],
-                product['min_price'],
-                product['max_price'],
-                product['price_stddev'],
-                product['price_consistency'],
-                product['total_revenue'],
-                product['avg_cost'],
-                product['total_cost'],
-                product['standard_cost'],
-                product['list_price'],
-                product['margin_amount'],
-                product['margin_percentage'],
-                product['current_stock'],
-                product['turnover_ratio'],
-                product['pos_available'],
-                product['sale_ok'],
-                product['purchase_ok']
-            ])
+            writer.writerow(self._get_csv_export_row(product))
         
         return output.getvalue()
 
+    def _get_csv_export_row(self, product):
+        """CSV cells of one product row of the monthly sales data."""
+        return [
+            product['product_name'],
+            product['sku'],
+            product['category_name'],
+            product['total_quantity'],
+            product['sale_quantity'],
+            product['return_quantity'],
+            product['order_count'],
+            product['days_sold'],
+            product['avg_daily_sales'],
+            product['avg_price'],
+            product['min_price'],
+            product['max_price'],
+            product['price_stddev'],
+            product['price_consistency'],
+            product['total_revenue'],
+            product['avg_cost'],
+            product['total_cost'],
+            product['standard_cost'],
+            product['list_price'],
+            product['margin_amount'],
+            product['margin_percentage'],
+            product['current_stock'],
+            product['turnover_ratio'],
+            product['pos_available'],
+            product['sale_ok'],
+            product['purchase_ok']
+        ]
+
     def _export_to_excel(self, data):
         """Export data to Excel format."""
         try:
@@ -1789,62 +1769,11 @@ class PosOrder(models.Model):
             
             output = io.BytesIO()
             workbook = xlsxwriter.Workbook(output)
-            worksheet = workbook.add_worksheet('Monthly Sales Data')
-            
-            # Define formats
-            header_format = workbook.add_format({
-                'bold': True,
-                'bg_color': '#D7E4BC',
-                'border': 1
-            })
-            
-            currency_format = workbook.add_format({'num_format': '0.00'})
-            percentage_format = workbook.add_format({'num_format': '0.00%'})
-            
-            # Write headers
-            headers = [
-                'Product Name', 'SKU', 'Category', 'Total Quantity', 'Sale Quantity', 'Return Quantity',
-                'Order Count', 'Days Sold', 'Avg Daily Sales', 'Avg Price', 'Min Price', 'Max Price',
-                'Price StdDev', 'Price Consistency', 'Total Revenue', 'Avg Cost', 'Total Cost',
-                'Standard Cost', 'List Price', 'Margin Amount', 'Margin %', 'Current Stock',
-                'Turnover Ratio', 'POS Available', 'Sale OK', 'Purchase OK'
-            ]
-            
-            for col, header in enumerate(headers):
-                worksheet.write(0, col, header, header_format)
+            worksheet, formats = self._add_excel_export_sheet(workbook)
             
             # Write data
             for row, product in enumerate(data['products'], 1):
-                worksheet.write(row, 0, product['product_name'])
-                worksheet.write(row, 1, product['sku'])
-                worksheet.write(row, 2, product['category_name'])
-                worksheet.write(row, 3, product['total_quantity'])
-                worksheet.write(row, 4, product['sale_quantity'])
-                worksheet.write(row, 5, product['return_quantity'])
-                worksheet.write(row, 6, product['order_count'])
-                worksheet.write(row, 7, product['days_sold'])
-                worksheet.write(row, 8, product['avg_daily_sales'])
-                worksheet.write(row, 9, product['avg_price'], currency_format)
-                worksheet.write(row, 10, product['min_price'], currency_format)
-                worksheet.write(row, 11, product['max_price'], currency_format)
-                worksheet.write(row, 12, product['price_stddev'])
-                worksheet.write(row, 13, product['price_consistency'])
-                worksheet.write(row, 14, product['total_revenue'], currency_format)
-                worksheet.write(row, 15, product['avg_cost'], currency_format)
-                worksheet.write(row, 16, product['total_cost'], currency_format)
-                worksheet.write(row, 17, product['standard_cost'], currency_format)
-                worksheet.write(row, 18, product['list_price'], currency_format)
-                worksheet.write(row, 19, product['margin_amount'], currency_format)
-                worksheet.write(row, 20, product['margin_percentage'] / 100, percentage_format)
-                worksheet.write(row, 21, product['current_stock'])
-                worksheet.write(row, 22, product['turnover_ratio'])
-                worksheet.write(row, 23, 'Yes' if product['pos_available'] else 'No')
-                worksheet.write(row, 24, 'Yes' if product['sale_ok'] else 'No')
-                worksheet.write(row, 25, 'Yes' if product['purchase_ok'] else 'No')
-            
-            # Auto-fit columns
-            for col in range(len(headers)):
-                worksheet.set_column(col, col, 15)
+                self._write_excel_export_row(worksheet, row, product, formats)
             
             workbook.close()
             output.seek(0)
@@ -1854,6 +1783,143 @@ class PosOrder(models.Model):
             _logger.warning("xlsxwriter not available, falling back to CSV export")
             return self._export_to_csv(data)
 
+    def _add_excel_export_sheet(self, workbook):
+        """Add the monthly sales sheet with its header row.
+        
+        Returns:
+            tuple: (worksheet, dict of cell formats)
+        """
+        worksheet = workbook.add_worksheet('Monthly Sales Data')
+        
+        # Define formats
+        header_format = workbook.add_format({
+            'bold': True,
+            'bg_color': '#D7E4BC',
+            'border': 1
+        })
+        formats = {
+            'currency': workbook.add_format({'num_format': '0.00'}),
+            'percentage': workbook.add_format({'num_format': '0.00%'}),
+        }
+        
+        # Column widths first, constant memory sheets are written row by row
+        worksheet.set_column(0, len(MONTHLY_SALES_EXPORT_HEADERS) - 1, 15)
+        for col, header in enumerate(MONTHLY_SALES_EXPORT_HEADERS):
+            worksheet.write(0, col, header, header_format)
+        return worksheet, formats
+
+    def _write_excel_export_row(self, worksheet, row, product, formats):
+        """Write one product row of the monthly sales data."""
+        currency_format = formats['currency']
+        worksheet.write(row, 0, product['product_name'])
+        worksheet.write(row, 1, product['sku'])
+        worksheet.write(row, 2, product['category_name'])
+        worksheet.write(row, 3, product['total_quantity'])
+        worksheet.write(row, 4, product['sale_quantity'])
+        worksheet.write(row, 5, product['return_quantity'])
+        worksheet.write(row, 6, product['order_count'])
+        worksheet.write(row, 7, product['days_sold'])
+        worksheet.write(row, 8, product['avg_daily_sales'])
+        worksheet.write(row, 9, product['avg_price'], currency_format)
+        worksheet.write(row, 10, product['min_price'], currency_format)
+        worksheet.write(row, 11, product['max_price'], currency_format)
+        worksheet.write(row, 12, product['price_stddev'])
+        worksheet.write(row, 13, product['price_consistency'])
+        worksheet.write(row, 14, product['total_revenue'], currency_format)
+        worksheet.write(row, 15, product['avg_cost'], currency_format)
+        worksheet.write(row, 16, product['total_cost'], currency_format)
+        worksheet.write(row, 17, product['standard_cost'], currency_format)
+        worksheet.write(row, 18, product['list_price'], currency_format)
+        worksheet.write(row, 19, product['margin_amount'], currency_format)
+        worksheet.write(row, 20, product['margin_percentage'] / 100, formats['percentage'])
+        worksheet.write(row, 21, product['current_stock'])
+        worksheet.write(row, 22, product['turnover_ratio'])
+        worksheet.write(row, 23, 'Yes' if product['pos_available'] else 'No')
+        worksheet.write(row, 24, 'Yes' if product['sale_ok'] else 'No')
+        worksheet.write(row, 25, 'Yes' if product['purchase_ok'] else 'No')
+
+    @api.model
+    def _iter_monthly_sales_rows(self, month_start, month_end, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        Stream the product rows of get_complete_monthly_sales_data.
+        
+        The aggregates are merged and sorted in SQL and read through a
+        server-side cursor, ``chunk_size`` products at a time; each chunk is
+        enriched, yielded and dropped from the cache, so memory stays bounded
+        whatever the number of products.
+        
+        Args:
+            month_start (date): Start of the period (inclusive)
+            month_end (date): End of the period (exclusive)
+            chunk_size (int): Products fetched per round trip
+            
+        Yields:
+            list: Product rows, by decreasing revenue
+        """
+        if isinstance(month_start, str):
+            month_start = datetime.strptime(month_start, '%Y-%m-%d').date()
+        if isinstance(month_end, str):
+            month_end = datetime.strptime(month_end, '%Y-%m-%d').date()
+        
+        sales_cube = self.env['pos.product.sales.month']
+        query, params = sales_cube._get_merged_aggregates_query(
+            month_start, month_end, self.env.company)
+        cursor_name = 'pos_monthly_sales_export_%s' % id(query)
+        self._cr.execute('DECLARE %s NO SCROLL CURSOR FOR %s' % (cursor_name, query), params)
+        try:
+            while True:
+                self._cr.execute('FETCH %s FROM %s' % (int(chunk_size), cursor_name))
+                aggregates = self._cr.dictfetchall()
+                if not aggregates:
+                    break
+                for agg in aggregates:
+                    sales_cube._finalize_aggregate(agg)
+                yield self._prepare_monthly_sales_rows(aggregates)
+                self.env.invalidate_all()
+        finally:
+            self._cr.execute('CLOSE %s' % cursor_name)
+
+    @api.model
+    def _stream_monthly_sales_csv(self, month_start, month_end):
+        """
+        CSV export of the monthly sales data as a generator of UTF-8 chunks.
+        
+        Same columns as _export_to_csv, one chunk per fetched batch of products.
+        """
+        import csv
+        import io
+        
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(MONTHLY_SALES_EXPORT_HEADERS)
+        for products in self._iter_monthly_sales_rows(month_start, month_end):
+            writer.writerows(self._get_csv_export_row(product) for product in products)
+            yield output.getvalue().encode('utf-8')
+            output.seek(0)
+            output.truncate()
+        if output.tell():
+            yield output.getvalue().encode('utf-8')
+
+    @api.model
+    def _write_monthly_sales_excel(self, month_start, month_end, fileobj):
+        """
+        Excel export of the monthly sales data into ``fileobj``.
+        
+        The workbook is written in xlsxwriter constant memory mode: each row is
+        flushed to a temporary file as soon as the next one starts, so memory
+        stays bounded whatever the number of products.
+        """
+        import xlsxwriter
+        
+        workbook = xlsxwriter.Workbook(fileobj, {'constant_memory': True})
+        worksheet, formats = self._add_excel_export_sheet(workbook)
+        row = 1
+        for products in self._iter_monthly_sales_rows(month_start, month_end):
+            for product in products:
+                self._write_excel_export_row(worksheet, row, product, formats)
+                row += 1
+        workbook.close()
+
 
 class ResPartner(models.Model):
     _inherit = 'res.partner'
@@ -1864,32 +1930,65 @@ class ResPartner(models.Model):
         res.company_id = self.env.company.id
         return res
 
-    is_new_customer = fields.Integer(string='POS Order Count(Today)', compute="_compute_is_new_customer", store=True)
-    inactive_customer = fields.Boolean(string='Inactive Customer')
+    is_new_customer = fields.Integer(string='POS Order Count(Today)', readonly=True, copy=False,
+                                     help='Number of POS orders of the customer in its company')
+    inactive_customer = fields.Boolean(string='Inactive Customer', readonly=True, copy=False,
+                                       help='No POS order during the last 6 months')
 
-    @api.depends('pos_order_count')
-    def _compute_is_new_customer(self):
-        partners = self.env['res.partner'].sudo().search([('company_id', '=', self.env.company.id)])
+    @api.model
+    def _mark_pos_segment_dirty(self, partners):
+        """Schedule the segmentation of ``partners`` before commit."""
+        dirty = self.env.cr.precommit.data.setdefault('res.partner.pos_segment.dirty', set())
+        if not dirty:
+            self.env.cr.precommit.add(self._flush_pos_segment_dirty)
+        dirty.update(partners.ids)
+
+    @api.model
+    def _flush_pos_segment_dirty(self):
+        partner_ids = self.env.cr.precommit.data.pop('res.partner.pos_segment.dirty', set())
+        if partner_ids:
+            partners = self.sudo().browse(partner_ids).exists()
+            for company in partners.company_id:
+                partners._update_pos_customer_segments(company)
+
+    def _update_pos_customer_segments(self, company):
+        """Set the order count and inactivity flag of the customers of ``company``.
+
+        Called on an empty recordset it segments every partner of the company.
+        Lifetime and last-6-month order counts come from a single grouped
+        query, and partners sharing the same values are written together.
+        """
+        self.env['pos.order'].flush_model(['partner_id', 'company_id', 'date_order'])
+        domain = [('company_id', '=', company.id)]
+        if self:
+            domain.append(('id', 'in', self.ids))
+        partners = self.sudo().with_context(active_test=False).search(domain)
+        if not partners:
+            return
         today_start = fields.Datetime.to_datetime(fields.Date.today())
-        today_end = today_start + timedelta(hours=24)
+        six_months_before = today_start - relativedelta(months=6)
+        self._cr.execute('''
+            SELECT partner_id, COUNT(*), COUNT(*) FILTER (WHERE date_order >= %s)
+            FROM pos_order
+            WHERE company_id = %s AND partner_id = ANY(%s)
+            GROUP BY partner_id
+        ''', (six_months_before, company.id, partners.ids))
+        stats = {partner_id: (total, recent) for partner_id, total, recent in self._cr.fetchall()}
+
+        to_write = {}
         for partner in partners:
-            # pos_order = self.env['pos.order'].sudo().search([('partner_id', '=', partner.id),
-            #                                                  ('date_order','>=', today_start),
-            #                                                  ('date_order','<', today_end),
-            #                                                  ('company_id', '=', self.env.company.id),
-            #                                                  ])
-            pos_order = self.env['pos.order'].sudo().search([('partner_id', '=', partner.id),
-                                                             ('company_id', '=', self.env.company.id),
-                                                             ])
-            partner.is_new_customer = len(pos_order)
-            six_months_before = today_start - relativedelta(months=6)
-            pos_order_inactive = self.env['pos.order'].sudo().search([('partner_id', '=', partner.id),
-                                                                      ('date_order', '>=', six_months_before),
-                                                                      ('date_order', '<', today_end),
-                                                                      ('company_id', '=', self.env.company.id),
-                                                                      ])
-            if pos_order_inactive:
-                partner.inactive_customer = False
-            else:
-                partner.inactive_customer = True
+            total, recent = stats.get(partner.id, (0, 0))
+            values = (total, not recent)
+            if values != (partner.is_new_customer, partner.inactive_customer):
+                to_write.setdefault(values, []).append(partner.id)
+        for (total, inactive), partner_ids in to_write.items():
+            self.sudo().browse(partner_ids).write({
+                'is_new_customer': total,
+                'inactive_customer': inactive,
+            })
 
+    @api.model
+    def _cron_update_pos_customer_segments(self):
+        """Full segmentation, inactivity depends on the passing of time"""
+        for company in self.env['res.company'].search([]):
+            self.browse()._update_pos_customer_segments(company)
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+import math
+from datetime import date, datetime, time, timedelta
+
+from dateutil.relativedelta import relativedelta
+from psycopg2.errors import SerializationFailure
+
+from odoo import api, fields, models
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Mergeable per-product aggregates of the paid POS lines between two
+# datetimes. Every value can be summed (or min/max-ed) across disjoint
+# periods: orders and days never span two periods, and the price standard
+# deviation is rebuilt from the count, sum and sum of squares.
+PRODUCT_SALES_AGGREGATE_QUERY = '''
+    SELECT
+        pol.product_id AS product_id,
+        COUNT(*) AS line_count,
+        SUM(pol.qty)::float AS qty,
+        SUM(CASE WHEN pol.qty > 0 THEN pol.qty ELSE 0 END)::float AS sale_qty,
+        SUM(CASE WHEN pol.qty < 0 THEN pol.qty ELSE 0 END)::float AS return_qty,
+        SUM(pol.price_unit)::float AS price_sum,
+        SUM(pol.price_unit * pol.price_unit)::float AS price_sq_sum,
+        MIN(pol.price_unit)::float AS price_min,
+        MAX(pol.price_unit)::float AS price_max,
+        SUM(pol.price_subtotal)::float AS revenue,
+        SUM(COALESCE(pol.total_cost, 0))::float AS cost,
+        COUNT(DISTINCT pol.order_id) AS order_count,
+        COUNT(DISTINCT DATE(po.date_order)) AS days_sold
+    FROM pos_order_line pol
+    INNER JOIN pos_order po ON pol.order_id = po.id
+    WHERE po.company_id = %(company_id)s
+        AND po.date_order >= %(start)s
+        AND po.date_order < %(end)s
+        AND po.state IN ('paid', 'done', 'invoiced')
+    GROUP BY pol.product_id
+'''
+
+# Orders are paid within hours of their date: builds stop that long before
+# they start, so that the orders still open do not mark the cube dirty
+BUILD_MARGIN = timedelta(hours=12)
+
+AGGREGATE_COLUMNS = [
+    'line_count', 'qty', 'sale_qty', 'return_qty', 'price_sum', 'price_sq_sum',
+    'price_min', 'price_max', 'revenue', 'cost', 'order_count', 'days_sold',
+]
+
+
+class PosProductSalesMonth(models.Model):
+    """Monthly per-product POS sales cube of a company.
+
+    A cube holds the order lines of its month dated before ``built_until``,
+    reads add the orders dated since from the order lines. The cron extends
+    the cubes every day, in two short transactions: the first one takes the
+    row lock of the cube and sets ``pending_until``, the second one builds
+    the lines up to it.
+
+    Paying or cancelling an order dated before the ``pending_until`` or
+    ``built_until`` of its cube, e.g. an offline order synced late or a
+    refund dated into a closed month, marks the cube dirty: its month is
+    read from the order lines until the cron rebuilds it. Payments hold a
+    key share lock on the cube of their month until they commit, so that
+    the builder waits for them and sees their orders. Months are cut on UTC
+    dates, like the raw queries they replace.
+    """
+    _name = 'pos.product.sales.month'
+    _description = 'POS Monthly Product Sales Cube'
+    _order = 'month desc'
+    _rec_name = 'month'
+
+    month = fields.Date('Month', required=True, index=True, help='First day of the month')
+    company_id = fields.Many2one('res.company', string='Company', required=True,
+                                 ondelete='cascade')
+    built_until = fields.Datetime('Built Until', help='The cube holds the orders dated before')
+    pending_until = fields.Datetime('Pending Until', help='End of the build in progress')
+    dirty = fields.Boolean('Dirty', help='Orders dated before the end of the cube changed since its build')
+    line_ids = fields.One2many('pos.product.sales.month.line', 'month_id', string='Products')
+
+    _sql_constraints = [
+        ('month_company_uniq', 'unique(month, company_id)',
+         'Only one sales cube per month and company is allowed.'),
+    ]
+
+    @api.model
+    def _lock_month(self, month, company, mode='UPDATE'):
+        """Create the cube of ``month`` if needed, and lock it.
+
+        Returns:
+            tuple: (id, built_until, pending_until, dirty) of the cube
+        """
+        query = '''
+            SELECT id, built_until, pending_until, dirty FROM pos_product_sales_month
+            WHERE month = %s AND company_id = %s
+            FOR {mode}
+        '''.format(mode=mode)
+        self._cr.execute(query, (month, company.id))
+        row = self._cr.fetchone()
+        if row:
+            return row
+        self._cr.execute('''
+            INSERT INTO pos_product_sales_month (month, company_id, dirty, create_date, write_date)
+            VALUES (%s, %s, false, now() at time zone 'UTC', now() at time zone 'UTC')
+            ON CONFLICT (month, company_id) DO NOTHING
+        ''', (month, company.id))
+        self._cr.execute(query, (month, company.id))
+        return self._cr.fetchone()
+
+    @api.model
+    def _invalidate_orders(self, orders):
+        """Mark dirty the cubes holding ``orders``, just paid or cancelled"""
+        dates = {}
+        for order in orders:
+            key = (order.company_id, order.date_order.date().replace(day=1))
+            dates[key] = min(dates.get(key, order.date_order), order.date_order)
+        for (company, month), date_order in sorted(dates.items(), key=lambda item: (item[0][0].id, item[0][1])):
+            # Held until the commit: a builder of the month waits for it
+            cube_id, built_until, pending_until, dirty = self._lock_month(month, company, 'KEY SHARE')
+            end = max(built_until or datetime.min, pending_until or datetime.min)
+            if not dirty and date_order < end:
+                self._cr.execute('''
+                    UPDATE pos_product_sales_month SET dirty = true WHERE id = %s
+                ''', (cube_id,))
+        self.invalidate_model(['dirty'])
+
+    @api.model
+    def _get_build_end(self, month):
+        """End of a build of ``month`` started now"""
+        end = fields.Datetime.now().replace(microsecond=0) - BUILD_MARGIN
+        end = min(end, datetime.combine(month + relativedelta(months=1), time.min))
+        return max(end, datetime.combine(month, time.min))
+
+    @api.model
+    def _prepare_build(self, month, company=None):
+        """First transaction of a build: wait for the payments of the month
+        and set the end of the build, committed before ``_build``"""
+        company = company or self.env.company
+        cube_id, _built_until, _pending_until, _dirty = self._lock_month(month.replace(day=1), company)
+        cube = self.browse(cube_id)
+        cube.write({'pending_until': self._get_build_end(cube.month)})
+        return cube
+
+    def _build(self):
+        """Second transaction of a build: recompute the product lines of the
+        cube from the order lines dated before ``pending_until``"""
+        self.ensure_one()
+        self.env.flush_all()
+        # Fails the build if a late payment marks the cube dirty meanwhile
+        self._cr.execute('''
+            SELECT pending_until FROM pos_product_sales_month WHERE id = %s FOR UPDATE
+        ''', (self.id,))
+        [end] = self._cr.fetchone()
+        self._cr.execute('DELETE FROM pos_product_sales_month_line WHERE month_id = %s', (self.id,))
+        self._cr.execute('''
+            INSERT INTO pos_product_sales_month_line (month_id, product_id, {columns})
+            SELECT %(month_id)s, agg.product_id, {agg_columns}
+            FROM ({query}) agg
+        '''.format(
+            columns=', '.join(AGGREGATE_COLUMNS),
+            agg_columns=', '.join('agg.%s' % column for column in AGGREGATE_COLUMNS),
+            query=PRODUCT_SALES_AGGREGATE_QUERY,
+        ), {
+            'month_id': self.id,
+            'company_id': self.company_id.id,
+            'start': self.month,
+            'end': end,
+        })
+        self.write({'built_until': end, 'pending_until': False, 'dirty': False})
+        self.env['pos.product.sales.month.line'].invalidate_model()
+
+    @api.model
+    def _get_aggregate_sources(self, date_start, date_end, company):
+        """Split [date_start, date_end) into clean cubes and raw segments.
+
+        Whole months are read from their cube when it is not dirty, and the
+        orders dated after the end of the cube from the order lines; the
+        other whole months and the partial months at both ends are read from
+        the order lines. Nothing is written, the cubes are built by the
+        daily cron.
+
+        Returns:
+            tuple: (cube ids, list of (start, end) segments)
+        """
+        first_full = date_start if date_start.day == 1 else date_start.replace(day=1) + relativedelta(months=1)
+        end_full = date_end.replace(day=1)
+        segments = []
+        months = []
+        if first_full < end_full:
+            month = first_full
+            while month < end_full:
+                months.append(month)
+                month += relativedelta(months=1)
+            if date_start < first_full:
+                segments.append((date_start, first_full))
+            if end_full < date_end:
+                segments.append((end_full, date_end))
+        elif date_start < date_end:
+            segments.append((date_start, date_end))
+        cubes = self._get_current_cubes(months, company)
+        cube_ids = []
+        for month in months:
+            next_month = month + relativedelta(months=1)
+            if month not in cubes:
+                segments.append((month, next_month))
+                continue
+            cube_id, built_until = cubes[month]
+            cube_ids.append(cube_id)
+            if built_until < datetime.combine(next_month, time.min):
+                segments.append((built_until, next_month))
+        if segments:
+            self.env.flush_all()
+        return cube_ids, segments
+
+    @api.model
+    def _get_current_cubes(self, months, company):
+        """(id, built_until) of the clean cubes of ``months``, by month"""
+        if not months:
+            return {}
+        self.flush_model()
+        self._cr.execute('''
+            SELECT month, id, built_until FROM pos_product_sales_month
+            WHERE company_id = %s AND month = ANY(%s) AND built_until IS NOT NULL AND NOT dirty
+        ''', (company.id, months))
+        return {month: (cube_id, built_until) for month, cube_id, built_until in self._cr.fetchall()}
+
+    @api.model
+    def _get_product_aggregates(self, date_start, date_end, company=None):
+        """Per-product aggregates of [date_start, date_end), keyed by product id.
+
+        Whole months are read from the cubes, the partial months at both
+        ends from the order lines, then everything is merged.
+        """
+        company = company or self.env.company
+        cube_ids, segments = self._get_aggregate_sources(date_start, date_end, company)
+        rows = []
+        if cube_ids:
+            self._cr.execute('''
+                SELECT product_id, {columns}
+                FROM pos_product_sales_month_line
+                WHERE month_id = ANY(%s)
+            '''.format(columns=', '.join(AGGREGATE_COLUMNS)), (cube_ids,))
+            rows += self._cr.dictfetchall()
+        for start, end in segments:
+            self._cr.execute(PRODUCT_SALES_AGGREGATE_QUERY, {
+                'company_id': company.id,
+                'start': start,
+                'end': end,
+            })
+            rows += self._cr.dictfetchall()
+        return self._merge_aggregates(rows)
+
+    @api.model
+    def _get_merged_aggregates_query(self, date_start, date_end, company=None):
+        """Same aggregates as _get_product_aggregates, merged in SQL.
+
+        Products with a non-zero quantity are sorted by revenue, so the
+        result can be read through a server-side cursor; pass each row to
+        _finalize_aggregate.
+
+        Returns:
+            tuple: (query, params)
+        """
+        company = company or self.env.company
+        cube_ids, segments = self._get_aggregate_sources(date_start, date_end, company)
+        params = {'company_id': company.id, 'cube_ids': cube_ids}
+        parts = ['''
+            SELECT product_id, {columns}
+            FROM pos_product_sales_month_line
+            WHERE month_id = ANY(%(cube_ids)s)
+        '''.format(columns=', '.join(AGGREGATE_COLUMNS))]
+        for i, (start, end) in enumerate(segments):
+            params.update({'start_%s' % i: start, 'end_%s' % i: end})
+            parts.append(PRODUCT_SALES_AGGREGATE_QUERY.replace(
+                '%(start)s', '%%(start_%s)s' % i).replace('%(end)s', '%%(end_%s)s' % i))
+        merged_columns = ', '.join(
+            '%s(%s) AS %s' % ({'price_min': 'MIN', 'price_max': 'MAX'}.get(column, 'SUM'), column, column)
+            for column in AGGREGATE_COLUMNS
+        )
+        query = '''
+            SELECT product_id, {merged_columns}
+            FROM ({parts}) parts
+            GROUP BY product_id
+            HAVING SUM(qty) != 0
+            ORDER BY SUM(revenue) DESC, product_id
+        '''.format(merged_columns=merged_columns, parts=' UNION ALL '.join(parts))
+        return query, params
+
+    @api.model
+    def _merge_aggregates(self, rows):
+        merged = {}
+        for row in rows:
+            current = merged.get(row['product_id'])
+            if current is None:
+                merged[row['product_id']] = dict(row)
+                continue
+            for column in AGGREGATE_COLUMNS:
+                if column == 'price_min':
+                    current[column] = min(current[column], row[column])
+                elif column == 'price_max':
+                    current[column] = max(current[column], row[column])
+                else:
+                    current[column] += row[column]
+        for values in merged.values():
+            self._finalize_aggregate(values)
+        return merged
+
+    @api.model
+    def _finalize_aggregate(self, values):
+        """Add the averages and the price standard deviation to merged aggregates"""
+        n = values['line_count']
+        values['avg_price'] = values['price_sum'] / n if n else 0.0
+        values['avg_cost'] = values['cost'] / n if n else 0.0
+        if n > 1:
+            variance = (values['price_sq_sum'] - values['price_sum'] ** 2 / n) / (n - 1)
+            values['price_stddev'] = math.sqrt(max(variance, 0.0))
+        else:
+            values['price_stddev'] = 0.0
+        return values
+
+    @api.model
+    def _cron_build_months(self):
+        """Build the cubes since the first order of every company: the
+        missing and dirty ones, and those not yet holding their whole month.
+        """
+        current = date.today().replace(day=1)
+        for company in self.env['res.company'].search([]):
+            self._cr.execute('''
+                SELECT MIN(date_order) FROM pos_order WHERE company_id = %s
+            ''', (company.id,))
+            first_order = self._cr.fetchone()[0]
+            if not first_order:
+                continue
+            complete = set(self.search([
+                ('company_id', '=', company.id),
+                ('dirty', '=', False),
+                ('built_until', '!=', False),
+            ]).filtered(
+                lambda cube: cube.built_until >= datetime.combine(cube.month + relativedelta(months=1), time.min)
+            ).mapped('month'))
+            month = first_order.date().replace(day=1)
+            while month <= current:
+                if month not in complete:
+                    cube = self._prepare_build(month, company)
+                    self._cr.commit()
+                    try:
+                        cube._build()
+                        self._cr.commit()
+                    except SerializationFailure:
+                        self._cr.rollback()
+                        _logger.info("POS sales cube of %s changed during its build, built on the next run",
+                                     month)
+                month += relativedelta(months=1)
+
+
+class PosProductSalesMonthLine(models.Model):
+    """Aggregates of one product in a monthly sales cube"""
+    _name = 'pos.product.sales.month.line'
+    _description = 'POS Monthly Product Sales Cube Line'
+
+    month_id = fields.Many2one('pos.product.sales.month', string='Month', required=True,
+                               index=True, ondelete='cascade')
+    product_id = fields.Many2one('product.product', string='Product', required=True,
+                                 ondelete='cascade')
+    line_count = fields.Integer('Order Lines')
+    qty = fields.Float('Quantity')
+    sale_qty = fields.Float('Sold Quantity')
+    return_qty = fields.Float('Returned Quantity')
+    price_sum = fields.Float('Sum of Unit Prices')
+    price_sq_sum = fields.Float('Sum of Squared Unit Prices')
+    price_min = fields.Float('Min Unit Price')
+    price_max = fields.Float('Max Unit Price')
+    revenue = fields.Float('Revenue')
+    cost = fields.Float('Cost')
+    order_count = fields.Integer('Orders')
+    days_sold = fields.Integer('Days Sold')
@@ -0,0 +1,521 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+import pytz
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Timezone used to cut POS days when the company has none configured
+DEFAULT_DASHBOARD_TZ = 'Asia/Dubai'
+POS_DONE_STATES = ('paid', 'done', 'invoiced')
+
+
+class PosSalesDaily(models.Model):
+    """Per-day, per-company, per-shop rollup of POS sales.
+
+    One row is kept for each (date, company, pos config) having paid orders.
+    Vendor bill costs are not attached to a shop, they are stored on a row
+    without ``config_id``. Paid and cancelled orders add their amounts to
+    the row of their shop and day, vendor bills recompute the cost of their
+    day, so the dashboard tiles read O(days) rows. An hourly cron rebuilds
+    the last two days from the orders as a safety net.
+    """
+    _name = 'pos.sales.daily'
+    _description = 'POS Daily Sales Rollup'
+    _order = 'date desc, config_id'
+    _rec_name = 'date'
+
+    date = fields.Date('Date', required=True, index=True,
+                       help='Day in the company timezone')
+    company_id = fields.Many2one('res.company', string='Company', required=True, index=True,
+                                 ondelete='cascade')
+    config_id = fields.Many2one('pos.config', string='Point of Sale', ondelete='cascade')
+    sale_amount = fields.Float('Sales', help='Total of the orders with a positive amount')
+    refund_amount = fields.Float('Refunds', help='Total of the refund orders, as a positive amount')
+    net_amount = fields.Float('Net Sales', compute='_compute_net_amount', store=True)
+    order_count = fields.Integer('Orders', help='Number of paid orders, refunds included')
+    refund_count = fields.Integer('Refund Orders')
+    vendor_bill_cost = fields.Float('Vendor Bill Cost',
+                                    help='Total of the vendor bills dated on this day')
+    payment_ids = fields.One2many('pos.sales.daily.payment', 'daily_id', string='Payments')
+    revision = fields.Integer('Revision', help='Number of incremental updates of the row')
+
+    _sql_constraints = [
+        ('date_company_config_uniq', 'unique(date, company_id, config_id)',
+         'Only one rollup row per day and point of sale is allowed.'),
+    ]
+
+    def init(self):
+        super().init()
+        # The unique constraint does not hold for the vendor bill cost rows,
+        # whose config_id is NULL, see _set_vendor_bill_costs
+        self._cr.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS pos_sales_daily_date_company_cost_uniq
+            ON pos_sales_daily (date, company_id) WHERE config_id IS NULL
+        ''')
+
+    @api.depends('sale_amount', 'refund_amount')
+    def _compute_net_amount(self):
+        for record in self:
+            record.net_amount = record.sale_amount - record.refund_amount
+
+    @api.model
+    def _get_company_tz(self, company=None):
+        """Timezone in which the POS days of ``company`` are cut"""
+        company = company or self.env.company
+        return pytz.timezone(company.partner_id.tz or DEFAULT_DASHBOARD_TZ)
+
+    @api.model
+    def _get_local_today(self, company=None):
+        return datetime.now(self._get_company_tz(company)).date()
+
+    @api.model
+    def _get_utc_bounds(self, company, date_from, date_to):
+        """Naive UTC datetimes for the half-open range [date_from, date_to)"""
+        tz = self._get_company_tz(company)
+        start = tz.localize(datetime.combine(date_from, time.min)).astimezone(pytz.utc)
+        end = tz.localize(datetime.combine(date_to, time.min)).astimezone(pytz.utc)
+        return start.replace(tzinfo=None), end.replace(tzinfo=None)
+
+    @api.model
+    def _local_date(self, company, dt):
+        return pytz.utc.localize(dt).astimezone(self._get_company_tz(company)).date()
+
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _add_orders(self, orders, sign=1):
+        """Add paid ``orders`` to the rows of their day and shop.
+
+        Only the amounts of ``orders`` are read, the other orders of the day
+        are left alone. Use ``sign=-1`` to remove orders leaving the paid
+        states.
+        """
+        deltas = {}
+        for order in orders.filtered('date_order'):
+            company = order.company_id
+            key = (company.id, self._local_date(company, order.date_order), order.config_id.id)
+            delta = deltas.setdefault(key, {
+                'sale_amount': 0.0,
+                'refund_amount': 0.0,
+                'order_count': 0,
+                'refund_count': 0,
+                'payments': defaultdict(float),
+            })
+            if order.amount_total >= 0:
+                delta['sale_amount'] += sign * order.amount_total
+            else:
+                delta['refund_amount'] -= sign * order.amount_total
+                delta['refund_count'] += sign
+            delta['order_count'] += sign
+            for payment in order.payment_ids:
+                delta['payments'][payment.payment_method_id.id] += sign * payment.amount
+        self._add_deltas(deltas)
+
+    @api.model
+    def _add_deltas(self, deltas):
+        """Add amounts to the rollup rows, creating the missing rows.
+
+        Each POS terminal only locks the row of its own shop and day, and
+        every update bumps the ``revision`` of the row so that the data
+        version changes.
+
+        Args:
+            deltas (dict): {(company_id, date, config_id): values}, the values
+                holding the sale / refund amounts and order / refund counts
+                to add, and the ``payments`` amounts by payment method id
+        """
+        if not deltas:
+            return
+        self.flush_model()
+        self.env['pos.sales.daily.payment'].flush_model()
+        # Always lock the rows in the same order between transactions
+        for (company_id, day, config_id), delta in sorted(deltas.items()):
+            self._cr.execute('''
+                INSERT INTO pos_sales_daily (date, company_id, config_id, sale_amount, refund_amount,
+                                             net_amount, order_count, refund_count, vendor_bill_cost,
+                                             revision, create_uid, create_date, write_uid, write_date)
+                VALUES (%(date)s, %(company_id)s, %(config_id)s, %(sale_amount)s, %(refund_amount)s,
+                        %(sale_amount)s - %(refund_amount)s, %(order_count)s, %(refund_count)s, 0,
+                        0, %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC')
+                ON CONFLICT (date, company_id, config_id) DO UPDATE SET
+                    sale_amount = pos_sales_daily.sale_amount + excluded.sale_amount,
+                    refund_amount = pos_sales_daily.refund_amount + excluded.refund_amount,
+                    net_amount = pos_sales_daily.net_amount + excluded.net_amount,
+                    order_count = pos_sales_daily.order_count + excluded.order_count,
+                    refund_count = pos_sales_daily.refund_count + excluded.refund_count,
+                    revision = pos_sales_daily.revision + 1,
+                    write_uid = excluded.write_uid,
+                    write_date = excluded.write_date
+                RETURNING id
+            ''', {
+                'date': day,
+                'company_id': company_id,
+                'config_id': config_id,
+                'sale_amount': delta['sale_amount'],
+                'refund_amount': delta['refund_amount'],
+                'order_count': delta['order_count'],
+                'refund_count': delta['refund_count'],
+                'uid': self.env.uid,
+            })
+            [daily_id] = self._cr.fetchone()
+            for payment_method_id, amount in sorted(delta['payments'].items()):
+                self._cr.execute('''
+                    INSERT INTO pos_sales_daily_payment (daily_id, date, company_id, config_id,
+                                                         payment_method_id, amount, create_uid,
+                                                         create_date, write_uid, write_date)
+                    VALUES (%(daily_id)s, %(date)s, %(company_id)s, %(config_id)s,
+                            %(payment_method_id)s, %(amount)s, %(uid)s,
+                            now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC')
+                    ON CONFLICT (daily_id, payment_method_id) DO UPDATE SET
+                        amount = pos_sales_daily_payment.amount + excluded.amount,
+                        write_uid = excluded.write_uid,
+                        write_date = excluded.write_date
+                ''', {
+                    'daily_id': daily_id,
+                    'date': day,
+                    'company_id': company_id,
+                    'config_id': config_id,
+                    'payment_method_id': payment_method_id,
+                    'amount': amount,
+                    'uid': self.env.uid,
+                })
+        self.invalidate_model()
+        self.env['pos.sales.daily.payment'].invalidate_model()
+
+    @api.model
+    def _set_vendor_bill_costs(self, company, dates):
+        """Recompute the vendor bill cost of the given local days.
+
+        The costs are stored on the rows without ``config_id``, the rows of
+        the shops are not touched.
+        """
+        dates = sorted({day for day in dates if day})
+        if not dates:
+            return
+        self.env['account.move'].flush_model(
+            ['company_id', 'state', 'move_type', 'invoice_date', 'amount_total'])
+        self.flush_model()
+        self._cr.execute('''
+            INSERT INTO pos_sales_daily (date, company_id, sale_amount, refund_amount, net_amount,
+                                         order_count, refund_count, vendor_bill_cost, revision,
+                                         create_uid, create_date, write_uid, write_date)
+            SELECT day, %(company_id)s, 0, 0, 0, 0, 0, COALESCE(SUM(am.amount_total), 0), 0,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM unnest(%(dates)s::date[]) AS day
+            LEFT JOIN account_move am ON am.invoice_date = day
+                AND am.company_id = %(company_id)s
+                AND am.state = 'posted'
+                AND am.move_type = 'in_invoice'
+            GROUP BY day
+            ON CONFLICT (date, company_id) WHERE config_id IS NULL DO UPDATE SET
+                vendor_bill_cost = excluded.vendor_bill_cost,
+                revision = pos_sales_daily.revision + 1,
+                write_uid = excluded.write_uid,
+                write_date = excluded.write_date
+        ''', {'company_id': company.id, 'dates': dates, 'uid': self.env.uid})
+        self.invalidate_model()
+
+    @api.model
+    def _refresh(self, company, dates):
+        """Recompute the rollup rows of ``company`` for the given local days.
+
+        Args:
+            company: res.company record
+            dates: iterable of dates in the company timezone
+        """
+        dates = sorted(set(dates))
+        if not dates:
+            return
+        self.env.flush_all()
+        first, last = dates[0], dates[-1] + timedelta(days=1)
+        start, end = self._get_utc_bounds(company, first, last)
+        params = {
+            'company_id': company.id,
+            'tz': self._get_company_tz(company).zone,
+            'start': start,
+            'end': end,
+            'dates': dates,
+            'states': POS_DONE_STATES,
+        }
+        rows = {}
+
+        def row(day, config_id):
+            return rows.setdefault((day, config_id), {
+                'date': day,
+                'company_id': company.id,
+                'config_id': config_id,
+                'sale_amount': 0.0,
+                'refund_amount': 0.0,
+                'order_count': 0,
+                'refund_count': 0,
+                'vendor_bill_cost': 0.0,
+                'payment_ids': [],
+            })
+
+        self._cr.execute('''
+            SELECT * FROM (
+                SELECT (po.date_order AT TIME ZONE 'UTC' AT TIME ZONE %(tz)s)::date AS day,
+                       po.config_id,
+                       COALESCE(SUM(po.amount_total) FILTER (WHERE po.amount_total >= 0), 0) AS sale_amount,
+                       COALESCE(-SUM(po.amount_total) FILTER (WHERE po.amount_total < 0), 0) AS refund_amount,
+                       COUNT(*) AS order_count,
+                       COUNT(*) FILTER (WHERE po.amount_total < 0) AS refund_count
+                FROM pos_order po
+                WHERE po.company_id = %(company_id)s
+                    AND po.date_order >= %(start)s
+                    AND po.date_order < %(end)s
+                    AND po.state IN %(states)s
+                GROUP BY 1, 2
+            ) orders
+            WHERE day = ANY(%(dates)s)
+        ''', params)
+        for rec in self._cr.dictfetchall():
+            row(rec['day'], rec['config_id']).update({
+                'sale_amount': rec['sale_amount'],
+                'refund_amount': rec['refund_amount'],
+                'order_count': rec['order_count'],
+                'refund_count': rec['refund_count'],
+            })
+
+        self._cr.execute('''
+            SELECT * FROM (
+                SELECT (po.date_order AT TIME ZONE 'UTC' AT TIME ZONE %(tz)s)::date AS day,
+                       po.config_id,
+                       pp.payment_method_id,
+                       SUM(pp.amount) AS amount
+                FROM pos_payment pp
+                INNER JOIN pos_order po ON po.id = pp.pos_order_id
+                WHERE po.company_id = %(company_id)s
+                    AND po.date_order >= %(start)s
+                    AND po.date_order < %(end)s
+                    AND po.state IN %(states)s
+                GROUP BY 1, 2, 3
+            ) payments
+            WHERE day = ANY(%(dates)s)
+        ''', params)
+        for rec in self._cr.dictfetchall():
+            row(rec['day'], rec['config_id'])['payment_ids'].append((0, 0, {
+                'payment_method_id': rec['payment_method_id'],
+                'amount': rec['amount'],
+            }))
+
+        self._cr.execute('''
+            SELECT invoice_date AS day, SUM(amount_total) AS cost
+            FROM account_move
+            WHERE company_id = %(company_id)s
+                AND state = 'posted'
+                AND move_type = 'in_invoice'
+                AND invoice_date = ANY(%(dates)s)
+            GROUP BY invoice_date
+        ''', params)
+        for rec in self._cr.dictfetchall():
+            row(rec['day'], False)['vendor_bill_cost'] = rec['cost']
+
+        self.search([('company_id', '=', company.id), ('date', 'in', dates)]).unlink()
+        self.create(list(rows.values()))
+
+    @api.model
+    def _rebuild(self, date_from=None, company=None):
+        """Recompute every day from ``date_from`` (or the first order) until today."""
+        companies = company or self.env['res.company'].search([])
+        for company in companies:
+            self._cr.execute('''
+                SELECT MIN(date_order) FROM pos_order WHERE company_id = %s
+            ''', (company.id,))
+            first_order = self._cr.fetchone()[0]
+            start = date_from or (first_order and self._local_date(company, first_order))
+            if not start:
+                continue
+            today = self._get_local_today(company)
+            days = [start + timedelta(days=i) for i in range((today - start).days + 1)]
+            # Refresh month by month to keep each transaction reasonably small
+            for i in range(0, len(days), 31):
+                self._refresh(company, days[i:i + 31])
+            _logger.info("POS daily sales rollup rebuilt for %s from %s", company.name, start)
+
+    @api.model
+    def _cron_refresh_recent(self):
+        """Safety net for changes made outside the ORM hooks (imports, SQL fixes)"""
+        for company in self.env['res.company'].search([]):
+            today = self._get_local_today(company)
+            self._refresh(company, [today - timedelta(days=1), today])
+
+    # ------------------------------------------------------------------
+    # Readers used by the dashboard
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _get_data_version(self, company=None):
+        """Version of the POS data of ``company``, used to key cached results.
+
+        Incremental updates bump the revision of their row, and new rows get
+        a higher id; a cron refresh deletes the rows of its days and creates
+        the new ones, so either the highest id grows or the row count drops.
+        The triple changes whenever an order is paid or cancelled, or a
+        vendor bill is posted or reset, and never repeats.
+        """
+        company = company or self.env.company
+        self.flush_model(['company_id', 'revision'])
+        self._cr.execute('''
+            SELECT MAX(id), COUNT(*), COALESCE(SUM(revision), 0)
+            FROM pos_sales_daily WHERE company_id = %s
+        ''', (company.id,))
+        return tuple(self._cr.fetchone())
+
+    @api.model
+    def _get_totals(self, date_from=None, date_to=None, company=None):
+        """Sum the rollup between two local days, both included.
+
+        Returns:
+            dict: sale, refund, net, order/refund counts and vendor bill cost
+        """
+        company = company or self.env.company
+        domain = [('company_id', '=', company.id)]
+        if date_from:
+            domain.append(('date', '>=', date_from))
+        if date_to:
+            domain.append(('date', '<=', date_to))
+        [(sale, refund, orders, refunds, cost)] = self._read_group(
+            domain, [], ['sale_amount:sum', 'refund_amount:sum', 'order_count:sum',
+                         'refund_count:sum', 'vendor_bill_cost:sum'])
+        sale, refund, cost = sale or 0.0, refund or 0.0, cost or 0.0
+        return {
+            'sale_amount': sale,
+            'refund_amount': refund,
+            'net_amount': sale - refund,
+            'order_count': orders or 0,
+            'refund_count': refunds or 0,
+            'vendor_bill_cost': cost,
+        }
+
+    @api.model
+    def _get_monthly_series(self, months=12, last_month=None, company=None):
+        """Monthly sale, cost, expense, gross and net figures.
+
+        Whatever the number of months, this costs two grouped queries: one
+        on the daily rollup and one on the expense journal items.
+
+        Args:
+            months (int): number of months in the series
+            last_month (date): any day of the last month, defaults to today
+            company: res.company record, defaults to the current company
+
+        Returns:
+            list: one dict per month, oldest first, months without activity included
+        """
+        company = company or self.env.company
+        last_month = (last_month or self._get_local_today(company)).replace(day=1)
+        first_month = last_month - relativedelta(months=months - 1)
+        end = last_month + relativedelta(months=1)
+        series = {
+            first_month + relativedelta(months=i): {
+                'month': first_month + relativedelta(months=i),
+                'sale': 0.0,
+                'cost': 0.0,
+                'expense': 0.0,
+                'order_count': 0,
+            } for i in range(months)
+        }
+
+        groups = self._read_group(
+            [('company_id', '=', company.id), ('date', '>=', first_month), ('date', '<', end)],
+            ['date:month'], ['net_amount:sum', 'vendor_bill_cost:sum', 'order_count:sum'])
+        for month, sale, cost, order_count in groups:
+            series[month].update({
+                'sale': sale or 0.0,
+                'cost': cost or 0.0,
+                'order_count': order_count or 0,
+            })
+
+        self.env['account.move.line'].flush_model(['date', 'debit', 'company_id', 'parent_state', 'account_id'])
+        self._cr.execute('''
+            SELECT date_trunc('month', aml.date)::date AS month, SUM(aml.debit) AS expense
+            FROM account_move_line aml
+            INNER JOIN account_account aa ON aa.id = aml.account_id
+            WHERE aml.company_id = %s
+                AND aml.date >= %s
+                AND aml.date < %s
+                AND aml.parent_state = 'posted'
+                AND aa.account_type = 'expense'
+            GROUP BY 1
+        ''', (company.id, first_month, end))
+        for month, expense in self._cr.fetchall():
+            series[month]['expense'] = expense or 0.0
+
+        result = []
+        for month in sorted(series):
+            values = series[month]
+            values.update({
+                'gross_profit': values['sale'] - values['cost'],
+                'net_income': values['sale'] - values['expense'],
+            })
+            result.append(values)
+        return result
+
+    @api.model
+    def _get_payment_totals(self, date_from, date_to, company=None):
+        """Payment method totals between two local days, largest first.
+
+        The method name is returned as stored (translated jsonb), like the
+        raw queries on pos_payment did, so the dashboard template is unchanged.
+        """
+        company = company or self.env.company
+        self.env['pos.sales.daily.payment'].flush_model()
+        self._cr.execute('''
+            SELECT ppm.name, SUM(p.amount)
+            FROM pos_sales_daily_payment p
+            INNER JOIN pos_payment_method ppm ON ppm.id = p.payment_method_id
+            WHERE p.company_id = %s AND p.date >= %s AND p.date <= %s
+            GROUP BY ppm.id, ppm.name
+            ORDER BY SUM(p.amount) DESC
+        ''', (company.id, date_from, date_to))
+        return self._cr.fetchall()
+
+
+class PosSalesDailyPayment(models.Model):
+    """Payment method totals of a daily rollup row"""
+    _name = 'pos.sales.daily.payment'
+    _description = 'POS Daily Sales Rollup Payment'
+
+    daily_id = fields.Many2one('pos.sales.daily', string='Daily Rollup', required=True,
+                               index=True, ondelete='cascade')
+    date = fields.Date(related='daily_id.date', store=True, index=True)
+    company_id = fields.Many2one(related='daily_id.company_id', store=True)
+    config_id = fields.Many2one(related='daily_id.config_id', store=True)
+    payment_method_id = fields.Many2one('pos.payment.method', string='Payment Method',
+                                        required=True, ondelete='cascade')
+    amount = fields.Float('Amount')
+
+    _sql_constraints = [
+        ('daily_payment_method_uniq', 'unique(daily_id, payment_method_id)',
+         'Only one total per payment method and rollup row is allowed.'),
+    ]
+
+
+class AccountMove(models.Model):
+    _inherit = 'account.move'
+
+    def _post(self, soft=True):
+        posted = super()._post(soft=soft)
+        posted._update_pos_sales_daily_costs()
+        return posted
+
+    def button_draft(self):
+        res = super().button_draft()
+        self._update_pos_sales_daily_costs()
+        return res
+
+    def _update_pos_sales_daily_costs(self):
+        bills = self.filtered(lambda m: m.move_type == 'in_invoice' and m.invoice_date)
+        for company in bills.company_id:
+            self.env['pos.sales.daily'].sudo()._set_vendor_bill_costs(
+                company, bills.filtered(lambda m: m.company_id == company).mapped('invoice_date'))
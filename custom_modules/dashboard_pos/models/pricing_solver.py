@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+class PricingScenarioSolver(object):
+    """Array-backed solver for the pricing scenarios of a month.
+
+    Products are held as parallel NumPy arrays so that break-even prices and
+    uniform or weighted uplifts are computed for every SKU in one pass.
+
+    The weighted scenario gives each product an uplift proportional to its
+    revenue share ``w_i``, never below its cost floor ``f_i = cost/price - 1``,
+    while the revenue-weighted uplift stays equal to the budget ``x``::
+
+        x_i = max(f_i, lambda * w_i)    with    sum(w_i * x_i) = x
+
+    ``sum(w_i * max(f_i, lambda * w_i))`` is piecewise linear and increasing
+    in ``lambda``, with a breakpoint at ``f_i / w_i`` for each product, so
+    ``lambda`` is found exactly by water-filling over the sorted breakpoints
+    instead of iterating. Many budgets are solved at once with a single
+    ``searchsorted``.
+    """
+
+    def __init__(self, product_data):
+        self.names = [item['product_name'] for item in product_data]
+        self.qty = np.array([item['qty'] for item in product_data], dtype=float)
+        self.price = np.array([item['price'] for item in product_data], dtype=float)
+        self.cost = np.array([item['cost'] for item in product_data], dtype=float)
+        self.revenue = self.qty * self.price
+        self.R = float(self.revenue.sum())
+        positive = self.price > 0
+        self.floor = np.zeros_like(self.price)
+        np.divide(self.cost, self.price, out=self.floor, where=positive)
+        self.floor = np.where(positive, self.floor - 1, 0.0)
+        self._prepare_water_filling()
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def x_min(self):
+        """Smallest uniform uplift that keeps every price above its cost"""
+        positive = self.price > 0
+        return max(0.0, float(self.floor[positive].max())) if positive.any() else 0.0
+
+    def _prepare_water_filling(self):
+        """Sort the breakpoints of the weighted budget function once"""
+        weights = self.revenue / self.R if self.R > 0 else np.zeros_like(self.revenue)
+        # Returns can give a negative revenue share, they take no budget
+        self.weights = np.clip(weights, 0.0, None)
+        self.active = self.weights > 0
+        w = self.weights[self.active]
+        f = self.floor[self.active]
+        order = np.argsort(f / w)
+        self._w = w[order]
+        self._f = f[order]
+        self._breakpoints = (f / w)[order]
+        # Items 0..k follow lambda * w_i beyond breakpoint k, the others sit on their floor
+        self._active_w2 = np.cumsum(self._w ** 2)
+        wf = self._w * self._f
+        self._floor_after = wf[::-1].cumsum()[::-1] - wf
+        self._budget_at_breakpoints = self._floor_after + self._breakpoints * self._active_w2
+
+    def solve_lambda(self, budgets):
+        """Water level for each budget of the weighted scenario"""
+        budgets = np.atleast_1d(np.asarray(budgets, dtype=float))
+        if not len(self._breakpoints):
+            return np.zeros_like(budgets)
+        k = np.searchsorted(self._budget_at_breakpoints, budgets, side='right') - 1
+        # Below the first breakpoint every item is on its floor
+        below = k < 0
+        k = np.clip(k, 0, None)
+        lam = (budgets - self._floor_after[k]) / self._active_w2[k]
+        return np.where(below, self._breakpoints[0], lam)
+
+    def weighted_uplifts(self, budgets):
+        """Per-item uplifts, one row per budget"""
+        lam = self.solve_lambda(budgets)
+        return np.maximum(self.floor[None, :], lam[:, None] * self.weights[None, :])
+
+    def uniform_uplifts(self, budgets):
+        budgets = np.atleast_1d(np.asarray(budgets, dtype=float))
+        return np.maximum(self.floor[None, :], budgets[:, None])
+
+    def break_even_prices(self, expenses, revenue):
+        return self.cost + expenses * self.price / revenue
+
+    def high_uplift_count(self):
+        """Number of items needing more than twice their price to reach cost"""
+        return int(np.count_nonzero((self.price > 0) & (self.floor > 1.0)))
+
+    def uplift_rows(self, uplifts):
+        """Scenario rows for one vector of per-item uplifts"""
+        price_target = self.price * (1 + uplifts)
+        margin_after = np.zeros_like(price_target)
+        np.divide((price_target - self.cost) * 100, price_target, out=margin_after, where=price_target > 0)
+        columns = zip(
+            self.names,
+            self.qty.round(2).tolist(),
+            self.cost.round(2).tolist(),
+            self.price.round(2).tolist(),
+            price_target.round(2).tolist(),
+            (uplifts * 100).round(2).tolist(),
+            margin_after.round(2).tolist(),
+        )
+        return [{
+            'product': name,
+            'qty': qty,
+            'cost': cost,
+            'price_real': price,
+            'price_target': target,
+            'pct': pct,
+            'margin_after': margin,
+        } for name, qty, cost, price, target, pct, margin in columns]
+
+    def break_even_rows(self, expenses, revenue):
+        price_be = self.break_even_prices(expenses, revenue)
+        diff = self.price - price_be
+        diff_pct = np.zeros_like(price_be)
+        np.divide(self.price, price_be, out=diff_pct, where=price_be > 0)
+        diff_pct = np.where(price_be > 0, (diff_pct - 1) * 100, 0.0)
+        columns = zip(
+            self.names,
+            self.qty.round(2).tolist(),
+            self.cost.round(2).tolist(),
+            self.price.round(2).tolist(),
+            price_be.round(2).tolist(),
+            diff.round(2).tolist(),
+            diff_pct.round(2).tolist(),
+        )
+        return [{
+            'product': name,
+            'qty': qty,
+            'cost': cost,
+            'price_real': price,
+            'price_target': target,
+            'diff': d,
+            'diff_pct': d_pct,
+        } for name, qty, cost, price, target, d, d_pct in columns]
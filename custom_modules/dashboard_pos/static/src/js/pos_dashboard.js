@@ -1755,6 +1755,18 @@ export class PosDashboard extends Component {
   // Export monthly sales data
   async exportMonthlySalesData(monthStart, monthEnd, format = 'csv') {
     try {
+      if (format === 'csv' || format === 'excel') {
+        // Streamed by the server, the browser saves the response as it arrives
+        const params = new URLSearchParams({ month_start: monthStart, month_end: monthEnd, format });
+        const link = document.createElement('a');
+        link.href = `/api/pricing-scenarios/export?${params}`;
+        document.body.appendChild(link);
+        link.click();
+        document.body.removeChild(link);
+        this.showToast(`Exporting data as ${format.toUpperCase()}`, 'success');
+        return;
+      }
+
       const result = await this.orm.call('pos.order', 'export_monthly_sales_data', [monthStart, monthEnd, format]);
 
       if (result) {
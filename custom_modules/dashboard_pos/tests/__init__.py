@@ -3,3 +3,8 @@ from . import test_pricing_scenarios
 from . import test_expense_integration
 from . import test_vat_conversion
 from . import test_action_buttons
+from . import test_sales_daily
+from . import test_customer_segments
+from . import test_dashboard_cache
+from . import test_product_sales_month
+from . import test_dashboard_benchmark
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase
+
+
+class TestCustomerSegments(TransactionCase):
+    """Test the batched POS customer segmentation"""
+
+    def setUp(self):
+        super().setUp()
+        self.partner_model = self.env['res.partner']
+        self.company = self.env.company
+        self.partner = self.partner_model.create({
+            'name': 'Segment Customer',
+            'company_id': self.company.id
+        })
+
+    def test_partner_without_orders_is_inactive(self):
+        """Test that a customer without any order is flagged inactive"""
+        self.partner._update_pos_customer_segments(self.company)
+        self.assertEqual(self.partner.is_new_customer, 0)
+        self.assertTrue(self.partner.inactive_customer)
+
+    def test_full_segmentation_covers_company_partners(self):
+        """Test that the cron segments every partner of the company"""
+        self.partner.write({'inactive_customer': False})
+        self.partner_model._cron_update_pos_customer_segments()
+        self.assertTrue(self.partner.inactive_customer)
+
+    def test_dashboard_read_does_not_segment(self):
+        """Test that loading the dashboard only counts stored segments"""
+        self.partner.write({'inactive_customer': False})
+        self.env['pos.order'].get_refund_details()
+        self.assertFalse(self.partner.inactive_customer)
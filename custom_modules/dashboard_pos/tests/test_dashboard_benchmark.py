@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Load benchmark of the dashboard RPC methods and the pricing scenario routes.
+
+Synthetic POS history is generated in SQL at the requested scale, then each
+public dashboard method and ``/api/pricing-scenarios/*`` route is timed and
+its SQL queries counted. The run fails when a target needs more queries, or
+is clearly slower, than its baseline in ``benchmark_baselines.json``, or has
+no baseline yet (see ``odoo.addons.benchmark_base.tests.common``).
+
+Excluded from the standard test run, start it with::
+
+    odoo-bin -d <db> -i dashboard_pos --test-tags dashboard_pos_benchmark
+
+Environment variables:
+    DASHBOARD_POS_BENCH_SCALE: order lines to generate, '10k', '100k' or '1m'
+    DASHBOARD_POS_BENCH_PARTNERS: number of customers (defaults by scale)
+    DASHBOARD_POS_BENCH_PRODUCTS: number of SKUs (defaults by scale)
+    DASHBOARD_POS_BENCH_ROUNDS: calls per target, the median time is kept
+    DASHBOARD_POS_BENCH_RECORD: set to 1 to write the measures as baselines
+"""
+import json
+import os
+import time
+import uuid
+from datetime import date, datetime
+
+from dateutil.relativedelta import relativedelta
+
+from odoo.tests import HttpCase, tagged
+from odoo.addons.benchmark_base.tests.common import BenchmarkCase
+from odoo.addons.dashboard_pos.models.dashboard_cache import dashboard_cache
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+LINES_PER_ORDER = 10
+HISTORY_DAYS = 400
+
+
+@tagged('post_install', '-at_install', '-standard', 'dashboard_pos_benchmark')
+class TestDashboardBenchmark(BenchmarkCase, HttpCase):
+    """Query count and latency of the dashboard at scale"""
+
+    benchmark_name = 'dashboard_pos'
+    benchmark_env_prefix = 'DASHBOARD_POS_BENCH'
+    benchmark_baselines_path = os.path.join(os.path.dirname(__file__), 'benchmark_baselines.json')
+    # Order lines, customers and SKUs of each scale
+    benchmark_scales = {
+        '10k': (10000, 100, 200),
+        '100k': (100000, 1000, 1000),
+        '1m': (1000000, 10000, 5000),
+    }
+    benchmark_default_scale = '10k'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        line_count, partner_count, product_count = cls._setup_benchmark()
+        cls.partner_count = int(cls._get_benchmark_setting('PARTNERS', partner_count))
+        cls.product_count = int(cls._get_benchmark_setting('PRODUCTS', product_count))
+        cls.order_count = max(line_count // LINES_PER_ORDER, 1)
+
+        start = time.perf_counter()
+        cls._generate_pos_data()
+        _logger.info('dashboard_pos benchmark: %s orders, %s lines generated in %.1fs',
+                     cls.order_count, cls.order_count * LINES_PER_ORDER, time.perf_counter() - start)
+
+        last_month = date.today().replace(day=1) - relativedelta(months=1)
+        cls.month = last_month.strftime('%Y-%m')
+        cls.month_start = last_month.strftime('%Y-%m-%d')
+        cls.month_end = (last_month + relativedelta(months=1)).strftime('%Y-%m-%d')
+
+    @classmethod
+    def _generate_pos_data(cls):
+        """Customers and SKUs through the ORM, orders, lines and payments in SQL"""
+        env = cls.env
+        company = env.company
+        partners = env['res.partner'].create([
+            {'name': 'Benchmark Customer %05d' % i} for i in range(cls.partner_count)
+        ])
+        products = env['product.product'].create([{
+            'name': 'Benchmark SKU %05d' % i,
+            'available_in_pos': True,
+            'list_price': 5.0 + i % 200,
+            'standard_price': (5.0 + i % 200) * 0.6,
+        } for i in range(cls.product_count)])
+
+        config = env['pos.config'].search([
+            ('company_id', '=', company.id), ('payment_method_ids', '!=', False)], limit=1)
+        if not config:
+            payment_method = env['pos.payment.method'].create({
+                'name': 'Benchmark Customer Account',
+                'split_transactions': True,
+            })
+            config = env['pos.config'].create({
+                'name': 'Benchmark POS',
+                'payment_method_ids': [(6, 0, payment_method.ids)],
+            })
+        session = config.current_session_id or env['pos.session'].create({
+            'config_id': config.id,
+            'user_id': env.uid,
+        })
+        env.flush_all()
+
+        params = {
+            'session_id': session.id,
+            'config_id': config.id,
+            'company_id': company.id,
+            'payment_method_id': config.payment_method_ids[:1].id,
+            'uid': env.uid,
+            'now': datetime.now().replace(microsecond=0),
+            'days': HISTORY_DAYS,
+            'order_count': cls.order_count,
+            'lines_per_order': LINES_PER_ORDER,
+            'partner_ids': partners.ids,
+            'partner_count': len(partners),
+            'product_ids': products.ids,
+            'prices': products.mapped('list_price'),
+            'product_count': len(products),
+        }
+        cr = env.cr
+        cr.execute('''
+            INSERT INTO pos_order (name, pos_reference, session_id, config_id, company_id,
+                                   partner_id, user_id, date_order, state, amount_tax,
+                                   amount_total, amount_paid, amount_return,
+                                   create_uid, create_date, write_uid, write_date)
+            SELECT 'BENCH/' || i, 'BENCH-' || i, %(session_id)s, %(config_id)s, %(company_id)s,
+                   (%(partner_ids)s::int[])[1 + i %% %(partner_count)s], %(uid)s,
+                   %(now)s - (i %% %(days)s) * interval '1 day' - (i * 7919 %% 86400) * interval '1 second',
+                   'paid', 0, 0, 0, 0, %(uid)s, %(now)s, %(uid)s, %(now)s
+            FROM generate_series(1, %(order_count)s) AS i
+        ''', params)
+        # One order in fifty is a refund, lines spread over the whole catalog
+        cr.execute('''
+            INSERT INTO pos_order_line (name, full_product_name, order_id, product_id, company_id,
+                                        qty, price_unit, discount, price_subtotal,
+                                        price_subtotal_incl, total_cost,
+                                        create_uid, create_date, write_uid, write_date)
+            SELECT 'BENCH-L' || l.n || '-' || l.k, '', l.id, (%(product_ids)s::int[])[l.idx],
+                   %(company_id)s, l.qty, (%(prices)s::float[])[l.idx], 0,
+                   l.qty * (%(prices)s::float[])[l.idx],
+                   l.qty * (%(prices)s::float[])[l.idx] * 1.05,
+                   l.qty * (%(prices)s::float[])[l.idx] * 0.6,
+                   %(uid)s, %(now)s, %(uid)s, %(now)s
+            FROM (
+                SELECT o.id, o.n, k,
+                       1 + (o.n * 31 + k * 17) %% %(product_count)s AS idx,
+                       CASE WHEN o.n %% 50 = 0 THEN -1 ELSE 1 + (o.n + k) %% 3 END AS qty
+                FROM (
+                    SELECT id, row_number() OVER (ORDER BY id) AS n
+                    FROM pos_order WHERE session_id = %(session_id)s AND name LIKE 'BENCH/%%'
+                ) o
+                CROSS JOIN generate_series(1, %(lines_per_order)s) AS k
+            ) l
+        ''', params)
+        cr.execute('''
+            UPDATE pos_order po
+            SET amount_total = s.total, amount_paid = s.total, amount_tax = s.total - s.untaxed
+            FROM (
+                SELECT order_id, SUM(price_subtotal_incl) AS total, SUM(price_subtotal) AS untaxed
+                FROM pos_order_line
+                WHERE order_id IN (
+                    SELECT id FROM pos_order WHERE session_id = %(session_id)s AND name LIKE 'BENCH/%%'
+                )
+                GROUP BY order_id
+            ) s
+            WHERE po.id = s.order_id
+        ''', params)
+        cr.execute('''
+            INSERT INTO pos_payment (pos_order_id, session_id, company_id, payment_method_id,
+                                     amount, payment_date, create_uid, create_date, write_uid, write_date)
+            SELECT id, session_id, company_id, %(payment_method_id)s, amount_total, date_order,
+                   %(uid)s, %(now)s, %(uid)s, %(now)s
+            FROM pos_order
+            WHERE session_id = %(session_id)s AND name LIKE 'BENCH/%%'
+        ''', params)
+        cr.execute('ANALYZE pos_order')
+        cr.execute('ANALYZE pos_order_line')
+        cr.execute('ANALYZE pos_payment')
+        env.invalidate_all()
+
+        env['pos.sales.daily']._rebuild()
+        env['res.partner']._update_pos_customer_segments(company)
+        env.flush_all()
+        dashboard_cache.clear()
+
+    def test_dashboard_rpc(self):
+        """Benchmark the public pos.order methods called by the dashboard"""
+        pos_order = self.env['pos.order'].with_context(dashboard_no_cache=True)
+        calls = {
+            'get_target': lambda: pos_order.get_target(100000),
+            'get_all_data': lambda: pos_order.get_all_data(self.month_start, self.month_end),
+            'get_details': lambda: pos_order.get_details(),
+            'get_refund_details': lambda: pos_order.get_refund_details(),
+            'get_the_top_customer': lambda: pos_order.get_the_top_customer(),
+            'get_the_top_products': lambda: pos_order.get_the_top_products(),
+            'get_the_top_categories': lambda: pos_order.get_the_top_categories(),
+            'get_pricing_scenarios': lambda: pos_order.get_pricing_scenarios(self.month),
+            'calculate_custom_net_scenarios': lambda: pos_order.calculate_custom_net_scenarios(
+                self.month, [5000, 10000, 25000]),
+            'get_complete_monthly_sales_data': lambda: pos_order.get_complete_monthly_sales_data(
+                self.month_start, self.month_end),
+            'get_product_performance_analysis': lambda: pos_order.get_product_performance_analysis(
+                self.month_start, self.month_end),
+            'get_category_analysis': lambda: pos_order.get_category_analysis(
+                self.month_start, self.month_end),
+            'export_monthly_sales_data': lambda: pos_order.export_monthly_sales_data(
+                self.month_start, self.month_end, 'csv'),
+        }
+        for option in ('pos_today_sales_cost', 'pos_week_sales_cost', 'pos_month_sales_cost'):
+            calls['get_sale_vs_cost:%s' % option] = lambda option=option: pos_order.get_sale_vs_cost(option)
+        for option in ('pos_hourly_sales', 'pos_weekly_sales', 'pos_monthly_sales'):
+            calls['get_department:%s' % option] = lambda option=option: pos_order.get_department(option)
+
+        results = {name: self._measure(call) for name, call in calls.items()}
+        self._check_baselines(results)
+
+    def test_pricing_scenario_routes(self):
+        """Benchmark the /api/pricing-scenarios/* HTTP routes"""
+        self.authenticate('admin', 'admin')
+
+        def get(url):
+            def call():
+                response = self.url_open(url, timeout=600)
+                self.assertLess(response.status_code, 500, url)
+            return call
+
+        def post_custom():
+            response = self.url_open('/api/pricing-scenarios/custom', timeout=600, data=json.dumps({
+                'month': self.month,
+                'targets': [5000, 10000, 25000],
+            }), headers={'Content-Type': 'application/json'})
+            self.assertLess(response.status_code, 500)
+
+        def post_apply(mode, dry_run):
+            def call():
+                result = self.make_jsonrpc_request('/api/pricing-scenarios/apply', {
+                    'month': self.month,
+                    'scenario': 'net_custom',
+                    'mode': mode,
+                    'target': 10000,
+                    'dry_run': dry_run,
+                    # A new price list on every call
+                    'idempotency_key': str(uuid.uuid4()),
+                })
+                self.assertNotEqual(result.get('status'), 'error', result.get('message'))
+            return call
+
+        calls = {
+            'route:/api/pricing-scenarios': get('/api/pricing-scenarios?month=%s' % self.month),
+            'route:/api/pricing-scenarios/custom': post_custom,
+            'route:/api/pricing-scenarios/date-range': get(
+                '/api/pricing-scenarios/date-range?start_date=%s&end_date=%s' % (self.month_start, self.month_end)),
+            'route:/api/pricing-scenarios/months': get('/api/pricing-scenarios/months'),
+            'route:/api/pricing-scenarios/available-months': get('/api/pricing-scenarios/available-months'),
+            'route:/api/pricing-scenarios/export:csv': get(
+                '/api/pricing-scenarios/export?month_start=%s&month_end=%s&format=csv' % (
+                    self.month_start, self.month_end)),
+            'route:/api/pricing-scenarios/export:excel': get(
+                '/api/pricing-scenarios/export?month_start=%s&month_end=%s&format=excel' % (
+                    self.month_start, self.month_end)),
+        }
+        for mode in ('uniform', 'weighted'):
+            calls['route:/api/pricing-scenarios/apply:%s:preview' % mode] = post_apply(mode, True)
+            calls['route:/api/pricing-scenarios/apply:%s' % mode] = post_apply(mode, False)
+        results = {name: self._measure(call) for name, call in calls.items()}
+        self._check_baselines(results)
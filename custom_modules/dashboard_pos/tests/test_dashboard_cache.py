@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+from odoo.tests.common import TransactionCase
+from odoo.addons.dashboard_pos.models.dashboard_cache import DashboardCache, dashboard_cache
+
+
+class TestDashboardCache(TransactionCase):
+    """Test the shared result cache of the dashboard RPC methods"""
+
+    def setUp(self):
+        super().setUp()
+        self.pos_order_model = self.env['pos.order']
+        dashboard_cache.clear()
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = DashboardCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), (True, 1))
+        self.assertEqual(cache.get('b'), (False, None))
+        self.assertEqual(cache.get('c'), (True, 3))
+
+    def test_ttl_expiry(self):
+        """Test that entries expire after the TTL"""
+        cache = DashboardCache(maxsize=2, ttl=60)
+        with patch('odoo.addons.dashboard_pos.models.dashboard_cache.time.monotonic', return_value=0):
+            cache.set('a', 1)
+        with patch('odoo.addons.dashboard_pos.models.dashboard_cache.time.monotonic', return_value=61):
+            self.assertEqual(cache.get('a'), (False, None))
+
+    def test_results_shared_until_version_changes(self):
+        """Test that a dashboard method is computed once per data version"""
+        rollup_model = self.env['pos.sales.daily']
+        first = self.pos_order_model.get_the_top_products()
+        misses = dashboard_cache.misses
+        self.assertIs(self.pos_order_model.get_the_top_products(), first)
+        self.assertEqual(dashboard_cache.misses, misses)
+
+        rollup_model._set_vendor_bill_costs(self.env.company, [rollup_model._get_local_today()])
+        self.assertIsNot(self.pos_order_model.get_the_top_products(), first)
+        self.assertEqual(dashboard_cache.misses, misses + 1)
@@ -4,6 +4,7 @@ from unittest.mock import Mock, patch
 from datetime import date, datetime
 from odoo.tests.common import TransactionCase
 from odoo.exceptions import ValidationError
+from odoo.addons.dashboard_pos.models.pricing_solver import PricingScenarioSolver
 
 
 class TestPricingScenarios(TransactionCase):
@@ -277,6 +278,62 @@ class TestPricingScenarios(TransactionCase):
         break_even_data = self.pos_order_model._calculate_break_even(zero_revenue_data, totals)
         self.assertEqual(len(break_even_data), 0)  # Should return empty list
 
+    def test_weighted_uplift_meets_budget(self):
+        """Test that weighted uplifts keep the revenue-weighted budget"""
+        problematic_data = self.sample_product_data + [
+            {
+                'product_name': 'Product D',
+                'qty': 20.0,
+                'price': 40.0,
+                'cost': 52.0  # Needs a 30% uplift to reach cost
+            }
+        ]
+        solver = PricingScenarioSolver(problematic_data)
+        budgets = [solver.x_min, 0.35, 0.5]
+        uplifts = solver.weighted_uplifts(budgets)
+
+        for i, budget in enumerate(budgets):
+            self.assertAlmostEqual(float((uplifts[i] * solver.weights).sum()), budget, places=9)
+            # Every item stays at or above its cost floor
+            self.assertTrue(all(uplifts[i] >= solver.floor - 1e-12))
+
+    def test_calculate_net_targets(self):
+        """Test the scenarios of several targets against hand-computed values"""
+        totals = {
+            'R': 12200.0,
+            'G': 2200.0,
+            'E': 1800.0,
+            'N': 400.0,
+            'x_min': 0.0
+        }
+        targets = [1000.0, 5000.0, 10000.0]
+
+        results = self.pos_order_model._calculate_net_targets(self.sample_product_data, totals, targets)
+
+        self.assertEqual(len(results), 3)
+        # x = (target - N) / R: 600 / 12200, 4600 / 12200 and 9600 / 12200
+        self.assertEqual([result['uniform']['x'] for result in results], [0.0492, 0.377, 0.7869])
+        self.assertEqual([result['weighted']['x_budget'] for result in results], [0.0492, 0.377, 0.7869])
+        # Above 30% of uplift a target is unrealistic
+        self.assertEqual([result['uniform']['unrealistic'] for result in results], [False, True, True])
+
+        # Every floor is negative, so the uniform uplift is x for each product
+        uniform_rows = results[0]['uniform']['rows']
+        self.assertEqual([row['pct'] for row in uniform_rows], [4.92, 4.92, 4.92])
+        self.assertEqual([row['price_target'] for row in uniform_rows], [104.92, 83.93, 62.95])
+
+        # Revenue shares 0.5, 0.32 and 0.18: x_i = x * w_i / sum(w_i^2), sum(w_i^2) = 0.3848
+        weighted = results[0]['weighted']
+        self.assertEqual([row['pct'] for row in weighted['rows']], [6.39, 4.09, 2.3])
+        self.assertEqual([row['price_target'] for row in weighted['rows']], [106.39, 83.27, 61.38])
+        self.assertEqual(weighted['x_range'], [2.3, 6.39])
+        weighted = results[2]['weighted']
+        self.assertEqual([row['pct'] for row in weighted['rows']], [102.25, 65.44, 36.81])
+        self.assertEqual([row['price_target'] for row in weighted['rows']], [202.25, 132.35, 82.09])
+
+        for target, result in zip(targets, results):
+            single = self.pos_order_model._calculate_net_target(self.sample_product_data, totals, target)
+            self.assertEqual(result, single)
 
 if __name__ == '__main__':
     unittest.main()
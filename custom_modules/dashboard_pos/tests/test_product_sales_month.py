@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+from odoo import fields
+from odoo.tests.common import TransactionCase
+from datetime import date, datetime
+
+from dateutil.relativedelta import relativedelta
+
+
+class TestProductSalesMonth(TransactionCase):
+    """Test the monthly product sales cube"""
+
+    def setUp(self):
+        super().setUp()
+        self.cube_model = self.env['pos.product.sales.month']
+        self._create_orders()
+
+    def _create_orders(self):
+        """Paid orders of three products between January and March 2020"""
+        env = self.env
+        config = env['pos.config'].create({'name': 'Sales Cube Test POS'})
+        session = env['pos.session'].create({'config_id': config.id, 'user_id': env.uid})
+        self.product_a, self.product_b, self.product_c = env['product.product'].create([
+            {'name': 'Sales Cube Product A', 'available_in_pos': True},
+            {'name': 'Sales Cube Product B', 'available_in_pos': True},
+            {'name': 'Sales Cube Product C', 'available_in_pos': True},
+        ])
+        env.flush_all()
+        self.config, self.session = config, session
+        self.order_count = 0
+        orders = [
+            (datetime(2020, 1, 20, 10), [(self.product_a, 2, 10.0), (self.product_b, 1, 30.0)]),
+            (datetime(2020, 2, 10, 10), [(self.product_a, 3, 12.0), (self.product_c, 1, 5.0)]),
+            (datetime(2020, 2, 20, 10), [(self.product_a, 1, 8.0), (self.product_b, 2, 30.0)]),
+            # A return on the first day of March
+            (datetime(2020, 3, 1, 10), [(self.product_b, -1, 30.0)]),
+        ]
+        for date_order, lines in orders:
+            self._insert_order(date_order, lines)
+
+    def _insert_order(self, date_order, lines):
+        """Paid order of ``lines`` (product, qty, price), inserted in SQL"""
+        env = self.env
+        self.order_count += 1
+        total = sum(qty * price for _product, qty, price in lines)
+        env.cr.execute('''
+            INSERT INTO pos_order (name, pos_reference, session_id, config_id, company_id, user_id,
+                                   date_order, state, amount_tax, amount_total, amount_paid,
+                                   amount_return)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, 'paid', 0, %s, %s, 0)
+            RETURNING id
+        ''', ('CUBE/%s' % self.order_count, 'CUBE-%s' % self.order_count, self.session.id, self.config.id, env.company.id, env.uid, date_order, total, total))
+        [order_id] = env.cr.fetchone()
+        for product, qty, price in lines:
+            env.cr.execute('''
+                INSERT INTO pos_order_line (name, full_product_name, order_id, product_id,
+                                            company_id, qty, price_unit, discount, price_subtotal,
+                                            price_subtotal_incl, total_cost)
+                VALUES (%s, '', %s, %s, %s, %s, %s, 0, %s, %s, 0)
+            ''', ('CUBE-L', order_id, product.id, env.company.id, qty, price, qty * price, qty * price))
+        env.invalidate_all()
+        return env['pos.order'].browse(order_id)
+
+    def _build(self, month):
+        cube = self.cube_model._prepare_build(month)
+        cube._build()
+        return cube
+
+    def _get_products(self, data):
+        """Rows of the test products, by product"""
+        return {
+            product['product_id']: product for product in data['products']
+            if product['product_id'] in (self.product_a | self.product_b | self.product_c).ids
+        }
+
+    def _row(self, product_id, prices, qty, orders, days):
+        return {
+            'product_id': product_id,
+            'line_count': len(prices),
+            'qty': qty,
+            'sale_qty': qty,
+            'return_qty': 0.0,
+            'price_sum': sum(prices),
+            'price_sq_sum': sum(price * price for price in prices),
+            'price_min': min(prices),
+            'price_max': max(prices),
+            'revenue': sum(prices),
+            'cost': 0.0,
+            'order_count': orders,
+            'days_sold': days,
+        }
+
+    def test_merge_aggregates(self):
+        """Test that merged months give the aggregates of the whole period"""
+        merged = self.cube_model._merge_aggregates([
+            self._row(1, [10.0, 12.0], 2.0, 2, 1),
+            self._row(1, [14.0], 1.0, 1, 1),
+            self._row(2, [5.0], 1.0, 1, 1),
+        ])
+        product = merged[1]
+        self.assertEqual(product['line_count'], 3)
+        self.assertEqual(product['order_count'], 3)
+        self.assertEqual(product['days_sold'], 2)
+        self.assertEqual(product['price_min'], 10.0)
+        self.assertEqual(product['price_max'], 14.0)
+        self.assertAlmostEqual(product['avg_price'], 12.0)
+        # Sample standard deviation of 10, 12 and 14
+        self.assertAlmostEqual(product['price_stddev'], 2.0)
+        self.assertEqual(merged[2]['price_stddev'], 0.0)
+
+    def test_closed_month_build(self):
+        """Test that a past month is built up to its end"""
+        cube = self._build(date(2020, 2, 15))
+        self.assertEqual(cube.month, date(2020, 2, 1))
+        self.assertEqual(cube.built_until, datetime(2020, 3, 1))
+        self.assertFalse(cube.dirty)
+        lines = cube.line_ids.filtered(lambda line: line.product_id == self.product_a)
+        self.assertEqual(lines.qty, 4.0)
+        self.assertEqual(lines.revenue, 44.0)
+        self.assertEqual(lines.order_count, 2)
+        self.assertEqual(self._build(date(2020, 2, 1)), cube)
+
+    def test_late_order_marks_cube_dirty(self):
+        """Test that an order paid late into a built month is not lost"""
+        pos_order = self.env['pos.order']
+        cube = self._build(date(2020, 2, 1))
+        late_order = self._insert_order(datetime(2020, 2, 25, 10), [(self.product_a, 5, 10.0)])
+        self.cube_model._invalidate_orders(late_order)
+        self.assertTrue(cube.dirty)
+        self.assertFalse(self.cube_model._get_current_cubes([date(2020, 2, 1)], self.env.company))
+        data = pos_order.get_complete_monthly_sales_data(date(2020, 2, 1), date(2020, 3, 1))
+        self.assertEqual(self._get_products(data)[self.product_a.id]['total_quantity'], 9.0)
+        # The next build holds it again
+        self._build(date(2020, 2, 1))
+        self.assertFalse(cube.dirty)
+        lines = cube.line_ids.filtered(lambda line: line.product_id == self.product_a)
+        self.assertEqual(lines.qty, 9.0)
+        self.assertEqual(self._get_products(
+            pos_order.get_complete_monthly_sales_data(date(2020, 2, 1), date(2020, 3, 1))), self._get_products(data))
+
+    def test_complete_monthly_sales_data(self):
+        """Test the comprehensive sales data of a range across three months"""
+        data = self.env['pos.order'].get_complete_monthly_sales_data(date(2020, 1, 10), date(2020, 3, 5))
+        self.assertEqual(data['month_start'], '2020-01-10')
+        self.assertEqual(data['month_end'], '2020-03-05')
+        self.assertEqual(data['total_products'], len(data['products']))
+        products = self._get_products(data)
+        self.assertEqual(list(products), [self.product_a.id, self.product_b.id, self.product_c.id])
+
+        product_a = products[self.product_a.id]
+        self.assertEqual(product_a['total_quantity'], 6.0)
+        self.assertEqual(product_a['total_revenue'], 64.0)
+        self.assertEqual(product_a['order_count'], 3)
+        self.assertEqual(product_a['days_sold'], 3)
+        self.assertEqual(product_a['avg_price'], 10.0)
+        self.assertEqual(product_a['min_price'], 8.0)
+        self.assertEqual(product_a['max_price'], 12.0)
+        self.assertEqual(product_a['price_stddev'], 2.0)
+
+        product_b = products[self.product_b.id]
+        self.assertEqual(product_b['total_quantity'], 2.0)
+        self.assertEqual(product_b['sale_quantity'], 3.0)
+        self.assertEqual(product_b['return_quantity'], -1.0)
+        self.assertEqual(product_b['total_revenue'], 60.0)
+        self.assertEqual(products[self.product_c.id]['total_revenue'], 5.0)
+
+    def test_reads_do_not_build_cubes(self):
+        """Test that reading a range writes no cube, and that a built cube gives the same data"""
+        pos_order = self.env['pos.order']
+        raw = pos_order.get_complete_monthly_sales_data(date(2020, 1, 10), date(2020, 3, 5))
+        self.assertFalse(self.cube_model.search([('month', '=', date(2020, 2, 1))]))
+
+        # Only February is a full month of the range
+        self._build(date(2020, 2, 1))
+        cube_ids, segments = self.cube_model._get_aggregate_sources(
+            date(2020, 1, 10), date(2020, 3, 5), self.env.company)
+        self.assertEqual(len(cube_ids), 1)
+        self.assertEqual(segments, [(date(2020, 1, 10), date(2020, 2, 1)), (date(2020, 3, 1), date(2020, 3, 5))])
+        self.assertEqual(
+            self._get_products(pos_order.get_complete_monthly_sales_data(date(2020, 1, 10), date(2020, 3, 5))),
+            self._get_products(raw))
+
+    def test_open_month_reads_orders_since_build(self):
+        """Test that the open month cube is read with the orders paid since its build"""
+        month = date.today().replace(day=1)
+        next_month = month + relativedelta(months=1)
+        cube = self._build(month)
+        self.assertLessEqual(cube.built_until, fields.Datetime.now())
+        order = self._insert_order(fields.Datetime.now(), [(self.product_c, 2, 7.0)])
+        # Dated after the end of the cube, read from the order lines
+        self.cube_model._invalidate_orders(order)
+        self.assertFalse(cube.dirty)
+        cube_ids, segments = self.cube_model._get_aggregate_sources(month, next_month, self.env.company)
+        self.assertEqual(cube_ids, [cube.id])
+        self.assertEqual(segments, [(cube.built_until, next_month)])
+        aggregates = self.cube_model._get_product_aggregates(month, next_month)
+        self.assertEqual(aggregates[self.product_c.id]['qty'], 2.0)
+        self.assertEqual(aggregates[self.product_c.id]['revenue'], 14.0)
+
+    def test_streamed_rows_match_complete_data(self):
+        """Test that the streaming export reads the same rows in the same order"""
+        pos_order = self.env['pos.order']
+        data = pos_order.get_complete_monthly_sales_data(date(2020, 1, 10), date(2020, 3, 5))
+        streamed = [
+            product
+            for products in pos_order._iter_monthly_sales_rows(date(2020, 1, 10), date(2020, 3, 5), chunk_size=2)
+            for product in products
+        ]
+        self.assertGreaterEqual(len(streamed), 3)
+        self.assertEqual(
+            [product['product_id'] for product in streamed],
+            [product['product_id'] for product in data['products']])
+        self.assertEqual(self._get_products({'products': streamed}), self._get_products(data))
+
+    def test_streamed_csv_matches_export(self):
+        """Test that the chunked CSV export gives the same file as the in-memory one"""
+        pos_order = self.env['pos.order']
+        data = pos_order.get_complete_monthly_sales_data(date(2020, 1, 10), date(2020, 3, 5))
+        streamed = b''.join(pos_order._stream_monthly_sales_csv(date(2020, 1, 10), date(2020, 3, 5)))
+        self.assertIn('Sales Cube Product A', streamed.decode('utf-8'))
+        self.assertEqual(streamed.decode('utf-8'), pos_order._export_to_csv(data))
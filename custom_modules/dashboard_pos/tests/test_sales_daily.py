@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase
+from datetime import timedelta
+
+
+class TestPosSalesDaily(TransactionCase):
+    """Test the daily POS sales rollup and the tiles reading it"""
+
+    def setUp(self):
+        super().setUp()
+        self.pos_order_model = self.env['pos.order']
+        self.rollup_model = self.env['pos.sales.daily']
+        self.company = self.env.company
+        self.today = self.rollup_model._get_local_today()
+        self.rollup_model.search([('company_id', '=', self.company.id)]).unlink()
+        self.config = self.env['pos.config'].create({'name': 'Rollup Test POS'})
+        self.payment_method = self.env['pos.payment.method'].create({'name': 'Rollup Test Cash'})
+
+        self.rollup_model.create([
+            {
+                'date': self.today,
+                'company_id': self.company.id,
+                'config_id': self.config.id,
+                'sale_amount': 1000.0,
+                'refund_amount': 100.0,
+                'order_count': 12,
+                'refund_count': 2,
+            },
+            {
+                'date': self.today,
+                'company_id': self.company.id,
+                'vendor_bill_cost': 300.0,
+            },
+            {
+                'date': self.today - timedelta(days=3),
+                'company_id': self.company.id,
+                'config_id': self.config.id,
+                'sale_amount': 500.0,
+                'order_count': 5,
+            },
+        ])
+
+    def test_get_totals(self):
+        """Test that totals sum the rows of the requested days only"""
+        totals = self.rollup_model._get_totals(self.today, self.today)
+        self.assertEqual(totals['sale_amount'], 1000.0)
+        self.assertEqual(totals['refund_amount'], 100.0)
+        self.assertEqual(totals['net_amount'], 900.0)
+        self.assertEqual(totals['order_count'], 12)
+        self.assertEqual(totals['refund_count'], 2)
+        self.assertEqual(totals['vendor_bill_cost'], 300.0)
+
+        all_time = self.rollup_model._get_totals()
+        self.assertEqual(all_time['net_amount'], 1400.0)
+        self.assertEqual(all_time['order_count'], 17)
+
+    def test_get_sale_vs_cost(self):
+        """Test that the sale vs cost tile reads the rollup"""
+        self.assertEqual(self.pos_order_model.get_sale_vs_cost('pos_today_sales_cost'), [900.0, 300.0, 600.0])
+        self.assertEqual(self.pos_order_model.get_sale_vs_cost('pos_week_sales_cost'), [1400.0, 300.0, 1100.0])
+
+    def test_refresh_removes_stale_rows(self):
+        """Test that refreshing a day without orders or bills clears its rows"""
+        stale_day = self.today - timedelta(days=3)
+        self.rollup_model._refresh(self.company, [stale_day])
+        rows = self.rollup_model.search([('company_id', '=', self.company.id), ('date', '=', stale_day)])
+        self.assertFalse(rows)
+
+    def test_add_deltas(self):
+        """Test that order deltas are added to the row of their shop and day"""
+        version = self.rollup_model._get_data_version()
+        key = (self.company.id, self.today, self.config.id)
+        self.rollup_model._add_deltas({key: {
+            'sale_amount': 200.0,
+            'refund_amount': 50.0,
+            'order_count': 3,
+            'refund_count': 1,
+            'payments': {self.payment_method.id: 150.0},
+        }})
+        totals = self.rollup_model._get_totals(self.today, self.today)
+        self.assertEqual(totals['sale_amount'], 1200.0)
+        self.assertEqual(totals['refund_amount'], 150.0)
+        self.assertEqual(totals['net_amount'], 1050.0)
+        self.assertEqual(totals['order_count'], 15)
+        self.assertEqual(totals['refund_count'], 3)
+        row = self.rollup_model.search([('config_id', '=', self.config.id), ('date', '=', self.today)])
+        self.assertEqual(len(row), 1)
+        self.assertEqual(row.payment_ids.amount, 150.0)
+        updated_version = self.rollup_model._get_data_version()
+        self.assertNotEqual(updated_version, version)
+
+        # Removing the same orders restores the totals, with a new version
+        self.rollup_model._add_deltas({key: {
+            'sale_amount': -200.0,
+            'refund_amount': -50.0,
+            'order_count': -3,
+            'refund_count': -1,
+            'payments': {self.payment_method.id: -150.0},
+        }})
+        totals = self.rollup_model._get_totals(self.today, self.today)
+        self.assertEqual(totals['net_amount'], 900.0)
+        self.assertEqual(totals['order_count'], 12)
+        self.assertEqual(row.payment_ids.amount, 0.0)
+        self.assertNotIn(self.rollup_model._get_data_version(), (version, updated_version))
+
+    def test_add_deltas_new_day(self):
+        """Test that a delta on a day without row creates it"""
+        day = self.today - timedelta(days=1)
+        self.rollup_model._add_deltas({(self.company.id, day, self.config.id): {
+            'sale_amount': 80.0,
+            'refund_amount': 0.0,
+            'order_count': 1,
+            'refund_count': 0,
+            'payments': {},
+        }})
+        totals = self.rollup_model._get_totals(day, day)
+        self.assertEqual(totals['net_amount'], 80.0)
+        self.assertEqual(totals['order_count'], 1)
+
+    def test_get_monthly_series(self):
+        """Test that the monthly series covers every month, oldest first"""
+        series = self.rollup_model._get_monthly_series(3, self.today)
+        self.assertEqual(len(series), 3)
+        self.assertEqual(series[-1]['month'], self.today.replace(day=1))
+        self.assertTrue(series[0]['month'] < series[1]['month'] < series[2]['month'])
+        current = series[-1]
+        self.assertEqual(current['cost'], 300.0)
+        self.assertEqual(current['gross_profit'], current['sale'] - current['cost'])
+        self.assertEqual(current['net_income'], current['sale'] - current['expense'])
+
+    def test_chart_series_indexes(self):
+        """Test that the chart range scans have their composite indexes"""
+        self.env.cr.execute('''
+            SELECT indexname FROM pg_indexes
+            WHERE tablename = 'pos_order' AND indexname IN %s
+        ''', (('pos_order_company_id_date_order_index', 'pos_order_company_id_state_date_order_index'),))
+        self.assertEqual(len(self.env.cr.fetchall()), 2)
+
+    def test_get_department_labels(self):
+        """Test that every chart option returns amounts, buckets and its label"""
+        for option, label in [('pos_hourly_sales', 'HOURS'), ('pos_weekly_sales', 'DAYS'),
+                              ('pos_monthly_sales', 'MONTHS')]:
+            amounts, buckets, result_label = self.pos_order_model.with_context(
+                dashboard_no_cache=True).get_department(option)
+            self.assertEqual(result_label, label)
+            self.assertEqual(len(amounts), len(buckets))
+
+    def test_sales_series_empty_range(self):
+        """Test that an empty half-open range gives no bucket"""
+        utc_start, utc_end = self.rollup_model._get_utc_bounds(self.company, self.today, self.today)
+        self.assertEqual(self.pos_order_model._get_sales_series('day', utc_start, utc_end, 'Asia/Dubai'), [])
@@ -160,3 +160,47 @@ class TestVATConversion(TransactionCase):
         # Cost should be 80.190... rounded to 2 decimals
         self.assertAlmostEqual(converted_data[0]['price'], 100.24, places=2)
         self.assertAlmostEqual(converted_data[0]['cost'], 80.19, places=2)
+
+    def test_get_vat_rates_bulk(self):
+        """Test resolving VAT rates of many templates by id"""
+        rates = self.pos_order_model._get_vat_rates([self.product_with_vat.id, self.product_without_vat.id])
+        
+        self.assertEqual(rates[self.product_with_vat.id], 0.05)
+        # Templates without a percent sale tax are not returned, callers use the default rate
+        self.assertNotIn(self.product_without_vat.id, rates)
+
+    def test_convert_to_net_prices_by_template(self):
+        """Test that items carrying their template are converted without name lookups"""
+        raw_data = [
+            {
+                'template_id': self.product_with_vat.id,
+                'product_name': 'Renamed product',
+                'qty': 10.0,
+                'price': 105.0,
+                'cost': 84.0
+            }
+        ]
+        
+        converted_data = self.pos_order_model._convert_to_net_prices(raw_data)
+        
+        self.assertEqual(converted_data[0]['vat_rate'], 0.05)
+        self.assertAlmostEqual(converted_data[0]['price'], 100.0, places=2)
+        self.assertAlmostEqual(converted_data[0]['cost'], 80.0, places=2)
+
+    def test_company_tax_rates_follow_tax_changes(self):
+        """Test that the cached company rates follow a tax change"""
+        rates = self.pos_order_model._get_company_tax_rates(self.company.id, False)
+        self.assertEqual(rates[self.vat_tax.id], 0.05)
+        
+        self.vat_tax.write({'amount': 10.0})
+        rates = self.pos_order_model._get_company_tax_rates(self.company.id, False)
+        self.assertEqual(rates[self.vat_tax.id], 0.10)
+
+    def test_tax_rates_version(self):
+        """Test that only the fields the rates depend on change their cache key"""
+        version = self.pos_order_model._get_tax_rates_version(self.company.id, False)
+        self.vat_tax.write({'name': 'UAE VAT'})
+        self.assertEqual(self.pos_order_model._get_tax_rates_version(self.company.id, False), version)
+
+        self.vat_tax.write({'amount': 10.0})
+        self.assertNotEqual(self.pos_order_model._get_tax_rates_version(self.company.id, False), version)
@@ -22,6 +22,7 @@
 from . import account_general_ledger
 from . import account_partner_ledger
 from . import account_trial_balance
+from . import aged_partner_report
 from . import aged_payable_report
 from . import aged_receivable_report
 from . import bank_book_report
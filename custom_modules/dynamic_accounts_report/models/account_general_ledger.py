@@ -22,12 +22,20 @@
 import io
 import json
 import calendar
+from collections import defaultdict
 from dateutil.relativedelta import relativedelta
 import xlsxwriter
 from odoo import api, fields, models
 from datetime import datetime
+from odoo.osv import expression
 from odoo.tools import date_utils
 
+# Number of move lines fetched each time an account is expanded
+GL_PAGE_SIZE = 80
+GL_MOVE_LINE_FIELDS = ['date', 'name', 'move_name', 'debit', 'credit',
+                       'partner_id', 'account_id', 'journal_id', 'move_id',
+                       'analytic_line_ids']
+
 
 class AccountGeneralLedger(models.TransientModel):
     """For creating General Ledger report"""
@@ -37,7 +45,10 @@ class AccountGeneralLedger(models.TransientModel):
     @api.model
     def view_report(self, option, tag):
         """
-        Retrieve partner ledger report data based on options and tags.
+        Retrieve the general ledger account totals of the posted move lines.
+
+        The move lines of an account are not included, they are fetched with
+        get_move_lines when the account is expanded.
 
         :param option: The options to filter the report data.
         :type option: str
@@ -45,44 +56,16 @@ class AccountGeneralLedger(models.TransientModel):
         :param tag: The tag to filter the report data.
         :type tag: str
 
-        :return: A dictionary containing the partner ledger report data.
+        :return: A dictionary containing the general ledger report data.
         :rtype: dict
         """
-        account_dict = {}
-        account_totals = {}
-        move_line_ids = self.env['account.move.line'].search(
-            [('parent_state', '=', 'posted')])
-        account_ids = move_line_ids.mapped('account_id')
-        account_dict['journal_ids'] = self.env['account.journal'].search_read(
-            [], ['name'])
-        account_dict['analytic_ids'] = self.env[
-            'account.analytic.account'].search_read(
-            [], ['name'])
-        for account in account_ids:
-            move_line_id = move_line_ids.filtered(
-                lambda x: x.account_id == account)
-            move_line_list = []
-            for move_line in move_line_id:
-                move_line_data = move_line.read(
-                    ['date', 'name', 'move_name', 'debit', 'credit',
-                     'partner_id', 'account_id', 'journal_id', 'move_id',
-                     'analytic_line_ids'])
-                move_line_list.append(move_line_data)
-            account_dict[account.display_name] = move_line_list
-            currency_id = self.env.company.currency_id.symbol
-            account_totals[account.display_name] = {
-                'total_debit': round(sum(move_line_id.mapped('debit')), 2),
-                'total_credit': round(sum(move_line_id.mapped('credit')), 2),
-                'currency_id': currency_id,
-                'account_id': account.id}
-            account_dict['account_totals'] = account_totals
-        return account_dict
+        return self._get_account_data([('parent_state', '=', 'posted')])
 
     @api.model
     def get_filter_values(self, journal_id, date_range, options, analytic,
                           method):
         """
-        Retrieve filtered values for the partner ledger report.
+        Retrieve the general ledger account totals for the given filters.
 
         :param journal_id: The journal IDs to filter the report data.
         :type journal_id: list
@@ -99,12 +82,119 @@ class AccountGeneralLedger(models.TransientModel):
         :param analytic: The analytic IDs to filter the report data.
         :type analytic: list
 
-        :return: A dictionary containing the filtered values for the partner
+        :return: A dictionary containing the filtered values for the general
         ledger report.
         :rtype: dict
         """
+        return self._get_account_data(
+            self._get_domain(journal_id, date_range, options, analytic,
+                             method))
+
+    @api.model
+    def get_move_lines(self, account_id, journal_id, date_range, options,
+                       analytic, method, after=None, limit=GL_PAGE_SIZE):
+        """
+        Retrieve a page of the move lines of an account, ordered by date and
+        ID. The page starts after the (date, id) key of the last line of the
+        previous page, so that fetching a page does not depend on how many
+        lines come before it.
+
+        :param account_id: The ID of the account.
+        :type account_id: int
+
+        :param after: The [date, id] key of the last line already fetched.
+        :type after: list
+
+        :param limit: The maximum number of lines of the page.
+        :type limit: int
+
+        :return: A dictionary containing the lines of the page, and the key
+        of the next page or False when the last line has been fetched.
+        :rtype: dict
+        """
+        domain = self._get_domain(journal_id, date_range, options, analytic,
+                                  method)
+        domain = expression.AND([domain, [('account_id', '=', account_id)]])
+        if after:
+            after_date, after_id = after
+            domain = expression.AND([domain, [
+                '|', ('date', '>', after_date),
+                '&', ('date', '=', after_date), ('id', '>', after_id)]])
+        move_lines = self.env['account.move.line'].search_read(
+            domain, GL_MOVE_LINE_FIELDS, order='date, id', limit=limit + 1)
+        next_page = False
+        if len(move_lines) > limit:
+            move_lines = move_lines[:limit]
+            next_page = [fields.Date.to_string(move_lines[-1]['date']),
+                         move_lines[-1]['id']]
+        return {
+            'lines': [[move_line] for move_line in move_lines],
+            'next': next_page,
+        }
+
+    @api.model
+    def get_export_lines(self, journal_id, date_range, options, analytic,
+                         method):
+        """
+        Retrieve all the move lines of the report by account, as printed in
+        the PDF and XLSX reports.
+
+        :return: A dictionary of the move lines by account display name.
+        :rtype: dict
+        """
+        domain = self._get_domain(journal_id, date_range, options, analytic,
+                                  method)
+        move_lines = self.env['account.move.line'].search_read(
+            domain, GL_MOVE_LINE_FIELDS, order='account_id, date, id')
+        export_lines = defaultdict(list)
+        for move_line in move_lines:
+            account_name = move_line['account_id'] and \
+                move_line['account_id'][1]
+            export_lines[account_name].append([move_line])
+        return dict(export_lines)
+
+    def _get_account_data(self, domain):
+        """
+        Compute the debit and credit totals of every account of the move
+        lines matching the domain, in one grouped query.
+
+        :param domain: The domain of the move lines.
+        :type domain: list
+
+        :return: A dictionary containing the journals, the analytic accounts,
+        the account totals and an empty list of move lines by account.
+        :rtype: dict
+        """
         account_dict = {}
         account_totals = {}
+        account_dict['journal_ids'] = self.env['account.journal'].search_read(
+            [], ['name'])
+        account_dict['analytic_ids'] = self.env[
+            'account.analytic.account'].search_read(
+            [], ['name'])
+        currency_id = self.env.company.currency_id.symbol
+        for account, debit, credit, count in self.env[
+                'account.move.line']._read_group(
+                domain, ['account_id'],
+                ['debit:sum', 'credit:sum', '__count']):
+            account_dict[account.display_name] = []
+            account_totals[account.display_name] = {
+                'total_debit': round(debit, 2),
+                'total_credit': round(credit, 2),
+                'currency_id': currency_id,
+                'account_id': account.id,
+                'line_count': count}
+            account_dict['account_totals'] = account_totals
+        return account_dict
+
+    @api.model
+    def _get_domain(self, journal_id, date_range, options, analytic, method):
+        """
+        Get the domain of the move lines for the given filters.
+
+        :return: The domain of the move lines.
+        :rtype: list
+        """
         today = fields.Date.today()
         quarter_start, quarter_end = date_utils.get_quarter(today)
         previous_quarter_start = quarter_start - relativedelta(months=3)
@@ -124,9 +214,7 @@ class AccountGeneralLedger(models.TransientModel):
             domain += [('journal_id', 'in',
                         self.env.company.tax_cash_basis_journal_id.ids), ]
         if analytic:
-            analytic_line = self.env['account.analytic.line'].search(
-                [('account_id', 'in', analytic)]).mapped('id')
-            domain += [('analytic_line_ids', 'in', analytic_line)]
+            domain += [('analytic_line_ids.account_id', 'in', analytic)]
         if date_range:
             if date_range == 'month':
                 domain += [('date', '>=', today.replace(day=1)),
@@ -170,32 +258,7 @@ class AccountGeneralLedger(models.TransientModel):
                 end_date = datetime.strptime(date_range['end_date'],
                                              '%Y-%m-%d').date()
                 domain += [('date', '<=', end_date)]
-        move_line_ids = self.env['account.move.line'].search(domain)
-        account_ids = move_line_ids.mapped('account_id')
-        account_dict['journal_ids'] = self.env['account.journal'].search_read(
-            [], ['name'])
-        account_dict['analytic_ids'] = self.env[
-            'account.analytic.account'].search_read(
-            [], ['name'])
-        for account in account_ids:
-            move_line_id = move_line_ids.filtered(
-                lambda x: x.account_id == account)
-            move_line_list = []
-            for move_line in move_line_id:
-                move_line_data = move_line.read(
-                    ['date', 'name', 'move_name', 'debit', 'credit',
-                     'partner_id', 'account_id', 'journal_id', 'move_id',
-                     'analytic_line_ids'])
-                move_line_list.append(move_line_data)
-            account_dict[account.display_name] = move_line_list
-            currency_id = self.env.company.currency_id.symbol
-            account_totals[account.display_name] = {
-                'total_debit': round(sum(move_line_id.mapped('debit')), 2),
-                'total_credit': round(sum(move_line_id.mapped('credit')), 2),
-                'currency_id': currency_id,
-                'account_id': account.id}
-            account_dict['account_totals'] = account_totals
-        return account_dict
+        return domain
 
     @api.model
     def get_xlsx_report(self, data, response, report_name, report_action):
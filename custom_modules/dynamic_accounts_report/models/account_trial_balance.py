@@ -22,9 +22,11 @@
 import calendar
 import io
 import json
+from collections import defaultdict
 from datetime import datetime
 import xlsxwriter
 from odoo import api, fields, models
+from odoo.osv import expression
 from odoo.tools.date_utils import get_month, get_fiscal_year, \
     get_quarter_number, subtract
 
@@ -45,39 +47,24 @@ class AccountTrialBalance(models.TransientModel):
         :return: List of dictionaries representing the trial balance report.
         :rtype: list
         """
-        account_ids = self.env['account.move.line'].search([]).mapped(
-            'account_id')
         today = fields.Date.today()
+        month_start, month_end = get_month(today)
+        initial_balances, (balances,) = self._get_balances(
+            [('parent_state', '=', 'posted')], month_start,
+            [(month_start, month_end)])
         move_line_list = []
-        for account_id in account_ids:
-            initial_move_line_ids = self.env['account.move.line'].search(
-                [('date', '<', get_month(today)[0]),
-                 ('account_id', '=', account_id.id),
-                 ('parent_state', '=', 'posted')])
-            initial_total_debit = round(
-                sum(initial_move_line_ids.mapped('debit')), 2)
-            initial_total_credit = round(
-                sum(initial_move_line_ids.mapped('credit')), 2)
-            move_line_ids = self.env['account.move.line'].search(
-                [('date', '>=', get_month(today)[0]),
-                 ('account_id', '=', account_id.id),
-                 ('date', '<=', get_month(today)[1]),
-                 ('parent_state', '=', 'posted')])
-            total_debit = round(sum(move_line_ids.mapped('debit')), 2)
-            total_credit = round(sum(move_line_ids.mapped('credit')), 2)
+        for account_id in self._get_accounts():
+            initial_total_debit, initial_total_credit = initial_balances.get(
+                account_id.id, (0.0, 0.0))
+            total_debit, total_credit = balances.get(account_id.id,
+                                                     (0.0, 0.0))
             sum_debit = initial_total_debit + total_debit
             sum_credit = initial_total_credit + total_credit
-            diff_credit_debit = sum_debit - sum_credit
-            if diff_credit_debit > 0:
-                end_total_debit = diff_credit_debit
-                end_total_credit = 0.0
-            else:
-                end_total_debit = 0.0
-                end_total_credit = abs(diff_credit_debit)
+            end_total_debit, end_total_credit = self._get_end_balance(
+                sum_debit, sum_credit)
             data = {
                 'account': account_id.display_name,
                 'account_id': account_id.id,
-                'journal_ids': self.env['account.journal'].search_read([], ['name']),
                 'initial_total_debit': "{:,.2f}".format(initial_total_debit),
                 'initial_total_credit': "{:,.2f}".format(initial_total_credit),
                 'total_debit': total_debit,
@@ -123,177 +110,86 @@ class AccountTrialBalance(models.TransientModel):
             option_domain = ['posted', 'draft']
         if method == {}:
             method = None
-        dynamic_total_debit = {}
+        domain = [('parent_state', 'in', option_domain), ]
+        if journal_list:
+            domain.append(
+                ('journal_id', 'in', journal_list), )
+        if analytic:
+            domain.append(
+                ('analytic_line_ids', 'in', analytic))
+        if method is not None and 'cash' in method:
+            domain.append(('journal_id', 'in',
+                           self.env.company.tax_cash_basis_journal_id.ids))
         dynamic_date_num = {}
-        dynamic_total_credit = {}
-        account_ids = self.env['account.move.line'].search([]).mapped(
-            'account_id')
-        move_line_list = []
-        start_date_first = \
+        comparison_count = eval(comparison_number) if comparison_number else 0
+        start_date = \
             get_fiscal_year(datetime.strptime(start_date, "%Y-%m-%d").date())[
                 0] if comparison_type == 'year' else datetime.strptime(
                 start_date, "%Y-%m-%d").date()
-        end_date_first = \
+        end_date = \
             get_fiscal_year(datetime.strptime(end_date, "%Y-%m-%d").date())[
                 1] if comparison_type == 'year' else datetime.strptime(end_date,
                                                                        "%Y-%m-%d").date()
-        for account_id in account_ids:
-            start_date = start_date_first
-            end_date = end_date_first
-            if comparison_number:
-                if comparison_type == 'month':
-                    initial_start_date = subtract(start_date, months=eval(
-                        comparison_number))
-                elif comparison_type == 'year':
-                    initial_start_date = subtract(start_date, years=eval(
-                        comparison_number))
-                else:
-                    initial_start_date = subtract(start_date, months=eval(
-                        comparison_number) * 3)
+        # The report period, then each comparison period going back in time
+        periods = [(start_date, end_date)]
+        if comparison_count:
+            if comparison_type == 'month':
+                initial_start_date = subtract(start_date,
+                                              months=comparison_count)
+                dynamic_date_num[
+                    f"dynamic_date_num{0}"] = self.get_month_name(
+                    start_date) + ' ' + str(
+                    start_date.year)
+            elif comparison_type == 'year':
+                initial_start_date = subtract(start_date,
+                                              years=comparison_count)
             else:
-                initial_start_date = start_date
-            domain = [('date', '<', initial_start_date),
-                      ('account_id', '=', account_id.id),
-                      ('parent_state', 'in', option_domain), ]
-            if journal_list:
-                domain.append(
-                    ('journal_id', 'in', journal_list), )
-            if analytic:
-                domain.append(
-                    ('analytic_line_ids', 'in', analytic))
-            if method is not None and 'cash' in method:
-                domain.append(('journal_id', 'in',
-                               self.env.company.tax_cash_basis_journal_id.ids))
-            initial_move_line_ids = self.env['account.move.line'].search(
-                domain)
-            initial_total_debit = round(
-                sum(initial_move_line_ids.mapped('debit')), 2)
-            initial_total_credit = round(
-                sum(initial_move_line_ids.mapped('credit')), 2)
-            if comparison_number:
+                initial_start_date = subtract(start_date,
+                                              months=comparison_count * 3)
+                dynamic_date_num[
+                    f"dynamic_date_num{0}"] = 'Q' + ' ' + str(
+                    get_quarter_number(start_date)) + ' ' + str(
+                    start_date.year)
+            for i in range(1, comparison_count + 1):
                 if comparison_type == 'year':
-                    for i in range(1, eval(comparison_number) + 1):
-                        com_start_date = subtract(start_date, years=i)
-                        com_end_date = subtract(end_date, years=i)
-                        domain = [('date', '>=', com_start_date),
-                                  ('account_id', '=', account_id.id),
-                                  ('date', '<=', com_end_date),
-                                  ('parent_state', 'in', option_domain), ]
-                        if journal_list:
-                            domain.append(
-                                ('journal_id', 'in', journal_list), )
-                        if analytic:
-                            domain.append(
-                                ('analytic_line_ids', 'in', analytic))
-                        if method is not None and 'cash' in method:
-                            domain.append(('journal_id', 'in',
-                                           self.env.company.tax_cash_basis_journal_id.ids))
-                        move_lines = self.env['account.move.line'].search(
-                            domain)
-                        dynamic_total_debit[
-                            f"dynamic_total_debit_{i}"] = round(
-                            sum(move_lines.mapped('debit')), 2)
-                        dynamic_total_credit[
-                            f"dynamic_total_credit_{i}"] = round(
-                            sum(move_lines.mapped('credit')), 2)
-                if comparison_type == 'month':
+                    com_start_date = subtract(start_date, years=i)
+                    com_end_date = subtract(end_date, years=i)
+                elif comparison_type == 'month':
+                    com_start_date = subtract(start_date, months=i)
+                    com_end_date = subtract(end_date, months=i)
                     dynamic_date_num[
-                        f"dynamic_date_num{0}"] = self.get_month_name(
-                        start_date) + ' ' + str(
-                        start_date.year)
-                    for i in range(1, eval(comparison_number) + 1):
-                        com_start_date = subtract(start_date, months=i)
-                        com_end_date = subtract(end_date, months=i)
-                        domain = [('date', '>=', com_start_date),
-                                  ('account_id', '=', account_id.id),
-                                  ('date', '<=', com_end_date),
-                                  ('parent_state', 'in', option_domain), ]
-                        if journal_list:
-                            domain.append(
-                                ('journal_id', 'in', journal_list), )
-                        if analytic:
-                            domain.append(
-                                ('analytic_line_ids', 'in', analytic))
-                        if method is not None and 'cash' in method:
-                            domain.append(('journal_id', 'in',
-                                           self.env.company.tax_cash_basis_journal_id.ids), )
-                        move_lines = self.env['account.move.line'].search(
-                            domain)
-                        dynamic_date_num[
-                            f"dynamic_date_num{i}"] = self.get_month_name(
-                            com_start_date) + ' ' + str(
-                            com_start_date.year)
-                        dynamic_total_debit[
-                            f"dynamic_total_debit_{i}"] = round(
-                            sum(move_lines.mapped('debit')), 2)
-                        dynamic_total_credit[
-                            f"dynamic_total_credit_{i}"] = round(
-                            sum(move_lines.mapped('credit')), 2)
-                if comparison_type == 'quarter':
+                        f"dynamic_date_num{i}"] = self.get_month_name(
+                        com_start_date) + ' ' + str(
+                        com_start_date.year)
+                else:
+                    com_start_date = subtract(start_date, months=i * 3)
+                    com_end_date = subtract(end_date, months=i * 3)
                     dynamic_date_num[
-                        f"dynamic_date_num{0}"] = 'Q' + ' ' + str(
-                        get_quarter_number(start_date)) + ' ' + str(
-                        start_date.year)
-                    for i in range(1, eval(comparison_number) + 1):
-                        com_start_date = subtract(start_date, months=i * 3)
-                        com_end_date = subtract(end_date, months=i * 3)
-                        domain = [('date', '>=', com_start_date),
-                                  ('account_id', '=', account_id.id),
-                                  ('date', '<=', com_end_date),
-                                  ('parent_state', 'in', option_domain), ]
-                        if journal_list:
-                            domain.append(
-                                ('journal_id', 'in', journal_list), )
-                        if analytic:
-                            domain.append(
-                                ('analytic_line_ids', 'in', analytic))
-                        if method is not None and 'cash' in method:
-                            domain.append(('journal_id', 'in',
-                                           self.env.company.tax_cash_basis_journal_id.ids))
-                        move_lines = self.env['account.move.line'].search(
-                            domain)
-                        dynamic_date_num[
-                            f"dynamic_date_num{i}"] = 'Q' + ' ' + str(
-                            get_quarter_number(com_start_date)) + ' ' + str(
-                            com_start_date.year)
-                        dynamic_total_debit[
-                            f"dynamic_total_debit_{i}"] = round(
-                            sum(move_lines.mapped('debit')), 2)
-                        dynamic_total_credit[
-                            f"dynamic_total_credit_{i}"] = round(
-                            sum(move_lines.mapped('credit')), 2)
-            domain = [('date', '>=', start_date),
-                      ('account_id', '=', account_id.id),
-                      ('date', '<=', end_date),
-                      ('parent_state', 'in', option_domain), ]
-            if journal_list:
-                domain.append(
-                    ('journal_id', 'in', journal_list), )
-            if analytic:
-                domain.append(
-                    ('analytic_line_ids', 'in', analytic))
-            if method is not None and 'cash' in method:
-                domain.append(('journal_id', 'in',
-                               self.env.company.tax_cash_basis_journal_id.ids))
-            move_line_ids = self.env['account.move.line'].search(domain)
-            total_debit = round(sum(move_line_ids.mapped('debit')), 2)
-            total_credit = round(sum(move_line_ids.mapped('credit')), 2)
+                        f"dynamic_date_num{i}"] = 'Q' + ' ' + str(
+                        get_quarter_number(com_start_date)) + ' ' + str(
+                        com_start_date.year)
+                periods.append((com_start_date, com_end_date))
+        else:
+            initial_start_date = start_date
+        initial_balances, period_balances = self._get_balances(
+            domain, initial_start_date, periods)
+        move_line_list = []
+        for account_id in self._get_accounts():
+            initial_total_debit, initial_total_credit = initial_balances.get(
+                account_id.id, (0.0, 0.0))
+            total_debit, total_credit = period_balances[0].get(
+                account_id.id, (0.0, 0.0))
+            dynamic_totals = [balances.get(account_id.id, (0.0, 0.0))
+                              for balances in period_balances[1:]]
             sum_debit = initial_total_debit + sum(
-                dynamic_total_debit.values()) + total_debit
+                debit for debit, _credit in dynamic_totals) + total_debit
             sum_credit = initial_total_credit + sum(
-                dynamic_total_credit.values()) + total_credit
-            diff_credit_debit = sum_debit - sum_credit
-            if diff_credit_debit > 0:
-                end_total_debit = diff_credit_debit
-                end_total_credit = 0.0
-            else:
-                end_total_debit = 0.0
-                end_total_credit = abs(diff_credit_debit)
+                credit for _debit, credit in dynamic_totals) + total_credit
+            end_total_debit, end_total_credit = self._get_end_balance(
+                sum_debit, sum_credit)
             data = {
                 'account': account_id.display_name,
                 'account_id': account_id.id,
-                'journal_ids': self.env['account.journal'].search_read([], [
-                    'name']),
                 'initial_total_debit': initial_total_debit,
                 'initial_total_credit': initial_total_credit,
                 'total_debit': total_debit,
@@ -301,20 +197,92 @@ class AccountTrialBalance(models.TransientModel):
                 'end_total_debit': end_total_debit,
                 'end_total_credit': end_total_credit
             }
-            if comparison_number:
+            if comparison_count:
                 if dynamic_date_num:
                     data['dynamic_date_num'] = dynamic_date_num
-                for i in range(1, eval(comparison_number) + 1):
-                    data[f'dynamic_total_debit_{i}'] = dynamic_total_debit.get(
-                        f"dynamic_total_debit_{eval(comparison_number) + 1 - i}",
-                        0.0)
-                    data[
-                        f'dynamic_total_credit_{i}'] = dynamic_total_credit.get(
-                        f"dynamic_total_credit_{eval(comparison_number) + 1 - i}",
-                        0.0)
+                # The oldest comparison period comes first
+                for i, (debit, credit) in enumerate(
+                        reversed(dynamic_totals), start=1):
+                    data[f'dynamic_total_debit_{i}'] = debit
+                    data[f'dynamic_total_credit_{i}'] = credit
             move_line_list.append(data)
         return move_line_list
 
+    @api.model
+    def _get_accounts(self):
+        """
+        Retrieve the accounts having move lines, in one grouped query.
+
+        :return: The accounts of the trial balance.
+        :rtype: account.account
+        """
+        groups = self.env['account.move.line']._read_group([], ['account_id'])
+        return self.env['account.account'].concat(
+            *(account for account, in groups))
+
+    @api.model
+    def _get_balances(self, domain, initial_date, periods):
+        """
+        Compute the debit and credit of every account before the initial date
+        and over each period, in two grouped queries whatever the number of
+        periods.
+
+        :param list domain: The domain of the move lines, without dates.
+        :param datetime.date initial_date: The end of the initial balance,
+            excluded.
+        :param list periods: The (start date, end date) tuples of the
+            periods.
+        :return: The initial (debit, credit) by account ID, and a list of the
+            (debit, credit) by account ID of each period, rounded.
+        :rtype: tuple
+        """
+        move_line = self.env['account.move.line']
+        initial_balances = {
+            account.id: (round(debit, 2), round(credit, 2))
+            for account, debit, credit in move_line._read_group(
+                expression.AND([domain, [('date', '<', initial_date)]]),
+                ['account_id'], ['debit:sum', 'credit:sum'])}
+        period_balances = [defaultdict(lambda: [0.0, 0.0]) for _period in
+                           periods]
+        period_domains = [
+            [('date', '>=', date_from), ('date', '<=', date_to)]
+            for date_from, date_to in periods if date_from <= date_to]
+        if period_domains:
+            # The lines are grouped by dates aligned on the bounds of the
+            # periods, and each group is added to the periods containing it
+            groupby = ['account_id']
+            if len(periods) > 1:
+                granularity = self.env[
+                    'dynamic.balance.sheet.report']._get_period_granularity(
+                    periods)
+                groupby.append(f'date:{granularity}')
+            for group in move_line._read_group(
+                    expression.AND([domain, expression.OR(period_domains)]),
+                    groupby, ['debit:sum', 'credit:sum']):
+                account, debit, credit = group[0], group[-2], group[-1]
+                for index, (date_from, date_to) in enumerate(periods):
+                    if len(groupby) == 1 or date_from <= group[1] <= date_to:
+                        period_balances[index][account.id][0] += debit
+                        period_balances[index][account.id][1] += credit
+        return initial_balances, [
+            {account_id: (round(debit, 2), round(credit, 2))
+             for account_id, (debit, credit) in balances.items()}
+            for balances in period_balances]
+
+    @api.model
+    def _get_end_balance(self, sum_debit, sum_credit):
+        """
+        Split the balance of the total debit and credit into an end debit or
+        an end credit.
+
+        :return: The end debit and the end credit.
+        :rtype: tuple
+        """
+        diff_credit_debit = sum_debit - sum_credit
+        if diff_credit_debit > 0:
+            return diff_credit_debit, 0.0
+        return 0.0, abs(diff_credit_debit)
+
     @api.model
     def get_month_name(self, date):
         """
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+################################################################################
+#
+#    Cybrosys Technologies Pvt. Ltd.
+#
+#    Copyright (C) 2024-TODAY Cybrosys Technologies(<https://www.cybrosys.com>)
+#    Author: Bhagyadev KP (<https://www.cybrosys.com>)
+#
+#    You can modify it under the terms of the GNU LESSER
+#    GENERAL PUBLIC LICENSE (LGPL v3), Version 3.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU LESSER GENERAL PUBLIC LICENSE (LGPL v3) for more details.
+#
+#    You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+#    (LGPL v3) along with this program.
+#    If not, see <http://www.gnu.org/licenses/>.
+#
+################################################################################
+from collections import defaultdict
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+# Aging buckets as (after, up to) days past the maturity date, the first one
+# holds the lines not yet due or without maturity date
+AGING_BUCKETS = [(None, 0), (0, 30), (30, 60), (60, 90), (90, 120),
+                 (120, None)]
+
+
+class AgedPartnerReport(models.AbstractModel):
+    """Aging of the open receivable or payable lines by partner, computed by
+    the database. The lines of a partner are read on demand."""
+    _name = 'dynamic.aged.report'
+    _description = 'Aged Partner Report'
+
+    # Set by the aged receivable and aged payable reports
+    _aged_account_type = None
+    _aged_amount_field = None
+
+    @api.model
+    def view_report(self):
+        """
+        Retrieve the aged amounts of every partner at today's date.
+
+        Returns:
+            dict: Dictionary containing an empty list of move lines by partner
+                  name, and the aged amounts of each partner under the
+                  'partner_totals' key.
+        """
+        return self._get_aged_data(False, False)
+
+    @api.model
+    def get_filter_values(self, date, partner):
+        """
+        Retrieve the aged amounts by partner at the given date.
+
+        Parameters:
+            date (str): Date for filtering move lines (format: 'YYYY-MM-DD').
+            partner (list): List of partner IDs to filter move lines for.
+
+        Returns:
+            dict: Dictionary containing an empty list of move lines by partner
+                  name, and the aged amounts of each partner under the
+                  'partner_totals' key.
+        """
+        return self._get_aged_data(date, partner)
+
+    @api.model
+    def get_move_lines(self, partner_id, date):
+        """
+        Retrieve the open move lines of a partner with their aged amounts,
+        when the partner is expanded.
+
+        Parameters:
+            partner_id (int): ID of the partner.
+            date (str): Date for filtering move lines (format: 'YYYY-MM-DD').
+
+        Returns:
+            list: The move lines of the partner.
+        """
+        move_lines = self._get_export_lines(date, [partner_id])
+        return move_lines[partner_id]
+
+    @api.model
+    def get_export_lines(self, date, partner):
+        """
+        Retrieve the open move lines of every partner, as printed in the PDF
+        and XLSX reports.
+
+        Parameters:
+            date (str): Date for filtering move lines (format: 'YYYY-MM-DD').
+            partner (list): List of partner IDs to filter move lines for.
+
+        Returns:
+            dict: Dictionary containing the move lines by partner name.
+        """
+        move_lines = self._get_export_lines(date, partner)
+        partners = self.env['res.partner'].browse(list(move_lines))
+        return {partner_id.name: move_lines[partner_id.id]
+                for partner_id in partners}
+
+    def _get_domain(self, date, partner):
+        """
+        Get the domain of the open move lines of the report.
+
+        Parameters:
+            date (str): Date for filtering move lines (format: 'YYYY-MM-DD').
+            partner (list): List of partner IDs to filter move lines for.
+
+        Returns:
+            list: The domain of the move lines.
+        """
+        domain = [('parent_state', '=', 'posted'),
+                  ('account_type', '=', self._aged_account_type),
+                  ('reconciled', '=', False),
+                  ('partner_id', '!=', False)]
+        if date:
+            domain.append(('date', '<=', date))
+        if partner:
+            domain.append(('partner_id', 'in', partner))
+        return domain
+
+    def _get_aged_data(self, date, partner):
+        """
+        Compute the aged amounts of every partner in one query grouped by
+        partner, each bucket being the sum of the amounts whose days past
+        the maturity date at the given date fall in it.
+
+        Parameters:
+            date (str): Date of the aging, today when empty.
+            partner (list): List of partner IDs to filter move lines for.
+
+        Returns:
+            dict: Dictionary containing an empty list of move lines by partner
+                  name, and the aged amounts of each partner under the
+                  'partner_totals' key. The amounts are not formatted.
+        """
+        aging_date = fields.Date.to_date(date) or fields.Date.today()
+        query = self.env['account.move.line']._search(
+            self._get_domain(date, partner))
+        amount = SQL.identifier(query.table, self._aged_amount_field)
+        date_maturity = SQL.identifier(query.table, 'date_maturity')
+        days = SQL("(%s::date - %s)", aging_date, date_maturity)
+        buckets = []
+        for after, up_to in AGING_BUCKETS:
+            if after is None:
+                condition = SQL("%s IS NULL OR %s <= %s", date_maturity, days,
+                                up_to)
+            elif up_to is None:
+                condition = SQL("%s > %s", days, after)
+            else:
+                condition = SQL("%s > %s AND %s <= %s", days, after, days,
+                                up_to)
+            buckets.append(SQL("COALESCE(SUM(%s) FILTER (WHERE %s), 0)::float",
+                               amount, condition))
+        partner_column = SQL.identifier(query.table, 'partner_id')
+        query.groupby = partner_column
+        rows = self.env.execute_query(query.select(
+            partner_column, SQL("SUM(%s)::float", amount), *buckets))
+        currency_id = self.env.company.currency_id.symbol
+        partners = self.env['res.partner'].browse([row[0] for row in rows])
+        totals = {row[0]: row[1:] for row in rows}
+        move_line_list = {}
+        partner_total = {}
+        for partner_id in partners.sorted('name'):
+            total, *aged_amounts = totals[partner_id.id]
+            move_line_list[partner_id.name] = []
+            partner_total[partner_id.name] = {
+                f'{self._aged_amount_field}_sum': total,
+                **{f'diff{index}_sum': round(aged_amount, 2)
+                   for index, aged_amount in enumerate(aged_amounts)},
+                'currency_id': currency_id,
+                'partner_id': partner_id.id
+            }
+        move_line_list['partner_totals'] = partner_total
+        return move_line_list
+
+    def _get_export_lines(self, date, partner):
+        """
+        Read the open move lines with their aged amounts by partner ID.
+
+        Parameters:
+            date (str): Date of the aging, today when empty.
+            partner (list): List of partner IDs to filter move lines for.
+
+        Returns:
+            dict: Dictionary containing the move lines by partner ID.
+        """
+        aging_date = fields.Date.to_date(date) or fields.Date.today()
+        move_lines = defaultdict(list)
+        for val in self.env['account.move.line'].search_read(
+                self._get_domain(date, partner),
+                ['name', 'move_name', 'date', 'amount_currency', 'account_id',
+                 'date_maturity', 'currency_id', self._aged_amount_field,
+                 'move_id', 'partner_id'],
+                order='partner_id, date, id'):
+            difference = 0
+            if val['date_maturity']:
+                difference = (aging_date - val['date_maturity']).days
+            for index, (after, up_to) in enumerate(AGING_BUCKETS):
+                in_bucket = ((after is None or difference > after) and
+                             (up_to is None or difference <= up_to))
+                val[f'diff{index}'] = val[self._aged_amount_field] \
+                    if in_bucket else 0.0
+            move_lines[val['partner_id'][0]].append(val)
+        return move_lines
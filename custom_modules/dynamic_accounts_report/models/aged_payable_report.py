@@ -22,135 +22,16 @@
 import io
 import json
 import xlsxwriter
-from odoo import api, fields, models
+from odoo import api, models
 
 
 class AgePayableReport(models.TransientModel):
     """For creating Age Payable report"""
     _name = 'age.payable.report'
     _description = 'Aged Payable Report'
-
-    @api.model
-    def view_report(self):
-        """
-        Generate a report with move line data categorized by partner and credit
-        difference.
-        Returns:
-            dict: Dictionary containing move line data categorized by partner
-                  names. Each partner's data includes credit amounts and credit
-                  differences based on days between maturity date and today. The
-                  'partner_totals' key contains summary data for each partner.
-        """
-        partner_total = {}
-        move_line_list = {}
-        paid = self.env['account.move.line'].search(
-            [('parent_state', '=', 'posted'),
-             ('account_type', '=', 'liability_payable'),
-             ('reconciled', '=', False)])
-        currency_id = self.env.company.currency_id.symbol
-        partner_ids = paid.mapped('partner_id')
-        today = fields.Date.today()
-        for partner_id in partner_ids:
-            move_line_ids = paid.filtered(
-                lambda rec: rec.partner_id in partner_id)
-            move_line_data = move_line_ids.read(
-                ['name', 'move_name', 'date', 'amount_currency', 'account_id',
-                 'date_maturity', 'currency_id', 'credit', 'move_id'])
-            for val in move_line_data:
-                diffrence = (today - val['date_maturity']).days
-                val['diff0'] = val['credit'] if diffrence <= 0 else 0.0
-                val['diff1'] = val['credit'] if 0 < diffrence <= 30 else 0.0
-                val['diff2'] = val['credit'] if 30 < diffrence <= 60 else 0.0
-                val['diff3'] = val['credit'] if 60 < diffrence <= 90 else 0.0
-                val['diff4'] = val['credit'] if 90 < diffrence <= 120 else 0.0
-                val['diff5'] = val['credit'] if diffrence > 120 else 0.0
-            move_line_list[partner_id.name] = move_line_data
-            partner_total[partner_id.name] = {
-                'credit_sum': sum(val['credit'] for val in move_line_data),
-                'diff0_sum': round(sum(val['diff0'] for val in move_line_data),
-                                   2),
-                'diff1_sum': round(sum(val['diff1'] for val in move_line_data),
-                                   2),
-                'diff2_sum': round(sum(val['diff2'] for val in move_line_data),
-                                   2),
-                'diff3_sum': round(sum(val['diff3'] for val in move_line_data),
-                                   2),
-                'diff4_sum': round(sum(val['diff4'] for val in move_line_data),
-                                   2),
-                'diff5_sum': round(sum(val['diff5'] for val in move_line_data),
-                                   2),
-                'currency_id': currency_id,
-                'partner_id': partner_id.id
-            }
-        move_line_list['partner_totals'] = partner_total
-        return move_line_list
-
-    @api.model
-    def get_filter_values(self, date, partner):
-        """
-        Retrieve filtered move line data based on date and partner(s).
-        Parameters:
-            date (str): Date for filtering move lines (format: 'YYYY-MM-DD').
-            partner (list): List of partner IDs to filter move lines for.
-        Returns:
-            dict: Dictionary with filtered move line data organized by partner
-                  names. Includes credit amount categorization based on days
-                  difference. Contains partner-wise summary under
-                  'partner_totals' key.
-        """
-        partner_total = {}
-        move_line_list = {}
-        if date:
-            paid = self.env['account.move.line'].search(
-                [('parent_state', '=', 'posted'),
-                 ('account_type', '=', 'liability_payable'),
-                 ('reconciled', '=', False), ('date', '<=', date)])
-        else:
-            paid = self.env['account.move.line'].search(
-                [('parent_state', '=', 'posted'),
-                 ('account_type', '=', 'liability_payable'),
-                 ('reconciled', '=', False)])
-        currency_id = self.env.company.currency_id.symbol
-        if partner:
-            partner_ids = self.env['res.partner'].search(
-                [('id', 'in', partner)])
-        else:
-            partner_ids = paid.mapped('partner_id')
-        today = fields.Date.today()
-        for partner_id in partner_ids:
-            move_line_ids = paid.filtered(
-                lambda rec: rec.partner_id in partner_id)
-            move_line_data = move_line_ids.read(
-                ['name', 'move_name', 'date', 'amount_currency', 'account_id',
-                 'date_maturity', 'currency_id', 'credit', 'move_id'])
-            for val in move_line_data:
-                diffrence = (today - val['date_maturity']).days
-                val['diff0'] = val['credit'] if diffrence <= 0 else 0.0
-                val['diff1'] = val['credit'] if 0 < diffrence <= 30 else 0.0
-                val['diff2'] = val['credit'] if 30 < diffrence <= 60 else 0.0
-                val['diff3'] = val['credit'] if 60 < diffrence <= 90 else 0.0
-                val['diff4'] = val['credit'] if 90 < diffrence <= 120 else 0.0
-                val['diff5'] = val['credit'] if diffrence > 120 else 0.0
-            move_line_list[partner_id.name] = move_line_data
-            partner_total[partner_id.name] = {
-                'credit_sum': sum(val['credit'] for val in move_line_data),
-                'diff0_sum': round(sum(val['diff0'] for val in move_line_data),
-                                   2),
-                'diff1_sum': round(sum(val['diff1'] for val in move_line_data),
-                                   2),
-                'diff2_sum': round(sum(val['diff2'] for val in move_line_data),
-                                   2),
-                'diff3_sum': round(sum(val['diff3'] for val in move_line_data),
-                                   2),
-                'diff4_sum': round(sum(val['diff4'] for val in move_line_data),
-                                   2),
-                'diff5_sum': round(sum(val['diff5'] for val in move_line_data),
-                                   2),
-                'currency_id': currency_id,
-                'partner_id': partner_id.id
-            }
-        move_line_list['partner_totals'] = partner_total
-        return move_line_list
+    _inherit = 'dynamic.aged.report'
+    _aged_account_type = 'liability_payable'
+    _aged_amount_field = 'credit'
 
     @api.model
     def get_xlsx_report(self, data, response, report_name, report_action):
@@ -22,12 +22,27 @@
 import io
 import json
 import datetime
+from collections import defaultdict
 import xlsxwriter
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError
+from odoo.osv import expression
 from odoo.tools.date_utils import get_month, get_fiscal_year, get_quarter, \
     subtract
 
+ACCOUNT_TYPES = [
+    'income', 'income_other', 'expense', 'expense_depreciation',
+    'expense_direct_cost', 'asset_receivable', 'asset_cash', 'asset_current',
+    'asset_non_current', 'asset_prepayments', 'asset_fixed',
+    'liability_payable', 'liability_credit_card', 'liability_current',
+    'liability_non_current', 'equity', 'equity_unaffected',
+]
+# Account types whose amounts are shown as credit minus debit
+CREDIT_ACCOUNT_TYPES = [
+    'income', 'income_other', 'liability_payable', 'liability_current',
+    'liability_non_current', 'equity', 'equity_unaffected',
+]
+
 
 class ProfitLossReport(models.TransientModel):
     """For creating Profit and Loss and Balance sheet report."""
@@ -64,257 +79,198 @@ class ProfitLossReport(models.TransientModel):
 
     @api.model
     def view_report(self, option, comparison, comparison_type):
-        datas = []
-        account_types = {
-            'income': 'income',
-            'income_other': 'income_other',
-            'expense': 'expense',
-            'expense_depreciation': 'expense_depreciation',
-            'expense_direct_cost': 'expense_direct_cost',
-            'asset_receivable': 'asset_receivable',
-            'asset_cash': 'asset_cash',
-            'asset_current': 'asset_current',
-            'asset_non_current': 'asset_non_current',
-            'asset_prepayments': 'asset_prepayments',
-            'asset_fixed': 'asset_fixed',
-            'liability_payable': 'liability_payable',
-            'liability_credit_card': 'liability_credit_card',
-            'liability_current': 'liability_current',
-            'liability_non_current': 'liability_non_current',
-            'equity': 'equity',
-            'equity_unaffected': 'equity_unaffected',
-        }
+        """
+            Compute the Profit and Loss and Balance Sheet values of the report
+            period, or of each comparison period.
+            :param option: The ID of the report record.
+            :param comparison: The number of comparison periods.
+            :param comparison_type: The comparison type, 'month' or 'year'.
+            :return: A tuple containing the values of the last period, the
+                filter data and the values of every period.
+            """
         financial_report_id = self.browse(option)
-        current_year = fields.Date.today().year
+        periods = self._get_periods(financial_report_id, comparison,
+                                    comparison_type)
+        account_ids = self.env['account.account'].search(
+            [('account_type', 'in', ACCOUNT_TYPES)])
+        accounts_by_type = {
+            account_type: account_ids.filtered(
+                lambda account: account.account_type == account_type)
+            for account_type in ACCOUNT_TYPES}
+        balances = self._get_balances(financial_report_id, periods)
+        datas = [self._get_period_data(accounts_by_type, period_balances)
+                 for period_balances in balances]
+        filters = self._get_filter_data()
+        return datas[-1], filters, datas
+
+    def _get_periods(self, financial_report_id, comparison, comparison_type):
+        """
+            Get the date ranges of the report, one per comparison period, or
+            the report period when there is no comparison. The comparison
+            periods are restricted to the start and end dates of the report.
+            :param financial_report_id: The report record.
+            :param comparison: The number of comparison periods.
+            :param comparison_type: The comparison type, 'month' or 'year'.
+            :return: A list of (date_from, date_to) tuples, an empty range has
+                a start date after its end date.
+            """
         current_date = fields.Date.today()
+        current_year = current_date.year
+        if not comparison:
+            return [(financial_report_id.date_from or
+                     datetime.date(current_year, 1, 1),
+                     financial_report_id.date_to or
+                     datetime.date(current_year, 12, 31))]
+        periods = []
+        for count in range(0, int(comparison) + 1):
+            if comparison_type == "month":
+                month_date = current_date - datetime.timedelta(
+                    days=30 * count)
+                periods.append((month_date.replace(day=1),
+                                month_date.replace(day=12)))
+            elif comparison_type == "year":
+                periods.append((datetime.date(current_year - count, 1, 1),
+                                datetime.date(current_year - count, 12, 31)))
+        return [(max(filter(None, [date_from, financial_report_id.date_from])),
+                 min(filter(None, [date_to, financial_report_id.date_to])))
+                for date_from, date_to in periods]
+
+    def _get_balances(self, financial_report_id, periods):
+        """
+            Get the balance of every account for each period, in one grouped
+            query over the move lines of all the periods.
+            :param financial_report_id: The report record.
+            :param periods: The (date_from, date_to) tuples of the periods.
+            :return: A list containing a dictionary of the balances by account
+                ID for each period.
+            """
+        balances = [defaultdict(float) for _period in periods]
+        period_domains = [
+            [('date', '>=', date_from), ('date', '<=', date_to)]
+            for date_from, date_to in periods if date_from <= date_to]
+        if not period_domains:
+            return balances
         if financial_report_id.target_move == 'draft':
             target_move = ['posted', 'draft']
         else:
             target_move = ['posted']
-        if comparison:
-            for count in range(0, int(comparison) + 1):
-                if comparison_type == "month":
-                    account_move_lines = self.env['account.move.line'].search(
-                        [(
-                            'parent_state', 'in', target_move),
-                            ('date', '>=', (current_date - datetime.timedelta(
-                                days=30 * count)).strftime('%Y-%m-01')),
-                            ('date', '<=', (current_date - datetime.timedelta(
-                                days=30 * count)).strftime('%Y-%m-12'))])
-                elif comparison_type == "year":
-                    account_move_lines = self.env['account.move.line'].search(
-                        [(
-                            'parent_state', 'in', target_move),
-                            ('date', '>=', f'{current_year - count}-01-01'),
-                            ('date', '<=', f'{current_year - count}-12-31')])
-                lists = [{'id': rec.id, 'value': [eval(i) for i in
-                                                  rec.analytic_distribution.keys()]}
-                         for rec in account_move_lines if
-                         rec.analytic_distribution]
-                if financial_report_id.analytic_ids:
-                    account_move_lines = account_move_lines.filtered(lambda
-                                                                         rec: rec.id in [
-                        lst['id'] for lst in lists if lst['value'] and any(
-                            i in financial_report_id.analytic_ids.mapped('id')
-                            for i in lst['value'])])
-                account_move_lines = account_move_lines.filtered(lambda
-                                                                     a: not financial_report_id.journal_ids or a.journal_id in financial_report_id.journal_ids)
-                account_move_lines = account_move_lines.filtered(lambda
-                                                                     a: not financial_report_id.account_ids or a.account_id in financial_report_id.account_ids)
-                account_move_lines = account_move_lines.filtered(lambda
-                                                                     a: not financial_report_id.date_from or a.date >= financial_report_id.date_from)
-                account_move_lines = account_move_lines.filtered(lambda
-                                                                     a: not financial_report_id.date_to or a.date <= financial_report_id.date_to)
-                account_entries = {}
-                for account_type in account_types.values():
-                    account_entries[account_type] = self._get_entries(
-                        account_move_lines, self.env['account.account'].search(
-                            [('account_type', '=', account_type)]),
-                        account_type)
-                total_income = sum(
-                    float(entry['amount'].replace(',', '')) for account_type
-                    in
-                    ['income', 'income_other'] for entry in
-                    account_entries[account_type][0]) - sum(
-                    float(entry['amount'].replace(',', '')) for entry in
-                    account_entries['expense_direct_cost'][0])
-                total_expense = sum(
-                    float(entry['amount'].replace(',', '')) for account_type
-                    in
-                    ['expense', 'expense_depreciation'] for entry in
-                    account_entries[account_type][0])
-                total_current_asset = sum(
-                    float(entry['amount'].replace(',', '')) for account_type
-                    in
-                    ['asset_receivable', 'asset_current', 'asset_cash',
-                     'asset_prepayments'] for entry in
-                    account_entries[account_type][0])
-                total_assets = total_current_asset + sum(
-                    float(entry['amount'].replace(',', '')) for account_type
-                    in
-                    ['asset_fixed', 'asset_non_current'] for entry in
-                    account_entries[account_type][0])
-                total_current_liability = sum(
-                    float(entry['amount'].replace(',', '')) for account_type
-                    in
-                    ['liability_current', 'liability_payable'] for entry in
-                    account_entries[account_type][0])
-                total_liability = total_current_liability + sum(
-                    float(entry['amount'].replace(',', '')) for account_type
-                    in
-                    ['liability_non_current'] for entry in
-                    account_entries[account_type][0])
-                total_unallocated_earning = (
-                                                    total_income - total_expense) + sum(
-                    float(entry['amount'].replace(',', '')) for account_type
-                    in
-                    ['equity_unaffected'] for entry in
-                    account_entries[account_type][0])
-                total_equity = total_unallocated_earning + sum(
-                    float(entry['amount'].replace(',', '')) for account_type
-                    in
-                    ['equity'] for entry in
-                    account_entries[account_type][0])
-                total = total_liability + total_equity
-                data = {
-                    'total': total_income - total_expense,
-                    'total_expense': "{:,.2f}".format(total_expense),
-                    'total_income': "{:,.2f}".format(total_income),
-                    'total_current_asset': "{:,.2f}".format(
-                        total_current_asset),
-                    'total_assets': "{:,.2f}".format(total_assets),
-                    'total_current_liability': "{:,.2f}".format(
-                        total_current_liability),
-                    'total_liability': "{:,.2f}".format(total_liability),
-                    'total_earnings': "{:,.2f}".format(
-                        total_income - total_expense),
-                    'total_unallocated_earning': "{:,.2f}".format(
-                        total_unallocated_earning),
-                    'total_equity': "{:,.2f}".format(total_equity),
-                    'total_balance': "{:,.2f}".format(total),
-                    **account_entries}
-                datas.append(data)
-        else:
-            current_year = fields.Date.today().year
-            date_from = financial_report_id.date_from or f'{current_year}-01-01'
-            date_to = financial_report_id.date_to or f'{current_year}-12-31'
-            account_move_lines = self.env['account.move.line'].search(
-                [('parent_state', 'in', target_move),
-                 ('date', '>=', date_from),
-                 ('date', '<=', date_to)])
-            lists = [{'id': rec.id,
-                      'value': [eval(i) for i in
-                                rec.analytic_distribution.keys()]}
-                     for rec in account_move_lines if
-                     rec.analytic_distribution]
-            if financial_report_id.analytic_ids:
-                account_move_lines = account_move_lines.filtered(
-                    lambda rec: rec.id in [lst['id'] for lst in lists if
-                                           lst['value'] and any(
-                                               i in financial_report_id.analytic_ids.mapped(
-                                                   'id') for i in
-                                               lst['value'])])
-            account_move_lines = account_move_lines.filtered(lambda
-                                                                 a: not financial_report_id.journal_ids or a.journal_id in financial_report_id.journal_ids)
-            account_move_lines = account_move_lines.filtered(lambda
-                                                                 a: not financial_report_id.account_ids or a.account_id in financial_report_id.account_ids)
-            account_move_lines = account_move_lines.filtered(lambda
-                                                                 a: not financial_report_id.date_from or a.date >= financial_report_id.date_from)
-            account_move_lines = account_move_lines.filtered(lambda
-                                                                 a: not financial_report_id.date_to or a.date <= financial_report_id.date_to)
-            account_entries = {}
-            for account_type in account_types.values():
-                account_entries[account_type] = self._get_entries(
-                    account_move_lines, self.env['account.account'].search(
-                        [('account_type', '=', account_type)]), account_type)
-            total_income = sum(
-                float(entry['amount'].replace(',', '')) for account_type in
-                ['income', 'income_other'] for entry in
-                account_entries[account_type][0]) - sum(
-                float(entry['amount'].replace(',', '')) for entry in
-                account_entries['expense_direct_cost'][0])
-            total_expense = sum(
-                float(entry['amount'].replace(',', '')) for account_type in
-                ['expense', 'expense_depreciation'] for entry in
-                account_entries[account_type][0])
-            total_current_asset = sum(
-                float(entry['amount'].replace(',', '')) for account_type in
-                ['asset_receivable', 'asset_current', 'asset_cash',
-                 'asset_prepayments'] for entry in
-                account_entries[account_type][0])
-            total_assets = total_current_asset + sum(
-                float(entry['amount'].replace(',', '')) for account_type in
-                ['asset_fixed', 'asset_non_current'] for entry in
-                account_entries[account_type][0])
-            total_current_liability = sum(
-                float(entry['amount'].replace(',', '')) for account_type in
-                ['liability_current', 'liability_payable'] for entry in
-                account_entries[account_type][0])
-            total_liability = total_current_liability + sum(
-                float(entry['amount'].replace(',', '')) for account_type in
-                ['liability_non_current'] for entry in
-                account_entries[account_type][0])
-            total_unallocated_earning = (total_income - total_expense) + sum(
-                float(entry['amount'].replace(',', '')) for account_type in
-                ['equity_unaffected'] for entry in
-                account_entries[account_type][0])
-            total_equity = total_unallocated_earning + sum(
-                float(entry['amount'].replace(',', '')) for account_type in
-                ['equity'] for entry in account_entries[account_type][0])
-            total = total_liability + total_equity
-            data = {
-                'total': total_income - total_expense,
-                'total_expense': "{:,.2f}".format(total_expense),
-                'total_income': "{:,.2f}".format(total_income),
-                'total_current_asset': "{:,.2f}".format(total_current_asset),
-                'total_assets': "{:,.2f}".format(total_assets),
-                'total_current_liability': "{:,.2f}".format(
-                    total_current_liability),
-                'total_liability': "{:,.2f}".format(total_liability),
-                'total_earnings': "{:,.2f}".format(
-                    total_income - total_expense),
-                'total_unallocated_earning': "{:,.2f}".format(
-                    total_unallocated_earning),
-                'total_equity': "{:,.2f}".format(total_equity),
-                'total_balance': "{:,.2f}".format(total),
-                **account_entries}
-            datas.append(data)
-        filters = self._get_filter_data()
-        return data, filters, datas
+        domain = [('parent_state', 'in', target_move)]
+        if financial_report_id.journal_ids:
+            domain.append(
+                ('journal_id', 'in', financial_report_id.journal_ids.ids))
+        if financial_report_id.account_ids:
+            domain.append(
+                ('account_id', 'in', financial_report_id.account_ids.ids))
+        if financial_report_id.analytic_ids:
+            domain.append(('analytic_distribution', 'in',
+                           financial_report_id.analytic_ids.ids))
+        domain = expression.AND([domain, expression.OR(period_domains)])
+        granularity = self._get_period_granularity(periods)
+        groupby = ['account_id']
+        if len(periods) > 1:
+            groupby.append(f'date:{granularity}')
+        for group in self.env['account.move.line']._read_group(
+                domain, groupby, ['balance:sum']):
+            account, balance = group[0], group[-1]
+            for index, (date_from, date_to) in enumerate(periods):
+                # Every bucket of the granularity lies in or out of a period
+                if len(groupby) == 1 or date_from <= group[1] <= date_to:
+                    balances[index][account.id] += balance
+        return balances
+
+    @api.model
+    def _get_period_granularity(self, periods):
+        """
+            Get the coarsest date granularity aligned on the bounds of all the
+            periods, so that the lines can be grouped by date before being
+            dispatched to the periods.
+            :param periods: The (date_from, date_to) tuples of the periods.
+            :return: 'year', 'month' or 'day'.
+            """
+        periods = [period for period in periods if period[0] <= period[1]]
+        if all(date_from == date_from.replace(month=1, day=1) and
+               date_to == date_to.replace(month=12, day=31)
+               for date_from, date_to in periods):
+            return 'year'
+        if all(date_from.day == 1 and
+               date_to == get_month(date_to)[1]
+               for date_from, date_to in periods):
+            return 'month'
+        return 'day'
 
-    def _get_entries(self, account_move_lines, account_ids, account_type):
+    def _get_period_data(self, accounts_by_type, balances):
+        """
+            Compute the entries and totals of a period from its balances.
+            :param accounts_by_type: A dictionary of the accounts of the report
+                by account type.
+            :param balances: A dictionary of the balances by account ID.
+            :return: A dictionary containing the entries by account type and
+                the totals of the period.
+            """
+        account_entries = {}
+        account_totals = {}
+        for account_type in ACCOUNT_TYPES:
+            account_entries[account_type] = self._get_entries(
+                balances, accounts_by_type[account_type], account_type)
+            # The totals add up the amounts as displayed
+            account_totals[account_type] = sum(
+                float(entry['amount'].replace(',', ''))
+                for entry in account_entries[account_type][0])
+        total_income = (account_totals['income'] +
+                        account_totals['income_other'] -
+                        account_totals['expense_direct_cost'])
+        total_expense = (account_totals['expense'] +
+                         account_totals['expense_depreciation'])
+        total_current_asset = (account_totals['asset_receivable'] +
+                               account_totals['asset_current'] +
+                               account_totals['asset_cash'] +
+                               account_totals['asset_prepayments'])
+        total_assets = (total_current_asset + account_totals['asset_fixed'] +
+                        account_totals['asset_non_current'])
+        total_current_liability = (account_totals['liability_current'] +
+                                   account_totals['liability_payable'])
+        total_liability = (total_current_liability +
+                           account_totals['liability_non_current'])
+        total_unallocated_earning = (total_income - total_expense +
+                                     account_totals['equity_unaffected'])
+        total_equity = total_unallocated_earning + account_totals['equity']
+        total = total_liability + total_equity
+        return {
+            'total': total_income - total_expense,
+            'total_expense': "{:,.2f}".format(total_expense),
+            'total_income': "{:,.2f}".format(total_income),
+            'total_current_asset': "{:,.2f}".format(total_current_asset),
+            'total_assets': "{:,.2f}".format(total_assets),
+            'total_current_liability': "{:,.2f}".format(
+                total_current_liability),
+            'total_liability': "{:,.2f}".format(total_liability),
+            'total_earnings': "{:,.2f}".format(
+                total_income - total_expense),
+            'total_unallocated_earning': "{:,.2f}".format(
+                total_unallocated_earning),
+            'total_equity': "{:,.2f}".format(total_equity),
+            'total_balance': "{:,.2f}".format(total),
+            **account_entries}
+
+    def _get_entries(self, balances, account_ids, account_type):
         """
             Get the entries for the specified account type.
-            :param account_move_lines: The account move lines to filter.
-            :param account_ids: The account IDs to filter.
+            :param balances: A dictionary of the balances by account ID.
+            :param account_ids: The accounts of the account type.
             :param account_type: The account type.
             :return: A tuple containing the entries and the total amount.
             """
         entries = []
         total = 0
         for account in account_ids:
-            filtered_lines = account_move_lines.filtered(
-                lambda line: line.account_id == account)
-            if filtered_lines:
-                if account_type in ['income', 'income_other',
-                                    'liability_payable', 'liability_current',
-                                    'liability_non_current', 'equity',
-                                    'equity_unaffected']:
-                    amount = -(sum(filtered_lines.mapped('debit')) - sum(
-                        filtered_lines.mapped('credit')))
-                else:
-                    amount = sum(filtered_lines.mapped('debit')) - sum(
-                        filtered_lines.mapped('credit'))
-                entries.append({
-                    'name': "{} - {}".format(account.code, account.name),
-                    'amount': "{:,.2f}".format(amount),
-                })
-                total += amount
-            else:
-                entries.append({
-                    'name': "{} - {}".format(account.code, account.name),
-                    'amount': "{:,.2f}".format(0),
-                })
+            amount = balances.get(account.id, 0)
+            if account_type in CREDIT_ACCOUNT_TYPES:
+                amount = -amount
+            entries.append({
+                'name': "{} - {}".format(account.code, account.name),
+                'amount': "{:,.2f}".format(amount),
+            })
+            total += amount
         return entries, "{:,.2f}".format(total)
 
     def filter(self, vals):
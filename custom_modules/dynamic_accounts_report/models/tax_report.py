@@ -22,9 +22,12 @@
 import calendar
 import io
 import json
+from collections import defaultdict
 from datetime import datetime
 import xlsxwriter
 from odoo import models, fields, api
+from odoo.osv import expression
+from odoo.tools import SQL
 from odoo.tools.date_utils import get_month, get_fiscal_year, \
     get_quarter_number, subtract
 
@@ -46,33 +49,14 @@ class TaxReport(models.TransientModel):
         """
         sale = []
         purchase = []
-        tax_ids = self.env['account.move.line'].search([]).mapped(
-            'tax_ids')
-        today = fields.Date.today()
-        for tax in tax_ids:
-            tax_id = self.env['account.move.line'].search(
-                [('tax_ids', '=', tax.id), ('parent_state', '=', 'posted'),
-                 ('date', '>=', get_month(today)[0]),
-                 ('date', '<=', get_month(today)[1])]).read(
-                ['debit', 'credit'])
-            tax_debit_sums = sum(record['debit'] for record in tax_id)
-            tax_credit_sums = sum(record['credit'] for record in tax_id)
+        periods = [get_month(fields.Date.today())]
+        net_sums, _counts = self._get_tax_sums(['posted'], periods)
+        for tax in self._get_used_taxes():
+            row = self._get_tax_row(tax, net_sums[tax.id, False])
             if tax.type_tax_use == 'sale':
-                sale.append({
-                    'name': tax.name,
-                    'amount': tax.amount,
-                    'net': round(tax_debit_sums + tax_credit_sums, 2),
-                    'tax': round((tax_debit_sums + tax_credit_sums) * (
-                            tax.amount / 100), 2)
-                })
+                sale.append(row)
             elif tax.type_tax_use == 'purchase':
-                purchase.append({
-                    'name': tax.name,
-                    'amount': tax.amount,
-                    'net': round(tax_debit_sums + tax_credit_sums, 2),
-                    'tax': round((tax_debit_sums + tax_credit_sums) * (
-                            tax.amount / 100), 2)
-                })
+                purchase.append(row)
         return {
             'sale': sale,
             'purchase': purchase
@@ -102,498 +86,181 @@ class TaxReport(models.TransientModel):
             option_domain = ['posted']
         elif 'draft' in options:
             option_domain = ['posted', 'draft']
-        tax_ids = self.env['account.move.line'].search([]).mapped(
-            'tax_ids')
-        start_date_first = \
+        comparison_count = eval(comparison_number) if comparison_number else 0
+        start_date = \
             get_fiscal_year(datetime.strptime(start_date, "%Y-%m-%d").date())[
                 0] if comparison_type == 'year' else datetime.strptime(
                 start_date, "%Y-%m-%d").date()
-        end_date_first = \
+        end_date = \
             get_fiscal_year(datetime.strptime(end_date, "%Y-%m-%d").date())[
                 1] if comparison_type == 'year' else datetime.strptime(
                 end_date, "%Y-%m-%d").date()
-        if report_type is not None and 'account' in report_type:
-            start_date = start_date_first
-            end_date = end_date_first
-            account_ids = self.env['account.move.line'].search([]).mapped(
-                'account_id')
-            for account in account_ids:
-                tax_ids = self.env['account.move.line'].search(
-                    [('account_id', '=', account.id)]).mapped('tax_ids')
-                if tax_ids:
-                    for tax in tax_ids:
-                        dynamic_total_tax_sum = {}
-                        dynamic_total_net_sum = {}
-                        if comparison_number:
-                            if comparison_type == 'year':
-                                start_date = start_date_first
-                                end_date = end_date_first
-                                for i in range(1, eval(comparison_number) + 1):
-                                    com_start_date = subtract(start_date,
-                                                              years=i)
-                                    com_end_date = subtract(end_date, years=i)
-                                    tax_id = self.env[
-                                        'account.move.line'].search(
-                                        [('tax_ids', '=', tax.id),
-                                         ('date', '>=', com_start_date),
-                                         ('date', '<=', com_end_date),
-                                         ('account_id', '=', account.id),
-                                         ('parent_state', 'in',
-                                          option_domain)]).read(
-                                        ['debit', 'credit'])
-                                    tax_debit_sums = sum(
-                                        record['debit'] for record in tax_id)
-                                    tax_credit_sums = sum(
-                                        record['credit'] for record in tax_id)
-                                    dynamic_total_net_sum[
-                                        f"dynamic_total_net_sum{i}"] = tax_debit_sums + tax_credit_sums
-                                    dynamic_total_tax_sum[
-                                        f"dynamic_total_tax_sum{i}"] = \
-                                        dynamic_total_net_sum[
-                                            f"dynamic_total_net_sum{i}"] * (
-                                                tax.amount / 100)
-                            elif comparison_type == 'month':
-                                dynamic_date_num[
-                                    f"dynamic_date_num{0}"] = self.get_month_name(
-                                    start_date) + ' ' + str(start_date.year)
-                                for i in range(1, eval(comparison_number) + 1):
-                                    com_start_date = subtract(start_date,
-                                                              months=i)
-                                    com_end_date = subtract(end_date, months=i)
-                                    tax_id = self.env[
-                                        'account.move.line'].search(
-                                        [('tax_ids', '=', tax.id),
-                                         ('date', '>=', com_start_date),
-                                         ('account_id', '=', account.id),
-                                         ('date', '<=', com_end_date),
-                                         ('parent_state', 'in',
-                                          option_domain)]).read(
-                                        ['debit', 'credit'])
-                                    tax_debit_sums = sum(
-                                        record['debit'] for record in tax_id)
-                                    tax_credit_sums = sum(
-                                        record['credit'] for record in tax_id)
-                                    dynamic_total_net_sum[
-                                        f"dynamic_total_net_sum{i}"] = tax_debit_sums + tax_credit_sums
-                                    dynamic_total_tax_sum[
-                                        f"dynamic_total_tax_sum{i}"] = \
-                                        dynamic_total_net_sum[
-                                            f"dynamic_total_net_sum{i}"] * (
-                                                tax.amount / 100)
-                                    dynamic_date_num[
-                                        f"dynamic_date_num{i}"] = self.get_month_name(
-                                        com_start_date) + ' ' + str(
-                                        com_start_date.year)
-                            elif comparison_type == 'quarter':
-                                dynamic_date_num[
-                                    f"dynamic_date_num{0}"] = 'Q' + ' ' + str(
-                                    get_quarter_number(
-                                        start_date)) + ' ' + str(
-                                    start_date.year)
-                                for i in range(1, eval(comparison_number) + 1):
-                                    com_start_date = subtract(start_date,
-                                                              months=i * 3)
-                                    com_end_date = subtract(end_date,
-                                                            months=i * 3)
-                                    tax_id = self.env[
-                                        'account.move.line'].search(
-                                        [('tax_ids', '=', tax.id),
-                                         ('date', '>=', com_start_date),
-                                         ('account_id', '=', account.id),
-                                         ('date', '<=', com_end_date),
-                                         ('parent_state', 'in',
-                                          option_domain)]).read(
-                                        ['debit', 'credit'])
-                                    tax_debit_sums = sum(
-                                        record['debit'] for record in tax_id)
-                                    tax_credit_sums = sum(
-                                        record['credit'] for record in tax_id)
-                                    dynamic_total_net_sum[
-                                        f"dynamic_total_net_sum{i}"] = tax_debit_sums + tax_credit_sums
-                                    dynamic_total_tax_sum[
-                                        f"dynamic_total_tax_sum{i}"] = \
-                                        dynamic_total_net_sum[
-                                            f"dynamic_total_net_sum{i}"] * (
-                                                tax.amount / 100)
-                                    dynamic_date_num[
-                                        f"dynamic_date_num{i}"] = 'Q' + ' ' + str(
-                                        get_quarter_number(
-                                            com_start_date)) + ' ' + str(
-                                        com_start_date.year)
-                        tax_id = self.env['account.move.line'].search(
-                            [('tax_ids', '=', tax.id),
-                             ('date', '>=', start_date_first),
-                             ('date', '<=', end_date_first),
-                             ('parent_state', 'in', option_domain),
-                             ('account_id', '=', account.id)]).read(
-                            ['debit', 'credit'])
-                        tax_debit_sums = sum(
-                            record['debit'] for record in tax_id)
-                        tax_credit_sums = sum(
-                            record['credit'] for record in tax_id)
-                        if tax_id and tax.type_tax_use == 'sale':
-                            if comparison_number:
-                                sale.append({
-                                    'name': tax.name,
-                                    'amount': tax.amount,
-                                    'net': round(
-                                        tax_debit_sums + tax_credit_sums,
-                                        2),
-                                    'tax': round(
-                                        (tax_debit_sums + tax_credit_sums) * (
-                                                tax.amount / 100), 2),
-                                    'dynamic net': dynamic_total_net_sum,
-                                    'dynamic tax': dynamic_total_tax_sum,
-                                    'account': account.display_name,
-                                })
-                            else:
-                                sale.append({
-                                    'name': tax.name,
-                                    'amount': tax.amount,
-                                    'net': round(
-                                        tax_debit_sums + tax_credit_sums,
-                                        2),
-                                    'tax': round(
-                                        (tax_debit_sums + tax_credit_sums) * (
-                                                tax.amount / 100), 2),
-                                    'account': account.display_name,
-                                })
-                        elif tax_id and tax.type_tax_use == 'purchase':
-                            if comparison_number:
-                                purchase.append({
-                                    'name': tax.name,
-                                    'amount': tax.amount,
-                                    'net': round(
-                                        tax_debit_sums + tax_credit_sums,
-                                        2),
-                                    'tax': round(
-                                        (tax_debit_sums + tax_credit_sums) * (
-                                                tax.amount / 100), 2),
-                                    'dynamic net': dynamic_total_net_sum,
-                                    'dynamic tax': dynamic_total_tax_sum,
-                                    'account': account.display_name,
-                                })
-                            else:
-                                purchase.append({
-                                    'name': tax.name,
-                                    'amount': tax.amount,
-                                    'net': round(
-                                        tax_debit_sums + tax_credit_sums,
-                                        2),
-                                    'tax': round(
-                                        (tax_debit_sums + tax_credit_sums) * (
-                                                tax.amount / 100), 2),
-                                    'account': account.display_name,
-                                })
-        elif report_type is not None and 'tax' in report_type:
-            start_date = start_date_first
-            end_date = end_date_first
-            for tax in tax_ids:
-                account_ids = self.env['account.move.line'].search(
-                    [('tax_ids', '=', tax.id)]).mapped('account_id')
-                for account in account_ids:
-                    dynamic_total_tax_sum = {}
-                    dynamic_total_net_sum = {}
-                    if comparison_number:
-                        if comparison_type == 'year':
-                            start_date = start_date_first
-                            end_date = end_date_first
-                            for i in range(1, eval(comparison_number) + 1):
-                                com_start_date = subtract(start_date,
-                                                          years=i)
-                                com_end_date = subtract(end_date, years=i)
-                                tax_id = self.env[
-                                    'account.move.line'].search(
-                                    [('tax_ids', '=', tax.id),
-                                     ('date', '>=', com_start_date),
-                                     ('date', '<=', com_end_date),
-                                     ('account_id', '=', account.id),
-                                     ('parent_state', 'in',
-                                      option_domain)]).read(
-                                    ['debit', 'credit'])
-                                tax_debit_sums = sum(
-                                    record['debit'] for record in tax_id)
-                                tax_credit_sums = sum(
-                                    record['credit'] for record in tax_id)
-                                dynamic_total_net_sum[
-                                    f"dynamic_total_net_sum{i}"] = tax_debit_sums + tax_credit_sums
-                                dynamic_total_tax_sum[
-                                    f"dynamic_total_tax_sum{i}"] = \
-                                    dynamic_total_net_sum[
-                                        f"dynamic_total_net_sum{i}"] * (
-                                            tax.amount / 100)
-                        elif comparison_type == 'month':
-                            dynamic_date_num[
-                                f"dynamic_date_num{0}"] = self.get_month_name(
-                                start_date) + ' ' + str(start_date.year)
-                            for i in range(1, eval(comparison_number) + 1):
-                                com_start_date = subtract(start_date, months=i)
-                                com_end_date = subtract(end_date, months=i)
-                                tax_id = self.env[
-                                    'account.move.line'].search(
-                                    [('tax_ids', '=', tax.id),
-                                     ('date', '>=', com_start_date),
-                                     ('date', '<=', com_end_date),
-                                     ('account_id', '=', account.id),
-                                     ('parent_state', 'in',
-                                      option_domain)]).read(
-                                    ['debit', 'credit'])
-                                tax_debit_sums = sum(
-                                    record['debit'] for record in tax_id)
-                                tax_credit_sums = sum(
-                                    record['credit'] for record in tax_id)
-                                dynamic_total_net_sum[
-                                    f"dynamic_total_net_sum{i}"] = tax_debit_sums + tax_credit_sums
-                                dynamic_total_tax_sum[
-                                    f"dynamic_total_tax_sum{i}"] = \
-                                    dynamic_total_net_sum[
-                                        f"dynamic_total_net_sum{i}"] * (
-                                            tax.amount / 100)
-                                dynamic_date_num[
-                                    f"dynamic_date_num{i}"] = self.get_month_name(
-                                    com_start_date) + ' ' + str(
-                                    com_start_date.year)
-                        elif comparison_type == 'quarter':
-                            dynamic_date_num[
-                                f"dynamic_date_num{0}"] = 'Q' + ' ' + str(
-                                get_quarter_number(start_date)) + ' ' + str(
-                                start_date.year)
-                            for i in range(1, eval(comparison_number) + 1):
-                                com_start_date = subtract(start_date,
-                                                          months=i * 3)
-                                com_end_date = subtract(end_date,
-                                                        months=i * 3)
-                                tax_id = self.env[
-                                    'account.move.line'].search(
-                                    [('tax_ids', '=', tax.id),
-                                     ('date', '>=', com_start_date),
-                                     ('date', '<=', com_end_date),
-                                     ('account_id', '=', account.id),
-                                     ('parent_state', 'in',
-                                      option_domain)]).read(
-                                    ['debit', 'credit'])
-                                tax_debit_sums = sum(
-                                    record['debit'] for record in tax_id)
-                                tax_credit_sums = sum(
-                                    record['credit'] for record in tax_id)
-                                dynamic_total_net_sum[
-                                    f"dynamic_total_net_sum{i}"] = tax_debit_sums + tax_credit_sums
-                                dynamic_total_tax_sum[
-                                    f"dynamic_total_tax_sum{i}"] = \
-                                    dynamic_total_net_sum[
-                                        f"dynamic_total_net_sum{i}"] * (
-                                            tax.amount / 100)
-                                dynamic_date_num[
-                                    f"dynamic_date_num{i}"] = 'Q' + ' ' + str(
-                                    get_quarter_number(
-                                        com_start_date)) + ' ' + str(
-                                    com_start_date.year)
-                    tax_id = self.env['account.move.line'].search(
-                        [('tax_ids', '=', tax.id),
-                         ('parent_state', 'in', option_domain),
-                         ('date', '>=', start_date_first),
-                         ('date', '<=', end_date_first),
-                         ('account_id', '=', account.id)]).read(
-                        ['debit', 'credit'])
-                    tax_debit_sums = sum(
-                        record['debit'] for record in tax_id)
-                    tax_credit_sums = sum(
-                        record['credit'] for record in tax_id)
-                    if tax_id and tax.type_tax_use == 'sale':
-                        if comparison_number:
-                            sale.append({
-                                'name': tax.name,
-                                'amount': tax.amount,
-                                'net': round(tax_debit_sums + tax_credit_sums,
-                                             2),
-                                'tax': round(
-                                    (tax_debit_sums + tax_credit_sums) * (
-                                            tax.amount / 100), 2),
-                                'dynamic net': dynamic_total_net_sum,
-                                'dynamic tax': dynamic_total_tax_sum,
-                                'account': account.display_name,
-                            })
-                        else:
-                            sale.append({
-                                'name': tax.name,
-                                'amount': tax.amount,
-                                'net': round(tax_debit_sums + tax_credit_sums,
-                                             2),
-                                'tax': round(
-                                    (tax_debit_sums + tax_credit_sums) * (
-                                            tax.amount / 100), 2),
-                                'account': account.display_name,
-                            })
-                    elif tax_id and tax.type_tax_use == 'purchase':
-                        if comparison_number:
-                            purchase.append({
-                                'name': tax.name,
-                                'amount': tax.amount,
-                                'net': round(tax_debit_sums + tax_credit_sums,
-                                             2),
-                                'tax': round(
-                                    (tax_debit_sums + tax_credit_sums) * (
-                                            tax.amount / 100), 2),
-                                'dynamic net': dynamic_total_net_sum,
-                                'dynamic tax': dynamic_total_tax_sum,
-                                'account': account.display_name,
-                            })
-                        else:
-                            purchase.append({
-                                'name': tax.name,
-                                'amount': tax.amount,
-                                'net': round(tax_debit_sums + tax_credit_sums,
-                                             2),
-                                'tax': round(
-                                    (tax_debit_sums + tax_credit_sums) * (
-                                            tax.amount / 100), 2),
-                                'account': account.display_name,
-                            })
+        # The report period, then each comparison period going back in time
+        periods = [(start_date, end_date)]
+        if comparison_count and comparison_type in ('year', 'month',
+                                                    'quarter'):
+            if comparison_type == 'month':
+                dynamic_date_num[
+                    f"dynamic_date_num{0}"] = self.get_month_name(
+                    start_date) + ' ' + str(start_date.year)
+            elif comparison_type == 'quarter':
+                dynamic_date_num[
+                    f"dynamic_date_num{0}"] = 'Q' + ' ' + str(
+                    get_quarter_number(start_date)) + ' ' + str(
+                    start_date.year)
+            for i in range(1, comparison_count + 1):
+                if comparison_type == 'year':
+                    com_start_date = subtract(start_date, years=i)
+                    com_end_date = subtract(end_date, years=i)
+                elif comparison_type == 'month':
+                    com_start_date = subtract(start_date, months=i)
+                    com_end_date = subtract(end_date, months=i)
+                    dynamic_date_num[
+                        f"dynamic_date_num{i}"] = self.get_month_name(
+                        com_start_date) + ' ' + str(com_start_date.year)
+                else:
+                    com_start_date = subtract(start_date, months=i * 3)
+                    com_end_date = subtract(end_date, months=i * 3)
+                    dynamic_date_num[
+                        f"dynamic_date_num{i}"] = 'Q' + ' ' + str(
+                        get_quarter_number(com_start_date)) + ' ' + str(
+                        com_start_date.year)
+                periods.append((com_start_date, com_end_date))
+        by_account = report_type is not None and (
+                'account' in report_type or 'tax' in report_type)
+        net_sums, counts = self._get_tax_sums(option_domain, periods,
+                                              by_account=by_account)
+        if by_account:
+            # Only the taxes and accounts having lines in the report period
+            keys = [key for key in net_sums if counts[key]]
+            taxes = self.env['account.tax'].browse(
+                {tax_id for tax_id, _account_id in keys})
+            accounts = self.env['account.account'].browse(
+                {account_id for _tax_id, account_id in keys})
+            tax_order = {tax.id: index for index, tax in
+                         enumerate(taxes.sorted())}
+            account_order = {account.id: index for index, account in
+                             enumerate(accounts.sorted())}
+            if 'account' in report_type:
+                keys.sort(key=lambda key: (account_order[key[1]],
+                                           tax_order[key[0]]))
+            else:
+                keys.sort(key=lambda key: (tax_order[key[0]],
+                                           account_order[key[1]]))
+            rows = [(taxes.browse(tax_id), accounts.browse(account_id),
+                     net_sums[tax_id, account_id])
+                    for tax_id, account_id in keys]
         else:
-            start_date = start_date_first
-            end_date = end_date_first
-            for tax in tax_ids:
-                dynamic_total_tax_sum = {}
-                dynamic_total_net_sum = {}
-                if comparison_number:
-                    if comparison_type == 'year':
-                        start_date = start_date_first
-                        end_date = end_date_first
-                        for i in range(1, eval(comparison_number) + 1):
-                            com_start_date = subtract(start_date,
-                                                      years=i)
-                            com_end_date = subtract(end_date, years=i)
-                            tax_id = self.env[
-                                'account.move.line'].search(
-                                [('tax_ids', '=', tax.id),
-                                 ('date', '>=', com_start_date),
-                                 ('date', '<=', com_end_date),
-                                 ('parent_state', 'in', option_domain)]).read(
-                                ['debit', 'credit'])
-                            tax_debit_sums = sum(
-                                record['debit'] for record in tax_id)
-                            tax_credit_sums = sum(
-                                record['credit'] for record in tax_id)
-                            dynamic_total_net_sum[
-                                f"dynamic_total_net_sum{i}"] = tax_debit_sums + tax_credit_sums
-                            dynamic_total_tax_sum[
-                                f"dynamic_total_tax_sum{i}"] = \
-                                dynamic_total_net_sum[
-                                    f"dynamic_total_net_sum{i}"] * (
-                                        tax.amount / 100)
-                    elif comparison_type == 'month':
-                        dynamic_date_num[
-                            f"dynamic_date_num{0}"] = self.get_month_name(
-                            start_date) + ' ' + str(start_date.year)
-                        for i in range(1, eval(comparison_number) + 1):
-                            com_start_date = subtract(start_date, months=i)
-                            com_end_date = subtract(end_date, months=i)
-                            tax_id = self.env[
-                                'account.move.line'].search(
-                                [('tax_ids', '=', tax.id),
-                                 ('date', '>=', com_start_date),
-                                 ('date', '<=', com_end_date),
-                                 ('parent_state', 'in', option_domain)]).read(
-                                ['debit', 'credit'])
-                            tax_debit_sums = sum(
-                                record['debit'] for record in tax_id)
-                            tax_credit_sums = sum(
-                                record['credit'] for record in tax_id)
-                            dynamic_total_net_sum[
-                                f"dynamic_total_net_sum{i}"] = tax_debit_sums + tax_credit_sums
-                            dynamic_total_tax_sum[
-                                f"dynamic_total_tax_sum{i}"] = \
-                                dynamic_total_net_sum[
-                                    f"dynamic_total_net_sum{i}"] * (
-                                        tax.amount / 100)
-                            dynamic_date_num[
-                                f"dynamic_date_num{i}"] = self.get_month_name(
-                                com_start_date) + ' ' + str(
-                                com_start_date.year)
-                    elif comparison_type == 'quarter':
-                        dynamic_date_num[
-                            f"dynamic_date_num{0}"] = 'Q' + ' ' + str(
-                            get_quarter_number(start_date)) + ' ' + str(
-                            start_date.year)
-                        for i in range(1, eval(comparison_number) + 1):
-                            com_start_date = subtract(start_date,
-                                                      months=i * 3)
-                            com_end_date = subtract(end_date,
-                                                    months=i * 3)
-                            tax_id = self.env[
-                                'account.move.line'].search(
-                                [('tax_ids', '=', tax.id),
-                                 ('date', '>=', com_start_date),
-                                 ('date', '<=', com_end_date),
-                                 ('parent_state', 'in', option_domain)]).read(
-                                ['debit', 'credit'])
-                            tax_debit_sums = sum(
-                                record['debit'] for record in tax_id)
-                            tax_credit_sums = sum(
-                                record['credit'] for record in tax_id)
-                            dynamic_total_net_sum[
-                                f"dynamic_total_net_sum{i}"] = tax_debit_sums + tax_credit_sums
-                            dynamic_total_tax_sum[
-                                f"dynamic_total_tax_sum{i}"] = \
-                                dynamic_total_net_sum[
-                                    f"dynamic_total_net_sum{i}"] * (
-                                        tax.amount / 100)
-                            dynamic_date_num[
-                                f"dynamic_date_num{i}"] = 'Q' + ' ' + str(
-                                get_quarter_number(
-                                    com_start_date)) + ' ' + str(
-                                com_start_date.year)
-                tax_id = self.env['account.move.line'].search(
-                    [('tax_ids', '=', tax.id),
-                     ('parent_state', 'in', option_domain),
-                     ('date', '>=', start_date_first),
-                     ('date', '<=', end_date_first)]).read(['debit', 'credit'])
-                tax_debit_sums = sum(record['debit'] for record in tax_id)
-                tax_credit_sums = sum(record['credit'] for record in tax_id)
-                if tax.type_tax_use == 'sale':
-                    if comparison_number:
-                        sale.append({
-                            'name': tax.name,
-                            'amount': tax.amount,
-                            'net': round(tax_debit_sums + tax_credit_sums, 2),
-                            'tax': round((tax_debit_sums + tax_credit_sums) * (
-                                    tax.amount / 100), 2),
-                            'dynamic net': dynamic_total_net_sum,
-                            'dynamic tax': dynamic_total_tax_sum,
-                        })
-                    else:
-                        sale.append({
-                            'name': tax.name,
-                            'amount': tax.amount,
-                            'net': round(tax_debit_sums + tax_credit_sums, 2),
-                            'tax': round((tax_debit_sums + tax_credit_sums) * (
-                                    tax.amount / 100), 2),
-                        })
-                elif tax.type_tax_use == 'purchase':
-                    if comparison_number:
-                        purchase.append({
-                            'name': tax.name,
-                            'amount': tax.amount,
-                            'net': round(tax_debit_sums + tax_credit_sums, 2),
-                            'tax': round((tax_debit_sums + tax_credit_sums) * (
-                                    tax.amount / 100), 2),
-                            'dynamic net': dynamic_total_net_sum,
-                            'dynamic tax': dynamic_total_tax_sum,
-                        })
-                    else:
-                        purchase.append({
-                            'name': tax.name,
-                            'amount': tax.amount,
-                            'net': round(tax_debit_sums + tax_credit_sums, 2),
-                            'tax': round((tax_debit_sums + tax_credit_sums) * (
-                                    tax.amount / 100), 2),
-                        })
+            rows = [(tax, False, net_sums[tax.id, False])
+                    for tax in self._get_used_taxes()]
+        for tax, account, period_sums in rows:
+            row = self._get_tax_row(tax, period_sums,
+                                    comparison=bool(comparison_number))
+            if account:
+                row['account'] = account.display_name
+            if tax.type_tax_use == 'sale':
+                sale.append(row)
+            elif tax.type_tax_use == 'purchase':
+                purchase.append(row)
         return {
             'dynamic_date_num': dynamic_date_num,
             'sale': sale,
             'purchase': purchase
         }
 
+    @api.model
+    def _get_used_taxes(self):
+        """
+        Retrieve the taxes set on move lines, from the relation table of the
+        move line taxes rather than from the move lines themselves.
+
+        :return: The taxes of the report.
+        :rtype: account.tax
+        """
+        field = self.env['account.move.line']._fields['tax_ids']
+        rows = self.env.execute_query(SQL(
+            "SELECT DISTINCT %s FROM %s",
+            SQL.identifier(field.column2), SQL.identifier(field.relation)))
+        return self.env['account.tax'].search(
+            [('id', 'in', [tax_id for tax_id, in rows])])
+
+    @api.model
+    def _get_tax_sums(self, option_domain, periods, by_account=False):
+        """
+        Compute the net amount of the move lines of every tax, and of every
+        account when required, over each period, in one grouped query whatever
+        the number of periods.
+
+        :param list option_domain: The states of the moves to report.
+        :param list periods: The (start date, end date) tuples of the
+            periods, the report period first.
+        :param bool by_account: Whether to split the amounts by account.
+        :return: The net amount of each period by (tax ID, account ID), the
+            account ID being False when not split by account, and the number
+            of lines in the report period by the same keys.
+        :rtype: tuple
+        """
+        net_sums = defaultdict(lambda: [0.0] * len(periods))
+        counts = defaultdict(int)
+        period_domains = [
+            [('date', '>=', date_from), ('date', '<=', date_to)]
+            for date_from, date_to in periods if date_from <= date_to]
+        if not period_domains:
+            return net_sums, counts
+        groupby = ['tax_ids']
+        if by_account:
+            groupby.append('account_id')
+        if len(periods) > 1:
+            # The lines are grouped by dates aligned on the bounds of the
+            # periods, and each group is added to the periods containing it
+            granularity = self.env[
+                'dynamic.balance.sheet.report']._get_period_granularity(
+                periods)
+            groupby.append(f'date:{granularity}')
+        domain = expression.AND([
+            [('parent_state', 'in', option_domain), ('tax_ids', '!=', False)],
+            expression.OR(period_domains)])
+        for group in self.env['account.move.line']._read_group(
+                domain, groupby, ['debit:sum', 'credit:sum', '__count']):
+            tax = group[0]
+            key = (tax.id, group[1].id if by_account else False)
+            debit, credit, count = group[-3:]
+            for index, (date_from, date_to) in enumerate(periods):
+                if len(periods) == 1 or date_from <= group[-4] <= date_to:
+                    net_sums[key][index] += debit + credit
+                    if not index:
+                        counts[key] += count
+        return net_sums, counts
+
+    @api.model
+    def _get_tax_row(self, tax, period_sums, comparison=False):
+        """
+        Build the report line of a tax from its net amount over each period.
+
+        :param account.tax tax: The tax of the line.
+        :param list period_sums: The net amount of each period, the report
+            period first.
+        :param bool comparison: Whether to add the comparison amounts.
+        :return: The report line.
+        :rtype: dict
+        """
+        net = period_sums[0]
+        row = {
+            'name': tax.name,
+            'amount': tax.amount,
+            'net': round(net, 2),
+            'tax': round(net * (tax.amount / 100), 2),
+        }
+        if comparison:
+            row['dynamic net'] = {
+                f"dynamic_total_net_sum{i}": period_sums[i]
+                for i in range(1, len(period_sums))}
+            row['dynamic tax'] = {
+                f"dynamic_total_tax_sum{i}": period_sums[i] * (
+                        tax.amount / 100)
+                for i in range(1, len(period_sums))}
+        return row
+
     @api.model
     def get_month_name(self, date):
         """
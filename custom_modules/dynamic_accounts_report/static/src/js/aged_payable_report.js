@@ -5,6 +5,7 @@ import { useService } from "@web/core/utils/hooks";
 import { useRef, useState } from "@odoo/owl";
 import { BlockUI,unblockUI } from "@web/core/ui/block_ui";
 import { download } from "@web/core/network/download";
+import { formatFloat } from "@web/core/utils/numbers";
 const actionRegistry = registry.category("actions");
 const today = luxon.DateTime.now();
 
@@ -31,62 +32,75 @@ class AgedPayable extends owl.Component {
             diff5_sum: null,
             selected_partner: [],
             selected_partner_rec: [],
+            expanded: {},
         });
         this.load_data(self.initial_render = true);
     }
     async load_data() {
         /**
-         * Loads the data for the aged payable report.
+         * Loads the aged amounts of the partners for the aged payable report.
          */
-        let move_line_list = []
-        let move_lines_total = ''
-        let diff0Sum = 0;
-        let diff1Sum = 0;
-        let diff2Sum = 0;
-        let diff3Sum = 0;
-        let diff4Sum = 0;
-        let diff5Sum = 0;
-        let TotalCredit = 0;
-        let currency;
-        var self = this;
-        var action_title = self.props.action.display_name;
         try {
-            var self = this;
-            self.state.data = await self.orm.call("age.payable.report", "view_report", []);
-            for (const index in self.state.data) {
-                const value = self.state.data[index];
-                if (index !== 'partner_totals') {
-                    move_line_list.push(index);
-                } else {
-                    move_lines_total = value;
-
-                    for (const moveLine of Object.values(move_lines_total)) {
-                        currency = moveLine.currency_id;
-                        diff0Sum += moveLine.diff0_sum || 0;
-                        diff1Sum += moveLine.diff1_sum || 0;
-                        diff2Sum += moveLine.diff2_sum || 0;
-                        diff3Sum += moveLine.diff3_sum || 0;
-                        diff4Sum += moveLine.diff4_sum || 0;
-                        diff5Sum += moveLine.diff5_sum || 0;
-                        TotalCredit += moveLine.credit_sum || 0;
-                    }
-                }
-            }
-            self.state.move_line = move_line_list
-            self.state.total = move_lines_total
-            self.state.currency = currency
-            self.state.total_credit = TotalCredit
-            self.state.diff0_sum = diff0Sum
-            self.state.diff1_sum = diff1Sum
-            self.state.diff2_sum = diff2Sum
-            self.state.diff3_sum = diff3Sum
-            self.state.diff4_sum = diff4Sum
-            self.state.diff5_sum = diff5Sum
+            this.setTotals(await this.orm.call("age.payable.report", "view_report", []));
         }
         catch (el) {
             window.location.href;
         }
     }
+    setTotals(data) {
+        /**
+         * Sets the partners and the totals of the report from the aged
+         * amounts computed by the server, and formats them for display.
+         *
+         * @param {Object} data - The move lines and totals by partner name.
+         */
+        const sums = {diff0_sum: 0, diff1_sum: 0, diff2_sum: 0, diff3_sum: 0, diff4_sum: 0, diff5_sum: 0, credit_sum: 0};
+        const move_lines_total = data['partner_totals'] || {};
+        let currency;
+        for (const moveLine of Object.values(move_lines_total)) {
+            currency = moveLine.currency_id;
+            for (const key in sums) {
+                sums[key] += moveLine[key] || 0;
+                moveLine[key + '_display'] = this.formatAmount(moveLine[key]);
+            }
+        }
+        this.state.data = data;
+        this.state.move_line = Object.keys(data).filter((index) => index !== 'partner_totals');
+        this.state.total = move_lines_total;
+        this.state.expanded = {};
+        if (currency) {
+            this.state.currency = currency;
+        }
+        this.state.total_credit = sums.credit_sum;
+        this.state.total_credit_display = this.formatAmount(sums.credit_sum);
+        for (let index = 0; index < 6; index++) {
+            this.state[`diff${index}_sum`] = sums[`diff${index}_sum`];
+            this.state[`diff${index}_sum_display`] = this.formatAmount(sums[`diff${index}_sum`]);
+        }
+    }
+    formatAmount(value) {
+        return formatFloat(value || 0, { digits: [0, 2] });
+    }
+    async toggleMoveLine(move_line) {
+        /**
+         * Expands or folds the move lines of a partner, they are fetched from
+         * the server the first time the partner is expanded.
+         *
+         * @param {string} move_line - The name of the partner.
+         */
+        if (!this.state.expanded[move_line] && !this.state.data[move_line].length) {
+            this.state.data[move_line] = await this.orm.call("age.payable.report", "get_move_lines", [this.state.total[move_line]['partner_id'], this.date_range.el.value]);
+        }
+        this.state.expanded[move_line] = !this.state.expanded[move_line];
+    }
+    async loadExportLines() {
+        /**
+         * Fetches the move lines of all the partners, printed in the reports.
+         */
+        const export_lines = await this.orm.call("age.payable.report", "get_export_lines", [this.date_range.el.value, this.state.selected_partner]);
+        Object.assign(this.state.data, export_lines);
+        return this.state.data;
+    }
     gotoJournalEntry(ev) {
         /**
          * Navigates to the journal entry form view based on the selected event target.
@@ -141,14 +155,13 @@ class AgedPayable extends owl.Component {
          * @param {Event} ev - The event object triggered by the action.
          */
         if (!ev.target.classList.contains("selected-filter")) {
-            for (var length = 0; length < this.tbody.el.children.length; length++) {
-                 this.tbody.el.children[length].classList.add('show')
-            }
             ev.target.classList.add("selected-filter");
-        } else {
-            for (var length = 0; length < this.tbody.el.children.length; length++) {
-                this.tbody.el.children[length].classList.remove('show')
+            await this.loadExportLines();
+            for (const move_line of this.state.move_line) {
+                this.state.expanded[move_line] = true;
             }
+        } else {
+            this.state.expanded = {};
             ev.target.classList.remove("selected-filter");
         }
     }
@@ -162,6 +175,7 @@ class AgedPayable extends owl.Component {
         ev.preventDefault();
         var self = this;
         var action_title = self.props.action.display_name;
+        await this.loadExportLines();
         let totals = {
             'diff0_sum':this.state.diff0_sum,
             'diff1_sum':this.state.diff1_sum,
@@ -202,6 +216,7 @@ class AgedPayable extends owl.Component {
          */
         var self = this;
         var action_title = self.props.action.display_name;
+        await this.loadExportLines();
         let totals = {
             'diff0_sum':this.state.diff0_sum,
             'diff1_sum':this.state.diff1_sum,
@@ -247,15 +262,6 @@ class AgedPayable extends owl.Component {
           *
           * @returns {Promise<void>} - A Promise that resolves after fetching and processing the filtered data.
           */
-        let move_line_list = []
-        let move_lines_total = ''
-        let diff0Sum = 0;
-        let diff1Sum = 0;
-        let diff2Sum = 0;
-        let diff3Sum = 0;
-        let diff4Sum = 0;
-        let diff5Sum = 0;
-        let TotalCredit = 0;
         if (ev.target && ev.target.attributes["data-value"]) {
             if (ev.target.attributes["data-value"].value == 'today') {
                 this.date_range.el.value = today.toFormat('yyyy-MM-dd')
@@ -274,36 +280,7 @@ class AgedPayable extends owl.Component {
             this.state.selected_partner_rec.splice(index, 1)
             this.state.selected_partner = this.state.selected_partner_rec.map((rec) => rec.id)
         }
-        let filtered_data = await this.orm.call("age.payable.report", "get_filter_values", [this.date_range.el.value, this.state.selected_partner,]);
-        for (const index in filtered_data) {
-            const value = filtered_data[index];
-
-            if (index !== 'partner_totals') {
-                move_line_list.push(index);
-            } else {
-                move_lines_total = value;
-
-                for (const moveLine of Object.values(move_lines_total)) {
-                    diff0Sum += moveLine.diff0_sum || 0;
-                    diff1Sum += moveLine.diff1_sum || 0;
-                    diff2Sum += moveLine.diff2_sum || 0;
-                    diff3Sum += moveLine.diff3_sum || 0;
-                    diff4Sum += moveLine.diff4_sum || 0;
-                    diff5Sum += moveLine.diff5_sum || 0;
-                    TotalCredit += moveLine.credit_sum || 0;
-                }
-            }
-        }
-        this.state.data = filtered_data
-        this.state.move_line = move_line_list
-        this.state.total = move_lines_total
-        this.state.total_credit = TotalCredit
-        this.state.diff0_sum = diff0Sum
-        this.state.diff1_sum = diff1Sum
-        this.state.diff2_sum = diff2Sum
-        this.state.diff3_sum = diff3Sum
-        this.state.diff4_sum = diff4Sum
-        this.state.diff5_sum = diff5Sum
+        this.setTotals(await this.orm.call("age.payable.report", "get_filter_values", [this.date_range.el.value, this.state.selected_partner,]));
     }
     getDomain() {
         return [];
@@ -32,68 +32,74 @@ class AgedReceivable extends owl.Component {
             diff5_sum: null,
             selected_partner: [],
             selected_partner_rec: [],
+            expanded: {},
         });
         this.load_data(self.initial_render = true);
     }
     async load_data() {
         /**
-         * Loads the data for the bank book report.
+         * Loads the aged amounts of the partners for the aged receivable report.
          */
-        let move_line_list = [];
-        let move_lines_total = '';
-        let diff0Sum = 0;
-        let diff1Sum = 0;
-        let diff2Sum = 0;
-        let diff3Sum = 0;
-        let diff4Sum = 0;
-        let diff5Sum = 0;
-        let TotalDebit = 0;
-        let currency;
-        var self = this;
-        var action_title = self.props.action.display_name;
         try {
-            self.state.data = await self.orm.call("age.receivable.report", "view_report", []);
-            for (const index in self.state.data) {
-                const value = self.state.data[index];
-                if (index !== 'partner_totals') {
-                    move_line_list.push(index);
-                } else {
-                    move_lines_total = value;
-                    for (const moveLine of Object.values(move_lines_total)) {
-                        currency = moveLine.currency_id;
-                        // Use raw values for summation
-                        diff0Sum += moveLine.diff0_sum || 0;
-                        diff1Sum += moveLine.diff1_sum || 0;
-                        diff2Sum += moveLine.diff2_sum || 0;
-                        diff3Sum += moveLine.diff3_sum || 0;
-                        diff4Sum += moveLine.diff4_sum || 0;
-                        diff5Sum += moveLine.diff5_sum || 0;
-                        TotalDebit += moveLine.debit_sum || 0;
-                    }
-                }
-            }
-            self.state.move_line = move_line_list;
-            self.state.total = move_lines_total;
-            self.state.currency = currency;
-            self.state.total_debit = TotalDebit;
-            self.state.diff0_sum = diff0Sum;
-            self.state.diff1_sum = diff1Sum;
-            self.state.diff2_sum = diff2Sum;
-            self.state.diff3_sum = diff3Sum;
-            self.state.diff4_sum = diff4Sum;
-            self.state.diff5_sum = diff5Sum;
-            // Format totals for display
-            self.state.total_debit_display = formatFloat(TotalDebit, { digits: [0, 2] });
-            self.state.diff0_sum_display = formatFloat(diff0Sum, { digits: [0, 2] });
-            self.state.diff1_sum_display = formatFloat(diff1Sum, { digits: [0, 2] });
-            self.state.diff2_sum_display = formatFloat(diff2Sum, { digits: [0, 2] });
-            self.state.diff3_sum_display = formatFloat(diff3Sum, { digits: [0, 2] });
-            self.state.diff4_sum_display = formatFloat(diff4Sum, { digits: [0, 2] });
-            self.state.diff5_sum_display = formatFloat(diff5Sum, { digits: [0, 2] });
+            this.setTotals(await this.orm.call("age.receivable.report", "view_report", []));
         } catch (el) {
             window.location.href;
         }
     }
+    setTotals(data) {
+        /**
+         * Sets the partners and the totals of the report from the aged
+         * amounts computed by the server, and formats them for display.
+         *
+         * @param {Object} data - The move lines and totals by partner name.
+         */
+        const sums = {diff0_sum: 0, diff1_sum: 0, diff2_sum: 0, diff3_sum: 0, diff4_sum: 0, diff5_sum: 0, debit_sum: 0};
+        const move_lines_total = data['partner_totals'] || {};
+        let currency;
+        for (const moveLine of Object.values(move_lines_total)) {
+            currency = moveLine.currency_id;
+            for (const key in sums) {
+                sums[key] += moveLine[key] || 0;
+                moveLine[key + '_display'] = this.formatAmount(moveLine[key]);
+            }
+        }
+        this.state.data = data;
+        this.state.move_line = Object.keys(data).filter((index) => index !== 'partner_totals');
+        this.state.total = move_lines_total;
+        this.state.expanded = {};
+        if (currency) {
+            this.state.currency = currency;
+        }
+        this.state.total_debit = sums.debit_sum;
+        this.state.total_debit_display = this.formatAmount(sums.debit_sum);
+        for (let index = 0; index < 6; index++) {
+            this.state[`diff${index}_sum`] = sums[`diff${index}_sum`];
+            this.state[`diff${index}_sum_display`] = this.formatAmount(sums[`diff${index}_sum`]);
+        }
+    }
+    formatAmount(value) {
+        return formatFloat(value || 0, { digits: [0, 2] });
+    }
+    async toggleMoveLine(move_line) {
+        /**
+         * Expands or folds the move lines of a partner, they are fetched from
+         * the server the first time the partner is expanded.
+         *
+         * @param {string} move_line - The name of the partner.
+         */
+        if (!this.state.expanded[move_line] && !this.state.data[move_line].length) {
+            this.state.data[move_line] = await this.orm.call("age.receivable.report", "get_move_lines", [this.state.total[move_line]['partner_id'], this.date_range.el.value]);
+        }
+        this.state.expanded[move_line] = !this.state.expanded[move_line];
+    }
+    async loadExportLines() {
+        /**
+         * Fetches the move lines of all the partners, printed in the reports.
+         */
+        const export_lines = await this.orm.call("age.receivable.report", "get_export_lines", [this.date_range.el.value, this.state.selected_partner]);
+        Object.assign(this.state.data, export_lines);
+        return this.state.data;
+    }
     gotoJournalEntry(ev) {
         /**
          * Navigates to the journal entry form view based on the selected event target.
@@ -148,14 +154,13 @@ class AgedReceivable extends owl.Component {
          * @param {Event} ev - The event object triggered by the action.
          */
         if (!ev.target.classList.contains("selected-filter")) {
-            for (var length = 0; length < this.tbody.el.children.length; length++) {
-                 this.tbody.el.children[length].classList.add('show');
-            }
             ev.target.classList.add("selected-filter");
-        } else {
-            for (var length = 0; length < this.tbody.el.children.length; length++) {
-                this.tbody.el.children[length].classList.remove('show')
+            await this.loadExportLines();
+            for (const move_line of this.state.move_line) {
+                this.state.expanded[move_line] = true;
             }
+        } else {
+            this.state.expanded = {};
             ev.target.classList.remove("selected-filter");
         }
     }
@@ -169,6 +174,7 @@ class AgedReceivable extends owl.Component {
         ev.preventDefault();
         var self = this;
         var action_title = self.props.action.display_name;
+        await this.loadExportLines();
         let totals = {
             'diff0_sum':this.state.diff0_sum,
             'diff0_sum_display':this.state.diff0_sum_display,
@@ -216,6 +222,7 @@ class AgedReceivable extends owl.Component {
          */
         var self = this;
         var action_title = self.props.action.display_name;
+        await this.loadExportLines();
         let totals = {
             'diff0_sum':this.state.diff0_sum,
             'diff1_sum':this.state.diff1_sum,
@@ -251,15 +258,6 @@ class AgedReceivable extends owl.Component {
         });
     }
     async applyFilter(ev, e, is_delete = false) {
-        let move_line_list = []
-        let move_lines_total = ''
-        let diff0Sum = 0;
-        let diff1Sum = 0;
-        let diff2Sum = 0;
-        let diff3Sum = 0;
-        let diff4Sum = 0;
-        let diff5Sum = 0;
-        let TotalDebit = 0;
         if (ev.target && ev.target.attributes["data-value"]) {
             if (ev.target.attributes["data-value"].value == 'today') {
                 this.date_range.el.value = today.toFormat('yyyy-MM-dd')
@@ -278,34 +276,7 @@ class AgedReceivable extends owl.Component {
             this.state.selected_partner_rec.splice(index, 1)
             this.state.selected_partner = this.state.selected_partner_rec.map((rec) => rec.id)
         }
-        let filtered_data = await this.orm.call("age.receivable.report", "get_filter_values", [this.date_range.el.value, this.state.selected_partner,]);
-        for (const index in filtered_data) {
-            const value = filtered_data[index];
-            if (index !== 'partner_totals') {
-                move_line_list.push(index);
-            } else {
-                move_lines_total = value;
-                for (const moveLine of Object.values(move_lines_total)) {
-                    diff0Sum += moveLine.diff0_sum || 0;
-                    diff1Sum += moveLine.diff1_sum || 0;
-                    diff2Sum += moveLine.diff2_sum || 0;
-                    diff3Sum += moveLine.diff3_sum || 0;
-                    diff4Sum += moveLine.diff4_sum || 0;
-                    diff5Sum += moveLine.diff5_sum || 0;
-                    TotalDebit += moveLine.debit_sum || 0;
-                }
-            }
-        }
-        this.state.data = filtered_data
-        this.state.move_line = move_line_list
-        this.state.total = move_lines_total
-        this.state.total_debit = TotalDebit
-        this.state.diff0_sum = diff0Sum
-        this.state.diff1_sum = diff1Sum
-        this.state.diff2_sum = diff2Sum
-        this.state.diff3_sum = diff3Sum
-        this.state.diff4_sum = diff4Sum
-        this.state.diff5_sum = diff5Sum
+        this.setTotals(await this.orm.call("age.receivable.report", "get_filter_values", [this.date_range.el.value, this.state.selected_partner,]));
     }
     getDomain() {
         return [];
@@ -38,6 +38,8 @@ class GeneralLedger extends owl.Component {
             method: {
                         'accural': true
                     },
+            expanded: {},
+            next_page: {},
         });
         this.load_data(self.initial_render = true);
     }
@@ -61,10 +63,8 @@ class GeneralLedger extends owl.Component {
         var action_title = self.props.action.display_name;
         try {
             var self = this;
-            let filtered_data = await this.orm.call("account.general.ledger", "get_filter_values", [self.state.selected_journal_list, self.state.date_range, self.state.options, self.state.selected_analytic_list,self.state.method]);
-            self.state.journals = filtered_data['journal_ids']
-            self.state.analytics = filtered_data['analytic_ids']
-            account_totals = filtered_data['account_totals']
+            self.state.expanded = {}
+            self.state.next_page = {}
             self.state.account_data = await self.orm.call("account.general.ledger", "view_report", [self.wizard_id, action_title,]);
             for (const [index, value] of Object.entries(self.state.account_data)){
                 if (index !== 'account_totals' && index !== 'journal_ids' && index !== 'analytic_ids') {
@@ -104,9 +104,33 @@ class GeneralLedger extends owl.Component {
             window.location.href;
         }
     }
+    filterArgs() {
+        return [this.state.selected_journal_list, this.state.date_range, this.state.options, this.state.selected_analytic_list, this.state.method];
+    }
+    async loadLines(account) {
+        // Fetch the next page of the move lines of the account, after the
+        // (date, id) key of the last line already fetched
+        const account_id = this.state.account_data.account_totals[account]['account_id'];
+        const after = this.state.next_page[account] || null;
+        const page = await this.orm.call("account.general.ledger", "get_move_lines", [account_id, ...this.filterArgs(), after]);
+        this.state.account_data[account] = after ? [...this.state.account_data[account], ...page.lines] : page.lines;
+        this.state.next_page[account] = page.next;
+    }
+    async toggleAccount(account) {
+        if (!this.state.expanded[account] && !(this.state.account_data[account] || []).length) {
+            await this.loadLines(account);
+        }
+        this.state.expanded[account] = !this.state.expanded[account];
+    }
+    async loadExportLines() {
+        // The printed reports contain every line, not only the fetched pages
+        const export_lines = await this.orm.call("account.general.ledger", "get_export_lines", this.filterArgs());
+        return Object.assign({}, this.state.account_data, export_lines);
+    }
     async printPdf(ev) {
         ev.preventDefault();
         var self = this;
+        const account_data = await this.loadExportLines();
         let totals = {
             'total_debit':this.state.total_debit || false,
             'total_debit_display':this.state.total_debit_display || false,
@@ -122,7 +146,7 @@ class GeneralLedger extends owl.Component {
             'report_file': 'dynamic_accounts_report.general_ledger',
             'data': {
                 'account': self.state.account,
-                'account_data': self.state.account_data,
+                'account_data': account_data,
                 'total': self.state.account_total,
                 'title': action_title,
                 'filters': this.filter(),
@@ -134,6 +158,7 @@ class GeneralLedger extends owl.Component {
     }
     async print_xlsx() {
         var self = this;
+        const account_data = await this.loadExportLines();
         let totals = {
             'total_debit':this.state.total_debit,
             'total_debit_display':this.state.total_debit_display || false,
@@ -144,7 +169,7 @@ class GeneralLedger extends owl.Component {
         var action_title = self.props.action.display_name;
         var datas = {
             'account': self.state.account,
-            'data': self.state.account_data,
+            'data': account_data,
             'total': self.state.account_total,
             'title': action_title,
             'filters': this.filter(),
@@ -321,6 +346,8 @@ class GeneralLedger extends owl.Component {
             }
         }
         this.state.account = account_list
+        this.state.expanded = {}
+        this.state.next_page = {}
         this.state.account_data = filtered_data
         this.state.account_total = account_totals
         this.state.total_debit = totalDebitSum.toFixed(2)
@@ -330,15 +357,17 @@ class GeneralLedger extends owl.Component {
         }
     }
     async unfoldAll(ev) {
+        const accounts = Object.keys(this.state.account_data.account_totals || {});
         if (!ev.target.classList.contains("selected-filter")) {
-            for (var length = 0; length < this.tbody.el.children.length; length++) {
-                this.tbody.el.children[length].classList.add('show')
-            }
             ev.target.classList.add("selected-filter");
-        } else {
-            for (var length = 0; length < this.tbody.el.children.length; length++) {
-                this.tbody.el.children[length].classList.remove('show')
+            await Promise.all(accounts.filter(
+                (account) => !(this.state.account_data[account] || []).length
+            ).map((account) => this.loadLines(account)));
+            for (const account of accounts) {
+                this.state.expanded[account] = true;
             }
+        } else {
+            this.state.expanded = {};
             ev.target.classList.remove("selected-filter");
         }
     }
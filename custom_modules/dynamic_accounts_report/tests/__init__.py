@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+from . import test_balance_sheet_report
+from . import test_trial_balance
+from . import test_tax_report
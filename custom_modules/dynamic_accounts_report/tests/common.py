@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from datetime import date
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+# Dates on both sides of the bounds of the periods below
+MOVE_DATES = [
+    date(2023, 12, 31), date(2024, 1, 1), date(2024, 1, 12),
+    date(2024, 1, 13), date(2024, 1, 31), date(2024, 2, 1),
+    date(2024, 2, 12), date(2024, 2, 13), date(2024, 2, 29),
+    date(2024, 3, 1),
+]
+# Comparison periods, the report period first, by granularity of their bounds
+PERIODS = {
+    'year': [(date(2024, 1, 1), date(2024, 12, 31)),
+             (date(2023, 1, 1), date(2023, 12, 31))],
+    'month': [(date(2024, 2, 1), date(2024, 2, 29)),
+              (date(2024, 1, 1), date(2024, 1, 31)),
+              (date(2023, 12, 1), date(2023, 12, 31))],
+    # The 1st to the 12th of each month, as compared by month
+    'day': [(date(2024, 2, 1), date(2024, 2, 12)),
+            (date(2024, 1, 1), date(2024, 1, 12)),
+            (date(2023, 12, 1), date(2023, 12, 12))],
+}
+
+
+class DynamicReportsCommon(AccountTestInvoicingCommon):
+    """Moves straddling the bounds of the comparison periods"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.journal = cls.company_data['default_journal_misc']
+        cls.account_revenue = cls.company_data['default_account_revenue']
+        cls.account_receivable = cls.company_data['default_account_receivable']
+        for index, move_date in enumerate(MOVE_DATES, start=1):
+            cls._create_entry(move_date, 100.0 * index)
+        # A draft entry, left out of the posted balances
+        cls._create_entry(date(2024, 1, 5), 7.0, post=False)
+
+    @classmethod
+    def _create_entry(cls, move_date, amount, post=True):
+        """Entry of ``amount`` from the revenue to the receivable account"""
+        move = cls.env['account.move'].create({
+            'move_type': 'entry',
+            'date': move_date,
+            'journal_id': cls.journal.id,
+            'line_ids': [
+                (0, 0, {'account_id': cls.account_receivable.id,
+                        'debit': amount, 'credit': 0.0}),
+                (0, 0, {'account_id': cls.account_revenue.id,
+                        'debit': 0.0, 'credit': amount}),
+            ],
+        })
+        if post:
+            move.action_post()
+        return move
+
+    def _search_sums(self, domain, date_from, date_to, field_names):
+        """Sums of the fields of the move lines of the period, by account ID,
+        the period being unbounded without start date"""
+        sums = defaultdict(lambda: [0.0] * len(field_names))
+        domain = domain + [('date', '<=', date_to)]
+        if date_from:
+            domain.append(('date', '>=', date_from))
+        for line in self.env['account.move.line'].search(domain):
+            for index, field_name in enumerate(field_names):
+                sums[line.account_id.id][index] += line[field_name]
+        return sums
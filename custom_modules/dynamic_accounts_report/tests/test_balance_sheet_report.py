@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from odoo.tests import tagged
+
+from .common import PERIODS, DynamicReportsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBalanceSheetReport(DynamicReportsCommon):
+    """Test the balances of the Profit and Loss and Balance Sheet report"""
+
+    def setUp(self):
+        super().setUp()
+        self.report_model = self.env['dynamic.balance.sheet.report']
+        self.report = self.report_model.create({})
+        self.report.write({'journal_ids': [(6, 0, self.journal.ids)]})
+
+    def _assert_balances(self, periods):
+        """The balances of each period are those searched line by line"""
+        balances = self.report_model._get_balances(self.report, periods)
+        self.assertEqual(len(balances), len(periods))
+        states = ['posted', 'draft'] if self.report.target_move == 'draft' \
+            else ['posted']
+        domain = [('parent_state', 'in', states),
+                  ('journal_id', 'in', self.journal.ids)]
+        for (date_from, date_to), period_balances in zip(periods, balances):
+            expected = self._search_sums(domain, date_from, date_to,
+                                         ['balance'])
+            self.assertEqual(
+                {account_id for account_id, balance in period_balances.items()
+                 if balance},
+                {account_id for account_id, (balance,) in expected.items()
+                 if balance})
+            for account_id, (balance,) in expected.items():
+                self.assertAlmostEqual(period_balances[account_id], balance,
+                                       msg=(date_from, date_to))
+
+    def test_period_granularity(self):
+        """The grouping is aligned on the bounds of all the periods"""
+        for granularity, periods in PERIODS.items():
+            self.assertEqual(
+                self.report_model._get_period_granularity(periods),
+                granularity)
+        # Empty periods do not count
+        self.assertEqual(self.report_model._get_period_granularity(
+            PERIODS['month'] + [(date(2024, 1, 13), date(2024, 1, 12))]),
+            'month')
+        # The monthly comparison of the report runs from the 1st to the 12th
+        periods = self.report_model._get_periods(self.report, 2, 'month')
+        self.assertEqual(self.report_model._get_period_granularity(periods),
+                         'day')
+
+    def test_balances_by_year(self):
+        self._assert_balances(PERIODS['year'])
+
+    def test_balances_by_month(self):
+        self._assert_balances(PERIODS['month'])
+
+    def test_balances_by_day(self):
+        self._assert_balances(PERIODS['day'])
+
+    def test_balances_single_period(self):
+        self._assert_balances([(date(2024, 1, 12), date(2024, 2, 12))])
+
+    def test_balances_empty_period(self):
+        periods = PERIODS['day'] + [(date(2024, 1, 13), date(2024, 1, 12))]
+        balances = self.report_model._get_balances(self.report, periods)
+        self.assertFalse(any(balances[-1].values()))
+        self._assert_balances(periods)
+
+    def test_balances_draft(self):
+        """The draft entries are added when the target moves are draft"""
+        periods = PERIODS['day']
+        posted_balances = self.report_model._get_balances(self.report, periods)
+        self.report.target_move = 'draft'
+        balances = self.report_model._get_balances(self.report, periods)
+        self.assertAlmostEqual(
+            balances[1][self.account_receivable.id] -
+            posted_balances[1][self.account_receivable.id], 7.0)
+        self._assert_balances(periods)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from datetime import date
+
+from odoo.tests import tagged
+
+from .common import MOVE_DATES, PERIODS, DynamicReportsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestTaxReport(DynamicReportsCommon):
+    """Test the net amounts of the Tax report"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for index, move_date in enumerate(MOVE_DATES, start=1):
+            cls.init_invoice('out_invoice', invoice_date=move_date,
+                             amounts=[10.0 * index],
+                             taxes=cls.tax_sale_a, post=True)
+            cls.init_invoice('in_invoice', invoice_date=move_date,
+                             amounts=[3.0 * index],
+                             taxes=cls.tax_purchase_a, post=True)
+        # A draft invoice, left out of the posted amounts
+        cls.init_invoice('out_invoice', invoice_date=date(2024, 1, 5),
+                         amounts=[1000.0], taxes=cls.tax_sale_a)
+
+    def _search_tax_sums(self, date_from, date_to, by_account=False):
+        """Net amount and number of the lines of the period, by (tax ID,
+        account ID)"""
+        net_sums = defaultdict(float)
+        counts = defaultdict(int)
+        for line in self.env['account.move.line'].search([
+                ('parent_state', 'in', ['posted']),
+                ('tax_ids', '!=', False),
+                ('date', '>=', date_from), ('date', '<=', date_to)]):
+            for tax in line.tax_ids:
+                key = (tax.id, line.account_id.id if by_account else False)
+                net_sums[key] += line.debit + line.credit
+                counts[key] += 1
+        return net_sums, counts
+
+    def _assert_tax_sums(self, periods, by_account=False):
+        """The net amounts of each period are those searched line by line,
+        and the counts those of the report period"""
+        net_sums, counts = self.env['tax.report']._get_tax_sums(
+            ['posted'], periods, by_account=by_account)
+        for index, (date_from, date_to) in enumerate(periods):
+            expected, expected_counts = self._search_tax_sums(
+                date_from, date_to, by_account=by_account)
+            self.assertEqual(
+                {key for key, sums in net_sums.items() if sums[index]},
+                {key for key, net in expected.items() if net})
+            for key, net in expected.items():
+                self.assertAlmostEqual(net_sums[key][index], net,
+                                       msg=(key, date_from, date_to))
+            if not index:
+                self.assertEqual(dict(counts), dict(expected_counts))
+        return net_sums
+
+    def test_tax_sums_by_year(self):
+        self._assert_tax_sums(PERIODS['year'])
+
+    def test_tax_sums_by_month(self):
+        self._assert_tax_sums(PERIODS['month'])
+
+    def test_tax_sums_by_day(self):
+        net_sums = self._assert_tax_sums(PERIODS['day'])
+        # 1st and 12th of January: 20.0 + 30.0, the draft invoice left out
+        self.assertAlmostEqual(net_sums[self.tax_sale_a.id, False][1], 50.0)
+
+    def test_tax_sums_by_account(self):
+        self._assert_tax_sums(PERIODS['day'], by_account=True)
+
+    def test_tax_sums_single_period(self):
+        self._assert_tax_sums([(date(2024, 1, 13), date(2024, 2, 12))])
+
+    def test_tax_sums_empty_period(self):
+        net_sums = self._assert_tax_sums(
+            PERIODS['month'] + [(date(2024, 1, 13), date(2024, 1, 12))])
+        self.assertFalse(any(sums[-1] for sums in net_sums.values()))
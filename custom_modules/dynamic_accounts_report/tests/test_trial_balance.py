@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from datetime import date, timedelta
+
+from odoo.tests import tagged
+
+from .common import PERIODS, DynamicReportsCommon
+
+
+@tagged('post_install', '-at_install')
+class TestTrialBalance(DynamicReportsCommon):
+    """Test the balances of the Trial Balance report"""
+
+    def _assert_balances(self, periods):
+        """The initial and period debits and credits are those searched line
+        by line, the initial balance ending at the start of the last period"""
+        domain = [('parent_state', '=', 'posted'),
+                  ('journal_id', '=', self.journal.id)]
+        initial_date = periods[-1][0]
+        initial_balances, balances = self.env[
+            'account.trial.balance']._get_balances(domain, initial_date,
+                                                   periods)
+        self.assertEqual(len(balances), len(periods))
+        expected_initial = self._search_sums(
+            domain, False, initial_date - timedelta(days=1),
+            ['debit', 'credit'])
+        self._assert_sums(initial_balances, expected_initial)
+        for (date_from, date_to), period_balances in zip(periods, balances):
+            expected = self._search_sums(domain, date_from, date_to,
+                                         ['debit', 'credit'])
+            self._assert_sums(period_balances, expected)
+        return balances
+
+    def _assert_sums(self, balances, expected):
+        self.assertEqual(
+            set(balances),
+            {account_id for account_id, sums in expected.items()
+             if any(sums)})
+        for account_id, (debit, credit) in expected.items():
+            self.assertAlmostEqual(balances[account_id][0], debit)
+            self.assertAlmostEqual(balances[account_id][1], credit)
+
+    def test_balances_by_year(self):
+        self._assert_balances(PERIODS['year'])
+
+    def test_balances_by_month(self):
+        self._assert_balances(PERIODS['month'])
+
+    def test_balances_by_day(self):
+        self._assert_balances(PERIODS['day'])
+
+    def test_balances_single_period(self):
+        self._assert_balances([(date(2024, 1, 13), date(2024, 2, 12))])
+
+    def test_balances_empty_period(self):
+        periods = [(date(2024, 1, 13), date(2024, 1, 12))] + PERIODS['day']
+        balances = self._assert_balances(periods)
+        self.assertEqual(balances[0], {})